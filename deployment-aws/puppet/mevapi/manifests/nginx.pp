@@ -8,6 +8,10 @@ class mevapi::nginx () {
   # custom log parsing solutions
   $nextflow_update_url = "/api/nextflow/status-update/"
 
+  # The job status stream (server-sent events) is long-lived, so it is
+  # served by gunicorn with gevent workers (see gunicorn.conf.epp)
+  $status_stream_url = "/api/executed-operations/status-stream/"
+
   class { 'nginx':
     confd_purge => true,  # remove default config
   }
@@ -20,6 +24,24 @@ class mevapi::nginx () {
       }
     }
   }
+  nginx::resource::upstream { 'mev_stream':
+    members => {
+      'gunicorn_stream' => {
+        server       => 'unix:/tmp/gunicorn_stream.sock',
+        fail_timeout => '0s',
+      }
+    }
+  }
+  # The Nextflow status updates are served by a separate, single-process
+  # gunicorn since the events are buffered in memory (see gunicorn.conf.epp)
+  nginx::resource::upstream { 'mev_nextflow':
+    members => {
+      'gunicorn_nextflow' => {
+        server       => 'unix:/tmp/gunicorn_nextflow.sock',
+        fail_timeout => '0s',
+      }
+    }
+  }
   # This map helps in situations where the request doesn't reach the
   # gunicorn application server. An example is when the payload
   # exceeds the client_max_body_size. In that case, nginx immediately
@@ -55,6 +77,24 @@ class mevapi::nginx () {
           'X-Forwarded-Port  $server_port',
         ],
       },
+      'status-stream' => {
+        location           => "${status_stream_url}",
+        add_header         => {
+          'Access-Control-Allow-Origin' => { '$cors_origin' => 'always' },
+        },
+        proxy              => 'http://mev_stream',
+        proxy_redirect     => 'off',
+        proxy_buffering    => 'off',
+        # longer than the interval between the heartbeats of the stream
+        proxy_read_timeout => '60s',
+        proxy_set_header   => [
+          'Host              $host',
+          'X-Forwarded-For   $proxy_add_x_forwarded_for',
+          'X-Forwarded-Proto $scheme',
+          'X-Forwarded-Host  $host',
+          'X-Forwarded-Port  $server_port',
+        ],
+      },
       'static' => {
         location       => '/static/',
         location_alias => "${mevapi::django::static_root}/",
@@ -74,7 +114,7 @@ class mevapi::nginx () {
     locations            => {
       'nf-status-update'   => {
         location         => "${nextflow_update_url}",
-        proxy            => 'http://mev_app',
+        proxy            => 'http://mev_nextflow',
       },
     },
   }
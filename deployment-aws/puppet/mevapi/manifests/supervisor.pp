@@ -1,6 +1,37 @@
 class mevapi::supervisor () {
   $conf_dir = '/etc/supervisor'
 
+  # Celery workers, keyed by name. Queues of long-running tasks get a
+  # small concurrency and no prefetching so that a burst of them doesn't
+  # tie up the machine or hide the priorities of the waiting tasks.
+  $celery_workers = {
+    'job_control'  => {
+      'queues'              => 'job_control',
+      'concurrency'         => 4,
+      'prefetch_multiplier' => 4,
+    },
+    'housekeeping' => {
+      'queues'              => 'housekeeping,celery',
+      'concurrency'         => 2,
+      'prefetch_multiplier' => 4,
+    },
+    'validation'   => {
+      'queues'              => 'validation',
+      'concurrency'         => 2,
+      'prefetch_multiplier' => 1,
+    },
+    'public_data'  => {
+      'queues'              => 'public_data',
+      'concurrency'         => 1,
+      'prefetch_multiplier' => 1,
+    },
+    'ingestion'    => {
+      'queues'              => 'ingestion',
+      'concurrency'         => 1,
+      'prefetch_multiplier' => 1,
+    },
+  }
+
   package { 'supervisor': }
   ->
   file {
@@ -13,7 +44,9 @@ class mevapi::supervisor () {
     "${conf_dir}/conf.d/celery_beat.conf":
       content => epp('mevapi/supervisor/celery_beat.conf.epp'),;
     "${conf_dir}/conf.d/celery_worker.conf":
-      content => epp('mevapi/supervisor/celery_worker.conf.epp'),;
+      content => epp('mevapi/supervisor/celery_worker.conf.epp', {
+        'workers' => $celery_workers,
+      }),;
   }
   ->
   file { '/tmp/supervisor':
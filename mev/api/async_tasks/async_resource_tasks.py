@@ -1,9 +1,11 @@
 import logging
+import datetime
 
 from celery import shared_task
 
 from django.core.files.storage import default_storage
 from django.conf import settings
+from django.utils import timezone
 
 from exceptions import ResourceValidationException
 
@@ -23,6 +25,36 @@ def delete_file(resource_path):
     default_storage.delete(resource_path)
 
 
+@shared_task(name='cleanup_abandoned_direct_uploads')
+def cleanup_abandoned_direct_uploads():
+    '''
+    Aborts the direct (multipart) uploads which were started but never
+    completed or aborted by the client, and removes their placeholder
+    Resources. This is run periodically (see mev/celery_app.py).
+
+    Only the uploads of placeholder Resources which have not been
+    modified (e.g. by a request for part URLs) in the last
+    DIRECT_UPLOAD_ABANDONED_AFTER seconds are aborted.
+    '''
+    cutoff = timezone.now() - datetime.timedelta(
+        seconds=settings.DIRECT_UPLOAD_ABANDONED_AFTER)
+    abandoned_resources = Resource.objects.filter(
+        is_active=False,
+        status=Resource.UPLOADING,
+        modification_datetime__lt=cutoff
+    )
+    for r in abandoned_resources:
+        logger.info(f'Removing the abandoned direct upload for resource {r.pk}')
+        try:
+            default_storage.abort_resource_multipart_uploads(r)
+        except NotImplementedError:
+            # local storage does not support direct uploads
+            return
+        except Exception as ex:
+            logger.info('Failed to remove the abandoned direct upload for'
+                f' resource {r.pk}. Reason: {ex}')
+
+
 @shared_task(name='validate_resource')
 def validate_resource(resource_pk, requested_resource_type, file_format):
     '''
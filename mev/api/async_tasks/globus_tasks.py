@@ -7,16 +7,22 @@ from django.core.files.storage import default_storage
 from django.contrib.auth import get_user_model
 from django.conf import settings
 
-from globus_sdk import TransferData
+from globus_sdk import TransferData, GlobusAPIError
 
 from api.utilities.globus import \
     create_user_transfer_client, \
     create_application_transfer_client, \
+    create_endpoint_manager_transfer_client, \
+    get_transfer_tasks, \
+    infer_transfer_direction, \
     add_acl_rule, \
     get_globus_uuid, \
     submit_transfer, \
     post_upload, \
     delete_acl_rule, \
+    perform_concurrent_copies, \
+    COPY_SUCCEEDED, \
+    GLOBUS_TASK_COMPLETED_STATUSES, \
     GLOBUS_UPLOAD, \
     GLOBUS_DOWNLOAD
 from api.models import GlobusTask, \
@@ -28,27 +34,104 @@ logger = logging.getLogger(__name__)
 
 @shared_task(name='poll_globus_task')
 def poll_globus_task(task_id, transfer_direction):
-    try:
-        task = GlobusTask.objects.get(task_id=task_id)
-    except GlobusTask.DoesNotExist:
-        logger.info(f'Could not locate task with ID: {task_id}') 
-        alert_admins('Failed to poll a Globus transfer task.'
-            f' Received an invalid ID of {task_id}'
-        )
+    '''
+    Deprecated. Previously, this task waited on each transfer. It is
+    kept so that any messages queued prior to the switch to
+    `check_globus_tasks` are still handled: we record the direction of
+    the transfer and leave the tracking to the periodic status checks.
 
-    user_transfer_client = create_user_transfer_client(task.user)
+    This can be removed once a release with `check_globus_tasks` has
+    been deployed and no `poll_globus_task` messages remain in the queue.
+    '''
+    GlobusTask.objects.filter(task_id=task_id, transfer_direction='').update(
+        transfer_direction=transfer_direction)
 
-    logger.info(f'Query Globus for transfer status ({task_id})')
-    while not user_transfer_client.task_wait(task_id):
-        logger.info(f'Task {task_id} not complete.')
 
-    logger.info(f'Task {task_id} completed.')
-    if transfer_direction == GLOBUS_UPLOAD:
-        post_upload(task_id, task.user)
+@shared_task(name='check_globus_tasks')
+def check_globus_tasks():
+    '''
+    Checks on the status of all the in-progress Globus transfers. This
+    is run periodically (see mev/celery_app.py) rather than having a
+    task wait on each transfer, which would occupy a worker for the
+    duration of the transfer.
 
-    # Now that the transfer is complete, we can remove modify the ACL on
-    # the collection and mark this transfer as complete (in our db)
-    delete_acl_rule(task.rule_id)
+    Completed transfers are finalized in a separate task so that
+    this check remains short.
+    '''
+    active_tasks = list(GlobusTask.objects.filter(
+        transfer_complete=False,
+        is_finalizing=False,
+        submission_failure=False
+    ).exclude(task_id=''))
+    if len(active_tasks) == 0:
+        return
+
+    transfer_client = create_endpoint_manager_transfer_client()
+    try:
+        task_info_dict = get_transfer_tasks(
+            transfer_client, [t.task_id for t in active_tasks])
+    except GlobusAPIError as ex:
+        logger.info(f'Failed to query the status of Globus tasks: {ex}')
+        return
+
+    for task in active_tasks:
+        task_info = task_info_dict.get(task.task_id, {})
+        task_status = task_info.get('status')
+
+        # Transfers which were started before we tracked the direction
+        # can be identified by their destination endpoint
+        if (task.transfer_direction == '') and task_info:
+            task.transfer_direction = infer_transfer_direction(task_info)
+            GlobusTask.objects.filter(pk=task.pk).update(
+                transfer_direction=task.transfer_direction)
+
+        if task_status in GLOBUS_TASK_COMPLETED_STATUSES:
+            # Set the flag for blocking multiple attempts to finalize
+            # in case the next check runs before the finalization starts.
+            num_updated = GlobusTask.objects.filter(
+                pk=task.pk, is_finalizing=False).update(is_finalizing=True)
+            if num_updated > 0:
+                logger.info(f'Task {task.task_id} completed'
+                    f' with status {task_status}.')
+                finalize_globus_task.delay(task.pk)
+        else:
+            logger.info(f'Task {task.task_id} not complete.'
+                f' Status: {task_status}')
+
+
+@shared_task(name='finalize_globus_task')
+def finalize_globus_task(globus_task_pk):
+    '''
+    Performs the work following a completed Globus transfer.
+
+    If this fails, the `is_finalizing` flag is cleared so that the
+    next status check retries, up to
+    settings.GLOBUS_MAX_FINALIZE_ATTEMPTS times. Steps which
+    completed in a prior attempt (the copy of uploaded files)
+    are not repeated.
+    '''
+    task = GlobusTask.objects.get(pk=globus_task_pk)
+    try:
+        if (task.transfer_direction == GLOBUS_UPLOAD) and (not task.upload_copied):
+            post_upload(task.task_id, task.user)
+            task.upload_copied = True
+            GlobusTask.objects.filter(pk=task.pk).update(upload_copied=True)
+
+        # Now that the transfer is complete, we can remove modify the ACL on
+        # the collection and mark this transfer as complete (in our db)
+        delete_acl_rule(task.rule_id)
+    except Exception as ex:
+        logger.info(f'Failed to finalize Globus task {task.task_id}: {ex}')
+        task.finalize_attempts += 1
+        if task.finalize_attempts < settings.GLOBUS_MAX_FINALIZE_ATTEMPTS:
+            task.is_finalizing = False
+        else:
+            # leave `is_finalizing` set so the checks no longer pick this up
+            alert_admins('Failed to finalize the Globus transfer'
+                f' {task.task_id} after {task.finalize_attempts} attempts.'
+                f' The exception was: {ex}')
+        task.save()
+        return
     task.transfer_complete = True
     task.save()
 
@@ -90,14 +173,23 @@ def perform_globus_download(resource_pk_set, user_pk, request_data):
     # collection is based.
     tmp_folder = f'tmp-{uuid.uuid4()}/'
 
-    resource_list = Resource.objects.filter(pk__in=resource_pk_set)
-    final_paths = []
-    for r in resource_list:
+    def copy_to_globus_bucket(r):
         object_name = f'{tmp_folder}{r.name}'
         default_storage.copy_out_to_bucket(
             r, settings.GLOBUS_BUCKET, object_name
         )
-        final_paths.append(object_name)
+        return object_name
+
+    resource_list = list(Resource.objects.filter(pk__in=resource_pk_set))
+    copy_status = perform_concurrent_copies(
+        copy_to_globus_bucket, resource_list)
+    final_paths = [x['result'] for x in copy_status
+        if x['status'] == COPY_SUCCEEDED]
+    failed_pks = [str(x['item'].pk) for x in copy_status
+        if x['status'] != COPY_SUCCEEDED]
+    if len(failed_pks) > 0:
+        alert_admins('Failed to copy the following resources to the'
+            f' Globus bucket for a download: {", ".join(failed_pks)}')
 
     # Create a 'read' rule and add it to the Globus shared collection
     # Note that for this, we need to 'root' the tmp folder
@@ -129,18 +221,20 @@ def perform_globus_download(resource_pk_set, user_pk, request_data):
     task_id = submit_transfer(user_transfer_client, transfer_data)
     if task_id:
         task_data = user_transfer_client.get_task(task_id)
+        # the status of the transfer is checked by `check_globus_tasks`
         GlobusTask.objects.create(
             user=webmev_user,
             task_id=task_id,
             rule_id=rule_id,
-            label=task_data['label']
+            label=task_data['label'],
+            transfer_direction=GLOBUS_DOWNLOAD
         )
-        poll_globus_task(task_id, GLOBUS_DOWNLOAD)
     else:
         GlobusTask.objects.create(
             user=webmev_user,
             task_id='',
             rule_id=rule_id,
             label='',
-            submission_failure=True
+            submission_failure=True,
+            transfer_direction=GLOBUS_DOWNLOAD
         )
\ No newline at end of file
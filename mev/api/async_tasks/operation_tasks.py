@@ -10,10 +10,14 @@ from exceptions import JobSubmissionException
 from api.models import Operation, \
     ExecutedOperation, \
     WorkspaceExecutedOperation, \
+    ExecutedOperationResource, \
     Workspace
 from api.utilities.ingest_operation import perform_operation_ingestion
 from api.runners import submit_job, finalize_job, get_runner
 from api.utilities.operations import get_operation_instance
+from api.utilities.executed_op_utilities import record_resource_usage
+from api.utilities.status_broker import publish_status
+from api.utilities.workspace_dag import update_workspace_dag
 from api.utilities.admin_utils import alert_admins
 
 logger = logging.getLogger(__name__)
@@ -105,6 +109,13 @@ def submit_async_job(executed_op_pk,
             status=ExecutedOperation.SUBMITTED
         )
 
+    # record the Resources used as inputs so we can later check
+    # whether a Resource was used without inspecting every job
+    record_resource_usage(executed_op, op.to_dict(),
+        ExecutedOperationResource.INPUT)
+    publish_status(executed_op)
+    update_workspace_dag(executed_op)
+
     try:
         submit_job(executed_op, op, validated_inputs)
     except JobSubmissionException as ex:
@@ -114,6 +125,8 @@ def submit_async_job(executed_op_pk,
                         ' An administrator has been notified.')]
         executed_op.execution_stop_datetime = datetime.datetime.now()
         executed_op.save()
+        publish_status(executed_op)
+        update_workspace_dag(executed_op)
         alert_admins(f'Job {executed_op_pk} failed for unexpected reason.')
         return
 
@@ -122,11 +135,14 @@ def submit_async_job(executed_op_pk,
 
 
 @shared_task(name='check_executed_op', bind=True, max_retries=None)
-def check_executed_op(task_self, exec_op_uuid):
+def check_executed_op(task_self, exec_op_uuid, last_status=None):
     '''
     After jobs are submitted, this task tracks their status by 
     polling the job runner. In this way, we don't depend on API
     requests to initiate the job status checks.
+
+    `last_status` is the status seen by the previous check so that
+    we only publish the status when it changes.
     '''
     logger.info('Check on status of {id}'.format(id=exec_op_uuid))
     executed_op = ExecutedOperation.objects.get(pk=exec_op_uuid)
@@ -153,9 +169,14 @@ def check_executed_op(task_self, exec_op_uuid):
         executed_op.is_finalizing = True
         executed_op.status = ExecutedOperation.FINALIZING
         executed_op.save()
+        publish_status(executed_op)
         finalize_executed_op.delay(exec_op_uuid)
     else:  # job still running
-        task_self.retry(countdown=settings.JOB_STATUS_CHECK_INTERVAL)
+        # the status can be updated elsewhere (e.g. by the runner)
+        if executed_op.status != last_status:
+            publish_status(executed_op)
+        task_self.retry(args=[exec_op_uuid, executed_op.status],
+            countdown=settings.JOB_STATUS_CHECK_INTERVAL)
 
 
 @shared_task(name='finalize_executed_op')
@@ -181,3 +202,13 @@ def finalize_executed_op(exec_op_uuid):
 
     op = get_operation_instance(executed_op.operation)
     finalize_job(executed_op, op)
+    publish_status(executed_op)
+    update_workspace_dag(executed_op)
+    try:
+        record_resource_usage(executed_op, op.to_dict(),
+            ExecutedOperationResource.OUTPUT)
+    except Exception as ex:
+        logger.error('Failed to record the output resources of executed'
+            f' op {exec_op_uuid}. Reason: {ex}')
+        alert_admins('Failed to record the output resources of executed'
+            f' op {exec_op_uuid}.')
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_alter_executedoperation_job_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='operationresource',
+            name='modification_datetime',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='modification_datetime',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='resourcemetadata',
+            name='modification_datetime',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
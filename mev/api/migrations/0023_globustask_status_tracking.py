@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 22:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_resource_modification_datetime'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globustask',
+            name='is_finalizing',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='globustask',
+            name='transfer_direction',
+            field=models.CharField(blank=True, default='', max_length=25),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.3 on 2026-10-18 22:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_globustask_status_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NextflowTaskTrace',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.IntegerField()),
+                ('process', models.CharField(max_length=255)),
+                ('name', models.CharField(blank=True, default='', max_length=255)),
+                ('status', models.CharField(blank=True, default='', max_length=25)),
+                ('exit_code', models.IntegerField(null=True)),
+                ('cpu_percent', models.FloatField(null=True)),
+                ('peak_rss', models.BigIntegerField(null=True)),
+                ('realtime', models.BigIntegerField(null=True)),
+                ('read_bytes', models.BigIntegerField(null=True)),
+                ('write_bytes', models.BigIntegerField(null=True)),
+                ('executed_operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_traces', to='api.executedoperation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['executed_operation', 'process'], name='api_nextflo_execute_2c1b63_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.3 on 2026-10-18 22:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_nextflowtasktrace'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutedOperationResource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_uuid', models.UUIDField(db_index=True)),
+                ('role', models.CharField(max_length=10)),
+                ('executed_operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resource_usages', to='api.executedoperation')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='executedoperationresource',
+            constraint=models.UniqueConstraint(fields=('executed_operation', 'resource_uuid', 'role'), name='unique_exec_op_resource_role'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+'''
+This is a data migration to record the Resources used by the existing
+ExecutedOperations in the api.models.ExecutedOperationResource table
+'''
+
+from django.db import migrations
+
+from api.utilities.operations import get_operation_instance_data
+from api.utilities.executed_op_utilities import collect_resource_uuids
+
+
+def record_resource_usage(apps, schema_editor):
+    '''
+    Prior to this migration, we determined whether a Resource was used
+    by reading the operation spec and inputs/outputs of every
+    ExecutedOperation. This script does that once for the existing
+    ExecutedOperations and records the result.
+    '''
+    ExecutedOperation = apps.get_model('api', 'ExecutedOperation')
+    ExecutedOperationResource = apps.get_model('api', 'ExecutedOperationResource')
+    op_data_cache = {}
+    for exec_op in ExecutedOperation.objects.select_related('operation').iterator():
+        try:
+            op_pk = exec_op.operation.pk
+            if op_pk not in op_data_cache:
+                op_data_cache[op_pk] = get_operation_instance_data(exec_op.operation)
+            op_data = op_data_cache[op_pk]
+            usages = []
+            for role, key, values in [
+                    ('input', 'inputs', exec_op.inputs),
+                    ('output', 'outputs', exec_op.outputs)]:
+                if values is None:
+                    continue
+                usages.extend([
+                    ExecutedOperationResource(
+                        executed_operation_id=exec_op.pk,
+                        resource_uuid=u,
+                        role=role
+                    ) for u in set(collect_resource_uuids(op_data[key], values))
+                ])
+            ExecutedOperationResource.objects.bulk_create(usages,
+                ignore_conflicts=True)
+        except Exception as ex:
+            print(f'Error when recording resources for ExecutedOperation:'
+                f' {exec_op.pk}. Error was {ex}.')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_executedoperationresource'),
+    ]
+
+    operations = [
+        migrations.RunPython(record_resource_usage, migrations.RunPython.noop)
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.3 on 2026-10-18 22:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_executedoperationresource_data_migration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkspaceDag',
+            fields=[
+                ('workspace', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dag', serialize=False, to='api.workspace')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('fragments', models.JSONField(default=dict)),
+                ('nodes', models.JSONField(default=list)),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_workspacedag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globustask',
+            name='finalize_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
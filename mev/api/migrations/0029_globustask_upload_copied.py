@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_globustask_finalize_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='globustask',
+            name='upload_copied',
+            field=models.BooleanField(default=False),
+        ),
+    ]
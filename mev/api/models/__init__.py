@@ -6,9 +6,12 @@ from .executed_operation import ExecutedOperation
 from .resource_metadata import ResourceMetadata
 from .executed_operation import ExecutedOperation
 from .workspace_executed_operation import WorkspaceExecutedOperation
+from .executed_operation_resource import ExecutedOperationResource
 from .operation_resource import OperationResource
 from .operation_category import OperationCategory
 from .public_dataset import PublicDataset
 from .feedback_message import FeedbackMessage
 from .globus import GlobusTokens, GlobusTask
-from .message import Message
\ No newline at end of file
+from .message import Message
+from .nextflow_trace import NextflowTaskTrace
+from .workspace_dag import WorkspaceDag
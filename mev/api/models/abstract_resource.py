@@ -68,6 +68,12 @@ class AbstractResource(models.Model):
         auto_now_add = True
     )
 
+    # When the resource (including its file) was last changed.
+    # Used to determine if clients have the current contents.
+    modification_datetime = models.DateTimeField(
+        auto_now = True
+    )
+
     def save(self, *args, **kwargs):
         '''
         This defines custom behavior to respect upon saving of a AbstractResource
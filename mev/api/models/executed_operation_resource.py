@@ -0,0 +1,35 @@
+from django.db import models
+
+from api.models import ExecutedOperation
+
+
+class ExecutedOperationResource(models.Model):
+    '''
+    Records that a Resource was used by an ExecutedOperation, either
+    as an input or an output. This lets us check whether a Resource was
+    used (e.g. before removing it from a Workspace) without reading the
+    operation spec and inputs/outputs of every ExecutedOperation.
+    '''
+    INPUT = 'input'
+    OUTPUT = 'output'
+
+    executed_operation = models.ForeignKey(
+        ExecutedOperation,
+        related_name='resource_usages',
+        on_delete=models.CASCADE
+    )
+
+    # Not a foreign key since the inputs/outputs of an ExecutedOperation
+    # keep the UUIDs of Resources which may be deleted later.
+    resource_uuid = models.UUIDField(db_index=True)
+
+    # whether the Resource was an input or output
+    role = models.CharField(max_length=10)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['executed_operation', 'resource_uuid', 'role'],
+                name='unique_exec_op_resource_role'
+            )
+        ]
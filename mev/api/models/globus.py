@@ -35,4 +35,23 @@ class GlobusTask(models.Model):
     # immediately know whether a submission was successful. Without this field,
     # we don't have a way to indicate a submission failure to the user
     submission_failure = models.BooleanField(default=False)
-    
\ No newline at end of file
+    
+    # whether the transfer is to (upload) or from (download) WebMeV.
+    # Uploads require that we copy the files into our storage once
+    # the transfer is complete.
+    transfer_direction = models.CharField(max_length=25, blank=True, default='')
+
+    # Set once the transfer is complete and we have started the
+    # post-transfer work. This prevents the periodic status checks
+    # from finalizing a transfer more than once.
+    is_finalizing = models.BooleanField(default=False)
+
+    # The number of failed attempts at the post-transfer work. Failed
+    # attempts are retried by the periodic status checks up to
+    # settings.GLOBUS_MAX_FINALIZE_ATTEMPTS times.
+    finalize_attempts = models.PositiveIntegerField(default=0)
+
+    # Set once the files of an upload have been copied into our storage.
+    # The copy removes the uploaded files, so a retried finalization
+    # (e.g. after failing to remove the ACL rule) must not repeat it.
+    upload_copied = models.BooleanField(default=False)
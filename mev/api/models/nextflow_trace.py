@@ -0,0 +1,44 @@
+from django.db import models
+
+from api.models import ExecutedOperation
+
+
+class NextflowTaskTrace(models.Model):
+    '''
+    Holds the trace (resource usage) of a single Nextflow task (i.e. one
+    execution of a process) which Nextflow reports when the task completes.
+    Used to aggregate runtime and memory usage per process for sizing
+    the process resource directives.
+    '''
+
+    executed_operation = models.ForeignKey(
+        ExecutedOperation,
+        related_name='task_traces',
+        on_delete=models.CASCADE
+    )
+
+    # the Nextflow-assigned task ID, unique within a run
+    task_id = models.IntegerField()
+
+    # the name of the process (e.g. "align") and the name
+    # of the task (e.g. "align (3)")
+    process = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, blank=True, default='')
+
+    # the final status (e.g. "COMPLETED") and exit code of the task
+    status = models.CharField(max_length=25, blank=True, default='')
+    exit_code = models.IntegerField(null=True)
+
+    # Resource usage. Note that Nextflow reports the CPU usage as a
+    # percentage of a single core, the memory and I/O in bytes and
+    # the realtime in milliseconds. Any of these can be missing.
+    cpu_percent = models.FloatField(null=True)
+    peak_rss = models.BigIntegerField(null=True)
+    realtime = models.BigIntegerField(null=True)
+    read_bytes = models.BigIntegerField(null=True)
+    write_bytes = models.BigIntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['executed_operation', 'process'])
+        ]
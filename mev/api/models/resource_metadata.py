@@ -38,6 +38,11 @@ class ResourceMetadata(models.Model):
     observation_set = JSONField(blank = True,null = True)
     feature_set = JSONField(blank = True, null = True)
 
+    # When the metadata was last changed
+    modification_datetime = models.DateTimeField(
+        auto_now = True
+    )
+
     def __str__(self):
         return '''ResourceMetadata
           Resource: {resource_pk}
@@ -0,0 +1,32 @@
+from django.db import models
+
+from api.models import Workspace
+
+
+class WorkspaceDag(models.Model):
+    '''
+    A stored representation of the DAG (directed acyclic graph) of the
+    resources and executed operations in a Workspace. The DAG only changes
+    when an operation is executed in the Workspace, so we update it at those
+    times rather than rebuilding it for each request.
+    '''
+
+    workspace = models.OneToOneField(
+        Workspace,
+        primary_key=True,
+        related_name='dag',
+        on_delete=models.CASCADE
+    )
+
+    # incremented on each change so clients can tell if their copy is current
+    version = models.PositiveIntegerField(default=0)
+
+    # maps the UUID of each ExecutedOperation to the (serialized) nodes
+    # it contributes. An operation can then be updated without
+    # touching the others.
+    fragments = models.JSONField(default=dict)
+
+    # the (serialized) nodes of the full DAG, merged from the fragments
+    nodes = models.JSONField(default=list)
+
+    last_modified = models.DateTimeField(auto_now=True)
@@ -6,7 +6,8 @@ from django.core.files import File
 
 from api.models import PublicDataset, Resource
 from api.async_tasks.async_resource_tasks import validate_resource
-from api.utilities.resource_utilities import create_resource
+from api.utilities.resource_utilities import create_resource, \
+    register_trusted_resource
 from api.utilities.basic_utils import delete_local_file
 from .sources.gdc.tcga import TCGARnaSeqDataSource, \
     TCGAMicroRnaSeqDataSource, \
@@ -96,13 +97,16 @@ def index_dataset(dataset_db_instance, file_mapping):
 
     files_to_index = dataset.get_indexable_files(file_mapping)
 
-    # get the implementation for the indexing tool and instantiate
+    # get the implementation for the indexing tool and instantiate.
+    # The files are committed together once they are all indexed.
     indexer = get_indexer()
-    for filepath in files_to_index:
-        try:
-            indexer.index(index_name, filepath)
-        except Exception as ex:
-            return
+    try:
+        for filepath in files_to_index:
+            indexer.index(index_name, filepath, commit=False)
+        indexer.commit(index_name)
+    except Exception as ex:
+        logger.info(f'Failed to index the {index_name} dataset. Reason: {ex}')
+        return
 
     # see if that dataset has any additional metadata we'd like to track
     additional_metadata = dataset.get_additional_metadata()
@@ -169,6 +173,11 @@ def create_dataset_from_params(dataset_id, user, request_payload, output_name =
         )
         raise ex
 
+    # Data sources can expose the tables they just wrote (keyed by path).
+    # Since those files were generated by us from a known schema, we
+    # register them directly rather than re-reading and validating them.
+    created_tables = getattr(ds, 'created_tables', None) or {}
+
     # create the Resource instances.
     for path, name, resource_type, file_format in \
             zip(path_list, name_list, resource_type_list, file_format_list):
@@ -182,16 +191,26 @@ def create_dataset_from_params(dataset_id, user, request_payload, output_name =
             status=Resource.VALIDATING
         )
 
-        # although we have full control over the creation of files here,
-        # running it through this function ensures that it is properly
-        # validated and that the proper metadata is extraced.
-        # Previously, the workspace was not populating metadata since
-        # it was bypassing this call
-        validate_resource.delay(
-            r.pk, 
-            resource_type,
-            file_format
-        )
+        registered = False
+        table = created_tables.get(path)
+        if table is not None:
+            try:
+                register_trusted_resource(r, resource_type, file_format, table)
+                registered = True
+            except Exception as ex:
+                logger.info(f'Failed to register resource {r.pk} directly.'
+                    f' Falling back to validation. Exception was: {ex}')
+
+        if not registered:
+            # running it through this function ensures that it is properly
+            # validated and that the proper metadata is extraced.
+            # Previously, the workspace was not populating metadata since
+            # it was bypassing this call
+            validate_resource.delay(
+                r.pk, 
+                resource_type,
+                file_format
+            )
 
         # if the file validated and a resource was created, then it's safe
         # in the permanent storage. Delete the tmp file:
@@ -6,5 +6,8 @@ class BaseIndexer(object):
     may do this differently.
     '''
 
-    def index(self, index_name, path):
-        raise NotImplementedError('Must implement this method in a child class.')
\ No newline at end of file
+    def index(self, index_name, path, commit=True):
+        raise NotImplementedError('Must implement this method in a child class.')
+
+    def commit(self, index_name):
+        raise NotImplementedError('Must implement this method in a child class.')
@@ -1,14 +1,51 @@
 import os
+import io
+import csv
+import time
 import requests
 import json
 import logging
 import mimetypes
+import hashlib
+import threading
+import uuid
+from urllib.parse import parse_qsl, urlencode
+
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+from django.core.cache import caches
 
 from api.utilities.basic_utils import run_shell_command
 from api.public_data.indexers.base import BaseIndexer
 
 logger = logging.getLogger(__name__)
 
+# A single session is shared by all SolrIndexer instances (which are
+# created per-request by `get_indexer`) so that connections to the
+# solr server are kept alive and re-used.
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    '''
+    Returns the shared requests.Session, creating it on first use.
+    '''
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.SOLR_CONNECTION_POOL_SIZE,
+                    pool_maxsize=settings.SOLR_CONNECTION_POOL_SIZE
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
 
 class SolrIndexer(BaseIndexer):
     """
@@ -26,12 +63,16 @@ class SolrIndexer(BaseIndexer):
     # relative to the SOLR_SERVER url
     CORES_URL = 'solr/admin/cores'
 
-    def index(self, core_name, filepath):
+    def index(self, core_name, filepath, commit=True):
         '''
-        Indexes/commits a file by a POST request
-        Note that the file is committed automatically, so it's
-        not an all-or-nothing if the calling function is attempting
-        to index a bunch of documents.
+        Indexes a file by sending its documents to solr in batches of
+        settings.SOLR_INDEX_BATCH_SIZE, so that large files are not
+        read into memory or sent in a single request.
+
+        If `commit` is False, the documents are not (hard) committed
+        and the caller is expected to call `commit` once all the files
+        for the core have been indexed. This avoids an expensive commit
+        for each file.
         '''
         logger.info('Using solr to index the following file: {f}'.format(f=filepath))
 
@@ -48,35 +89,142 @@ class SolrIndexer(BaseIndexer):
             m = content_type
         ))
 
-        data = open(filepath, 'r').read()
+        num_docs = 0
+        for batch, batch_size in self._get_batches(filepath, content_type):
+            self._post_update(core_name, batch, content_type)
+            # the number of documents is only known for batched formats
+            if batch_size is not None:
+                num_docs += batch_size
+                logger.info('Indexed {n} documents from {f}'.format(
+                    n = num_docs,
+                    f = filepath
+                ))
 
-        headers = {'content-type': content_type}
-        params = {'commit': 'true'}
+        if settings.SOLR_INDEX_COMMIT_WITHIN:
+            # the documents will become visible without a hard commit
+            self.invalidate_query_cache(core_name)
+
+        if commit:
+            self.commit(core_name)
+        logger.info('Successfully indexed {f}'.format(f=filepath))
+
+    def commit(self, core_name):
+        '''
+        Issues a (hard) commit so that indexed documents are persisted
+        and visible to queries.
+        '''
         u = '{host}/{core}/update/'.format(host=self.SOLR_SERVER, core=core_name)
-        r = requests.post(u, data=data, params=params, headers=headers)
-        if r.status_code == 200:
-            logger.info('Successfully indexed and committed {f}'.format(f=filepath))
-        else:
-            logger.info('Failed to index or commit {f}.'
-                ' The response was: {j}'.format(
-                    f = filepath,
-                    j = r.json()
+        r = get_session().post(u, params={'commit': 'true'},
+            timeout=settings.SOLR_REQUEST_TIMEOUT)
+        if r.status_code != 200:
+            logger.info('Failed to commit to the {c} core.'
+                ' The response was: {t}'.format(
+                    c = core_name,
+                    t = r.text
                 )
             )
-            raise Exception('Failed to index/commit {f}'.format(f=filepath))
+            raise Exception('Failed to commit to the {c} core'.format(
+                c = core_name))
+        logger.info('Committed to the {c} core.'.format(c=core_name))
+        self.invalidate_query_cache(core_name)
+
+    def _get_batches(self, filepath, content_type):
+        '''
+        Generator which yields tuples of (request body, number of
+        documents). CSV files are re-written in batches, each with the
+        header line. Other formats are sent as a single request.
+        '''
+        if content_type != 'text/csv':
+            with open(filepath, 'rb') as fin:
+                yield fin.read(), None
+            return
+
+        batch_size = settings.SOLR_INDEX_BATCH_SIZE
+        # newline='' so that quoted fields containing newlines are
+        # handled by the csv reader
+        with open(filepath, 'r', newline='') as fin:
+            reader = csv.reader(fin)
+            try:
+                header = next(reader)
+            except StopIteration:
+                return
+            rows = []
+            for row in reader:
+                rows.append(row)
+                if len(rows) == batch_size:
+                    yield self._write_csv(header, rows), len(rows)
+                    rows = []
+            if len(rows) > 0:
+                yield self._write_csv(header, rows), len(rows)
+
+    @staticmethod
+    def _write_csv(header, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        writer.writerows(rows)
+        return buffer.getvalue().encode('utf-8')
+
+    def _post_update(self, core_name, data, content_type):
+        '''
+        Sends a batch of documents to the update handler for the core.
+        Requests which fail due to connection problems or server
+        errors are retried. Other failures (e.g. malformed documents)
+        are not expected to succeed on retry and raise immediately.
+        '''
+        u = '{host}/{core}/update/'.format(host=self.SOLR_SERVER, core=core_name)
+        headers = {'content-type': content_type}
+        params = {}
+        if settings.SOLR_INDEX_COMMIT_WITHIN:
+            params['commitWithin'] = settings.SOLR_INDEX_COMMIT_WITHIN
+
+        max_retries = settings.SOLR_INDEX_MAX_RETRIES
+        for attempt in range(max_retries + 1):
+            try:
+                r = get_session().post(u, data=data, params=params,
+                    headers=headers, timeout=settings.SOLR_REQUEST_TIMEOUT)
+            except requests.exceptions.RequestException as ex:
+                error_msg = str(ex)
+            else:
+                if r.status_code == 200:
+                    return
+                error_msg = r.text
+                if r.status_code < 500:
+                    break
+            if attempt < max_retries:
+                logger.info('Request to index a batch in the {c} core'
+                    ' failed (attempt {n}). Retrying. The error'
+                    ' was: {e}'.format(c=core_name, n=attempt + 1, e=error_msg))
+                time.sleep(settings.SOLR_INDEX_RETRY_BACKOFF * (attempt + 1))
+
+        logger.info('Failed to index a batch in the {c} core.'
+            ' The response was: {e}'.format(c=core_name, e=error_msg))
+        raise Exception('Failed to index a batch of documents in'
+            ' the {c} core'.format(c=core_name))
 
     def query(self, index_name, query_string):
         '''
         Perform and return the query response from solr.
         `index_name` identifies the solr collection/core we are querying
         `query_string` is the query string appended to the url.
+
+        Successful responses are cached for a short time
+        (settings.SOLR_QUERY_CACHE_TIMEOUT) since the dataset browser
+        frequently issues identical (e.g. faceting) queries.
         '''
+        cache_key = self._get_query_cache_key(index_name, query_string)
+        if cache_key is not None:
+            j = self._get_cache().get(cache_key)
+            if j is not None:
+                return self._reformat_response(j)
+
         query_url = '{base_url}/{index_name}/select?{query_str}'.format(
             base_url = self.SOLR_SERVER,
             index_name = index_name,
             query_str = query_string
         ) 
-        r = requests.get(query_url)
+        r = get_session().get(query_url,
+            timeout=settings.SOLR_REQUEST_TIMEOUT)
         if r.status_code == 200:
             try:
                 j = r.json()
@@ -88,6 +236,9 @@ class SolrIndexer(BaseIndexer):
                     ' The query was successful, but could not interpret'
                     ' the response as JSON.'
                 )
+            if cache_key is not None:
+                self._get_cache().set(cache_key, j,
+                    settings.SOLR_QUERY_CACHE_TIMEOUT)
             return self._reformat_response(j) 
         else:
             payload = r.json()
@@ -122,10 +273,48 @@ class SolrIndexer(BaseIndexer):
             index_name = index_name,
             query_str = 'q=*:*&rows=1'
         ) 
-        r = requests.get(url)
+        r = get_session().get(url, timeout=settings.SOLR_REQUEST_TIMEOUT)
         if r.status_code == 200:
             return True
         return False
 
+    def invalidate_query_cache(self, index_name):
+        '''
+        Invalidates any cached query results for the core. Rather than
+        deleting keys (which a cache may not be able to enumerate), we
+        change the "generation" token which is part of each key.
+        '''
+        self._get_cache().set(self._get_generation_key(index_name),
+            uuid.uuid4().hex, None)
+
+    @staticmethod
+    def _get_cache():
+        return caches[settings.SOLR_QUERY_CACHE_ALIAS]
+
+    @staticmethod
+    def _get_generation_key(index_name):
+        return 'solr_query_generation:{idx}'.format(idx=index_name)
 
-    
+    @staticmethod
+    def _normalize_query(query_string):
+        '''
+        Returns a canonical form of the query string so that equivalent
+        queries (e.g. with parameters in a different order) share a cache
+        entry. The sort is stable so the order of repeated parameters,
+        which can be significant, is preserved.
+        '''
+        params = parse_qsl(query_string, keep_blank_values=True)
+        return urlencode(sorted(params, key=lambda x: x[0]))
+
+    def _get_query_cache_key(self, index_name, query_string):
+        '''
+        Returns the cache key for the query or None if caching is disabled.
+        '''
+        if not settings.SOLR_QUERY_CACHE_TIMEOUT:
+            return None
+        generation = self._get_cache().get(
+            self._get_generation_key(index_name), '0')
+        digest = hashlib.md5(
+            self._normalize_query(query_string).encode('utf-8')).hexdigest()
+        return 'solr_query:{idx}:{g}:{d}'.format(
+            idx=index_name, g=generation, d=digest)
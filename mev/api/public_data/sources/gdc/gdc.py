@@ -1,21 +1,26 @@
 import json
 import re
+import math
 import logging
-import shutil
 import os
-import requests
 import tarfile
 import uuid
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
+import tables
 
 from django.conf import settings
 
 from constants import CSV_FORMAT
-from api.utilities.basic_utils import get_with_retry
+from api.utilities.basic_utils import get_with_retry, \
+    post_with_retry
 from api.public_data.sources.base import PublicDataSource
 from api.public_data.sources.rnaseq import RnaSeqMixin
 from api.public_data.sources.methylation import MethylationMixin
+from api.public_data.sources.matrix_assembly import assemble_matrix
+from api.public_data.sources.hdf_matrix import write_matrix
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +43,13 @@ class GDCDataSource(PublicDataSource):
     # How many records to return with each query
     PAGE_SIZE = 100
 
+    # The maximum number of concurrent requests to the GDC API when
+    # querying pages of records or downloading archives
+    MAX_CONCURRENT_REQUESTS = 4
+
+    # Downloaded archives are written to disk in chunks of this many bytes
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
     # This defines which fields are returned from the data query about cases 
     # These are the top-level fields. Most of the interesting clinical data is 
     # contained in the "expandable" fields which are given below.
@@ -128,6 +140,89 @@ class GDCDataSource(PublicDataSource):
         '''
         raise NotImplementedError('You must implement this method in a child class.')
 
+    @staticmethod
+    def run_concurrently(fn, items):
+        '''
+        Calls `fn` on each of `items` using a bounded pool of threads.
+        Returns a list of the results in the same order as `items`.
+        If any call raises an exception, it is re-raised here.
+        '''
+        with ThreadPoolExecutor(
+            max_workers=GDCDataSource.MAX_CONCURRENT_REQUESTS) as executor:
+            return list(executor.map(fn, items))
+
+    @staticmethod
+    def query_all_pages(endpoint, query_params):
+        '''
+        Queries a paginated GDC endpoint and returns a list of the
+        parsed JSON responses (one per page, in order). The first page
+        gives the total number of records, after which the remaining
+        pages are requested concurrently.
+
+        Returns None if any of the requests failed.
+        '''
+        def get_page(page_index):
+            params = query_params.copy()
+            params['from'] = page_index * GDCDataSource.PAGE_SIZE
+            response = get_with_retry(endpoint, params=params)
+            if response.status_code != 200:
+                raise Exception('The GDC responded with status code'
+                    f' {response.status_code}.')
+            return json.loads(response.content.decode('utf-8'))
+
+        try:
+            first_page = get_page(0)
+            total_records = int(first_page['data']['pagination']['total'])
+            num_pages = math.ceil(total_records / GDCDataSource.PAGE_SIZE)
+            other_pages = GDCDataSource.run_concurrently(
+                get_page, range(1, num_pages))
+        except Exception as ex:
+            logger.info('An exception was raised when querying the GDC for'
+                ' metadata. The exception reads: {ex}'.format(ex=ex)
+            )
+            return None
+        return [first_page] + other_pages
+
+    @staticmethod
+    def download_archive(file_uuid_list):
+        '''
+        Given a list of file UUIDs, download an archive of those files to
+        the local disk. The response is streamed to disk in chunks so the
+        archive is never held in memory.
+
+        Returns the path to the downloaded archive.
+        '''
+        download_params = {"ids": file_uuid_list}
+        download_response = post_with_retry(GDCDataSource.GDC_DATA_ENDPOINT,
+            data = json.dumps(download_params), 
+            headers = {"Content-Type": "application/json"},
+            stream = True
+        )
+        with download_response:
+            response_head_cd = download_response.headers["Content-Disposition"]
+            file_name = re.findall("filename=(.+)", response_head_cd)[0]
+            # The GDC names archives by the download time, so prefix
+            # with a UUID to prevent concurrent downloads from colliding
+            fout = os.path.join(settings.TMP_DIR, f'{uuid.uuid4()}.{file_name}')
+            with open(fout, "wb") as output_file:
+                for chunk in download_response.iter_content(
+                    chunk_size=GDCDataSource.DOWNLOAD_CHUNK_SIZE):
+                    output_file.write(chunk)
+        return fout
+
+    @staticmethod
+    def iter_archive_files(archive_path):
+        '''
+        Iterates through the files of a gzipped tar archive, yielding
+        tuples of (TarInfo, file-like object). The archive is read in
+        streaming mode and nothing is extracted to disk, so only a single
+        (small) file from the archive is held in memory at a time.
+        '''
+        with tarfile.open(archive_path, 'r|gz') as tf:
+            for t in tf:
+                if t.isfile():
+                    yield t, BytesIO(tf.extractfile(t).read())
+
     @staticmethod
     def create_query_params(fields, page_size = None, **kwargs):
         '''
@@ -432,51 +527,20 @@ class GDCRnaSeqDataSourceMixin(RnaSeqMixin):
         '''
         final_query_params = self._create_rnaseq_query_params(project_id)
         
-        # prepare some temporary loop variables
-        finished = False
-        i = 0
-        downloaded_archives = []
+        # the records are paginated, so query for all the pages
+        page_responses = GDCDataSource.query_all_pages(
+            GDCDataSource.GDC_FILES_ENDPOINT, final_query_params)
+        if page_responses is None:
+            return
 
         # We have to keep a map of the fileId to the aliquot so we can properly 
         # concatenate the files later
         file_to_aliquot_mapping = {}
-        annotation_df = pd.DataFrame()
-        while not finished:
-            logger.info('Downloading batch %d for %s...' % (i, project_id))
-
-            # the records are paginated, so we have to keep track of which page we are currently requesting
-            start_index = i*GDCDataSource.PAGE_SIZE
-            end_index = (i+1)*GDCDataSource.PAGE_SIZE
-            final_query_params.update(
-                {
-                    'from': start_index
-                }
-            )
-
-            try:
-                response = get_with_retry(
-                    GDCDataSource.GDC_FILES_ENDPOINT, 
-                    params = final_query_params
-                )
-            except Exception as ex:
-                logger.info('An exception was raised when querying the GDC for'
-                    ' metadata. The exception reads: {ex}'.format(ex=ex)
-                )
-                return
-
-            if response.status_code == 200:
-                response_json = json.loads(response.content.decode("utf-8"))
-            else:
-                logger.error('The response code was NOT 200, but the request'
-                    ' exception was not handled.'
-                )
-                return
-
-            # If the first request, we can get the total records by examining
-            # the pagination data
-            if i == 0:
-                pagination_response = response_json['data']['pagination']
-                total_records = int(pagination_response['total'])
+        # the annotations for each page are collected and concatenated once
+        ann_dfs = []
+        file_uuid_batches = []
+        for i, response_json in enumerate(page_responses):
+            logger.info('Processing batch %d for %s...' % (i, project_id))
 
             # now collect the file UUIDs and download
             file_uuid_list = []
@@ -596,24 +660,19 @@ class GDCRnaSeqDataSourceMixin(RnaSeqMixin):
 
             ann_df = pd.concat([ann_df, s], axis=1)
 
-            # Add to the master dataframe for this cancer type
-            annotation_df = pd.concat([annotation_df, ann_df], axis=0)
+            # Add to the list of dataframes for this cancer type
+            ann_dfs.append(ann_df)
 
-            # Go get the actual count data for this batch.
-            downloaded_archives.append(
-                self._download_expression_archives(file_uuid_list)
-            )
-
-            i += 1
-
-            # are we done yet???
-            if end_index >= total_records:
-                finished = True
+            file_uuid_batches.append(file_uuid_list)
 
         logger.info('Completed looping through the batches for {ct}'.format(ct=project_id))
 
+        # Go get the actual count data for the batches.
+        downloaded_archives = GDCDataSource.run_concurrently(
+            self._download_expression_archives, file_uuid_batches)
+
         # there can be duplicate rows in the annotation dataframe
-        annotation_df = annotation_df.drop_duplicates()
+        annotation_df = pd.concat(ann_dfs, axis=0).drop_duplicates()
 
         annotation_df = self._append_gdc_annotations(annotation_df)
 
@@ -651,12 +710,12 @@ class GDCRnaSeqDataSourceMixin(RnaSeqMixin):
         # fields and how to interpret them:
         data_fields = self.get_data_dictionary()
 
-        total_annotation_df = pd.DataFrame()
+        ann_dfs = []
         counts_output_path = os.path.join(
             self.ROOT_DIR,
             self.COUNT_OUTPUT_FILE_TEMPLATE.format(tag=tag, date=self.date_str)
         )
-        with pd.HDFStore(counts_output_path) as hdf_out:
+        with tables.open_file(counts_output_path, mode='a') as hdf_out:
             for project_id in project_dict.keys():
                 logger.info('Pull data for %s' % project_id)
                 ann_df, count_df = self._download_cohort(project_id, data_fields)
@@ -668,10 +727,13 @@ class GDCRnaSeqDataSourceMixin(RnaSeqMixin):
                 logger.info(f'Unique aliquots: {len(count_df.columns.unique())}')
                 logger.info(f'Duplicated: {count_df.columns[count_df.columns.duplicated()]}')
 
-                count_df = count_df.iloc[:,~count_df.columns.duplicated()]
-                logger.info(f'Count matrix size (after duplicate removal): {count_df.shape[0]}')
+                # The merge already keeps only the first of any duplicated aliquots,
+                # so we avoid the copy unless necessary.
+                if count_df.columns.duplicated().any():
+                    count_df = count_df.iloc[:,~count_df.columns.duplicated()]
+                    logger.info(f'Count matrix size (after duplicate removal): {count_df.shape[0]}')
 
-                total_annotation_df = pd.concat([total_annotation_df, ann_df], axis=0)
+                ann_dfs.append(ann_df)
 
                 # save the counts to a cancer-specific dataset. Store each
                 # dataset in a cancer-specific group. On testing, this seemed
@@ -679,7 +741,7 @@ class GDCRnaSeqDataSourceMixin(RnaSeqMixin):
                 # as datasets in the root group
                 group_id = (
                     RnaSeqMixin.create_python_compatible_id(project_id) + '/ds')
-                hdf_out.put(group_id, count_df)
+                write_matrix(hdf_out, group_id, count_df)
                 logger.info('Added the {ct} matrix to the HDF5'
                     ' count matrix'.format(ct=project_id)
                 )
@@ -696,6 +758,7 @@ class GDCRnaSeqDataSourceMixin(RnaSeqMixin):
                 file_format = CSV_FORMAT
             )
         )
+        total_annotation_df = pd.concat(ann_dfs, axis=0)
         total_annotation_df.to_csv(
             ann_output_path, 
             sep=',', 
@@ -709,53 +772,47 @@ class GDCRnaSeqDataSourceMixin(RnaSeqMixin):
         Given a list of the downloaded archives, extract and merge them into a single count matrix
         '''
         logger.info('Begin merging the individual count matrix archives into a single count matrix')
-        count_df = pd.DataFrame()
-        tmpdir = os.path.join(self.ROOT_DIR, 'tmparchive')
-        for f in downloaded_archives:
-            with tarfile.open(f, 'r:gz') as tf:
-                tf.extractall(path=tmpdir)
-                for t in tf.getmembers():
-                    if t.isfile():
-                        if t.name.endswith(self.STAR_COUNTS_SUFFIX):
-                            # the folder has the name of the file.
-                            # The prefix UUID on the basename is not useful to us.
-                            file_id = t.name.split('/')[0]
-                            df = pd.read_table(
-                                os.path.join(tmpdir, t.path), 
-                                index_col=0, 
-                                sep = '\t',
-                                skiprows = 6,
-                                usecols =[0,3],
-                                names=['gene', file_to_aliquot_mapping[file_id]])
-                            count_df = pd.concat([count_df, df], axis=1)
-                        else:
-                            logger.info('Found file named: {x}'.format(x=t.name))
-                            if t.name != 'MANIFEST.txt':
-                                print(t.name)
-                                raise Exception('Found an unexpected file ({x}) '
-                                    'that did not match our expectations.'.format(x=t.name))
-
-        # remove the skipped rows which don't correspond to actual gene features
-        count_df = count_df.loc[~count_df.index.isin(self.SKIPPED_FEATURES)]
-
-        # As of this writing, there are alternate ENSG Ids that are suffixed with _PAR_Y
-        # to denote features that are on the regions of chrY which are identical to those
-        # on chrX.
+
+        # remove the skipped rows which don't correspond to actual gene features.
+        # As of this writing, there are also alternate ENSG Ids that are suffixed
+        # with _PAR_Y to denote features that are on the regions of chrY which are
+        # identical to those on chrX.
         # https://www.gencodegenes.org/pages/faq.html (search "PAR_Y")
         # We drop those here. 
         # It appears the mapping does not count to these regions anyway, since the rows are all
         # zeros (while the canonical transcript is generally non-zero)
-        idx_par = pd.Series([x.endswith('_PAR_Y') for x in count_df.index])
-        count_df = count_df.loc[~idx_par.values]
+        row_filter = lambda idx: ~(idx.isin(self.SKIPPED_FEATURES) | idx.str.endswith('_PAR_Y'))
+
+        def iter_columns():
+            for f in downloaded_archives:
+                # the files are parsed directly from the (streamed) archive
+                for t, fh in GDCDataSource.iter_archive_files(f):
+                    if t.name.endswith(self.STAR_COUNTS_SUFFIX):
+                        # the folder has the name of the file.
+                        # The prefix UUID on the basename is not useful to us.
+                        file_id = t.name.split('/')[0]
+                        df = pd.read_table(
+                            fh, 
+                            index_col=0, 
+                            sep = '\t',
+                            skiprows = 6,
+                            usecols =[0,3],
+                            names=['gene', file_to_aliquot_mapping[file_id]])
+                        yield df.columns[0], df.iloc[:, 0]
+                    else:
+                        logger.info('Found file named: {x}'.format(x=t.name))
+                        if t.name != 'MANIFEST.txt':
+                            raise Exception('Found an unexpected file ({x}) '
+                                'that did not match our expectations.'.format(x=t.name))
+
+        count_df = assemble_matrix(iter_columns,
+            len(file_to_aliquot_mapping), row_filter=row_filter)
 
         # The count matrices have Ensembl identifiers like ENSG0000122345.11
         # The 'version' suffix interferes with database lookups (such as for GO terms, etc.)
         # so we strip that off
         count_df.index = count_df.index.map(lambda x: x.split('.')[0])
 
-        # Clean up:
-        shutil.rmtree(tmpdir)
-
         return count_df
 
     def _create_rnaseq_query_params(self, project_id):
@@ -796,17 +853,7 @@ class GDCRnaSeqDataSourceMixin(RnaSeqMixin):
         '''
         # Download the actual expression data corresponding to the aliquot metadata
         # we've been collecting
-        download_params = {"ids": file_uuid_list}
-        download_response = requests.post(GDCDataSource.GDC_DATA_ENDPOINT, 
-            data = json.dumps(download_params), 
-            headers = {"Content-Type": "application/json"}
-        )
-        response_head_cd = download_response.headers["Content-Disposition"]
-        file_name = re.findall("filename=(.+)", response_head_cd)[0]
-        fout = os.path.join(settings.TMP_DIR, file_name)
-        with open(fout, "wb") as output_file:
-            output_file.write(download_response.content)
-        return fout
+        return GDCDataSource.download_archive(file_uuid_list)
 
 
 class GDCMethylationDataSourceMixin(MethylationMixin):
@@ -867,12 +914,12 @@ class GDCMethylationDataSourceMixin(MethylationMixin):
         # fields and how to interpret them:
         data_fields = self.get_data_dictionary()
 
-        total_annotation_df = pd.DataFrame()
+        ann_dfs = []
         betas_output_path = os.path.join(
             self.ROOT_DIR,
             self.BETAS_OUTPUT_FILE_TEMPLATE.format(tag=tag, date=self.date_str)
         )
-        with pd.HDFStore(betas_output_path) as hdf_out:
+        with tables.open_file(betas_output_path, mode='a') as hdf_out:
             for project_id in project_dict.keys():
                 logger.info('Pull data for %s' % project_id)
                 ann_df, betas_df = self._download_cohort(project_id, data_fields)
@@ -884,13 +931,16 @@ class GDCMethylationDataSourceMixin(MethylationMixin):
                 logger.info(f'Unique aliquots: {len(betas_df.columns.unique())}')
                 logger.info(f'Duplicated: {betas_df.columns[betas_df.columns.duplicated()]}')
 
-                betas_df = betas_df.iloc[:,~betas_df.columns.duplicated()]
-                logger.info(f'Betas matrix size (after duplicate removal): {betas_df.shape[0]}')
+                # The merge already keeps only the first of any duplicated aliquots,
+                # so we avoid the copy unless necessary.
+                if betas_df.columns.duplicated().any():
+                    betas_df = betas_df.iloc[:,~betas_df.columns.duplicated()]
+                    logger.info(f'Betas matrix size (after duplicate removal): {betas_df.shape[0]}')
 
                 # cast to float16 to save space. No need for float64 precision.
                 betas_df = betas_df.astype('float16')
 
-                total_annotation_df = pd.concat([total_annotation_df, ann_df], axis=0)
+                ann_dfs.append(ann_df)
 
                 # save the counts to a cancer-specific dataset. Store each
                 # dataset in a cancer-specific group. On testing, this seemed
@@ -898,7 +948,7 @@ class GDCMethylationDataSourceMixin(MethylationMixin):
                 # as datasets in the root group
                 group_id = (
                     MethylationMixin.create_python_compatible_id(project_id) + '/ds')
-                hdf_out.put(group_id, betas_df)
+                write_matrix(hdf_out, group_id, betas_df)
                 logger.info('Added the {ct} matrix to the HDF5'
                     ' beta matrix'.format(ct=project_id)
                 )
@@ -915,6 +965,7 @@ class GDCMethylationDataSourceMixin(MethylationMixin):
                 file_format = CSV_FORMAT
             )
         )
+        total_annotation_df = pd.concat(ann_dfs, axis=0)
         total_annotation_df.to_csv(
             ann_output_path, 
             sep=',', 
@@ -964,51 +1015,20 @@ class GDCMethylationDataSourceMixin(MethylationMixin):
         '''
         final_query_params = self._create_methylation_query_params(project_id)
         
-        # prepare some temporary loop variables
-        finished = False
-        i = 0
-        downloaded_archives = []
+        # the records are paginated, so query for all the pages
+        page_responses = GDCDataSource.query_all_pages(
+            GDCDataSource.GDC_FILES_ENDPOINT, final_query_params)
+        if page_responses is None:
+            return
 
         # We have to keep a map of the fileId to the aliquot so we can properly 
         # concatenate the files later
         file_to_aliquot_mapping = {}
-        annotation_df = pd.DataFrame()
-        while not finished:
-            logger.info('Downloading batch %d for %s...' % (i, project_id))
-
-            # the records are paginated, so we have to keep track of which page we are currently requesting
-            start_index = i*GDCDataSource.PAGE_SIZE
-            end_index = (i+1)*GDCDataSource.PAGE_SIZE
-            final_query_params.update(
-                {
-                    'from': start_index
-                }
-            )
-
-            try:
-                response = get_with_retry(
-                    GDCDataSource.GDC_FILES_ENDPOINT, 
-                    params = final_query_params
-                )
-            except Exception as ex:
-                logger.info('An exception was raised when querying the GDC for'
-                    ' metadata. The exception reads: {ex}'.format(ex=ex)
-                )
-                return
-
-            if response.status_code == 200:
-                response_json = json.loads(response.content.decode("utf-8"))
-            else:
-                logger.error('The response code was NOT 200, but the request'
-                    ' exception was not handled.'
-                )
-                return
-
-            # If the first request, we can get the total records by examining
-            # the pagination data
-            if i == 0:
-                pagination_response = response_json['data']['pagination']
-                total_records = int(pagination_response['total'])
+        # the annotations for each page are collected and concatenated once
+        ann_dfs = []
+        file_uuid_batches = []
+        for i, response_json in enumerate(page_responses):
+            logger.info('Processing batch %d for %s...' % (i, project_id))
 
             # now collect the file UUIDs and download
             file_uuid_list = []
@@ -1129,24 +1149,19 @@ class GDCMethylationDataSourceMixin(MethylationMixin):
 
             ann_df = pd.concat([ann_df, s], axis=1)
 
-            # Add to the master dataframe for this cancer type
-            annotation_df = pd.concat([annotation_df, ann_df], axis=0)
+            # Add to the list of dataframes for this cancer type
+            ann_dfs.append(ann_df)
 
-            # Go get the actual beta-values for this batch.
-            downloaded_archives.append(
-                self._download_methylation_archives(file_uuid_list)
-            )
-
-            i += 1
-
-            # are we done yet???
-            if end_index >= total_records:
-                finished = True
+            file_uuid_batches.append(file_uuid_list)
 
         logger.info('Completed looping through the batches for {ct}'.format(ct=project_id))
 
+        # Go get the actual beta-values for the batches.
+        downloaded_archives = GDCDataSource.run_concurrently(
+            self._download_methylation_archives, file_uuid_batches)
+
         # there can be duplicate rows in the annotation dataframe
-        annotation_df = annotation_df.drop_duplicates()
+        annotation_df = pd.concat(ann_dfs, axis=0).drop_duplicates()
 
         annotation_df = self._append_gdc_annotations(annotation_df)
 
@@ -1168,17 +1183,7 @@ class GDCMethylationDataSourceMixin(MethylationMixin):
         '''
         # Download the actual methylation data corresponding to the
         # aliquot metadata we've been collecting
-        download_params = {"ids": file_uuid_list}
-        download_response = requests.post(GDCDataSource.GDC_DATA_ENDPOINT,
-            data = json.dumps(download_params), 
-            headers = {"Content-Type": "application/json"}
-        )
-        response_head_cd = download_response.headers["Content-Disposition"]
-        file_name = re.findall("filename=(.+)", response_head_cd)[0]
-        fout = os.path.join(settings.TMP_DIR, file_name)
-        with open(fout, "wb") as output_file:
-            output_file.write(download_response.content)
-        return fout
+        return GDCDataSource.download_archive(file_uuid_list)
 
     def _merge_downloaded_archives(self, downloaded_archives, file_to_aliquot_mapping):
         '''
@@ -1187,35 +1192,31 @@ class GDCMethylationDataSourceMixin(MethylationMixin):
         '''
         logger.info('Begin merging the individual beta matrix archives'
             ' into a single beta matrix')
-        betas_df = pd.DataFrame()
-        tmpdir = os.path.join(self.ROOT_DIR, 'tmparchive')
-        for f in downloaded_archives:
-            with tarfile.open(f, 'r:gz') as tf:
-                tf.extractall(path=tmpdir)
-                for t in tf.getmembers():
-                    if t.isfile():
-                        if t.name.endswith(self.SESAME_BETAS_SUFFIX):
-                            # the folder has the name of the file.
-                            # The prefix UUID on the basename is not useful to us.
-                            file_id = t.name.split('/')[0]
-                            df = pd.read_table(
-                                os.path.join(tmpdir, t.path), 
-                                index_col=0, 
-                                sep = '\t',
-                                names=['cpg_site', file_to_aliquot_mapping[file_id]])
-                            betas_df = pd.concat([betas_df, df], axis=1)
-                        else:
-                            logger.info('Found file named: {x}'.format(x=t.name))
-                            if re.fullmatch('superseded_files_.*\.txt', t.name):
-                                logger.info('Found a supercede file, which we ignore...')
-                            elif t.name != 'MANIFEST.txt':
-                                print(t.name)
-                                raise Exception('Found an unexpected file ({x}) '
-                                    'that did not match our expectations.'.format(x=t.name))
-
-        # Clean up:
-        shutil.rmtree(tmpdir)
-        return betas_df
+        def iter_columns():
+            for f in downloaded_archives:
+                # the files are parsed directly from the (streamed) archive
+                for t, fh in GDCDataSource.iter_archive_files(f):
+                    if t.name.endswith(self.SESAME_BETAS_SUFFIX):
+                        # the folder has the name of the file.
+                        # The prefix UUID on the basename is not useful to us.
+                        file_id = t.name.split('/')[0]
+                        df = pd.read_table(
+                            fh, 
+                            index_col=0, 
+                            sep = '\t',
+                            names=['cpg_site', file_to_aliquot_mapping[file_id]])
+                        yield df.columns[0], df.iloc[:, 0]
+                    else:
+                        logger.info('Found file named: {x}'.format(x=t.name))
+                        if re.fullmatch('superseded_files_.*\.txt', t.name):
+                            logger.info('Found a supercede file, which we ignore...')
+                        elif t.name != 'MANIFEST.txt':
+                            raise Exception('Found an unexpected file ({x}) '
+                                'that did not match our expectations.'.format(x=t.name))
+
+        # files from different platforms (e.g. 450k and EPIC arrays)
+        # have different probes, so the matrix has the union of them.
+        return assemble_matrix(iter_columns, len(file_to_aliquot_mapping))
 
     def verify_files(self, file_dict):
         '''
@@ -2,9 +2,7 @@ import json
 import logging
 import requests
 import datetime
-import shutil
 import os
-import tarfile
 from urllib.parse import urlencode
 
 import pandas as pd
@@ -13,6 +11,7 @@ from django.conf import settings
 
 from api.utilities.basic_utils import get_with_retry, \
     make_local_directory
+from api.public_data.sources.matrix_assembly import assemble_matrix
 from .gdc import GDCDataSource, \
     GDCRnaSeqDataSourceMixin, \
     GDCMethylationDataSourceMixin
@@ -235,46 +234,42 @@ class TCGAMicroRnaSeqDataSource(TCGADataSource, GDCRnaSeqDataSourceMixin):
 
         logger.info('Begin merging the individual count'
             ' matrix archives into a single count matrix')
-        count_df = pd.DataFrame()
-        tmpdir = os.path.join(self.ROOT_DIR, 'tmparchive')
-        for f in downloaded_archives:
-            with tarfile.open(f, 'r:gz') as tf:
-                tf.extractall(path=tmpdir)
-                for t in tf.getmembers():
-                    if t.isfile():
-                        if t.name.endswith(
-                            'mirbase21.mirnas.quantification.txt'):
-                            # the folder has the name of the file.
-                            # The prefix UUID on the basename is
-                            # not useful to us.
-                            file_id = t.name.split('/')[0]
-                            df = pd.read_table(
-                                os.path.join(tmpdir, t.path),
-                                index_col=0,
-                                sep='\t',
-                                skiprows=1,
-                                usecols=[0, 1],
-                                names=[
-                                    'mirna_id',
-                                    file_to_aliquot_mapping[file_id]
-                                ]
-                            )
-                            count_df = pd.concat([count_df, df], axis=1)
-                        elif t.name.endswith(
-                            'mirbase21.isoforms.quantification.txt'):
-                            # the miRNA filters also return file hits
-                            # like above. There does not appear to be
-                            # a way to filter those out using the
-                            # GDC API so we just ignore them here
-                            pass
-                        elif t.name == 'MANIFEST.txt':
-                            pass
-                        else:
-                            raise Exception(f'Found an unexpected file ({t.name}) '
-                                'that did not match our expectations.')
-        # Clean up:
-        shutil.rmtree(tmpdir)
-        return count_df
+        def iter_columns():
+            for f in downloaded_archives:
+                # the files are parsed directly from the (streamed) archive
+                for t, fh in GDCDataSource.iter_archive_files(f):
+                    if t.name.endswith(
+                        'mirbase21.mirnas.quantification.txt'):
+                        # the folder has the name of the file.
+                        # The prefix UUID on the basename is
+                        # not useful to us.
+                        file_id = t.name.split('/')[0]
+                        df = pd.read_table(
+                            fh,
+                            index_col=0,
+                            sep='\t',
+                            skiprows=1,
+                            usecols=[0, 1],
+                            names=[
+                                'mirna_id',
+                                file_to_aliquot_mapping[file_id]
+                            ]
+                        )
+                        yield df.columns[0], df.iloc[:, 0]
+                    elif t.name.endswith(
+                        'mirbase21.isoforms.quantification.txt'):
+                        # the miRNA filters also return file hits
+                        # like above. There does not appear to be
+                        # a way to filter those out using the
+                        # GDC API so we just ignore them here
+                        pass
+                    elif t.name == 'MANIFEST.txt':
+                        pass
+                    else:
+                        raise Exception(f'Found an unexpected file ({t.name}) '
+                            'that did not match our expectations.')
+
+        return assemble_matrix(iter_columns, len(file_to_aliquot_mapping))
 
     def create_from_query(self, dataset_db_instance, query_filter, output_name=''):
         return GDCRnaSeqDataSourceMixin.create_from_query(
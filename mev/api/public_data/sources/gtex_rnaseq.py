@@ -1,6 +1,7 @@
 import os
 import datetime
 import pandas as pd
+import tables
 import logging
 import uuid
 
@@ -11,6 +12,7 @@ from api.utilities.basic_utils import make_local_directory, \
     run_shell_command
 from api.public_data.sources.base import PublicDataSource
 from api.public_data.sources.rnaseq import RnaSeqMixin
+from api.public_data.sources.hdf_matrix import write_matrix
 
 logger = logging.getLogger(__name__)
 
@@ -172,14 +174,15 @@ class GtexRnaseqDataSource(RnaSeqMixin, PublicDataSource):
         merged_ann = merged_ann[self.COLUMN_MAPPING.values()]
         merged_ann = merged_ann.set_index('sample_id')
 
-        final_ann = pd.DataFrame()
+        # the annotations for each tissue are concatenated once at the end
+        ann_dfs = []
         counts_output_path = os.path.join(
             self.ROOT_DIR,
             self.COUNT_OUTPUT_FILE_TEMPLATE.format(
                 tag=self.TAG, date=self.date_str
             )
         )
-        with pd.HDFStore(counts_output_path) as hdf_out:
+        with tables.open_file(counts_output_path, mode='a') as hdf_out:
             for i, (tissue, tissue_subdf) in enumerate(merged_ann.groupby('tissue')):
                 logger.info('Handling tissue {t}'.format(t=tissue))
                 try:
@@ -213,11 +216,12 @@ class GtexRnaseqDataSource(RnaSeqMixin, PublicDataSource):
 
                 samples_in_matrix = counts.columns
                 tissue_subdf = tissue_subdf.loc[samples_in_matrix]
-                final_ann = pd.concat([final_ann, tissue_subdf], axis=0)
+                ann_dfs.append(tissue_subdf)
 
                 group_id = RnaSeqMixin.create_python_compatible_id(tissue) + '/ds'
-                hdf_out.put(group_id, counts)
+                write_matrix(hdf_out, group_id, counts)
 
+        final_ann = pd.concat(ann_dfs, axis=0)
         final_ann.to_csv(os.path.join(self.ROOT_DIR,
             self.ANNOTATION_OUTPUT_FILE_TEMPLATE.format(
                 tag = self.TAG,
@@ -0,0 +1,110 @@
+import os
+import logging
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import tables
+
+logger = logging.getLogger(__name__)
+
+# Groups written by `write_matrix` carry this attribute so we can
+# distinguish them from older datasets which were written using
+# the pandas "fixed" format (which only supports full reads).
+LAYOUT_ATTR = 'mev_layout'
+COLUMN_CHUNKED_LAYOUT = 'column_chunked'
+
+COMPRESSION_FILTERS = tables.Filters(complevel=5, complib='blosc')
+
+
+def _encode_labels(labels):
+    return np.array([str(x).encode('utf-8') for x in labels])
+
+
+def _decode_labels(arr):
+    return [x.decode('utf-8') for x in arr]
+
+
+def write_matrix(h5_file, key, df):
+    '''
+    Writes the dataframe `df` to the group addressed by `key` (e.g.
+    "tcga_luad/ds") in `h5_file`, an open and writable pytables File.
+
+    The values are stored so that each column (e.g. a sample) is its
+    own compressed chunk. Hence, subsets of the columns can be read
+    without reading the full matrix. See `read_matrix_columns`.
+    '''
+    path = '/' + key.strip('/')
+    if path in h5_file:
+        # overwrite, as with pd.HDFStore.put
+        h5_file.remove_node(path, recursive=True)
+    parent, name = os.path.split(path)
+    group = h5_file.create_group(parent, name, createparents=True)
+    group._v_attrs[LAYOUT_ATTR] = COLUMN_CHUNKED_LAYOUT
+    group._v_attrs['index_name'] = df.index.name
+
+    h5_file.create_array(group, 'index', _encode_labels(df.index))
+    h5_file.create_array(group, 'columns', _encode_labels(df.columns))
+
+    num_rows, num_cols = df.shape
+    values = h5_file.create_carray(group, 'values',
+        atom=tables.Atom.from_dtype(df.dtypes.iloc[0]),
+        shape=(num_rows, num_cols),
+        chunkshape=(max(num_rows, 1), 1),
+        filters=COMPRESSION_FILTERS
+    )
+    # writing column-by-column aligns with the chunks
+    for j in range(num_cols):
+        values[:, j] = df.iloc[:, j].values
+
+
+def read_matrix_columns(hdf, key, columns):
+    '''
+    Returns a dataframe of the requested `columns` from the matrix
+    addressed by `key` in `hdf`, an open pd.HDFStore.
+
+    Raises a KeyError if the matrix does not exist or if any of the
+    columns are missing.
+    '''
+    group = hdf.get_node(key)
+    if group is None:
+        raise KeyError(key)
+
+    if getattr(group._v_attrs, LAYOUT_ATTR, None) != COLUMN_CHUNKED_LAYOUT:
+        # older datasets need to be fully read before subsetting
+        logger.info(f'Reading the full matrix at {key} prior to subsetting.')
+        return hdf.get(key)[columns]
+
+    all_columns = pd.Index(_decode_labels(group.columns.read()))
+    positions = all_columns.get_indexer(columns)
+    if (positions == -1).any():
+        missing = [c for c, p in zip(columns, positions) if p == -1]
+        raise KeyError(f'{missing} not found in the columns')
+
+    num_rows = group.values.shape[0]
+    values = np.empty((num_rows, len(columns)),
+        dtype=group.values.dtype, order='F')
+    for i, j in enumerate(positions):
+        values[:, i] = group.values[:, j]
+
+    index = pd.Index(_decode_labels(group.index.read()),
+        name=getattr(group._v_attrs, 'index_name', None))
+    return pd.DataFrame(values, index=index, columns=list(columns))
+
+
+@lru_cache(maxsize=8)
+def _read_annotation_table(path, mtime, size):
+    return pd.read_csv(path, index_col=0)
+
+
+def read_annotation_table(path):
+    '''
+    Returns the (CSV-format) annotation table for a public dataset.
+    These are large and unchanging, so we keep the parsed tables rather
+    than re-reading on each request. The modification time and size are
+    included in the cache key so that an updated file is re-read.
+
+    Callers should not modify the returned dataframe in-place.
+    '''
+    stat = os.stat(path)
+    return _read_annotation_table(path, stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,170 @@
+import os
+import uuid
+import logging
+
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MatrixAssembler(object):
+    '''
+    Assembles a matrix (e.g. counts) from a collection of columns
+    (e.g. one file per sample) without repeatedly concatenating
+    dataframes, which copies the full matrix on each addition.
+
+    The columns are given in two passes. In the first, `scan_column`
+    collects the row index (the union of the rows in all the columns,
+    as with an outer join) and the data type which can hold all the
+    columns. We then allocate a single array and `add_column` fills it
+    in place. Very large matrices are backed by a memory-mapped file so
+    that the peak memory remains predictable.
+    '''
+
+    # Above this size (in bytes), the array is memory-mapped to a
+    # file in settings.TMP_DIR rather than held in memory.
+    MEMMAP_THRESHOLD_BYTES = 2 * 1024**3
+
+    def __init__(self, num_columns, row_filter=None):
+        '''
+        `num_columns` is the maximum number of columns we will add.
+        `row_filter` is an optional function which takes the row index
+        (a pandas Index) and returns a boolean array of the rows to keep.
+        '''
+        self.num_columns = num_columns
+        self.row_filter = row_filter
+
+        # populated by the first pass
+        self.source_index = None
+        self.dtype = None
+        self.scanned_columns = set()
+        self.is_missing_rows = False
+        self._column_lengths = []
+
+        # populated by the second pass
+        self.index = None
+        self.keep_rows = None
+        self.array = None
+        self.columns = []
+        self.column_set = set()
+
+    def scan_column(self, name, s):
+        '''
+        Records the rows and data type of the pandas Series `s`, which
+        is subsequently added with `add_column`. As in `add_column`,
+        repeated names are ignored.
+        '''
+        if self.array is not None:
+            raise Exception('Columns cannot be scanned after they are added.')
+        if name in self.scanned_columns:
+            return
+        if len(self.scanned_columns) == self.num_columns:
+            raise Exception('Attempted to add more than the expected'
+                f' {self.num_columns} columns.')
+
+        if self.source_index is None:
+            self.source_index = s.index
+            self.dtype = s.dtype
+        else:
+            if not s.index.equals(self.source_index):
+                extra_rows = s.index.difference(self.source_index, sort=False)
+                if len(extra_rows) > 0:
+                    self.source_index = self.source_index.append(extra_rows)
+            self.dtype = np.result_type(self.dtype, s.dtype)
+        self.scanned_columns.add(name)
+        self._column_lengths.append(len(s.index))
+
+    def _allocate(self):
+        # each index is a subset of the union, so a shorter
+        # index means that column is missing rows
+        self.is_missing_rows = any(
+            [x < len(self.source_index) for x in self._column_lengths])
+        dtype = self.dtype
+        if self.is_missing_rows and not np.issubdtype(dtype, np.floating):
+            logger.warning('Some columns were missing rows, which are'
+                ' filled with NaN. Using a floating-point matrix.')
+            dtype = np.dtype(np.float64)
+
+        if self.row_filter is not None:
+            self.keep_rows = np.asarray(self.row_filter(self.source_index),
+                dtype=bool)
+            self.index = self.source_index[self.keep_rows]
+        else:
+            self.index = self.source_index
+        shape = (len(self.index), self.num_columns)
+        num_bytes = shape[0] * shape[1] * dtype.itemsize
+        if num_bytes > self.MEMMAP_THRESHOLD_BYTES:
+            path = os.path.join(settings.TMP_DIR, f'{uuid.uuid4()}.mmap')
+            logger.info(f'Allocating a memory-mapped matrix of shape {shape}'
+                f' at {path}')
+            self.array = np.memmap(path, dtype=dtype, mode='w+',
+                shape=shape, order='F')
+            # the mapping remains valid after the file is unlinked and the
+            # space is released once the array is garbage-collected.
+            os.remove(path)
+        else:
+            # columns are contiguous since we fill column-by-column
+            self.array = np.empty(shape, dtype=dtype, order='F')
+
+    def add_column(self, name, s):
+        '''
+        Adds the pandas Series `s` as the column named `name`. If a
+        column with that name was already added, the new column
+        is ignored. The column must have been scanned first.
+        '''
+        if name in self.column_set:
+            logger.info(f'Skipping duplicate column {name}')
+            return
+        if not name in self.scanned_columns:
+            raise Exception(f'Column {name} was not scanned prior to'
+                ' being added.')
+        if self.array is None:
+            self._allocate()
+
+        if s.index.equals(self.source_index):
+            values = s.values
+            if self.keep_rows is not None:
+                values = values[self.keep_rows]
+        else:
+            # slow path for a file which has its rows in a different
+            # order or is missing rows.
+            values = s.reindex(self.index).values
+
+        self.array[:, len(self.columns)] = values
+        self.columns.append(name)
+        self.column_set.add(name)
+
+    def get_dataframe(self):
+        '''
+        Returns a pandas DataFrame which wraps (and does not copy) the
+        assembled array.
+        '''
+        if self.array is None:
+            return pd.DataFrame()
+        return pd.DataFrame(
+            self.array[:, :len(self.columns)],
+            index=self.index,
+            columns=self.columns,
+            copy=False
+        )
+
+
+def assemble_matrix(iter_columns, num_columns, row_filter=None):
+    '''
+    Returns a pandas DataFrame assembled from the columns given by
+    `iter_columns`, which is a function returning an iterator of
+    (name, pandas Series) tuples. It is called twice: once to find
+    the rows and data type and once to fill the matrix. Hence, only
+    a single column is held in memory at a time, along with the matrix.
+
+    See MatrixAssembler for the other args.
+    '''
+    assembler = MatrixAssembler(num_columns, row_filter=row_filter)
+    for name, s in iter_columns():
+        assembler.scan_column(name, s)
+    for name, s in iter_columns():
+        assembler.add_column(name, s)
+    return assembler.get_dataframe()
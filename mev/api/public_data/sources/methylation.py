@@ -10,6 +10,8 @@ from django.conf import settings
 from constants import TSV_FORMAT, \
     MATRIX_KEY, \
     ANNOTATION_TABLE_KEY
+from api.public_data.sources.hdf_matrix import read_matrix_columns, \
+    read_annotation_table
 
 logger = logging.getLogger(__name__)
 
@@ -95,7 +97,7 @@ class MethylationMixin(object):
                    f' addressed by {MethylationMixin.SELECTION_KEY}')
             raise Exception(msg)
 
-        final_df = pd.DataFrame()
+        df_list = []
         with pd.HDFStore(beta_matrix_path, 'r') as hdf:
             for ct in selections.keys():
                 if not type(selections[ct]) is list:
@@ -106,20 +108,21 @@ class MethylationMixin(object):
                         )
                     )
                 group_id = MethylationMixin.create_python_compatible_id(ct) + '/ds'
-                try:
-                    df = hdf.get(group_id)
-                except KeyError as ex:
+                if hdf.get_node(group_id) is None:
                     raise Exception('The requested project'
                         f' {ct} was not found in the dataset. Ensure your'
                         ' request was correctly formatted.')
+                # only the requested samples are read from disk
                 try:
-                    df = df[selections[ct]]
+                    df = read_matrix_columns(hdf, group_id, selections[ct])
                 except KeyError as ex:
                     message = ('The subset of the count matrix failed since'
                         f' one or more requested samples were missing: {ex}')
                     raise Exception(message)
 
-                final_df = pd.concat([final_df, df], axis=1)
+                df_list.append(df)
+
+        final_df = pd.concat(df_list, axis=1) if df_list else pd.DataFrame()
 
         if final_df.shape[1] == 0:
             raise Exception('The resulting matrix was empty. No'
@@ -136,7 +139,7 @@ class MethylationMixin(object):
             raise Exception('Failed to find the proper data for this'
                 ' request. An administrator has been notified'
             )
-        ann_df = pd.read_csv(ann_path, index_col=0)
+        ann_df = read_annotation_table(ann_path)
 
         subset_ann = ann_df.loc[full_uuid_list]
 
@@ -177,6 +180,14 @@ class MethylationMixin(object):
                 f' dataframe. Exception was: {ex}')
             raise Exception('Failed when writing the filtered annotation data.')
 
+        # keep the tables we wrote so that callers can register the
+        # files without having to re-read them. See
+        # api.public_data.create_dataset_from_params
+        self.created_tables = {
+            betas_filepath: final_df,
+            ann_filepath: subset_ann
+        }
+
         # finally make some names for these files, which we return
         if output_name == '':
             u = str(uuid.uuid4())
@@ -12,6 +12,8 @@ from constants import TSV_FORMAT, \
     RNASEQ_COUNT_MATRIX_KEY, \
     ANNOTATION_TABLE_KEY
 from api.utilities.basic_utils import make_local_directory
+from api.public_data.sources.hdf_matrix import read_matrix_columns, \
+    read_annotation_table
 
 logger = logging.getLogger(__name__)
 
@@ -96,7 +98,7 @@ class RnaSeqMixin(object):
                    f' addressed by {RnaSeqMixin.SELECTION_KEY}')
             raise Exception(msg)
 
-        final_df = pd.DataFrame()
+        df_list = []
         with pd.HDFStore(count_matrix_path, 'r') as hdf:
             for ct in selections.keys():
                 if not type(selections[ct]) is list:
@@ -107,15 +109,14 @@ class RnaSeqMixin(object):
                         )
                     )
                 group_id = RnaSeqMixin.create_python_compatible_id(ct) + '/ds'
-                try:
-                    df = hdf.get(group_id)
-                except KeyError as ex:
+                if hdf.get_node(group_id) is None:
                     raise Exception('The requested project'
                         ' {ct} was not found in the dataset. Ensure your'
                         ' request was correctly formatted.'.format(ct=ct)
                     )
+                # only the requested samples are read from disk
                 try:
-                    df = df[selections[ct]]
+                    df = read_matrix_columns(hdf, group_id, selections[ct])
                 except KeyError as ex:
                     message = ('The subset of the count matrix failed since'
                         ' one or more requested samples were missing: {s}'.format(
@@ -124,7 +125,9 @@ class RnaSeqMixin(object):
                     )
                     raise Exception(message)
 
-                final_df = pd.concat([final_df, df], axis=1)
+                df_list.append(df)
+
+        final_df = pd.concat(df_list, axis=1) if df_list else pd.DataFrame()
 
         if final_df.shape[1] == 0:
             raise Exception('The resulting matrix was empty. No'
@@ -141,7 +144,7 @@ class RnaSeqMixin(object):
             raise Exception('Failed to find the proper data for this'
                 ' request. An administrator has been notified'
             )
-        ann_df = pd.read_csv(ann_path, index_col=0)
+        ann_df = read_annotation_table(ann_path)
         subset_ann = ann_df.loc[full_uuid_list]
 
         # drop columns which are completely empty:
@@ -181,6 +184,14 @@ class RnaSeqMixin(object):
             )
             raise Exception('Failed when writing the filtered annotation data.')
 
+        # keep the tables we wrote so that callers can register the
+        # files without having to re-read them. See
+        # api.public_data.create_dataset_from_params
+        self.created_tables = {
+            count_filepath: final_df,
+            ann_filepath: subset_ann
+        }
+
         # finally make some names for these files, which we return
         if output_name == '':
             u = str(uuid.uuid4())
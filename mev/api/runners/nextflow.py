@@ -17,7 +17,7 @@ from api.utilities.nextflow_utils import NF_SUFFIX, \
     read_final_nextflow_metadata, \
     job_succeeded, \
     get_error_report
-from api.utilities.docker import check_image_exists, \
+from api.utilities.docker import check_images_exist, \
     check_image_name_validity
 from api.utilities.basic_utils import copy_local_resource, \
     run_shell_command
@@ -62,19 +62,22 @@ class NextflowRunner(OperationRunner):
         logger.info('Found the following image names among the'
             f' Nextflow files: {", ".join(container_image_names)}')
 
+        # keep track of any "edited" image names so we can modify
+        # the Nextflow files
         name_mapping = {}
         for full_image_name in container_image_names:
-            final_image_name = check_image_name_validity(full_image_name,
+            name_mapping[full_image_name] = check_image_name_validity(
+                full_image_name,
                 repo_name,
                 git_hash)
-            image_found = check_image_exists(final_image_name)
-            if not image_found:
-                raise Exception('Could not locate the following'
-                    f' image: {final_image_name}. Aborting')
-
-            # keep track of any "edited" image names so we can modify
-            # the Nextflow files
-            name_mapping[full_image_name] = final_image_name
+
+        # the images are checked concurrently so that workflows with
+        # many containers don't take the sum of all the lookups
+        image_found = check_images_exist(sorted(set(name_mapping.values())))
+        missing_images = sorted([k for k, v in image_found.items() if not v])
+        if len(missing_images) > 0:
+            raise Exception('Could not locate the following'
+                f' image(s): {", ".join(missing_images)}. Aborting')
 
         # change the name of the image in the NF file(s), saving them in-place:
         edit_nf_containers(operation_dir, name_mapping)
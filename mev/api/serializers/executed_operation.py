@@ -5,7 +5,8 @@ from api.models import ExecutedOperation, Operation, OperationCategory
 
 class OperationField(serializers.RelatedField):
     def to_representation(self, value):
-        OpCategories = OperationCategory.objects.filter(operation=value)
+        # uses the prefetched categories, if available
+        OpCategories = value.operationcategory_set.all()
         categories = list(set([x.category for x in OpCategories]))
         return {
             'operation_id': str(value.id),
@@ -6,6 +6,7 @@ from rest_framework import serializers, exceptions
 
 from api.models import Resource, Workspace
 from api.utilities.resource_utilities import set_resource_to_inactive
+from api.utilities.workspace_dag import rename_resource_in_dags
 from api.serializers.workspace import WorkspaceSerializer
 import api.async_tasks.async_resource_tasks as api_tasks
 
@@ -155,6 +156,7 @@ class ResourceSerializer(serializers.ModelSerializer):
             )
 
         # Change the name or keep the existing if it wasn't supplied.
+        original_name = instance.name
         instance.name = validated_data.get('name', instance.name)
 
         # Save now so that we can save changes that don't require validation
@@ -163,6 +165,10 @@ class ResourceSerializer(serializers.ModelSerializer):
         # values, we DON'T trigger this save later.
         instance.save()
 
+        # the name is shown in the DAGs of workspaces using this resource
+        if instance.name != original_name:
+            rename_resource_in_dags(instance)
+
         # Set this flat to False at the start. If any of the parameters
         # should trigger a validation check, simply assign this flag to True
         change_requiring_validation = False
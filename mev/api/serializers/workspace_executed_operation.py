@@ -10,11 +10,20 @@ class OperationField(serializers.RelatedField):
         # we need the operation input definitions to properly display
         # a summary when someone requests executed operations. This
         # way they can see the inputs used. For that, we need the 
-        # operation data parsed from the op spec file:
-        op_data = get_operation_instance_data(value)
+        # operation data parsed from the op spec file. When listing many
+        # executed operations, the caller can provide a dict in the context
+        # so that each spec file is only read once.
+        cache = self.context.get('operation_data')
+        if cache is None:
+            op_data = get_operation_instance_data(value)
+        else:
+            if value.pk not in cache:
+                cache[value.pk] = get_operation_instance_data(value)
+            op_data = cache[value.pk]
 
         # for organizing the executed operations:
-        OpCategories = OperationCategory.objects.filter(operation=value)
+        # uses the prefetched categories, if available
+        OpCategories = value.operationcategory_set.all()
         categories = list(set([x.category for x in OpCategories]))
         return {
             'operation_id': str(value.id),
@@ -0,0 +1,22 @@
+from django.conf import settings
+from rest_framework import serializers
+
+
+class WorkspaceResourceBulkSerializer(serializers.Serializer):
+    '''
+    When adding or removing many Resources to/from a Workspace,
+    we need the identifiers of those resources.
+    '''
+    resource_uuids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False
+    )
+
+    def validate_resource_uuids(self, value):
+        # repeated identifiers are only acted on once
+        value = list(dict.fromkeys(value))
+        if len(value) > settings.MAX_WORKSPACE_RESOURCE_BULK_SIZE:
+            raise serializers.ValidationError('At most'
+                f' {settings.MAX_WORKSPACE_RESOURCE_BULK_SIZE} resources'
+                ' can be added or removed in a single request.')
+        return value
@@ -3,6 +3,7 @@ import os
 from io import BytesIO
 import datetime
 import logging
+import threading
 
 import boto3
 import botocore
@@ -49,6 +50,31 @@ class LocalResourceStorage(FileSystemStorage):
         dest_path = os.path.join(local_dir, name)
         copy_local_resource(resource.datafile.path, dest_path)
 
+    def read_leading_bytes(self, path_relative_to_storage_root, num_bytes):
+        '''
+        Returns (at most) the first `num_bytes` bytes of the file. Used
+        for things like previews where we do not want to read the 
+        entire file.
+        '''
+        return self.read_byte_range(path_relative_to_storage_root, 0, num_bytes)
+
+    def read_byte_range(self, path_relative_to_storage_root, start, num_bytes):
+        '''
+        Returns (at most) `num_bytes` bytes of the file, beginning 
+        at byte offset `start`.
+        '''
+        with self.open(path_relative_to_storage_root, 'rb') as fin:
+            fin.seek(start)
+            return fin.read(num_bytes)
+
+    def open_stream(self, path_relative_to_storage_root):
+        '''
+        Returns a file-like object which can be read incrementally
+        from the start of the file. The caller is responsible
+        for closing it.
+        '''
+        return self.open(path_relative_to_storage_root, 'rb')
+
     def copy_to_bucket(self, resource, dest_bucket_name, dest_object=None):
         raise NotImplementedError('Since local storage is used, we do not allow'\
             ' interaction with bucket/object storage.')
@@ -61,6 +87,26 @@ class LocalResourceStorage(FileSystemStorage):
         raise NotImplementedError('Since local storage is used, we do not allow'\
             ' interaction with bucket/object storage.')
 
+    def create_multipart_upload(self, owner, name, num_parts):
+        raise NotImplementedError('Since local storage is used, we do not allow'\
+            ' direct uploads to bucket/object storage.')
+
+    def complete_multipart_upload(self, resource, upload_id, parts):
+        raise NotImplementedError('Since local storage is used, we do not allow'\
+            ' direct uploads to bucket/object storage.')
+
+    def abort_multipart_upload(self, resource, upload_id):
+        raise NotImplementedError('Since local storage is used, we do not allow'\
+            ' direct uploads to bucket/object storage.')
+
+    def get_part_upload_urls(self, resource, upload_id, part_numbers):
+        raise NotImplementedError('Since local storage is used, we do not allow'\
+            ' direct uploads to bucket/object storage.')
+
+    def abort_resource_multipart_uploads(self, resource):
+        raise NotImplementedError('Since local storage is used, we do not allow'\
+            ' direct uploads to bucket/object storage.')
+
             
 class S3ResourceStorage(S3Boto3Storage):
     bucket_name = settings.MEDIA_ROOT
@@ -69,6 +115,23 @@ class S3ResourceStorage(S3Boto3Storage):
     # so that files are not overwritten
     file_overwite = False
 
+    _s3_client = None
+    _s3_client_lock = threading.Lock()
+
+    def get_s3_client(self):
+        '''
+        Returns a boto3 client which is shared by this storage instance.
+        Unlike boto3 resources (or creating clients from the default
+        session), clients are thread-safe. Hence, this client can be used
+        by methods which are called concurrently, such as the copies
+        made for Globus transfers.
+        '''
+        if self._s3_client is None:
+            with self._s3_client_lock:
+                if self._s3_client is None:
+                    self._s3_client = boto3.client('s3')
+        return self._s3_client
+
     def get_file_listing(self, full_path, recurse=False):
         '''
         This is a semi-override of the `listdir` method which returns a 
@@ -201,10 +264,52 @@ class S3ResourceStorage(S3Boto3Storage):
         '''
         name = str(uuid.uuid4())
         dest_path = os.path.join(local_dir, name)
-        s3 = boto3.client('s3')
+        s3 = self.get_s3_client()
         s3.download_file(settings.MEDIA_ROOT, resource.datafile.name, dest_path)
         return dest_path
 
+    def read_leading_bytes(self, path_relative_to_storage_root, num_bytes):
+        '''
+        Returns (at most) the first `num_bytes` bytes of the object
+        using a ranged GET request. This way, previews of large files
+        do not require downloading the full object.
+        '''
+        return self.read_byte_range(path_relative_to_storage_root, 0, num_bytes)
+
+    def read_byte_range(self, path_relative_to_storage_root, start, num_bytes):
+        '''
+        Returns (at most) `num_bytes` bytes of the object, beginning
+        at byte offset `start`, using a ranged GET request.
+        '''
+        s3 = self.get_s3_client()
+        try:
+            response = s3.get_object(
+                Bucket=self.bucket_name,
+                Key=path_relative_to_storage_root,
+                Range=f'bytes={start}-{start + num_bytes - 1}'
+            )
+        except botocore.exceptions.ClientError as ex:
+            # a range beginning past the end of the object (e.g. any
+            # range on an empty object) is not satisfiable
+            if ex.response['Error']['Code'] == 'InvalidRange':
+                return b''
+            raise ex
+        return response['Body'].read()
+
+    def open_stream(self, path_relative_to_storage_root):
+        '''
+        Returns a file-like object which can be read incrementally
+        from the start of the object. Unlike the file objects returned
+        by the `open` method, this does not download the entire object
+        first. The caller is responsible for closing it.
+        '''
+        s3 = boto3.client('s3')
+        response = s3.get_object(
+            Bucket=self.bucket_name,
+            Key=path_relative_to_storage_root
+        )
+        return response['Body']
+
     def _copy(self, src_bucket, dest_bucket, src_object, dest_object):
         '''
         A "private" method for general copies. Other public methods expose
@@ -217,13 +322,12 @@ class S3ResourceStorage(S3Boto3Storage):
         '''
 
         #TODO: catch bucket access issues
-        s3 = boto3.resource('s3')
         copy_source = {
             'Bucket': src_bucket,
             'Key': src_object
         }
         try:
-            s3.meta.client.copy(copy_source, dest_bucket, dest_object)
+            self.get_s3_client().copy(copy_source, dest_bucket, dest_object)
         except botocore.exceptions.ClientError as ex:
             response_code = ex.response['Error']['Code']
             if response_code == '404':
@@ -256,6 +360,27 @@ class S3ResourceStorage(S3Boto3Storage):
             dest_object
         )
 
+    def _create_placeholder_resource(self, owner, name):
+        '''
+        To avoid needing to duplicate the logic of locating files
+        within our storage, we basically create a dummy placeholder
+        "file" with empty content and create an instance
+        of api.models.Resource. The caller then uses the path of that
+        dummy file as a place to send the actual file (e.g. a copy of
+        a bucket-based file).
+
+        The Resource is initially inactive so that a user can't
+        interact with it (yet)
+        '''
+        with BytesIO() as fh:
+            f = File(fh, str(uuid.uuid4()))
+            return create_resource(
+                owner,
+                file_handle=f,
+                name=name,
+                is_active=False
+            )
+
     def create_resource_from_interbucket_copy(self, owner, src_path):
         '''
         Copies an object into our storage and creates/returns
@@ -266,21 +391,7 @@ class S3ResourceStorage(S3Boto3Storage):
         src_bucket, src_object = self.get_bucket_and_object_from_full_path(src_path)
         logger.info(f'src_bucket: {src_bucket}')
         logger.info(f'src_object: {src_object}')
-        # To avoid needing to duplicate the logic of locating files
-        # within our storage, we basically create a dummy placeholder
-        # "file" with empty content and create an instance
-        # of api.models.Resource. We then get the path of that dummy
-        # file and use that as a place to send the copy of our 
-        # bucket-based file.
-        with BytesIO() as fh:
-            f = File(fh, str(uuid.uuid4()))
-            r = create_resource(
-                owner,
-                file_handle=f,
-                name=os.path.basename(src_object),
-                # initially inactive so that a user can't interact with it (yet)
-                is_active=False
-            )
+        r = self._create_placeholder_resource(owner, os.path.basename(src_object))
         dest_obj = r.datafile.name
         logger.info('For interbucket copy, empty placeholder is'
             f' located at: {dest_obj}')
@@ -304,6 +415,115 @@ class S3ResourceStorage(S3Boto3Storage):
             r.delete()
             raise ex
 
+    def create_multipart_upload(self, owner, name, num_parts):
+        '''
+        Starts a multipart upload so that a client can upload a file
+        directly to our storage rather than through the server.
+
+        Returns a tuple of:
+        - an (inactive) api.models.Resource instance for the file
+        - the upload ID
+        - a list of presigned URLs which the client can use to PUT the
+          first parts (at most DIRECT_UPLOAD_URL_BATCH_SIZE of the
+          `num_parts` parts). Since the URLs expire, URLs for the
+          remaining parts are requested as the upload progresses
+          (see `get_part_upload_urls`).
+        '''
+        r = self._create_placeholder_resource(owner, name)
+        try:
+            response = self.get_s3_client().create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=r.datafile.name
+            )
+            upload_id = response['UploadId']
+            part_urls = self.get_part_upload_urls(r, upload_id,
+                range(1, min(num_parts, settings.DIRECT_UPLOAD_URL_BATCH_SIZE) + 1))
+        except Exception as ex:
+            logger.info(f'Failed to create a multipart upload. Reason: {ex}')
+            self.delete(r.datafile.name)
+            r.delete()
+            raise StorageException('Could not initiate the upload.')
+        return r, upload_id, part_urls
+
+    def get_part_upload_urls(self, resource, upload_id, part_numbers):
+        '''
+        Returns a list of presigned URLs (in the order of `part_numbers`)
+        which the client can use to PUT those parts of the multipart upload
+        initiated by `create_multipart_upload`. The URLs expire after
+        DIRECT_UPLOAD_URL_EXPIRATION seconds.
+        '''
+        s3 = self.get_s3_client()
+        return [
+            s3.generate_presigned_url('upload_part',
+                Params={
+                    'Bucket': self.bucket_name,
+                    'Key': resource.datafile.name,
+                    'UploadId': upload_id,
+                    'PartNumber': i
+                },
+                ExpiresIn=settings.DIRECT_UPLOAD_URL_EXPIRATION
+            ) for i in part_numbers
+        ]
+
+    def complete_multipart_upload(self, resource, upload_id, parts):
+        '''
+        Completes a multipart upload initiated by `create_multipart_upload`
+        and activates the Resource. `parts` is a list of tuples giving the
+        part number and the ETag returned when the part was uploaded.
+
+        Raises botocore.exceptions.ClientError if the upload could not
+        be completed, e.g. if parts are missing.
+        '''
+        self.get_s3_client().complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=resource.datafile.name,
+            UploadId=upload_id,
+            MultipartUpload={
+                'Parts': [{'PartNumber': n, 'ETag': etag}
+                    for n, etag in sorted(parts)]
+            }
+        )
+        resource.is_active = True
+        resource.size = resource.datafile.size
+        resource.save()
+
+    def abort_multipart_upload(self, resource, upload_id):
+        '''
+        Aborts a multipart upload (which removes any uploaded parts)
+        and removes the placeholder file and Resource.
+        '''
+        self.get_s3_client().abort_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=resource.datafile.name,
+            UploadId=upload_id
+        )
+        self.delete(resource.datafile.name)
+        resource.delete()
+
+    def abort_resource_multipart_uploads(self, resource):
+        '''
+        Aborts any multipart uploads to the object of `resource`, which
+        removes the uploaded parts, and removes the placeholder file and
+        Resource. Used for direct uploads which the client abandoned,
+        where we no longer know the upload ID.
+        '''
+        s3 = self.get_s3_client()
+        object_name = resource.datafile.name
+        paginator = s3.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=self.bucket_name,
+            Prefix=object_name):
+            for upload in page.get('Uploads', []):
+                # the prefix can also match other objects
+                if upload['Key'] != object_name:
+                    continue
+                s3.abort_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=object_name,
+                    UploadId=upload['UploadId']
+                )
+        self.delete(object_name)
+        resource.delete()
+
     def copy_out_to_bucket(self, resource, dest_bucket_name, dest_object=None):
         '''
         Copies the resource to a destination at
@@ -331,13 +551,12 @@ class S3ResourceStorage(S3Boto3Storage):
         boto3 `wait_until_exists`. This works on any bucket to which
         the host ec2 instance has access
         '''
-        s3 = boto3.resource('s3')
         bucket_name, obj_name = self.get_bucket_and_object_from_full_path(full_path)
-        obj = s3.Object(bucket_name, obj_name)
+        waiter = self.get_s3_client().get_waiter('object_exists')
         try:
             logger.info(f'Checking for {full_path}')
             t0 = datetime.datetime.now()
-            obj.wait_until_exists()
+            waiter.wait(Bucket=bucket_name, Key=obj_name)
         except botocore.exceptions.WaiterError as ex:
             t1 = datetime.datetime.now()
             logger.info(f'After waiting {t1-t0}, still could not find'
@@ -345,7 +564,6 @@ class S3ResourceStorage(S3Boto3Storage):
             raise FileNotFoundError
 
     def delete_object(self, full_path):
-        s3 = boto3.client('s3')
         bucket_name, obj_name = self.get_bucket_and_object_from_full_path(full_path)
-        s3.delete_object(Bucket=bucket_name, Key=obj_name)
+        self.get_s3_client().delete_object(Bucket=bucket_name, Key=obj_name)
         
\ No newline at end of file
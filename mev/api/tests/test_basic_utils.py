@@ -107,5 +107,13 @@ class TestBasicUtilities(unittest.TestCase):
         )
         shutil.rmtree(dummy_dest_path)
 
+        # if requested, the files are linked rather than copied
+        recursive_copy(dummy_src_path, dummy_dest_path,
+            include_hidden=True, hardlink=True)
+        for p in all_files:
+            dest_p = os.path.join(dummy_dest_path, os.path.basename(p))
+            self.assertTrue(os.path.samefile(p, dest_p))
+        shutil.rmtree(dummy_dest_path)
+
         # clean up
         shutil.rmtree(dummy_src_path)
@@ -0,0 +1,139 @@
+import os
+import pickle
+import unittest.mock as mock
+
+from django.urls import reverse
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework import status
+
+from constants import TSV_FORMAT, \
+    MATRIX_KEY
+from api.models import Resource
+from resource_types import get_contents
+from resource_types.table_types import TableResource
+from resource_types.contents_cache import LocalContentsCache, \
+    estimate_pickled_size, \
+    get_cache_stats, \
+    clear_local_cache
+
+from api.tests.base import BaseAPITestCase
+from api.tests.test_helpers import associate_file_with_resource
+
+TESTDIR = os.path.join(
+    os.path.dirname(__file__),
+    'resource_validation_test_files'
+)
+
+
+class TestContentsCache(BaseAPITestCase):
+
+    def setUp(self):
+        self.establish_clients()
+        clear_local_cache()
+        caches['default'].clear()
+        self.resource = Resource.objects.filter(
+            owner=self.regular_user_1, is_active=True)[0]
+        f = os.path.join(TESTDIR, 'test_matrix.tsv')
+        associate_file_with_resource(self.resource, f)
+        self.resource.resource_type = MATRIX_KEY
+        self.resource.file_format = TSV_FORMAT
+        self.resource.save()
+
+    def tearDown(self):
+        clear_local_cache()
+        caches['default'].clear()
+
+    @mock.patch.object(TableResource, 'read_resource',
+        autospec=True, side_effect=TableResource.read_resource)
+    def test_repeated_query_uses_cache(self, mock_read_resource):
+        '''
+        Tests that identical queries (which can differ in the page)
+        only read the file once.
+        '''
+        query_params = {'page': '1', 'page_size': '2', 'sort_vals': '[asc]:SW1_Control'}
+        contents = get_contents(self.resource, query_params)
+        query_params = {'page': '2', 'page_size': '2', 'sort_vals': '[asc]:SW1_Control'}
+        self.assertEqual(get_contents(self.resource, query_params), contents)
+        self.assertEqual(mock_read_resource.call_count, 1)
+        stats = get_cache_stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['local_hits'], 1)
+
+        # a different query requires a read
+        get_contents(self.resource, {'sort_vals': '[desc]:SW1_Control'})
+        self.assertEqual(mock_read_resource.call_count, 2)
+
+        # previews are cached separately
+        preview = get_contents(self.resource, {}, preview=True)
+        self.assertEqual(mock_read_resource.call_count, 3)
+        self.assertNotEqual(preview, contents)
+
+        # without the local tier (e.g. in another process) we
+        # use the shared tier
+        clear_local_cache()
+        query_params = {'page': '1', 'page_size': '2', 'sort_vals': '[asc]:SW1_Control'}
+        self.assertEqual(get_contents(self.resource, query_params), contents)
+        self.assertEqual(mock_read_resource.call_count, 3)
+        self.assertEqual(get_cache_stats()['shared_hits'], 1)
+
+    @mock.patch.object(TableResource, 'read_resource',
+        autospec=True, side_effect=TableResource.read_resource)
+    def test_modified_resource_invalidates_cache(self, mock_read_resource):
+        contents = get_contents(self.resource, {})
+        associate_file_with_resource(self.resource,
+            os.path.join(TESTDIR, 'test_integer_matrix.tsv'))
+        self.resource.save()
+        new_contents = get_contents(self.resource, {})
+        self.assertEqual(mock_read_resource.call_count, 2)
+        self.assertNotEqual(contents, new_contents)
+
+    @override_settings(RESOURCE_CONTENTS_CACHE_ENABLED=False)
+    @mock.patch.object(TableResource, 'read_resource',
+        autospec=True, side_effect=TableResource.read_resource)
+    def test_disabled_cache(self, mock_read_resource):
+        get_contents(self.resource, {})
+        get_contents(self.resource, {})
+        self.assertEqual(mock_read_resource.call_count, 2)
+
+    @override_settings(RESOURCE_CONTENTS_LOCAL_CACHE_MAX_BYTES=10)
+    def test_local_cache_evicts_least_recently_used(self):
+        cache = LocalContentsCache()
+        self.assertEqual(cache.set('a', b'1234'), 0)
+        self.assertEqual(cache.set('b', b'1234'), 0)
+        # access 'a' so that 'b' is the least recently used
+        cache.get('a')
+        self.assertEqual(cache.set('c', b'1234'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1234')
+        self.assertEqual(cache.num_bytes, 8)
+
+        # items larger than the budget are not added
+        self.assertEqual(cache.set('d', b'12345678901'), 0)
+        self.assertIsNone(cache.get('d'))
+
+    @override_settings(RESOURCE_CONTENTS_CACHE_MAX_ITEM_BYTES=1000)
+    @mock.patch('resource_types.contents_cache.pickle.dumps',
+        side_effect=pickle.dumps)
+    def test_large_contents_not_pickled(self, mock_dumps):
+        '''
+        Tests that contents estimated to exceed the item size
+        are not pickled in full.
+        '''
+        contents = [{'rowname': f'g{i}', 'values': {'a': i}} for i in range(1000)]
+        self.assertTrue(estimate_pickled_size(contents) > 1000)
+        self.assertIsNone(estimate_pickled_size(contents[:10]))
+
+        with mock.patch.object(TableResource, 'get_contents', return_value=contents):
+            get_contents(self.resource, {'sort_vals': '[asc]:SW1_Control'})
+        self.assertEqual(get_cache_stats()['uncacheable'], 1)
+        self.assertFalse(any(len(x[0][0]) == 1000 for x in mock_dumps.call_args_list))
+
+    def test_stats_endpoint_requires_admin(self):
+        url = reverse('resource-contents-cache-stats')
+        response = self.authenticated_regular_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        get_contents(self.resource, {})
+        response = self.authenticated_admin_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['misses'], 1)
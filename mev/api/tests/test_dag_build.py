@@ -4,9 +4,16 @@ import datetime
 
 from django.core.exceptions import ImproperlyConfigured
 
-from api.models import WorkspaceExecutedOperation, Operation, Workspace
+from api.models import WorkspaceExecutedOperation, \
+    Operation, \
+    Workspace, \
+    WorkspaceDag, \
+    ExecutedOperationResource
 from api.tests.base import BaseAPITestCase
-from api.views.workspace_tree_views import WorkspaceTreeBase
+from api.utilities.workspace_dag import create_workspace_dag, \
+    get_workspace_dag, \
+    update_workspace_dag, \
+    rename_resource_in_dags
 
 class DagBuildTester(BaseAPITestCase):
 
@@ -201,14 +208,13 @@ class DagBuildTester(BaseAPITestCase):
             'F': [str(self.ex2.pk)]
         }
 
-    @mock.patch('api.views.workspace_tree_views.get_operation_instance_data')
-    @mock.patch('api.views.workspace_tree_views.get_resource_by_pk')
+    @mock.patch('api.utilities.workspace_dag.get_operation_instance_data')
+    @mock.patch('api.utilities.workspace_dag.get_resource_by_pk')
     def test_graph_builder(self, mock_get_resource_by_pk, mock_get_operation_instance_data):
         '''
         Here we mock that we have two operations completed and check that the 
         graph structure is as expected
         '''        
-        base_tree = WorkspaceTreeBase()
         mock_get_operation_instance_data.side_effect = [self.op1_data, self.op2_data]
         mock_resource = mock.MagicMock()
         mock_resource.name = 'abc'
@@ -216,7 +222,7 @@ class DagBuildTester(BaseAPITestCase):
         # add stop datetimes to both ops so we see the full tree
         self.ex1.execution_stop_datetime = datetime.datetime.now()
         self.ex2.execution_stop_datetime = datetime.datetime.now()
-        dag = base_tree.create_workspace_dag([self.ex1, self.ex2])
+        dag = create_workspace_dag([self.ex1, self.ex2])
         nodes_present = []
         for node in dag:
             node_id = node['id']
@@ -225,22 +231,21 @@ class DagBuildTester(BaseAPITestCase):
             self.assertCountEqual(parents, self.expected_parents[node_id])
         self.assertCountEqual(nodes_present, ['A','B', 'C', 'D', 'E', 'F', str(self.ex1.pk),str(self.ex2.pk)])
 
-    @mock.patch('api.views.workspace_tree_views.get_operation_instance_data')
-    @mock.patch('api.views.workspace_tree_views.get_resource_by_pk')
+    @mock.patch('api.utilities.workspace_dag.get_operation_instance_data')
+    @mock.patch('api.utilities.workspace_dag.get_resource_by_pk')
     def test_graph_builder_with_unfinished_op(self, mock_get_resource_by_pk, mock_get_operation_instance_data):
         '''
         Here we mock that we have only op1 completed and check that the 
         graph structure is as expected. Namely, want to ensure that the output
         of the second op is NOT there (node F)
         ''' 
-        base_tree = WorkspaceTreeBase()       
         mock_get_operation_instance_data.side_effect = [self.op1_data, self.op2_data]
         mock_resource = mock.MagicMock()
         mock_resource.name = 'abc'
         mock_get_resource_by_pk.return_value = mock_resource
         # add stop datetimes to both ops so we see the full tree
         self.ex1.execution_stop_datetime = datetime.datetime.now()
-        dag = base_tree.create_workspace_dag([self.ex1, self.ex2])
+        dag = create_workspace_dag([self.ex1, self.ex2])
         nodes_present = []
         for node in dag:
             node_id = node['id']
@@ -250,15 +255,14 @@ class DagBuildTester(BaseAPITestCase):
         self.assertCountEqual(nodes_present, ['A','B', 'C', 'D', 'E', str(self.ex1.pk),str(self.ex2.pk)])
         self.assertFalse('F' in nodes_present) # explicitly double-check that 'F' is NOT there
 
-    @mock.patch('api.views.workspace_tree_views.get_operation_instance_data')
-    @mock.patch('api.views.workspace_tree_views.get_resource_by_pk')
+    @mock.patch('api.utilities.workspace_dag.get_operation_instance_data')
+    @mock.patch('api.utilities.workspace_dag.get_resource_by_pk')
     def test_graph_builder_with_failed_op(self, mock_get_resource_by_pk, mock_get_operation_instance_data):
         '''
         Here we mock that we have only op1 completed and check that the 
         graph structure is as expected. We pretend the second operation failed,
         so we should NOT see that 
         '''       
-        base_tree = WorkspaceTreeBase() 
         mock_get_operation_instance_data.side_effect = [self.op1_data, self.op2_data]
         mock_resource = mock.MagicMock()
         mock_resource.name = 'abc'
@@ -267,7 +271,7 @@ class DagBuildTester(BaseAPITestCase):
         self.ex1.execution_stop_datetime = datetime.datetime.now()
         self.ex2.execution_stop_datetime = datetime.datetime.now()
         self.ex2.job_failed = True
-        dag = base_tree.create_workspace_dag([self.ex1, self.ex2])
+        dag = create_workspace_dag([self.ex1, self.ex2])
         nodes_present = []
         for node in dag:
             node_id = node['id']
@@ -277,4 +281,119 @@ class DagBuildTester(BaseAPITestCase):
         self.assertCountEqual(nodes_present, ['A','B', 'C', 'D', 'E', str(self.ex1.pk)])
         self.assertFalse('F' in nodes_present) # explicitly double-check that 'F' is NOT there
         # explicitly double-check that the second op is NOT there        
-        self.assertFalse(str(self.ex2.pk) in nodes_present)
\ No newline at end of file
+        self.assertFalse(str(self.ex2.pk) in nodes_present)
+
+    def _use_new_workspace(self):
+        '''
+        Moves the executed ops to a new workspace (so no other ops are
+        included) and gives the second op its own Operation.
+        '''
+        workspace = Workspace.objects.create(owner=self.regular_user_1)
+        self.op2 = Operation.objects.create(id=uuid.uuid4(), name='bar')
+        self.ex1.workspace = workspace
+        self.ex1.save()
+        self.ex2.workspace = workspace
+        self.ex2.operation = self.op2
+        self.ex2.save()
+        return workspace
+
+    @mock.patch('api.utilities.workspace_dag.get_operation_instance_data')
+    @mock.patch('api.utilities.workspace_dag.get_resource_by_pk')
+    def test_stored_dag_updates(self, mock_get_resource_by_pk, mock_get_operation_instance_data):
+        '''
+        Tests that the stored DAG is built once and only the nodes
+        of the changed operation are recreated.
+        '''
+        workspace = self._use_new_workspace()
+        mock_get_operation_instance_data.side_effect = \
+            lambda op: self.op2_data if op.pk == self.op2.pk else self.op1_data
+        mock_resource = mock.MagicMock()
+        mock_resource.name = 'abc'
+        mock_get_resource_by_pk.return_value = mock_resource
+        self.ex1.execution_stop_datetime = datetime.datetime.now()
+        self.ex1.save()
+
+        dag = get_workspace_dag(workspace)
+        self.assertEqual(dag.version, 1)
+        self.assertCountEqual([x['id'] for x in dag.nodes],
+            ['A','B', 'C', 'D', 'E', str(self.ex1.pk),str(self.ex2.pk)])
+
+        # subsequent requests read the stored DAG
+        mock_get_operation_instance_data.reset_mock()
+        with self.assertNumQueries(1):
+            dag = get_workspace_dag(workspace)
+        mock_get_operation_instance_data.assert_not_called()
+
+        # the second op completes
+        self.ex2.execution_stop_datetime = datetime.datetime.now()
+        self.ex2.save()
+        update_workspace_dag(self.ex2)
+        mock_get_operation_instance_data.assert_called_once_with(self.op2)
+        dag = get_workspace_dag(workspace)
+        self.assertEqual(dag.version, 2)
+        nodes_present = []
+        for node in dag.nodes:
+            nodes_present.append(node['id'])
+            self.assertCountEqual(node['parentIds'],
+                self.expected_parents[node['id']])
+        self.assertCountEqual(nodes_present,
+            ['A','B', 'C', 'D', 'E', 'F', str(self.ex1.pk),str(self.ex2.pk)])
+
+        # nothing changed, so the version is the same
+        update_workspace_dag(self.ex2)
+        self.assertEqual(get_workspace_dag(workspace).version, 2)
+
+        # the first op is removed from the DAG if it fails
+        self.ex1.job_failed = True
+        update_workspace_dag(self.ex1)
+        dag = get_workspace_dag(workspace)
+        self.assertEqual(dag.version, 3)
+        self.assertCountEqual([x['id'] for x in dag.nodes],
+            ['C', 'D', 'F', str(self.ex2.pk)])
+
+    @mock.patch('api.utilities.workspace_dag.create_executed_op_dag')
+    def test_failed_update_removes_dag(self, mock_create_executed_op_dag):
+        workspace = self._use_new_workspace()
+        mock_create_executed_op_dag.return_value = []
+        get_workspace_dag(workspace)
+        mock_create_executed_op_dag.side_effect = Exception('!!!')
+        update_workspace_dag(self.ex1)
+        self.assertFalse(WorkspaceDag.objects.filter(workspace=workspace).exists())
+
+    @mock.patch('api.utilities.workspace_dag.create_executed_op_dag')
+    def test_update_without_stored_dag(self, mock_create_executed_op_dag):
+        '''
+        If the DAG was never requested, it is built in full on the
+        first request rather than being updated.
+        '''
+        workspace = self._use_new_workspace()
+        update_workspace_dag(self.ex1)
+        mock_create_executed_op_dag.assert_not_called()
+        self.assertFalse(WorkspaceDag.objects.filter(workspace=workspace).exists())
+
+    def test_rename_resource(self):
+        workspace = self._use_new_workspace()
+        r_uuid = str(uuid.uuid4())
+        other_uuid = str(uuid.uuid4())
+        fragment = [
+            {'id': str(self.ex1.pk), 'node_type': 'op_node', 'node_name': 'foo',
+                'parentIds': [r_uuid], 'data': {}},
+            {'id': r_uuid, 'node_type': 'data_resource_node', 'node_name': 'old',
+                'parentIds': [], 'data': None},
+            {'id': other_uuid, 'node_type': 'data_resource_node', 'node_name': 'other',
+                'parentIds': [], 'data': None}
+        ]
+        WorkspaceDag.objects.create(workspace=workspace,
+            version=1,
+            fragments={str(self.ex1.pk): fragment},
+            nodes=fragment)
+        ExecutedOperationResource.objects.create(executed_operation=self.ex1,
+            resource_uuid=r_uuid, role=ExecutedOperationResource.INPUT)
+        mock_resource = mock.MagicMock(pk=uuid.UUID(r_uuid))
+        mock_resource.name = 'new'
+        rename_resource_in_dags(mock_resource)
+        dag = WorkspaceDag.objects.get(workspace=workspace)
+        self.assertEqual(dag.version, 2)
+        names = {x['id']: x['node_name'] for x in dag.nodes}
+        self.assertEqual(names[r_uuid], 'new')
+        self.assertEqual(names[other_uuid], 'other')
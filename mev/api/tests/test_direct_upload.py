@@ -0,0 +1,228 @@
+import datetime
+import unittest.mock as mock
+from io import BytesIO
+
+from django.urls import reverse
+from django.core.files import File
+from django.test import override_settings
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from botocore.exceptions import ClientError
+
+from api.models import Resource
+from api.utilities.resource_utilities import create_resource
+from api.views.resource_upload_views import get_direct_upload_part_size
+from api.async_tasks.async_resource_tasks import \
+    cleanup_abandoned_direct_uploads
+
+from api.tests.base import BaseAPITestCase
+
+
+@override_settings(DIRECT_UPLOAD_PART_SIZE=100, DIRECT_UPLOAD_MAX_PARTS=10)
+class DirectUploadTests(BaseAPITestCase):
+
+    def setUp(self):
+        self.url = reverse('direct-upload')
+        self.establish_clients()
+
+    def _create_upload_resource(self, owner, is_active=False):
+        with BytesIO() as fh:
+            r = create_resource(owner,
+                file_handle=File(fh, 'f.tsv'),
+                name='f.tsv',
+                is_active=is_active
+            )
+        r.status = Resource.UPLOADING
+        r.save()
+        self.addCleanup(r.datafile.delete)
+        return r
+
+    def test_requires_auth(self):
+        response = self.regular_client.post(self.url, data={}, format='json')
+        self.assertTrue((response.status_code == status.HTTP_401_UNAUTHORIZED)
+            | (response.status_code == status.HTTP_403_FORBIDDEN))
+
+    def test_part_size(self):
+        self.assertEqual(get_direct_upload_part_size(50), 100)
+        self.assertEqual(get_direct_upload_part_size(1000), 100)
+        # would require more than the max number of parts
+        self.assertEqual(get_direct_upload_part_size(1001), 101)
+
+    def test_local_storage_backend_fails_request(self):
+        '''
+        If the storage backend is NOT bucket-based, the client has
+        to upload through the server.
+        '''
+        n0 = Resource.objects.count()
+        response = self.authenticated_regular_client.post(self.url,
+            data={'name': 'f.tsv', 'size': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Resource.objects.count(), n0)
+
+    @mock.patch('api.views.resource_upload_views.default_storage')
+    def test_bad_payload(self, mock_default_storage):
+        for payload in [{'size': 10}, {'name': 'f.tsv'},
+            {'name': 'f.tsv', 'size': 'abc'}, {'name': 'f.tsv', 'size': 0}]:
+            response = self.authenticated_regular_client.post(self.url,
+                data=payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        mock_default_storage.create_multipart_upload.assert_not_called()
+
+    @mock.patch('api.views.resource_upload_views.default_storage')
+    def test_initiate_upload(self, mock_default_storage):
+        r = self._create_upload_resource(self.regular_user_1)
+        mock_default_storage.create_multipart_upload.return_value = \
+            (r, 'abc', ['url1', 'url2', 'url3'])
+        response = self.authenticated_regular_client.post(self.url,
+            data={'name': 'f.tsv', 'size': 250}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        mock_default_storage.create_multipart_upload.assert_called_once_with(
+            self.regular_user_1, 'f.tsv', 3)
+        j = response.json()
+        self.assertEqual(j['resource_pk'], str(r.pk))
+        self.assertEqual(j['upload_id'], 'abc')
+        self.assertEqual(j['part_size'], 100)
+        self.assertEqual(j['num_parts'], 3)
+        self.assertEqual(j['part_urls'], ['url1', 'url2', 'url3'])
+
+    @mock.patch('api.views.resource_upload_views.async_validate_resource')
+    @mock.patch('api.views.resource_upload_views.default_storage')
+    def test_complete_upload(self, mock_default_storage, mock_validate):
+        r = self._create_upload_resource(self.regular_user_1)
+        url = reverse('direct-upload-complete', kwargs={'pk': r.pk})
+        response = self.authenticated_regular_client.post(url,
+            data={
+                'upload_id': 'abc',
+                'parts': [
+                    {'part_number': 1, 'etag': 'e1'},
+                    {'part_number': 2, 'etag': 'e2'}
+                ],
+                'resource_type': 'MTX'
+            },
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_default_storage.complete_multipart_upload.assert_called_once_with(
+            r, 'abc', [(1, 'e1'), (2, 'e2')])
+        mock_validate.delay.assert_called_once_with(r.pk, 'MTX', None)
+
+    @mock.patch('api.views.resource_upload_views.async_validate_resource')
+    @mock.patch('api.views.resource_upload_views.default_storage')
+    def test_failed_completion(self, mock_default_storage, mock_validate):
+        r = self._create_upload_resource(self.regular_user_1)
+        url = reverse('direct-upload-complete', kwargs={'pk': r.pk})
+        mock_default_storage.complete_multipart_upload.side_effect = \
+            ClientError({'Error': {'Code': 'InvalidPart'}},
+                'complete_multipart_upload')
+        response = self.authenticated_regular_client.post(url,
+            data={'upload_id': 'abc', 'parts': [{'part_number': 1, 'etag': 'e1'}]},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        mock_validate.delay.assert_not_called()
+
+    @mock.patch('api.views.resource_upload_views.async_validate_resource')
+    @mock.patch('api.views.resource_upload_views.default_storage')
+    def test_complete_requires_ownership(self, mock_default_storage, mock_validate):
+        r = self._create_upload_resource(self.regular_user_2)
+        url = reverse('direct-upload-complete', kwargs={'pk': r.pk})
+        response = self.authenticated_regular_client.post(url,
+            data={'upload_id': 'abc', 'parts': [{'part_number': 1, 'etag': 'e1'}]},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        mock_default_storage.complete_multipart_upload.assert_not_called()
+
+    @mock.patch('api.views.resource_upload_views.async_validate_resource')
+    @mock.patch('api.views.resource_upload_views.default_storage')
+    def test_complete_requires_pending_upload(self, mock_default_storage, mock_validate):
+        r = self._create_upload_resource(self.regular_user_1, is_active=True)
+        url = reverse('direct-upload-complete', kwargs={'pk': r.pk})
+        response = self.authenticated_regular_client.post(url,
+            data={'upload_id': 'abc', 'parts': [{'part_number': 1, 'etag': 'e1'}]},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        mock_default_storage.complete_multipart_upload.assert_not_called()
+
+    @mock.patch('api.views.resource_upload_views.default_storage')
+    def test_abort_upload(self, mock_default_storage):
+        r = self._create_upload_resource(self.regular_user_1)
+        url = reverse('direct-upload-abort', kwargs={'pk': r.pk})
+        response = self.authenticated_regular_client.post(url,
+            data={'upload_id': 'abc'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        mock_default_storage.abort_multipart_upload.assert_called_once_with(
+            r, 'abc')
+
+    def _age_resource(self, r, seconds):
+        # `update` bypasses the automatic modification time
+        Resource.objects.filter(pk=r.pk).update(
+            modification_datetime=timezone.now() - datetime.timedelta(seconds=seconds))
+
+    @override_settings(DIRECT_UPLOAD_ABANDONED_AFTER=1000)
+    @mock.patch('api.async_tasks.async_resource_tasks.default_storage')
+    def test_cleanup_abandoned_uploads(self, mock_default_storage):
+        '''
+        Tests that only the placeholders of direct uploads without
+        recent activity are removed.
+        '''
+        abandoned = self._create_upload_resource(self.regular_user_1)
+        self._age_resource(abandoned, 2000)
+        in_progress = self._create_upload_resource(self.regular_user_1)
+        self._age_resource(in_progress, 500)
+        # an inactive resource which is not a direct upload (e.g. validating)
+        other = self._create_upload_resource(self.regular_user_1)
+        other.status = Resource.VALIDATING
+        other.save()
+        self._age_resource(other, 2000)
+
+        cleanup_abandoned_direct_uploads()
+        mock_default_storage.abort_resource_multipart_uploads.assert_called_once()
+        self.assertEqual(
+            mock_default_storage.abort_resource_multipart_uploads.call_args.args[0].pk,
+            abandoned.pk)
+
+    @override_settings(DIRECT_UPLOAD_ABANDONED_AFTER=1000)
+    def test_cleanup_with_local_storage(self):
+        r = self._create_upload_resource(self.regular_user_1)
+        self._age_resource(r, 2000)
+        cleanup_abandoned_direct_uploads()
+        self.assertTrue(Resource.objects.filter(pk=r.pk).exists())
+
+    @override_settings(DIRECT_UPLOAD_MAX_SIZE=1000)
+    @mock.patch('api.views.resource_upload_views.default_storage')
+    def test_size_limit(self, mock_default_storage):
+        response = self.authenticated_regular_client.post(self.url,
+            data={'name': 'f.tsv', 'size': 1001}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        mock_default_storage.create_multipart_upload.assert_not_called()
+
+    @override_settings(DIRECT_UPLOAD_URL_BATCH_SIZE=2)
+    @mock.patch('api.views.resource_upload_views.default_storage')
+    def test_part_urls(self, mock_default_storage):
+        r = self._create_upload_resource(self.regular_user_1)
+        self._age_resource(r, 2000)
+        url = reverse('direct-upload-parts', kwargs={'pk': r.pk})
+        mock_default_storage.get_part_upload_urls.return_value = ['url3', 'url4']
+        response = self.authenticated_regular_client.post(url,
+            data={'upload_id': 'abc', 'part_numbers': [3, 4]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['part_urls'], {'3': 'url3', '4': 'url4'})
+        mock_default_storage.get_part_upload_urls.assert_called_once_with(
+            r, 'abc', [3, 4])
+        # the request counts as activity on the upload
+        self.assertTrue(Resource.objects.get(pk=r.pk).modification_datetime
+            > timezone.now() - datetime.timedelta(seconds=60))
+
+        # too many parts, invalid part numbers, or another user's upload
+        for payload in [{'upload_id': 'abc', 'part_numbers': [1, 2, 3]},
+            {'upload_id': 'abc', 'part_numbers': [0]},
+            {'upload_id': 'abc', 'part_numbers': ['a']},
+            {'upload_id': 'abc'}, {'part_numbers': [1]}]:
+            response = self.authenticated_regular_client.post(url,
+                data=payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        other_r = self._create_upload_resource(self.regular_user_2)
+        response = self.authenticated_regular_client.post(
+            reverse('direct-upload-parts', kwargs={'pk': other_r.pk}),
+            data={'upload_id': 'abc', 'part_numbers': [1]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(mock_default_storage.get_part_upload_urls.call_count, 1)
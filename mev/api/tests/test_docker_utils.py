@@ -1,6 +1,14 @@
+import unittest.mock as mock
+
+from django.test import override_settings
+from django.core.cache import caches
+
 from api.tests.base import BaseAPITestCase
 
-from api.utilities.docker import check_image_name_validity
+from api.utilities.docker import check_image_name_validity, \
+    check_image_exists, \
+    check_images_exist, \
+    locate_image
 from api.container_registries.github_cr import GithubContainerRegistry
 from api.container_registries.dockerhub_cr import DockerhubRegistry
 
@@ -67,4 +75,58 @@ class DockerUtilsTester(BaseAPITestCase):
         # shorter name with a tag. That's ok
         initial_image_name = 'docker.io/ubuntu:jammy'
         final_image_name = check_image_name_validity(initial_image_name, repo_name, git_hash)
-        self.assertTrue(initial_image_name == final_image_name)
\ No newline at end of file
+        self.assertTrue(initial_image_name == final_image_name)
+
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'docker-utils-tests'
+    }
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DockerImageCheckTester(BaseAPITestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    @mock.patch('api.utilities.docker.pull_image')
+    @mock.patch('api.utilities.docker.run_shell_command')
+    def test_locate_image(self, mock_run_shell_command, mock_pull_image):
+        # the manifest lookup works, so no pull
+        mock_run_shell_command.return_value = (b'{"abc": 1}', b'')
+        self.assertTrue(locate_image('ghcr.io/web-mev/pca:sha-abc'))
+        mock_pull_image.assert_not_called()
+
+        # the manifest lookup fails, but the pull works
+        mock_run_shell_command.side_effect = Exception('!!!')
+        self.assertTrue(locate_image('ghcr.io/web-mev/pca:sha-abc'))
+        mock_pull_image.assert_called_once_with('ghcr.io/web-mev/pca:sha-abc')
+
+        # neither works
+        mock_pull_image.side_effect = Exception('!!!')
+        self.assertFalse(locate_image('ghcr.io/web-mev/pca:sha-abc'))
+
+    @mock.patch('api.utilities.docker.locate_image')
+    def test_located_images_cached(self, mock_locate_image):
+        mock_locate_image.return_value = True
+        self.assertTrue(check_image_exists('docker.io/ubuntu:bionic'))
+        self.assertTrue(check_image_exists('docker.io/ubuntu:bionic'))
+        mock_locate_image.assert_called_once_with('docker.io/ubuntu:bionic')
+
+        # images which were not found are not cached
+        mock_locate_image.reset_mock()
+        mock_locate_image.return_value = False
+        self.assertFalse(check_image_exists('docker.io/ubuntu:focal'))
+        self.assertFalse(check_image_exists('docker.io/ubuntu:focal'))
+        self.assertEqual(mock_locate_image.call_count, 2)
+
+    @override_settings(MAX_CONCURRENT_IMAGE_CHECKS=2)
+    @mock.patch('api.utilities.docker.locate_image')
+    def test_check_images_exist(self, mock_locate_image):
+        mock_locate_image.side_effect = lambda x: x != 'b:1'
+        self.assertEqual(check_images_exist(['a:1', 'b:1', 'c:1']),
+            {'a:1': True, 'b:1': False, 'c:1': True})
+        self.assertEqual(check_images_exist([]), {})
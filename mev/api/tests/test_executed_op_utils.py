@@ -8,13 +8,15 @@ from rest_framework.exceptions import ValidationError
 
 from api.utilities.operations import read_operation_json
 from api.utilities.executed_op_utilities import collect_resource_uuids, \
-    check_for_resource_operations
+    check_for_resource_operations, \
+    record_resource_usage
 
 from api.tests.base import BaseAPITestCase
 from api.models import Workspace, \
     Operation, \
     ExecutedOperation, \
-    WorkspaceExecutedOperation
+    WorkspaceExecutedOperation, \
+    ExecutedOperationResource
 
 # the api/tests dir
 TESTDIR = os.path.dirname(__file__)
@@ -25,8 +27,7 @@ class ExecutedOperationUtilsTester(BaseAPITestCase):
     def setUp(self):
         self.establish_clients()
 
-    @mock.patch('api.utilities.executed_op_utilities.get_operation_instance_data')
-    def test_check_for_resource_operations_case1(self, mock_get_operation_instance_data):
+    def test_check_for_resource_operations_case1(self):
         '''
         When removing a Resource from a Workspace, we need to ensure
         we are not removing a file that has been used in one or more 
@@ -63,7 +64,6 @@ class ExecutedOperationUtilsTester(BaseAPITestCase):
         )
         op_data = read_operation_json(f)
 
-        mock_get_operation_instance_data.return_value = op_data
         executed_op_pk = uuid.uuid4()
         # the op_data we get from above has two outputs, one of which
         # is a DataResource. Just to be sure everything is consistent
@@ -87,12 +87,12 @@ class ExecutedOperationUtilsTester(BaseAPITestCase):
             mode = op_data['mode'],
             status = ExecutedOperation.SUBMITTED
         )
+        record_resource_usage(ex_op, op_data, ExecutedOperationResource.INPUT)
         was_used = check_for_resource_operations(mock_used_resource, workspace_with_resource)
         self.assertTrue(was_used)
 
 
-    @mock.patch('api.utilities.executed_op_utilities.get_operation_instance_data')
-    def test_check_for_resource_operations_case2(self, mock_get_operation_instance_data):
+    def test_check_for_resource_operations_case2(self):
         '''
         When removing a Resource from a Workspace, we need to ensure
         we are not removing a file that has been used in one or more 
@@ -128,7 +128,6 @@ class ExecutedOperationUtilsTester(BaseAPITestCase):
             'simple_workspace_op_test.json'
         )
         op_data = read_operation_json(f)
-        mock_get_operation_instance_data.return_value = op_data
         executed_op_pk = uuid.uuid4()
         # the op_data we get from above has two outputs, one of which
         # is a DataResource. Just to be sure everything is consistent
@@ -151,11 +150,11 @@ class ExecutedOperationUtilsTester(BaseAPITestCase):
             mode = op_data['mode'],
             status = ExecutedOperation.SUBMITTED
         )
+        record_resource_usage(ex_op, op_data, ExecutedOperationResource.INPUT)
         was_used = check_for_resource_operations(mock_used_resource, workspace_with_resource)
         self.assertFalse(was_used)
 
-    @mock.patch('api.utilities.executed_op_utilities.get_operation_instance_data')
-    def test_check_for_resource_operations_case3(self, mock_get_operation_instance_data):
+    def test_check_for_resource_operations_case3(self):
         '''
         When removing a Resource from a Workspace, we need to ensure
         we are not removing a file that has been used in one or more 
@@ -192,7 +191,6 @@ class ExecutedOperationUtilsTester(BaseAPITestCase):
             'valid_workspace_operation.json'
         )
         op_data = read_operation_json(f)
-        mock_get_operation_instance_data.return_value = op_data
         executed_op_pk = uuid.uuid4()
         # the op_data we get from above has two outputs, one of which
         # is a DataResource. Just to be sure everything is consistent
@@ -217,10 +215,52 @@ class ExecutedOperationUtilsTester(BaseAPITestCase):
             status = ExecutedOperation.COMPLETION_ERROR,
             job_failed = True
         )
+        record_resource_usage(ex_op, op_data, ExecutedOperationResource.INPUT)
         was_used = check_for_resource_operations(mock_used_resource, workspace_with_resource)
         self.assertFalse(was_used)
     
 
+    def test_record_resource_usage(self):
+        '''
+        Tests that we record the input and output resources and that
+        the check only considers the requested workspace.
+        '''
+        op = Operation.objects.create(id=str(uuid.uuid4()))
+        workspaces = Workspace.objects.filter(owner=self.regular_user_1)
+        if len(workspaces) < 2:
+            raise ImproperlyConfigured('Need at least two Workspaces'
+                ' for this test.')
+        workspace, other_workspace = workspaces[:2]
+        op_data = read_operation_json(
+            os.path.join(TESTDIR, 'valid_workspace_operation.json'))
+
+        input_uuid, output_uuid = uuid.uuid4(), uuid.uuid4()
+        ex_op = WorkspaceExecutedOperation.objects.create(
+            owner = self.regular_user_1,
+            workspace = workspace,
+            inputs = {'count_matrix': str(input_uuid), 'p_val': 0.01},
+            outputs = {'norm_counts': str(output_uuid), 'dge_table': None},
+            operation = op,
+            mode = op_data['mode']
+        )
+        record_resource_usage(ex_op, op_data, ExecutedOperationResource.INPUT)
+        record_resource_usage(ex_op, op_data, ExecutedOperationResource.OUTPUT)
+        # recording again does not create duplicates
+        record_resource_usage(ex_op, op_data, ExecutedOperationResource.OUTPUT)
+        self.assertCountEqual(
+            ex_op.resource_usages.values_list('resource_uuid', 'role'),
+            [(input_uuid, ExecutedOperationResource.INPUT),
+            (output_uuid, ExecutedOperationResource.OUTPUT)]
+        )
+
+        mock_resource = mock.MagicMock()
+        mock_resource.pk = output_uuid
+        with self.assertNumQueries(1):
+            self.assertTrue(check_for_resource_operations(mock_resource, workspace))
+        self.assertFalse(check_for_resource_operations(mock_resource, other_workspace))
+        mock_resource.pk = uuid.uuid4()
+        self.assertFalse(check_for_resource_operations(mock_resource, workspace))
+
     def test_collection_of_resource_uuids(self):
         '''
         To ensure that we don't erase crucial data resources in a workspace
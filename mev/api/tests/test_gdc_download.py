@@ -0,0 +1,160 @@
+import os
+import io
+import json
+import tarfile
+import threading
+import unittest.mock as mock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+from api.public_data.sources.gdc.gdc import GDCDataSource
+from api.public_data.sources.gdc.tcga import TCGARnaSeqDataSource
+
+from api.tests.base import BaseAPITestCase
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_FILES_DIR = os.path.join(THIS_DIR, 'public_data_test_files')
+
+
+def load_archive_members():
+    '''
+    Returns a dict mapping the GDC file ID to the (name, content)
+    of the count files in the test archives.
+    '''
+    members = {}
+    for f in ['archive1.tar.gz', 'archive2.tar.gz']:
+        with tarfile.open(os.path.join(TEST_FILES_DIR, f), 'r:gz') as tf:
+            for t in tf.getmembers():
+                if t.isfile():
+                    file_id = t.name.split('/')[0]
+                    members[file_id] = (t.name, tf.extractfile(t).read())
+    return members
+
+
+class MockGDCHandler(BaseHTTPRequestHandler):
+    '''
+    A local stand-in for the GDC API which serves the recorded
+    responses in the test files directory. The /files endpoint
+    is paginated and the /data endpoint returns a tar.gz archive
+    of the requested files.
+    '''
+    files_response = None
+    archive_members = None
+    requested_pages = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/files':
+            self.send_error(404)
+            return
+        params = parse_qs(url.query)
+        start = int(params['from'][0])
+        size = int(params['size'][0])
+        self.requested_pages.append(start)
+        response = json.loads(json.dumps(self.files_response))
+        response['data']['hits'] = response['data']['hits'][start:start + size]
+        content = json.dumps(response).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        ids = json.loads(self.rfile.read(length))['ids']
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as tf:
+            for file_id in ids + ['MANIFEST']:
+                if file_id == 'MANIFEST':
+                    name, data = 'MANIFEST.txt', b'id\n'
+                else:
+                    name, data = self.archive_members[file_id]
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+        content = buffer.getvalue()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Disposition',
+            'attachment; filename=gdc_download.tar.gz')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class TestGDCDownload(BaseAPITestCase):
+
+    def setUp(self):
+        with open(os.path.join(TEST_FILES_DIR, 'gdc_files_response.json')) as fin:
+            MockGDCHandler.files_response = json.load(fin)
+        MockGDCHandler.archive_members = load_archive_members()
+        MockGDCHandler.requested_pages = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockGDCHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+        base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        patchers = [
+            mock.patch.object(GDCDataSource, 'GDC_FILES_ENDPOINT', f'{base_url}/files'),
+            mock.patch.object(GDCDataSource, 'GDC_DATA_ENDPOINT', f'{base_url}/data'),
+            mock.patch.object(GDCDataSource, 'PAGE_SIZE', 2)
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+
+    def test_query_all_pages(self):
+        pages = GDCDataSource.query_all_pages(
+            GDCDataSource.GDC_FILES_ENDPOINT, {'size': '2'})
+        self.assertEqual(len(pages), 2)
+        self.assertEqual([x['file_id'] for x in pages[0]['data']['hits']],
+            ['s1', 's2'])
+        self.assertEqual([x['file_id'] for x in pages[1]['data']['hits']],
+            ['s3'])
+        self.assertCountEqual(MockGDCHandler.requested_pages, [0, 2])
+
+    def test_failed_page_query(self):
+        pages = GDCDataSource.query_all_pages(
+            GDCDataSource.GDC_FILES_ENDPOINT.replace('files', 'bad'), {'size': '2'})
+        self.assertIsNone(pages)
+
+    def test_download_cohort(self):
+        '''
+        Tests the full download of a cohort, which includes the
+        concurrent query of the paginated metadata and the download
+        and merging of the count archives.
+        '''
+        data_fields = {
+            'exposure': [{'field': 'alcohol_history'}, {'field': 'project_id'}],
+            'demographic': [{'field': 'gender'}, {'field': 'project_id'}],
+            'diagnosis': [{'field': 'tumor_grade'}, {'field': 'project_id'}],
+            'project': [{'field': 'name'}]
+        }
+        ds = TCGARnaSeqDataSource()
+        with mock.patch.object(ds, '_append_gdc_annotations',
+            side_effect=lambda x: x):
+            ann_df, count_df = ds._download_cohort('TCGA-FOO', data_fields)
+
+        self.assertCountEqual(MockGDCHandler.requested_pages, [0, 2])
+        self.assertCountEqual(ann_df.index, ['x1', 'x2', 'x3'])
+        self.assertEqual(ann_df.loc['x2', 'tumor_grade'], 'G2')
+        self.assertEqual(ann_df.loc['x3', 'case_id'], 'c3')
+        self.assertTrue(pd.isnull(ann_df.loc['x2', 'alcohol_history']))
+
+        expected_matrix = pd.DataFrame(
+            [[509, 1446, 2023],[0,2,22],[1768, 2356, 1768]],
+            index=['ENSG00000000003','ENSG00000000005','ENSG0000000000419'],
+            columns = ['x1', 'x2', 'x3']
+        )
+        expected_matrix.index.name = 'gene'
+        self.assertTrue(expected_matrix.equals(count_df))
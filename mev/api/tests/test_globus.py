@@ -1,7 +1,12 @@
 import unittest.mock as mock
 import uuid
+import time
+import json
+import threading
 from io import BytesIO
 
+import requests
+
 from django.urls import reverse
 from django.test import override_settings
 from django.db.utils import IntegrityError
@@ -9,7 +14,8 @@ from django.conf import settings
 from django.core.files import File
 
 from globus_sdk.services.auth.errors import AuthAPIError
-from globus_sdk import TransferAPIError
+from globus_sdk.response import GlobusHTTPResponse
+from globus_sdk import TransferAPIError, TransferClient
 
 from exceptions import NonexistentGlobusTokenException
 
@@ -27,35 +33,161 @@ from api.utilities.globus import get_globus_token_from_db, \
     post_upload, \
     add_acl_rule, \
     delete_acl_rule, \
+    perform_concurrent_copies, \
+    get_transfer_tasks, \
+    COPY_SUCCEEDED, \
+    COPY_FAILED, \
     GLOBUS_UPLOAD, \
     GLOBUS_DOWNLOAD
-from api.async_tasks.globus_tasks import poll_globus_task, \
+from api.async_tasks.globus_tasks import check_globus_tasks, \
+    finalize_globus_task, \
+    poll_globus_task, \
     perform_globus_download
 
 class GlobusAsyncTests(BaseAPITestCase):
     def setUp(self):
         self.establish_clients()
 
+    @mock.patch('api.async_tasks.globus_tasks.finalize_globus_task')
+    @mock.patch('api.async_tasks.globus_tasks.create_endpoint_manager_transfer_client')
+    def test_check_globus_tasks(self, mock_create_endpoint_manager_transfer_client,
+        mock_finalize_globus_task):
+        '''
+        Tests that the status of all the active transfers is queried
+        and that only completed transfers are finalized.
+        '''
+        tasks = {}
+        for i, label in enumerate(['done', 'failed', 'active']):
+            tasks[label] = GlobusTask.objects.create(
+                user=self.regular_user_1,
+                task_id=f'task-{i}',
+                rule_id='myrule',
+                label=label,
+                transfer_direction=GLOBUS_UPLOAD
+            )
+        # these should not be queried:
+        GlobusTask.objects.create(user=self.regular_user_1,
+            task_id='task-3', transfer_complete=True)
+        GlobusTask.objects.create(user=self.regular_user_1,
+            task_id='', submission_failure=True)
+
+        mock_client = mock.MagicMock()
+        mock_task_list = mock_client.paginated.endpoint_manager_task_list
+        mock_task_list.return_value.items.return_value = [
+            {'task_id': 'task-0', 'status': 'SUCCEEDED'},
+            {'task_id': 'task-1', 'status': 'FAILED'},
+            {'task_id': 'task-2', 'status': 'ACTIVE'},
+        ]
+        mock_create_endpoint_manager_transfer_client.return_value = mock_client
+
+        check_globus_tasks()
+        # a single query for the status of all the active tasks
+        mock_task_list.assert_called_once()
+        self.assertCountEqual(
+            mock_task_list.call_args.kwargs['filter_task_id'],
+            ['task-0', 'task-1', 'task-2']
+        )
+        mock_finalize_globus_task.delay.assert_has_calls([
+            mock.call(tasks['done'].pk),
+            mock.call(tasks['failed'].pk)
+        ], any_order=True)
+        self.assertEqual(mock_finalize_globus_task.delay.call_count, 2)
+        self.assertTrue(GlobusTask.objects.get(pk=tasks['done'].pk).is_finalizing)
+        self.assertFalse(GlobusTask.objects.get(pk=tasks['active'].pk).is_finalizing)
+
+        # on the next check, tasks which are being finalized are skipped
+        mock_client.reset_mock()
+        mock_finalize_globus_task.reset_mock()
+        mock_task_list.return_value.items.return_value = [
+            {'task_id': 'task-2', 'status': 'ACTIVE'},
+        ]
+        check_globus_tasks()
+        mock_task_list.assert_called_once_with(filter_task_id=['task-2'])
+        mock_finalize_globus_task.delay.assert_not_called()
+
+    @mock.patch('api.async_tasks.globus_tasks.create_endpoint_manager_transfer_client')
+    def test_check_globus_tasks_queries_in_batches(self,
+        mock_create_endpoint_manager_transfer_client):
+        for i in range(60):
+            GlobusTask.objects.create(user=self.regular_user_1,
+                task_id=f'task-{i}')
+        mock_client = mock.MagicMock()
+        mock_task_list = mock_client.paginated.endpoint_manager_task_list
+        mock_task_list.return_value.items.return_value = []
+        mock_create_endpoint_manager_transfer_client.return_value = mock_client
+        check_globus_tasks()
+        self.assertEqual(mock_task_list.call_count, 2)
+
+    @override_settings(GLOBUS_ENDPOINT_ID='my_endpoint_id')
+    @mock.patch('api.async_tasks.globus_tasks.finalize_globus_task')
+    @mock.patch('api.async_tasks.globus_tasks.create_endpoint_manager_transfer_client')
+    def test_check_infers_missing_direction(self,
+        mock_create_endpoint_manager_transfer_client,
+        mock_finalize_globus_task):
+        '''
+        Transfers recorded before we tracked the direction get their
+        direction from the destination endpoint of the transfer.
+        '''
+        upload = GlobusTask.objects.create(user=self.regular_user_1,
+            task_id='task-0')
+        download = GlobusTask.objects.create(user=self.regular_user_1,
+            task_id='task-1')
+        unknown = GlobusTask.objects.create(user=self.regular_user_1,
+            task_id='task-2')
+        mock_client = mock.MagicMock()
+        mock_task_list = mock_client.paginated.endpoint_manager_task_list
+        mock_task_list.return_value.items.return_value = [
+            {'task_id': 'task-0', 'status': 'SUCCEEDED',
+                'destination_endpoint_id': 'my_endpoint_id'},
+            {'task_id': 'task-1', 'status': 'ACTIVE',
+                'destination_endpoint_id': 'other_endpoint_id'},
+        ]
+        mock_create_endpoint_manager_transfer_client.return_value = mock_client
+        check_globus_tasks()
+        self.assertEqual(GlobusTask.objects.get(pk=upload.pk).transfer_direction,
+            GLOBUS_UPLOAD)
+        self.assertEqual(GlobusTask.objects.get(pk=download.pk).transfer_direction,
+            GLOBUS_DOWNLOAD)
+        # if Globus did not return the task, we leave it as-is
+        self.assertEqual(GlobusTask.objects.get(pk=unknown.pk).transfer_direction,
+            '')
+        mock_finalize_globus_task.delay.assert_called_once_with(upload.pk)
+
+    def test_poll_globus_task_records_direction(self):
+        '''
+        Tests that the `poll_globus_task` kept for messages queued prior
+        to the periodic checks only records the direction of the transfer.
+        '''
+        gt = GlobusTask.objects.create(user=self.regular_user_1,
+            task_id='task-0')
+        poll_globus_task('task-0', GLOBUS_UPLOAD)
+        gt = GlobusTask.objects.get(pk=gt.pk)
+        self.assertEqual(gt.transfer_direction, GLOBUS_UPLOAD)
+        self.assertFalse(gt.transfer_complete)
+        self.assertFalse(gt.is_finalizing)
+
+    @mock.patch('api.async_tasks.globus_tasks.create_endpoint_manager_transfer_client')
+    def test_check_without_active_tasks(self,
+        mock_create_endpoint_manager_transfer_client):
+        check_globus_tasks()
+        mock_create_endpoint_manager_transfer_client.assert_not_called()
+
     @mock.patch('api.async_tasks.globus_tasks.delete_acl_rule')
     @mock.patch('api.async_tasks.globus_tasks.post_upload')
-    @mock.patch('api.async_tasks.globus_tasks.create_user_transfer_client')
-    def test_poll_globus_task_for_upload(self, mock_create_user_transfer_client, 
-        mock_post_upload, mock_delete_acl_rule):
-        task_id = uuid.uuid4()
+    def test_finalize_globus_task_for_upload(self, mock_post_upload,
+        mock_delete_acl_rule):
+        task_id = str(uuid.uuid4())
         gt = GlobusTask.objects.create(
             user=self.regular_user_1,
             task_id=task_id,
             rule_id='myrule',
-            label='some label'
+            label='some label',
+            transfer_direction=GLOBUS_UPLOAD,
+            is_finalizing=True
         )
-
-        mock_client = mock.MagicMock()
-        # mocks the transfer being complete-
-        mock_client.task_wait.return_value = True
-        mock_create_user_transfer_client.return_value = mock_client
-        
-        poll_globus_task(task_id, GLOBUS_UPLOAD)
+        finalize_globus_task(gt.pk)
         mock_post_upload.assert_called_with(task_id, self.regular_user_1)
+        mock_delete_acl_rule.assert_called_with('myrule')
 
         # query the task to see that it's marked as completed
         gt2 = GlobusTask.objects.get(pk=gt.pk)
@@ -63,29 +195,90 @@ class GlobusAsyncTests(BaseAPITestCase):
 
     @mock.patch('api.async_tasks.globus_tasks.delete_acl_rule')
     @mock.patch('api.async_tasks.globus_tasks.post_upload')
-    @mock.patch('api.async_tasks.globus_tasks.create_user_transfer_client')
-    def test_poll_globus_task_for_download(self, mock_create_user_transfer_client, 
-        mock_post_upload, mock_delete_acl_rule):
-        task_id = uuid.uuid4()
+    def test_finalize_globus_task_for_download(self, mock_post_upload,
+        mock_delete_acl_rule):
         gt = GlobusTask.objects.create(
             user=self.regular_user_1,
-            task_id=task_id,
+            task_id=str(uuid.uuid4()),
             rule_id='myrule',
-            label='some label'
+            label='some label',
+            transfer_direction=GLOBUS_DOWNLOAD,
+            is_finalizing=True
         )
-
-        mock_client = mock.MagicMock()
-        # mocks the transfer being complete-
-        mock_client.task_wait.return_value = True
-        mock_create_user_transfer_client.return_value = mock_client
-        
-        poll_globus_task(task_id, GLOBUS_DOWNLOAD)
+        finalize_globus_task(gt.pk)
         mock_post_upload.assert_not_called()
+        mock_delete_acl_rule.assert_called_with('myrule')
 
         # query the task to see that it's marked as completed
         gt2 = GlobusTask.objects.get(pk=gt.pk)
         self.assertTrue(gt2.transfer_complete)
 
+    @override_settings(GLOBUS_MAX_FINALIZE_ATTEMPTS=2)
+    @mock.patch('api.async_tasks.globus_tasks.alert_admins')
+    @mock.patch('api.async_tasks.globus_tasks.delete_acl_rule')
+    @mock.patch('api.async_tasks.globus_tasks.post_upload')
+    def test_failed_finalization_is_retried(self, mock_post_upload,
+        mock_delete_acl_rule, mock_alert_admins):
+        '''
+        Tests that a failed finalization clears the flag so that the next
+        status check retries and that we eventually give up.
+        '''
+        gt = GlobusTask.objects.create(
+            user=self.regular_user_1,
+            task_id=str(uuid.uuid4()),
+            rule_id='myrule',
+            transfer_direction=GLOBUS_UPLOAD,
+            is_finalizing=True
+        )
+        mock_post_upload.side_effect = Exception('!!!')
+        finalize_globus_task(gt.pk)
+        gt = GlobusTask.objects.get(pk=gt.pk)
+        self.assertFalse(gt.is_finalizing)
+        self.assertFalse(gt.transfer_complete)
+        self.assertEqual(gt.finalize_attempts, 1)
+        mock_alert_admins.assert_not_called()
+
+        gt.is_finalizing = True
+        gt.save()
+        finalize_globus_task(gt.pk)
+        gt = GlobusTask.objects.get(pk=gt.pk)
+        self.assertTrue(gt.is_finalizing)
+        self.assertFalse(gt.transfer_complete)
+        self.assertEqual(gt.finalize_attempts, 2)
+        mock_alert_admins.assert_called_once()
+        mock_delete_acl_rule.assert_not_called()
+
+    @mock.patch('api.async_tasks.globus_tasks.alert_admins')
+    @mock.patch('api.async_tasks.globus_tasks.delete_acl_rule')
+    @mock.patch('api.async_tasks.globus_tasks.post_upload')
+    def test_retry_skips_completed_copy(self, mock_post_upload,
+        mock_delete_acl_rule, mock_alert_admins):
+        '''
+        Tests that if the copy of uploaded files succeeded but a later
+        step failed, the retry does not repeat the copy.
+        '''
+        gt = GlobusTask.objects.create(
+            user=self.regular_user_1,
+            task_id=str(uuid.uuid4()),
+            rule_id='myrule',
+            transfer_direction=GLOBUS_UPLOAD,
+            is_finalizing=True
+        )
+        mock_delete_acl_rule.side_effect = [Exception('!!!'), None]
+        finalize_globus_task(gt.pk)
+        gt = GlobusTask.objects.get(pk=gt.pk)
+        self.assertTrue(gt.upload_copied)
+        self.assertFalse(gt.transfer_complete)
+
+        gt.is_finalizing = True
+        gt.save()
+        finalize_globus_task(gt.pk)
+        gt = GlobusTask.objects.get(pk=gt.pk)
+        self.assertTrue(gt.transfer_complete)
+        mock_post_upload.assert_called_once()
+        self.assertEqual(mock_delete_acl_rule.call_count, 2)
+        mock_alert_admins.assert_not_called()
+
     @override_settings(GLOBUS_BUCKET='my-globus-bucket', 
         GLOBUS_ENDPOINT_ID='my_endpoint_id')
     @mock.patch('api.async_tasks.globus_tasks.create_application_transfer_client')
@@ -95,11 +288,9 @@ class GlobusAsyncTests(BaseAPITestCase):
     @mock.patch('api.async_tasks.globus_tasks.add_acl_rule')
     @mock.patch('api.async_tasks.globus_tasks.TransferData')
     @mock.patch('api.async_tasks.globus_tasks.submit_transfer')
-    @mock.patch('api.async_tasks.globus_tasks.poll_globus_task')
     @mock.patch('api.async_tasks.globus_tasks.uuid')
     def test_download(self,
         mock_uuid,
-        mock_poll_globus_task,
         mock_submit_transfer,
         mock_TransferData,
         mock_add_acl_rule,
@@ -152,10 +343,11 @@ class GlobusAsyncTests(BaseAPITestCase):
             user_pk,
             request_data
         )
+        # the copies are concurrent, so the order is not guaranteed
         mock_default_storage.copy_out_to_bucket.assert_has_calls([
             mock.call(r0, 'my-globus-bucket', f'tmp-{globus_tmp_uuid}/foo.txt'),
             mock.call(r1, 'my-globus-bucket', f'tmp-{globus_tmp_uuid}/bar.txt')
-        ])
+        ], any_order=True)
         mock_transfer_data.add_item.assert_has_calls([
             mock.call(
                 source_path=f'tmp-{globus_tmp_uuid}/foo.txt',
@@ -165,10 +357,10 @@ class GlobusAsyncTests(BaseAPITestCase):
                 destination_path='/rootpath/bar.txt'),
         ])
         mock_submit_transfer.assert_called_with(mock_user_tc, mock_transfer_data)
-        mock_poll_globus_task.assert_called_with(mock_task_id, GLOBUS_DOWNLOAD)
         gt1 = GlobusTask.objects.filter(user=self.regular_user_1)
         self.assertTrue(len(gt1) == 1)
         self.assertTrue(gt1[0].task_id == str(mock_task_id))
+        self.assertEqual(gt1[0].transfer_direction, GLOBUS_DOWNLOAD)
 
         # now mock a submission failure and check that we show this in the db
         mock_default_storage.reset_mock()
@@ -178,7 +370,6 @@ class GlobusAsyncTests(BaseAPITestCase):
         ]
         mock_transfer_data.reset_mock()
         mock_submit_transfer.reset_mock()
-        mock_poll_globus_task.reset_mock()
         failed_submissions = GlobusTask.objects.filter(user=self.regular_user_1, submission_failure=True)
         self.assertTrue(len(failed_submissions)==0)
         mock_submit_transfer.return_value = None
@@ -189,10 +380,11 @@ class GlobusAsyncTests(BaseAPITestCase):
         )
         failed_submissions = GlobusTask.objects.filter(user=self.regular_user_1, submission_failure=True)
         self.assertTrue(len(failed_submissions)==1)
+        # the copies are concurrent, so the order is not guaranteed
         mock_default_storage.copy_out_to_bucket.assert_has_calls([
             mock.call(r0, 'my-globus-bucket', f'tmp-{globus_tmp_uuid}/foo.txt'),
             mock.call(r1, 'my-globus-bucket', f'tmp-{globus_tmp_uuid}/bar.txt')
-        ])
+        ], any_order=True)
         mock_transfer_data.add_item.assert_has_calls([
             mock.call(
                 source_path=f'tmp-{globus_tmp_uuid}/foo.txt',
@@ -202,7 +394,6 @@ class GlobusAsyncTests(BaseAPITestCase):
                 destination_path='/rootpath/bar.txt'),
         ])
         mock_submit_transfer.assert_called_with(mock_user_tc, mock_transfer_data)
-        mock_poll_globus_task.assert_not_called()
 
 
 
@@ -499,6 +690,109 @@ class GlobusUtilsTests(BaseAPITestCase):
             mock.call(mock_user, paths[1])
         )
 
+    @override_settings(GLOBUS_BUCKET='my-globus-bucket')
+    @mock.patch('api.utilities.globus.alert_admins')
+    @mock.patch('api.utilities.globus.create_endpoint_manager_transfer_client')
+    @mock.patch('api.utilities.globus.default_storage')
+    def test_post_upload_with_failed_copy(self,
+        mock_default_storage,
+        mock_create_endpoint_manager_transfer_client,
+        mock_alert_admins):
+        '''
+        Tests that a failure to copy one file does not prevent
+        the other files from being copied.
+        '''
+        response = mock.MagicMock()
+        response.data = {
+            'DATA': [
+                {'destination_path': '/path/to/dest/f1.tsv'},
+                {'destination_path': '/path/to/dest/f2.tsv'},
+            ]
+        }
+        mock_transfer_client = mock.MagicMock()
+        mock_transfer_client.get.return_value = response
+        mock_create_endpoint_manager_transfer_client.return_value = mock_transfer_client
+        paths = [
+            's3://my-globus-bucket/path/to/dest/f1.tsv',
+            's3://my-globus-bucket/path/to/dest/f2.tsv',
+        ]
+        mock_resource = mock.MagicMock()
+
+        def mock_copy(user, path):
+            if path == paths[0]:
+                raise Exception('copy failed!')
+            return mock_resource
+        mock_default_storage.create_resource_from_interbucket_copy.side_effect = mock_copy
+
+        copy_status = post_upload('abc123', mock.MagicMock())
+        self.assertEqual([x['status'] for x in copy_status],
+            [COPY_FAILED, COPY_SUCCEEDED])
+        self.assertEqual(copy_status[0]['error'], 'copy failed!')
+        self.assertEqual(copy_status[1]['result'], mock_resource)
+        # only the successfully copied file is removed from the Globus bucket
+        mock_default_storage.delete_object.assert_called_once_with(paths[1])
+        mock_alert_admins.assert_called_once()
+
+    def test_transfer_tasks_across_pages(self):
+        '''
+        Tests that we collect the tasks from all the pages returned
+        by Globus, not only the first.
+        '''
+        transfer_client = TransferClient()
+
+        def make_page(task_ids, last_key=None):
+            r = requests.Response()
+            r.status_code = 200
+            r.headers['Content-Type'] = 'application/json'
+            r._content = json.dumps({
+                'DATA': [{'task_id': x, 'status': 'ACTIVE'} for x in task_ids],
+                'has_next_page': last_key is not None,
+                'last_key': last_key
+            }).encode()
+            return GlobusHTTPResponse(r, transfer_client)
+
+        task_ids = [f'task-{i}' for i in range(15)]
+        with mock.patch.object(transfer_client, 'get', side_effect=[
+            make_page(task_ids[:10], last_key='abc'),
+            make_page(task_ids[10:])
+        ]) as mock_get:
+            result = get_transfer_tasks(transfer_client, task_ids)
+        self.assertCountEqual(result.keys(), task_ids)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(
+            mock_get.call_args.kwargs['query_params']['last_key'], 'abc')
+
+    @override_settings(MAX_CONCURRENT_BUCKET_COPIES=3)
+    def test_concurrent_copies_are_bounded(self):
+        '''
+        Tests that the copies are performed concurrently, but with at most
+        settings.MAX_CONCURRENT_BUCKET_COPIES at once.
+        '''
+        lock = threading.Lock()
+        counts = {'active': 0, 'max_active': 0}
+
+        def mock_copy(item):
+            with lock:
+                counts['active'] += 1
+                counts['max_active'] = max(counts['max_active'], counts['active'])
+            time.sleep(0.02)
+            with lock:
+                counts['active'] -= 1
+            if item == 5:
+                raise Exception('failed')
+            return item * 2
+
+        copy_status = perform_concurrent_copies(mock_copy, list(range(10)))
+        self.assertEqual(counts['max_active'], 3)
+        self.assertEqual([x['item'] for x in copy_status], list(range(10)))
+        for x in copy_status:
+            if x['item'] == 5:
+                self.assertEqual(x['status'], COPY_FAILED)
+                self.assertIsNone(x['result'])
+            else:
+                self.assertEqual(x['status'], COPY_SUCCEEDED)
+                self.assertEqual(x['result'], x['item'] * 2)
+
 
 class GlobusUploadTests(BaseAPITestCase):
 
@@ -509,7 +803,6 @@ class GlobusUploadTests(BaseAPITestCase):
     @override_settings(GLOBUS_ENABLED=True, GLOBUS_ENDPOINT_ID='dest_id')
     @mock.patch('api.views.globus_views.add_acl_rule')
     @mock.patch('api.views.globus_views.submit_transfer')
-    @mock.patch('api.views.globus_views.poll_globus_task')
     @mock.patch('api.views.globus_views.create_application_transfer_client')
     @mock.patch('api.views.globus_views.create_user_transfer_client')
     @mock.patch('api.views.globus_views.get_globus_uuid')
@@ -520,7 +813,6 @@ class GlobusUploadTests(BaseAPITestCase):
         mock_get_globus_uuid,
         mock_create_user_transfer_client, 
         mock_create_application_transfer_client,
-        mock_poll_globus_task,
         mock_submit_transfer,
         mock_add_acl_rule):
 
@@ -575,13 +867,13 @@ class GlobusUploadTests(BaseAPITestCase):
         ])
         mock_submit_transfer.assert_called_with(mock_user_transfer_client, mock_transfer_data)
         mock_user_transfer_client.get_task.assert_called_with('my_task_id')
-        mock_poll_globus_task.delay.assert_called_with('my_task_id', GLOBUS_UPLOAD)
 
         tasks = GlobusTask.objects.filter(user=self.regular_user_1)
         self.assertTrue(len(tasks) == 1)
         task = tasks[0]
         self.assertTrue(task.task_id == 'my_task_id')
         self.assertTrue(task.rule_id == 'some_rule_id')
+        self.assertEqual(task.transfer_direction, GLOBUS_UPLOAD)
         self.assertTrue(task.label == mock_payload['params']['label'])
 
     @override_settings(GLOBUS_ENABLED=True)
@@ -610,7 +902,6 @@ class GlobusUploadTests(BaseAPITestCase):
     @override_settings(GLOBUS_ENABLED=True, GLOBUS_ENDPOINT_ID='dest_id')
     @mock.patch('api.views.globus_views.add_acl_rule')
     @mock.patch('api.views.globus_views.submit_transfer')
-    @mock.patch('api.views.globus_views.poll_globus_task')
     @mock.patch('api.views.globus_views.create_application_transfer_client')
     @mock.patch('api.views.globus_views.create_user_transfer_client')
     @mock.patch('api.views.globus_views.get_globus_uuid')
@@ -621,7 +912,6 @@ class GlobusUploadTests(BaseAPITestCase):
         mock_get_globus_uuid,
         mock_create_user_transfer_client, 
         mock_create_application_transfer_client,
-        mock_poll_globus_task,
         mock_submit_transfer,
         mock_add_acl_rule):
 
@@ -675,7 +965,6 @@ class GlobusUploadTests(BaseAPITestCase):
             mock.call('dest_id')
         ])
         mock_submit_transfer.assert_called_with(mock_user_transfer_client, mock_transfer_data)
-        mock_poll_globus_task.delay.assert_not_called()
 
         tasks = GlobusTask.objects.filter(user=self.regular_user_1)
         self.assertTrue(len(tasks) == 0)
@@ -0,0 +1,107 @@
+import os
+import uuid
+import unittest.mock as mock
+
+import pandas as pd
+import tables
+
+from django.conf import settings
+
+from api.public_data.sources.rnaseq import RnaSeqMixin
+from api.public_data.sources.hdf_matrix import write_matrix, \
+    read_matrix_columns, \
+    read_annotation_table
+
+from api.tests.base import BaseAPITestCase
+
+
+class TestHDFMatrix(BaseAPITestCase):
+
+    def setUp(self):
+        self.path = os.path.join(settings.TMP_DIR, f'{uuid.uuid4()}.hd5')
+        self.df = pd.DataFrame(
+            [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11, 12]],
+            index=pd.Index(['gA', 'gB', 'gC'], name='gene'),
+            columns=['s1', 's2', 's3', 's4']
+        )
+        with tables.open_file(self.path, mode='a') as h5:
+            write_matrix(h5, 'tcga_abc/ds', self.df)
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def test_reads_only_requested_columns(self):
+        with pd.HDFStore(self.path, 'r') as hdf:
+            with mock.patch.object(pd.HDFStore, 'get') as mock_get:
+                df = read_matrix_columns(hdf, 'tcga_abc/ds', ['s4', 's2'])
+                # the full matrix was not read
+                mock_get.assert_not_called()
+        self.assertTrue(df.equals(self.df[['s4', 's2']]))
+        self.assertEqual(df.index.name, 'gene')
+
+        with pd.HDFStore(self.path, 'r') as hdf:
+            with self.assertRaisesRegex(KeyError, 's5'):
+                read_matrix_columns(hdf, 'tcga_abc/ds', ['s1', 's5'])
+            with self.assertRaises(KeyError):
+                read_matrix_columns(hdf, 'tcga_xyz/ds', ['s1'])
+
+    def test_overwrites_existing_matrix(self):
+        with tables.open_file(self.path, mode='a') as h5:
+            write_matrix(h5, 'tcga_abc/ds', self.df[['s1']] * 2)
+        with pd.HDFStore(self.path, 'r') as hdf:
+            df = read_matrix_columns(hdf, 'tcga_abc/ds', ['s1'])
+        self.assertEqual(df['s1'].tolist(), [2, 10, 18])
+
+    def test_reads_pandas_format(self):
+        '''
+        Tests that datasets written prior to the column-chunked
+        layout are still read
+        '''
+        with pd.HDFStore(self.path) as hdf:
+            hdf.put('tcga_def/ds', self.df)
+        with pd.HDFStore(self.path, 'r') as hdf:
+            df = read_matrix_columns(hdf, 'tcga_def/ds', ['s3'])
+        self.assertTrue(df.equals(self.df[['s3']]))
+
+    def test_subset_query(self):
+        ann_path = os.path.join(settings.TMP_DIR, f'{uuid.uuid4()}.csv')
+        ann_df = pd.DataFrame({'cancer_type': ['TCGA-ABC'] * 4},
+            index=['s1', 's2', 's3', 's4'])
+        ann_df.to_csv(ann_path)
+        mock_db_record = mock.MagicMock()
+        mock_db_record.file_mapping = {
+            RnaSeqMixin.ANNOTATION_FILE_KEY: [ann_path],
+            RnaSeqMixin.COUNTS_FILE_KEY: [self.path]
+        }
+        data_src = RnaSeqMixin()
+        data_src.TAG = 'foo'
+        data_src.apply_additional_filters = lambda x, y, z: (x, y)
+        query = {RnaSeqMixin.SELECTION_KEY: {'TCGA-ABC': ['s3', 's1']}}
+        paths, _, _, _ = data_src.create_from_query(mock_db_record, query)
+        counts_df = pd.read_table(paths[0], index_col=0)
+        self.assertEqual(counts_df.columns.tolist(), ['s3', 's1'])
+        self.assertEqual(counts_df['s3'].tolist(), [3, 7, 11])
+
+        query = {RnaSeqMixin.SELECTION_KEY: {'TCGA-ABC': ['s3', 's7']}}
+        with self.assertRaisesRegex(Exception, 'samples were missing'):
+            data_src.create_from_query(mock_db_record, query)
+        [os.remove(p) for p in paths + [ann_path]]
+
+    def test_annotation_table_cached(self):
+        ann_path = os.path.join(settings.TMP_DIR, f'{uuid.uuid4()}.csv')
+        pd.DataFrame({'a': [1, 2]}, index=['s1', 's2']).to_csv(ann_path)
+        with mock.patch('api.public_data.sources.hdf_matrix.pd.read_csv',
+            side_effect=pd.read_csv) as mock_read_csv:
+            df1 = read_annotation_table(ann_path)
+            df2 = read_annotation_table(ann_path)
+            self.assertEqual(mock_read_csv.call_count, 1)
+            self.assertTrue(df1.equals(df2))
+
+            # a modified file is read again
+            pd.DataFrame({'a': [1, 2, 3]},
+                index=['s1', 's2', 's3']).to_csv(ann_path)
+            df3 = read_annotation_table(ann_path)
+            self.assertEqual(mock_read_csv.call_count, 2)
+            self.assertEqual(df3.shape[0], 3)
+        os.remove(ann_path)
@@ -0,0 +1,163 @@
+import os
+import json
+import shutil
+import unittest.mock as mock
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+
+from constants import JSON_FORMAT
+from api.models import Resource
+from resource_types.json_types import JsonResource
+from resource_types.json_contents import JsonRecordStore, \
+    JsonRecordsView, \
+    load_json_contents, \
+    delete_json_sidecars
+
+from api.tests.base import BaseAPITestCase
+from api.tests.test_helpers import associate_file_with_resource
+
+TESTDIR = os.path.join(
+    os.path.dirname(__file__),
+    'resource_contents_test_files'
+)
+
+
+class TestJsonRecordStore(BaseAPITestCase):
+
+    def setUp(self):
+        self.establish_clients()
+        self.r = Resource.objects.create(
+            owner=self.regular_user_1,
+            file_format='',
+            resource_type='',
+            datafile=File(BytesIO(), 'foo.json')
+        )
+
+    def tearDown(self):
+        shutil.rmtree(
+            os.path.join(settings.JSON_CONTENTS_CACHE_DIR, str(self.r.pk)),
+            ignore_errors=True)
+
+    def test_sidecar_created_during_validation(self):
+        '''
+        Tests that validating an array of records creates the sidecar
+        and that it gives back the same records.
+        '''
+        f = os.path.join(TESTDIR, 'json_array_file_test_filter.json')
+        associate_file_with_resource(self.r, f)
+        j = json.load(open(f))
+        is_valid, message = JsonResource().validate_type(self.r, JSON_FORMAT)
+        self.assertTrue(is_valid)
+
+        sidecar_exists, store = JsonRecordStore.open(self.r)
+        self.assertTrue(sidecar_exists)
+        self.assertEqual(len(store), len(j))
+        self.assertEqual(store.read_records(range(len(j))), j)
+        self.assertEqual(store.read_records([5, 0, 6]), [j[5], j[0], j[6]])
+
+    def test_non_record_json(self):
+        '''
+        JSON which is not an array of records is returned as-is and
+        a subsequent request does not attempt to create a sidecar again.
+        '''
+        f = os.path.join(TESTDIR, 'json_file.json')
+        associate_file_with_resource(self.r, f)
+        j = json.load(open(f))
+        self.assertEqual(load_json_contents(self.r), j)
+        sidecar_exists, store = JsonRecordStore.open(self.r)
+        self.assertTrue(sidecar_exists)
+        self.assertIsNone(store)
+
+        with mock.patch.object(JsonRecordStore, 'build') as mock_build:
+            self.assertEqual(load_json_contents(self.r), j)
+            mock_build.assert_not_called()
+
+    def test_changed_datafile_does_not_use_stale_sidecar(self):
+        f = os.path.join(TESTDIR, 'json_array_file_test_filter.json')
+        associate_file_with_resource(self.r, f)
+        store = load_json_contents(self.r)
+        self.assertEqual(len(store), 13)
+
+        f = os.path.join(TESTDIR, 'json_array_file.json')
+        associate_file_with_resource(self.r, f)
+        store = load_json_contents(self.r)
+        self.assertEqual(len(store), 60)
+
+        # only the sidecar for the current file remains
+        resource_dir = os.path.dirname(store.sidecar_dir)
+        self.assertEqual(os.listdir(resource_dir),
+            [os.path.basename(store.sidecar_dir)])
+
+    def test_sidecars_deleted(self):
+        f = os.path.join(TESTDIR, 'json_array_file.json')
+        associate_file_with_resource(self.r, f)
+        store = load_json_contents(self.r)
+        resource_dir = os.path.dirname(store.sidecar_dir)
+        # a sidecar being written concurrently is kept
+        tmp_dir = os.path.join(resource_dir, 'tmpabc')
+        os.mkdir(tmp_dir)
+        delete_json_sidecars(self.r.pk, keep=store.sidecar_dir)
+        self.assertCountEqual(os.listdir(resource_dir),
+            [os.path.basename(store.sidecar_dir), 'tmpabc'])
+
+        delete_json_sidecars(self.r.pk)
+        self.assertFalse(os.path.exists(resource_dir))
+        # no error if there are no sidecars
+        delete_json_sidecars(self.r.pk)
+
+    def test_filter_handles_missing_and_non_numeric(self):
+        '''
+        Records missing the field or having non-numeric values for a
+        numeric comparison do not pass the filter.
+        '''
+        f = os.path.join(TESTDIR, 'json_array_file_with_na.json')
+        associate_file_with_resource(self.r, f)
+        store = load_json_contents(self.r)
+
+        positions = store.filter_positions({'pval': ('[lte]', 0.02)})
+        self.assertEqual(list(positions), [1, 3, 5])
+
+        positions = store.filter_positions({
+            'pval': ('[lte]', 0.02),
+            'name': ('[startswith]', 'aaa')
+        })
+        self.assertEqual(list(positions), [1])
+
+        positions = store.filter_positions({'xyz': ('[lte]', 0.02)})
+        self.assertEqual(len(positions), 0)
+
+    def test_sort_places_missing_at_end(self):
+        f = os.path.join(TESTDIR, 'json_array_file_test_filter.json')
+        associate_file_with_resource(self.r, f)
+        j = json.load(open(f))
+        store = load_json_contents(self.r)
+        positions = store.filter_positions({'pval': ('[lt]', 10)})
+        for ascending in [True, False]:
+            ordering = store.sort_positions(positions, 'pval', ascending)
+            pvals = [j[i]['pval'] for i in ordering]
+            self.assertEqual(pvals, sorted(pvals, reverse=not ascending))
+
+        all_positions = range(len(j))
+        ordering = store.sort_positions(all_positions, 'pval', False)
+        self.assertEqual(j[ordering[-1]]['name'], 'MM')
+
+    def test_paginated_contents_only_read_page(self):
+        '''
+        If pagination is requested, we get a view which only reads
+        the requested records.
+        '''
+        f = os.path.join(TESTDIR, 'json_array_file.json')
+        associate_file_with_resource(self.r, f)
+        contents = JsonResource().get_contents(self.r, {settings.PAGE_PARAM: 1})
+        self.assertTrue(type(contents) is JsonRecordsView)
+        self.assertEqual(len(contents), 60)
+        with mock.patch.object(JsonRecordStore, 'read_records',
+            wraps=contents.store.read_records) as mock_read:
+            page = contents[10:20]
+            self.assertEqual(list(mock_read.call_args[0][0]), list(range(10, 20)))
+        self.assertEqual([x['idx'] for x in page], list(range(10, 20)))
+
+        contents = JsonResource().get_contents(self.r, {})
+        self.assertEqual(contents, json.load(open(f)))
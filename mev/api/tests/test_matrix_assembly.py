@@ -0,0 +1,111 @@
+import unittest.mock as mock
+
+import numpy as np
+import pandas as pd
+
+from api.public_data.sources.matrix_assembly import MatrixAssembler, \
+    assemble_matrix
+
+from api.tests.base import BaseAPITestCase
+
+
+class TestMatrixAssembler(BaseAPITestCase):
+
+    def test_assembles_columns(self):
+        idx = pd.Index(['g1', 'g2', 'g3'], name='gene')
+        columns = [
+            ('a', pd.Series([1, 2, 3], index=idx)),
+            ('b', pd.Series([4, 5, 6], index=idx)),
+            # duplicates are skipped
+            ('a', pd.Series([7, 8, 9], index=idx))
+        ]
+        df = assemble_matrix(lambda: iter(columns), 3)
+        expected = pd.DataFrame([[1, 4], [2, 5], [3, 6]],
+            index=idx, columns=['a', 'b'])
+        self.assertTrue(expected.equals(df))
+
+    def test_too_many_columns_raises_ex(self):
+        idx = pd.Index(['g1', 'g2'])
+        assembler = MatrixAssembler(1)
+        assembler.scan_column('a', pd.Series([1, 2], index=idx))
+        with self.assertRaises(Exception):
+            assembler.scan_column('b', pd.Series([1, 2], index=idx))
+
+    def test_unscanned_column_raises_ex(self):
+        idx = pd.Index(['g1', 'g2'])
+        assembler = MatrixAssembler(2)
+        assembler.scan_column('a', pd.Series([1, 2], index=idx))
+        assembler.add_column('a', pd.Series([1, 2], index=idx))
+        with self.assertRaises(Exception):
+            assembler.add_column('b', pd.Series([1, 2], index=idx))
+
+    def test_row_filter_and_reordered_rows(self):
+        '''
+        Tests that we apply the row filter and that columns whose
+        rows are in a different order are aligned.
+        '''
+        columns = [
+            ('a', pd.Series([1, 2, 3], index=['g1', 'g2', '__skip'])),
+            ('b', pd.Series([5, 6, 4], index=['g2', '__skip', 'g1']))
+        ]
+        df = assemble_matrix(lambda: iter(columns), 2,
+            row_filter=lambda idx: ~idx.str.startswith('__'))
+        expected = pd.DataFrame([[1, 4], [2, 5]],
+            index=['g1', 'g2'], columns=['a', 'b'])
+        self.assertTrue(expected.equals(df))
+
+    def test_rows_are_union_of_columns(self):
+        '''
+        Tests that rows which only appear in later columns are kept
+        (as with an outer join) and that missing values are NaN, which
+        requires a floating-point matrix.
+        '''
+        columns = [
+            ('a', pd.Series([1, 2], index=['g1', 'g2'])),
+            ('b', pd.Series([3, 4], index=['g2', 'g3'])),
+            ('c', pd.Series([5, 6, 7], index=['g1', 'g2', 'g3']))
+        ]
+        df = assemble_matrix(lambda: iter(columns), 3)
+        expected = pd.DataFrame([[1, np.nan, 5], [2, 3, 6], [np.nan, 4, 7]],
+            index=['g1', 'g2', 'g3'], columns=['a', 'b', 'c'], dtype=np.float64)
+        self.assertTrue(expected.equals(df))
+
+    def test_dtype_holds_all_columns(self):
+        '''
+        A floating-point column after an integer column
+        is not truncated.
+        '''
+        idx = pd.Index(['g1', 'g2'])
+        columns = [
+            ('a', pd.Series([1, 2], index=idx)),
+            ('b', pd.Series([0.5, 1.5], index=idx))
+        ]
+        df = assemble_matrix(lambda: iter(columns), 2)
+        self.assertEqual(df['a'].dtype, np.float64)
+        self.assertEqual(df.loc['g1', 'b'], 0.5)
+
+        # integer columns without missing rows remain integers
+        columns = [(x, pd.Series([1, 2], index=idx)) for x in ['a', 'b']]
+        df = assemble_matrix(lambda: iter(columns), 2)
+        self.assertTrue(np.issubdtype(df['a'].dtype, np.integer))
+
+    @mock.patch.object(MatrixAssembler, 'MEMMAP_THRESHOLD_BYTES', 10)
+    def test_large_matrix_is_memory_mapped(self):
+        idx = pd.Index(['g1', 'g2', 'g3'])
+        columns = [
+            ('a', pd.Series([1, 2, 3], index=idx)),
+            ('b', pd.Series([0.4, 0.5], index=idx[1:]))
+        ]
+        assembler = MatrixAssembler(2)
+        for name, s in columns:
+            assembler.scan_column(name, s)
+        for name, s in columns:
+            assembler.add_column(name, s)
+        # the dtype was known before allocating, so the
+        # array is never copied into memory
+        self.assertTrue(isinstance(assembler.array, np.memmap))
+        self.assertEqual(assembler.array.dtype, np.float64)
+        df = assembler.get_dataframe()
+        expected = pd.DataFrame([[1, np.nan], [2, 0.4], [3, 0.5]],
+            index=idx, columns=['a', 'b'], dtype=np.float64)
+        self.assertTrue(expected.equals(df))
@@ -0,0 +1,109 @@
+import uuid
+import unittest.mock as mock
+
+from django.test import override_settings
+
+from api.models import Operation, \
+    ExecutedOperation, \
+    NextflowTaskTrace
+from api.utilities.nextflow_utils import READABLE_STATES, \
+    NEXTFLOW_STARTED, \
+    NEXTFLOW_PROCESS_SUBMITTED, \
+    NEXTFLOW_PROCESS_STARTED, \
+    NEXTFLOW_PROCESS_COMPLETED, \
+    NEXTFLOW_COMPLETED
+from api.utilities.nextflow_events import NextflowEventBuffer
+from api.tests.base import BaseAPITestCase
+
+
+@override_settings(NEXTFLOW_EVENT_BUFFER_SIZE=100,
+    NEXTFLOW_EVENT_FLUSH_INTERVAL=1000)
+class NextflowEventBufferTests(BaseAPITestCase):
+
+    def setUp(self):
+        self.establish_clients()
+        op = Operation.objects.create(id=str(uuid.uuid4()))
+        self.ops = [ExecutedOperation.objects.create(
+            owner=self.regular_user_1,
+            operation=op,
+            job_id=f'job_{i}',
+            mode='foo') for i in range(2)]
+        self.buffer = NextflowEventBuffer()
+        self.addCleanup(self.buffer.clear)
+
+    def _get_status(self, exec_op):
+        return ExecutedOperation.objects.get(pk=exec_op.pk).status
+
+    def test_events_coalesced(self):
+        self.buffer.add('job_0', NEXTFLOW_STARTED)
+        self.buffer.add('job_0', NEXTFLOW_PROCESS_SUBMITTED)
+        self.buffer.add('job_1', NEXTFLOW_PROCESS_SUBMITTED)
+        self.buffer.add('job_0', NEXTFLOW_PROCESS_STARTED)
+        self.assertEqual(len(self.buffer), 4)
+        self.assertEqual(self._get_status(self.ops[0]), '')
+
+        # a query for the jobs and an update for each distinct status
+        with self.assertNumQueries(3):
+            self.buffer.flush()
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(self._get_status(self.ops[0]),
+            READABLE_STATES[NEXTFLOW_PROCESS_STARTED])
+        self.assertEqual(self._get_status(self.ops[1]),
+            READABLE_STATES[NEXTFLOW_PROCESS_SUBMITTED])
+
+        # nothing to write
+        with self.assertNumQueries(0):
+            self.buffer.flush()
+
+    @override_settings(NEXTFLOW_EVENT_BUFFER_SIZE=2)
+    def test_flush_when_full(self):
+        self.buffer.add('job_0', NEXTFLOW_STARTED)
+        self.assertEqual(self._get_status(self.ops[0]), '')
+        self.buffer.add('job_1', NEXTFLOW_STARTED)
+        self.assertEqual(self._get_status(self.ops[0]),
+            READABLE_STATES[NEXTFLOW_STARTED])
+        self.assertEqual(len(self.buffer), 0)
+
+    @mock.patch('api.utilities.nextflow_events.threading')
+    def test_timer_started_once(self, mock_threading):
+        self.buffer.add('job_0', NEXTFLOW_STARTED)
+        self.buffer.add('job_0', NEXTFLOW_PROCESS_SUBMITTED)
+        mock_threading.Timer.assert_called_once_with(1000,
+            self.buffer._flush_from_timer)
+        mock_timer = mock_threading.Timer.return_value
+        mock_timer.start.assert_called_once()
+        self.buffer.flush()
+        mock_timer.cancel.assert_called_once()
+
+    def test_final_status_not_overwritten(self):
+        '''
+        If the job completes (e.g. as handled by another process) before
+        the buffered events are written, we can't overwrite the status
+        since then the job would never be finalized.
+        '''
+        self.buffer.add('job_0', NEXTFLOW_PROCESS_COMPLETED)
+        ExecutedOperation.objects.filter(pk=self.ops[0].pk).update(
+            status=NEXTFLOW_COMPLETED)
+        self.buffer.flush()
+        self.assertEqual(self._get_status(self.ops[0]), NEXTFLOW_COMPLETED)
+
+    @mock.patch('api.utilities.nextflow_events.alert_admins')
+    def test_unknown_run_notifies_admins(self, mock_alert_admins):
+        self.buffer.add('job_0', NEXTFLOW_STARTED)
+        self.buffer.add('bad_job', NEXTFLOW_STARTED)
+        self.buffer.flush()
+        mock_alert_admins.assert_called_once()
+        self.assertTrue('bad_job' in mock_alert_admins.call_args.args[0])
+        self.assertEqual(self._get_status(self.ops[0]),
+            READABLE_STATES[NEXTFLOW_STARTED])
+
+    def test_traces_saved_with_flush(self):
+        for i in range(2):
+            self.buffer.add('job_1', NEXTFLOW_PROCESS_COMPLETED,
+                {'task_id': i, 'process': 'align', 'status': 'COMPLETED'})
+        # a query for the jobs, the status update and a single
+        # insert for the traces
+        with self.assertNumQueries(3):
+            self.buffer.flush()
+        traces = NextflowTaskTrace.objects.filter(executed_operation=self.ops[1])
+        self.assertEqual(traces.count(), 2)
@@ -30,8 +30,8 @@ class NextflowRunnerTester(BaseAPITestCase):
     @mock.patch('api.runners.nextflow.edit_nf_containers')
     @mock.patch('api.runners.nextflow.get_container_names')
     @mock.patch('api.runners.nextflow.check_image_name_validity')
-    @mock.patch('api.runners.nextflow.check_image_exists')
-    def test_operation_prep_makes_proper_calls(self, mock_check_image_exists,
+    @mock.patch('api.runners.nextflow.check_images_exist')
+    def test_operation_prep_makes_proper_calls(self, mock_check_images_exist,
         mock_check_image_name_validity,
         mock_get_container_names,
         mock_edit_nf_containers
@@ -48,8 +48,9 @@ class NextflowRunnerTester(BaseAPITestCase):
         # check the expected calls are made when everything works
         mock_get_container_names.return_value = ['a','b']
         mock_check_image_name_validity.side_effect = ['final_a', 'final_b']
-        mock_check_image_exists.return_value = True
+        mock_check_images_exist.return_value = {'final_a': True, 'final_b': True}
         nf_runner.prepare_operation(op_dir, repo_name, git_hash)
+        mock_check_images_exist.assert_called_once_with(['final_a', 'final_b'])
         mock_check_image_name_validity.assert_has_calls([
             mock.call('a', repo_name, git_hash),
             mock.call('b', repo_name, git_hash)
@@ -67,7 +68,7 @@ class NextflowRunnerTester(BaseAPITestCase):
         mock_check_image_name_validity.reset_mock()
         mock_get_container_names.return_value = ['a','b']
         mock_check_image_name_validity.side_effect = ['final_a', 'final_b']
-        mock_check_image_exists.side_effect = [True, False]
+        mock_check_images_exist.return_value = {'final_a': True, 'final_b': False}
         with self.assertRaisesRegex(Exception, 'final_b'):
             nf_runner.prepare_operation(op_dir, repo_name, git_hash)
         mock_check_image_name_validity.assert_has_calls([
@@ -0,0 +1,115 @@
+import uuid
+import unittest.mock as mock
+
+from django.test import override_settings
+
+from api.models import Operation, \
+    ExecutedOperation, \
+    NextflowTaskTrace
+from api.utilities.nextflow_trace import create_task_trace, \
+    save_task_traces, \
+    get_process_resource_usage
+from api.tests.base import BaseAPITestCase
+
+
+class NextflowTraceTests(BaseAPITestCase):
+
+    def setUp(self):
+        self.establish_clients()
+        self.op = Operation.objects.create(id=str(uuid.uuid4()))
+
+    def _create_exec_op(self):
+        return ExecutedOperation.objects.create(
+            owner=self.regular_user_1,
+            operation=self.op,
+            mode='foo'
+        )
+
+    def _trace(self, task_id, process, realtime, peak_rss, status='COMPLETED'):
+        return {
+            'task_id': task_id,
+            'process': process,
+            'status': status,
+            'realtime': realtime,
+            'peak_rss': peak_rss
+        }
+
+    def test_create_task_trace_handles_missing_values(self):
+        t = create_task_trace(uuid.uuid4(), {
+            'task_id': 1,
+            'process': 'align',
+            'exit': '-',
+            '%cpu': None
+        })
+        self.assertEqual(t.process, 'align')
+        self.assertEqual(t.name, '')
+        self.assertIsNone(t.exit_code)
+        self.assertIsNone(t.cpu_percent)
+        self.assertIsNone(t.realtime)
+
+    @override_settings(NEXTFLOW_TRACE_BATCH_SIZE=2)
+    def test_traces_saved_in_bulk(self):
+        exec_op = self._create_exec_op()
+        traces = [create_task_trace(exec_op.pk, self._trace(i, 'align', 10, 10))
+            for i in range(3)]
+        with self.assertNumQueries(2):
+            save_task_traces(traces)
+        self.assertEqual(NextflowTaskTrace.objects.count(), 3)
+
+        with self.assertNumQueries(0):
+            save_task_traces([])
+
+    @mock.patch('api.utilities.nextflow_trace.NextflowTaskTrace.objects.bulk_create')
+    def test_failed_save_not_raised(self, mock_bulk_create):
+        mock_bulk_create.side_effect = Exception('!!!')
+        exec_op = self._create_exec_op()
+        save_task_traces([create_task_trace(exec_op.pk,
+            self._trace(1, 'align', 10, 10))])
+
+    def test_resource_usage(self):
+        traces = []
+        for i in range(2):
+            exec_op = self._create_exec_op()
+            for j in range(1, 51):
+                traces.append(create_task_trace(exec_op.pk,
+                    self._trace(j, 'align', j * 100, j * 1000)))
+            traces.append(create_task_trace(exec_op.pk,
+                self._trace(51, 'index', None, 5000)))
+            # failed tasks are ignored
+            traces.append(create_task_trace(exec_op.pk,
+                self._trace(52, 'align', 10**6, 10**6, status='FAILED')))
+        save_task_traces(traces)
+
+        # traces for other operations are ignored
+        other_op = Operation.objects.create(id=str(uuid.uuid4()))
+        NextflowTaskTrace.objects.create(
+            executed_operation=ExecutedOperation.objects.create(
+                owner=self.regular_user_1, operation=other_op, mode='foo'),
+            task_id=1, process='align', status='COMPLETED', realtime=10**6)
+
+        usage = get_process_resource_usage(self.op.pk)
+        self.assertEqual([x['process'] for x in usage], ['align', 'index'])
+        align_usage, index_usage = usage
+        self.assertEqual(align_usage['num_tasks'], 100)
+        self.assertEqual(align_usage['realtime']['p50'], 2550)
+        self.assertAlmostEqual(align_usage['realtime']['p95'], 4800)
+        self.assertEqual(align_usage['peak_rss']['p50'], 25500)
+        self.assertEqual(index_usage['num_tasks'], 2)
+        self.assertIsNone(index_usage['realtime']['p50'])
+        self.assertEqual(index_usage['peak_rss']['p95'], 5000)
+
+    def test_resource_usage_without_traces(self):
+        self.assertEqual(get_process_resource_usage(self.op.pk), [])
+
+    @override_settings(NEXTFLOW_USAGE_MAX_SAMPLES=10)
+    def test_resource_usage_uses_recent_tasks(self):
+        exec_op = self._create_exec_op()
+        NextflowTaskTrace.objects.bulk_create([
+            create_task_trace(exec_op.pk, self._trace(j, 'align', j, j))
+            for j in range(1, 101)
+        ])
+        usage = get_process_resource_usage(self.op.pk)
+        # all the tasks are counted, but the quantiles only
+        # consider the 10 most recent (91-100)
+        self.assertEqual(usage[0]['num_tasks'], 100)
+        self.assertEqual(usage[0]['realtime']['p50'], 95.5)
@@ -10,9 +10,13 @@ from api.models import WorkspaceExecutedOperation, \
     Workspace
 from api.tests.base import BaseAPITestCase
 from api.runners.nextflow import NextflowRunner
-from api.utilities.nextflow_utils import NEXTFLOW_PROCESS_STARTED, \
+from api.utilities.nextflow_utils import READABLE_STATES, \
+    NEXTFLOW_PROCESS_STARTED, \
+    NEXTFLOW_PROCESS_COMPLETED, \
     NEXTFLOW_COMPLETED, \
     NEXTFLOW_ERROR
+from api.utilities.nextflow_events import event_buffer, \
+    NextflowEventBuffer
 
 
 class NextflowStatusUpdateTests(BaseAPITestCase):
@@ -43,6 +47,7 @@ class NextflowStatusUpdateTests(BaseAPITestCase):
             job_id=self.job_id,
             mode='foo'
         )
+        self.addCleanup(event_buffer.clear)
 
     def test_view_does_not_require_auth(self):
         """
@@ -70,6 +75,12 @@ class NextflowStatusUpdateTests(BaseAPITestCase):
         response = self.regular_client.post(self.url, data=data, format='json')
         self.assertTrue(response.status_code == status.HTTP_200_OK)
         mock_write_final_nextflow_metadata.assert_not_called()
+        # the status is written once the buffered events are
+        self.assertEqual(len(event_buffer), 1)
+        event_buffer.flush()
+        updated_exec_op = WorkspaceExecutedOperation.objects.get(pk=self.exec_op_uuid)
+        self.assertEqual(updated_exec_op.status,
+            READABLE_STATES[NEXTFLOW_PROCESS_STARTED])
 
     @mock.patch('api.views.nextflow_views.write_final_nextflow_metadata')
     def test_completed_job_sets_status(self, mock_write_final_nextflow_metadata):
@@ -121,4 +132,94 @@ class NextflowStatusUpdateTests(BaseAPITestCase):
         response = self.regular_client.post(self.url, data=data, format='json')
         # the response is 200 no matter what since the nextflow-generated POST
         # request would only generate a log if it was NOT 200
-        mock_alert_admins.assert_called()
\ No newline at end of file
+        mock_alert_admins.assert_called()
+    @mock.patch('api.views.nextflow_views.write_final_nextflow_metadata')
+    def test_task_traces_saved(self, mock_write_final_nextflow_metadata):
+        """
+        Test that the traces sent when each task completes are
+        buffered and saved once the run completes.
+        """
+        for i in range(3):
+            data = {
+                'event': NEXTFLOW_PROCESS_COMPLETED,
+                'runName': self.job_id,
+                'trace': {
+                    'task_id': i + 1,
+                    'process': 'align',
+                    'name': f'align ({i + 1})',
+                    'status': 'COMPLETED',
+                    'exit': 0,
+                    '%cpu': 95.5,
+                    'peak_rss': 1000,
+                    'realtime': 500,
+                    'read_bytes': None
+                }
+            }
+            response = self.regular_client.post(self.url, data=data, format='json')
+            self.assertTrue(response.status_code == status.HTTP_200_OK)
+        self.assertEqual(self.exec_op.task_traces.count(), 0)
+
+        data = {
+            'event': NEXTFLOW_COMPLETED,
+            'runName': self.job_id
+        }
+        response = self.regular_client.post(self.url, data=data, format='json')
+        traces = self.exec_op.task_traces.order_by('task_id')
+        self.assertEqual([x.task_id for x in traces], [1, 2, 3])
+        self.assertEqual(traces[0].peak_rss, 1000)
+        self.assertEqual(traces[0].cpu_percent, 95.5)
+        self.assertIsNone(traces[0].read_bytes)
+
+
+    @mock.patch('api.views.nextflow_views.write_final_nextflow_metadata')
+    def test_late_flush_after_completion(self, mock_write_final_nextflow_metadata):
+        """
+        Events can be written after the final event is handled, e.g. if
+        a timer took them from the buffer just before the final event
+        flushed it. The late write can't undo the completion and the
+        traces are still saved.
+        """
+        inflight_buffer = NextflowEventBuffer()
+        self.addCleanup(inflight_buffer.clear)
+        inflight_buffer.add(self.job_id, NEXTFLOW_PROCESS_STARTED)
+        inflight_buffer.add(self.job_id, NEXTFLOW_PROCESS_COMPLETED,
+            {'task_id': 1, 'process': 'align', 'status': 'COMPLETED'})
+
+        data = {
+            'event': NEXTFLOW_COMPLETED,
+            'runName': self.job_id
+        }
+        response = self.regular_client.post(self.url, data=data, format='json')
+        self.assertTrue(response.status_code == status.HTTP_200_OK)
+        self.assertEqual(self.exec_op.task_traces.count(), 0)
+
+        inflight_buffer.flush()
+        updated_exec_op = WorkspaceExecutedOperation.objects.get(pk=self.exec_op_uuid)
+        self.assertEqual(updated_exec_op.status, NEXTFLOW_COMPLETED)
+        self.assertEqual(self.exec_op.task_traces.count(), 1)
+
+class OperationResourceUsageTests(BaseAPITestCase):
+
+    def setUp(self):
+        self.establish_clients()
+        self.op = OperationDbModel.objects.create(id=str(uuid.uuid4()))
+        self.url = reverse('operation-resource-usage',
+            kwargs={'operation_uuid': self.op.pk})
+
+    def test_requires_admin(self):
+        response = self.authenticated_regular_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unknown_operation(self):
+        url = reverse('operation-resource-usage',
+            kwargs={'operation_uuid': uuid.uuid4()})
+        response = self.authenticated_admin_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @mock.patch('api.views.nextflow_views.get_process_resource_usage')
+    def test_returns_usage(self, mock_get_process_resource_usage):
+        mock_get_process_resource_usage.return_value = [{'process': 'align'}]
+        response = self.authenticated_admin_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [{'process': 'align'}])
+        mock_get_process_resource_usage.assert_called_once_with(uuid.UUID(self.op.pk))
@@ -4,8 +4,11 @@ import json
 import copy
 import uuid
 import shutil
+import subprocess as sp
+from tempfile import TemporaryDirectory
 
 from django.conf import settings
+from django.test import override_settings
 
 from exceptions import InvalidResourceTypeException, \
     DataStructureValidationException, \
@@ -17,6 +20,9 @@ from api.utilities.ingest_operation import add_required_keys_to_operation, \
     perform_operation_ingestion, \
     save_operation, \
     retrieve_repo_name, \
+    retrieve_commit_hash, \
+    clone_repository, \
+    get_repository_mirror_dir, \
     ingest_dir, \
     handle_operation_specific_resources, \
     validate_operation_spec
@@ -132,7 +138,7 @@ class OperationIngestionTester(BaseAPITestCase):
             None # this means no specific commit was requested
         )
 
-        mock_clone_repository.assert_called_with(repo_url)
+        mock_clone_repository.assert_called_with(repo_url, None)
         mock_retrieve_commit_hash.assert_called_with(mock_dir)
         mock_save_operation.assert_called()
         mock_shutil.rmtree.assert_called_with(mock_dir)
@@ -194,11 +200,11 @@ class OperationIngestionTester(BaseAPITestCase):
             mock_commit_id
         )
 
-        mock_clone_repository.assert_called_with(repo_url)
+        mock_clone_repository.assert_called_with(repo_url, mock_commit_id)
         mock_retrieve_commit_hash.assert_not_called()
         mock_save_operation.assert_called()
         mock_shutil.rmtree.assert_called_with(mock_dir)
-        mock_checkout_branch.assert_called_with(mock_dir, mock_commit_id)
+        mock_checkout_branch.assert_not_called()
         mock_check_for_repo.assert_called_with(repo_url)
 
         n3 = len(OperationDbModel.objects.filter(active=True))
@@ -263,7 +269,7 @@ class OperationIngestionTester(BaseAPITestCase):
             None # this means a specific commit was NOT requested
         )
 
-        mock_clone_repository.assert_called_with(repo_url)
+        mock_clone_repository.assert_called_with(repo_url, None)
         mock_retrieve_commit_hash.assert_called_with(mock_dir)
         mock_save_operation.assert_called()
         mock_shutil.rmtree.assert_called_with(mock_dir)
@@ -332,11 +338,11 @@ class OperationIngestionTester(BaseAPITestCase):
             mock_commit_id
         )
 
-        mock_clone_repository.assert_called_with(repo_url)
+        mock_clone_repository.assert_called_with(repo_url, mock_commit_id)
         mock_retrieve_commit_hash.assert_not_called()
         mock_save_operation.assert_called()
         mock_shutil.rmtree.assert_called_with(mock_dir)
-        mock_checkout_branch.assert_called_with(mock_dir, mock_commit_id)
+        mock_checkout_branch.assert_not_called()
         mock_check_for_repo.assert_called_with(repo_url)
 
         n3 = len(OperationDbModel.objects.filter(active=True))
@@ -397,7 +403,7 @@ class OperationIngestionTester(BaseAPITestCase):
                 None
             )
 
-        mock_clone_repository.assert_called_with(repo_url)
+        mock_clone_repository.assert_called_with(repo_url, None)
         mock_retrieve_commit_hash.assert_called_with(mock_dir)
         mock_save_operation.assert_not_called()
         mock_shutil.rmtree.assert_called_with(mock_dir)
@@ -464,7 +470,7 @@ class OperationIngestionTester(BaseAPITestCase):
                 None
             )
 
-        mock_clone_repository.assert_called_with(repo_url)
+        mock_clone_repository.assert_called_with(repo_url, None)
         mock_retrieve_commit_hash.assert_called_with(mock_dir)
         mock_save_operation.assert_not_called()
         mock_shutil.rmtree.assert_called_with(mock_dir)
@@ -650,7 +656,7 @@ class OperationIngestionTester(BaseAPITestCase):
                 None
             )
 
-        mock_clone_repository.assert_called_with(repo_url)
+        mock_clone_repository.assert_called_with(repo_url, None)
         mock_retrieve_commit_hash.assert_called_with(mock_dir)
         mock_shutil.rmtree.assert_called_with(mock_dir)
         mock_checkout_branch.assert_not_called()
@@ -914,4 +920,95 @@ class OperationIngestionTester(BaseAPITestCase):
     #     self.assertEqual(n1-n0, 1)
     #     mock_move_resource_to_final_location.assert_called()
     #     mock_get_resource_size.assert_called()
-    #     mock_storage_impl.resource_exists.assert_called_with(path)
\ No newline at end of file
+    #     mock_storage_impl.resource_exists.assert_called_with(path)
+
+
+class RepositoryMirrorTester(BaseAPITestCase):
+    '''
+    Tests the checkout of repositories through the local mirror
+    using local (file://) repositories.
+    '''
+
+    def setUp(self):
+        tmp_dir = TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.repo_dir = os.path.join(self.tmp_dir, 'my-op')
+        self.repo_url = f'file://{self.repo_dir}'
+        os.mkdir(self.repo_dir)
+        self._git('init', '--quiet')
+        self.first_commit = self._commit({
+            'main.nf': 'first',
+            'tests/data.txt': 'abc'
+        })
+        self.second_commit = self._commit({'main.nf': 'second'})
+
+        settings_override = override_settings(
+            CLONE_STAGING_DIR=os.path.join(self.tmp_dir, 'staging'),
+            OPERATION_REPO_CACHE_DIR=os.path.join(self.tmp_dir, 'mirrors'),
+            OPERATION_REPO_SPARSE_EXCLUDES=['/tests/'])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.mkdir(settings.CLONE_STAGING_DIR)
+
+    def _git(self, *args):
+        p = sp.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@test.com']
+            + list(args), cwd=self.repo_dir, capture_output=True, check=True)
+        return p.stdout.decode('utf-8').strip()
+
+    def _commit(self, contents):
+        for path, content in contents.items():
+            full_path = os.path.join(self.repo_dir, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'w') as fout:
+                fout.write(content)
+        self._git('add', '.')
+        self._git('commit', '--quiet', '-m', 'update')
+        return self._git('rev-parse', 'HEAD')
+
+    def _read(self, staging_dir, path):
+        return open(os.path.join(staging_dir, path)).read()
+
+    def test_checkout_default_branch(self):
+        staging_dir = clone_repository(self.repo_url)
+        self.assertEqual(self._read(staging_dir, 'main.nf'), 'second')
+        self.assertEqual(retrieve_commit_hash(staging_dir), self.second_commit)
+        self.assertEqual(retrieve_repo_name(staging_dir), 'my-op')
+        # excluded from the checkout:
+        self.assertFalse(os.path.exists(os.path.join(staging_dir, 'tests')))
+        self.assertTrue(os.path.exists(get_repository_mirror_dir(self.repo_url)))
+
+    def test_checkout_commit(self):
+        staging_dir = clone_repository(self.repo_url, self.first_commit)
+        self.assertEqual(self._read(staging_dir, 'main.nf'), 'first')
+        self.assertEqual(retrieve_commit_hash(staging_dir), self.first_commit)
+        # only the commit itself was fetched
+        p = sp.run(['git', 'rev-list', '--count', 'HEAD'], cwd=staging_dir,
+            capture_output=True, check=True)
+        self.assertEqual(p.stdout.decode('utf-8').strip(), '1')
+
+        # a later commit is fetched into the existing mirror
+        third_commit = self._commit({'main.nf': 'third'})
+        staging_dir = clone_repository(self.repo_url, third_commit)
+        self.assertEqual(self._read(staging_dir, 'main.nf'), 'third')
+        mirror_dir = get_repository_mirror_dir(self.repo_url)
+        p = sp.run(['git', 'for-each-ref', '--format=%(objectname)',
+            'refs/ingested/'], cwd=mirror_dir, capture_output=True, check=True)
+        self.assertCountEqual(p.stdout.decode('utf-8').split(),
+            [self.first_commit, third_commit])
+
+    @override_settings(OPERATION_REPO_SPARSE_EXCLUDES=[])
+    def test_checkout_without_excludes(self):
+        staging_dir = clone_repository(self.repo_url, self.first_commit)
+        self.assertEqual(self._read(staging_dir, 'tests/data.txt'), 'abc')
+
+    def test_checkout_abbreviated_commit(self):
+        staging_dir = clone_repository(self.repo_url, self.first_commit[:8])
+        self.assertEqual(self._read(staging_dir, 'main.nf'), 'first')
+        self.assertEqual(retrieve_commit_hash(staging_dir), self.first_commit)
+
+    def test_unknown_commit(self):
+        with self.assertRaisesRegex(Exception, 'cloning'):
+            clone_repository(self.repo_url, 'a' * 40)
+        # the partial checkout was removed
+        self.assertEqual(os.listdir(settings.CLONE_STAGING_DIR), [])
@@ -282,6 +282,59 @@ class ExecutedOperationListTests(BaseAPITestCase):
         self.assertEqual(len(admin_ops), len(j))
         self.assertTrue(len(all_ops) > len(admin_ops)) # ensure this isn't a trivial test.
 
+    def _add_exec_ops(self, n):
+        for i in range(n):
+            WorkspaceExecutedOperation.objects.create(
+                owner = self.regular_user_1,
+                workspace= self.workspace,
+                operation = self.opDb,
+                mode = 'foo'
+            )
+            ExecutedOperation.objects.create(
+                owner = self.regular_user_1,
+                operation = self.non_workspace_opDb,
+                mode = 'foo'
+            )
+
+    @mock.patch('api.serializers.workspace_executed_operation.get_operation_instance_data')
+    def test_listing_query_count(self, mock_get_operation_instance_data):
+        '''
+        Tests that the number of queries does not depend on the
+        number of executed operations and that the operation spec
+        is only read once.
+        '''
+        mock_get_operation_instance_data.return_value = {'inputs': {}}
+        url = reverse('executed-operation-list')
+        self._add_exec_ops(5)
+        # the executed ops and the operation categories
+        with self.assertNumQueries(2):
+            response = self.authenticated_regular_client.get(url)
+        j = response.json()
+        self.assertEqual(len(j), 12)
+        mock_get_operation_instance_data.assert_called_once()
+        self.assertEqual(
+            str(mock_get_operation_instance_data.call_args.args[0].pk),
+            str(self.opDb.pk))
+        self.assertEqual(len([x for x in j if 'workspace' in x]), 6)
+
+    def test_listing_is_ordered(self):
+        url = reverse('executed-operation-list')
+        self._add_exec_ops(2)
+        j = self.authenticated_regular_client.get(url).json()
+        start_times = [x['execution_start_datetime'] for x in j]
+        self.assertEqual(start_times, sorted(start_times, reverse=True))
+
+    def test_listing_pagination(self):
+        url = reverse('executed-operation-list')
+        self._add_exec_ops(2)
+        all_ops = self.authenticated_regular_client.get(url).json()
+        response = self.authenticated_regular_client.get(url,
+            {'page': 2, 'page_size': 4})
+        j = response.json()
+        self.assertEqual(j['count'], 6)
+        self.assertEqual([x['id'] for x in j['results']],
+            [x['id'] for x in all_ops[4:]])
+
 
 class NonWorkspaceExecutedOperationListTests(BaseAPITestCase):
     '''
@@ -364,6 +417,25 @@ class NonWorkspaceExecutedOperationListTests(BaseAPITestCase):
         j = response.json()
         self.assertCountEqual(j, [])
 
+    def test_listing_query_count(self):
+        url = reverse('non-workspace-executed-operation-list')
+        for i in range(5):
+            ExecutedOperation.objects.create(
+                owner = self.regular_user_1,
+                operation = self.non_workspace_opDb,
+                mode = 'foo'
+            )
+        # the executed ops and the operation categories
+        with self.assertNumQueries(2):
+            response = self.authenticated_regular_client.get(url)
+        self.assertEqual(len(response.json()), 6)
+
+        response = self.authenticated_regular_client.get(url,
+            {'page': 1, 'page_size': 4})
+        j = response.json()
+        self.assertEqual(j['count'], 6)
+        self.assertEqual(len(j['results']), 4)
+
 class ExecutedOperationTests(BaseAPITestCase):
 
     def setUp(self):
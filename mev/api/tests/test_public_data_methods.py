@@ -1,3 +1,4 @@
+import io
 import json
 import shutil
 import unittest
@@ -6,6 +7,7 @@ import os
 import datetime
 import pandas as pd
 import numpy as np
+import tables
 import uuid
 
 from django.conf import settings
@@ -29,6 +31,7 @@ from api.public_data.sources.gdc.tcga import TCGADataSource, \
     TCGAMethylationDataSource
 from api.public_data.sources.gdc.target import TargetDataSource
 from api.public_data.sources.gtex_rnaseq import GtexRnaseqDataSource
+from api.public_data.sources.hdf_matrix import LAYOUT_ATTR
 from api.public_data.indexers.solr import SolrIndexer
 
 
@@ -44,8 +47,8 @@ class TestSolrIndexer(BaseAPITestCase):
         '''
         self.indexer = SolrIndexer()
 
-    @mock.patch('api.public_data.indexers.solr.requests')
-    def test_query_call(self, mock_requests):
+    @mock.patch('api.public_data.indexers.solr.get_session')
+    def test_query_call(self, mock_get_session):
         '''
         Test the method where we check make a query request
         '''
@@ -60,18 +63,21 @@ class TestSolrIndexer(BaseAPITestCase):
         mock_response.status_code = 200
         d1 = {'a':1, 'b':2}
         mock_response.json.return_value = d1
-        mock_requests.get.return_value = mock_response
+        mock_session = mock.MagicMock()
+        mock_session.get.return_value = mock_response
+        mock_get_session.return_value = mock_session
         mock_reformat_method = mock.MagicMock()
         d2 = {'c':3, 'd':4}
         mock_reformat_method.return_value = d2
         self.indexer._reformat_response = mock_reformat_method
         result = self.indexer.query(index_name, query_str)
         self.assertDictEqual(result, d2)
-        mock_requests.get.assert_called_with(expected_url)
+        mock_session.get.assert_called_with(expected_url,
+            timeout=settings.SOLR_REQUEST_TIMEOUT)
         mock_reformat_method.assert_called_with(d1)
 
-    @mock.patch('api.public_data.indexers.solr.requests')
-    def test_bad_query_call(self, mock_requests):
+    @mock.patch('api.public_data.indexers.solr.get_session')
+    def test_bad_query_call(self, mock_get_session):
         '''
         Test the method where we check make a query request
         but a bad query is supplied. Solr would issue some kind
@@ -89,15 +95,18 @@ class TestSolrIndexer(BaseAPITestCase):
         mock_response.status_code = 400
         d1 = {'error':{'xyz':1, 'msg':'Something bad happened!'}}
         mock_response.json.return_value = d1
-        mock_requests.get.return_value = mock_response
+        mock_session = mock.MagicMock()
+        mock_session.get.return_value = mock_response
+        mock_get_session.return_value = mock_session
 
         with self.assertRaises(Exception):
             self.indexer.query(index_name, query_str)
-        mock_requests.get.assert_called_with(expected_url)
+        mock_session.get.assert_called_with(expected_url,
+            timeout=settings.SOLR_REQUEST_TIMEOUT)
 
 
-    @mock.patch('api.public_data.indexers.solr.requests')
-    def test_core_check_works(self, mock_requests):
+    @mock.patch('api.public_data.indexers.solr.get_session')
+    def test_core_check_works(self, mock_get_session):
         '''
         Test the method where we check if a core exists.
         Here, we mock out the actual request to the solr
@@ -105,26 +114,27 @@ class TestSolrIndexer(BaseAPITestCase):
         '''
         mock_response = mock.MagicMock()
         mock_response.status_code = 200
-        mock_requests.get.return_value = mock_response
+        mock_session = mock.MagicMock()
+        mock_session.get.return_value = mock_response
+        mock_get_session.return_value = mock_session
 
         self.assertTrue(self.indexer._check_if_core_exists('some name'))
 
         mock_response.status_code = 400
-        mock_requests.get.return_value = mock_response
         self.assertFalse(self.indexer._check_if_core_exists('junk'))
 
         mock_response.status_code = 404
-        mock_requests.get.return_value = mock_response
         self.assertFalse(self.indexer._check_if_core_exists('junk'))
 
-    @mock.patch('api.public_data.indexers.solr.requests.post')
+    @mock.patch('api.public_data.indexers.solr.get_session')
     @mock.patch('api.public_data.indexers.solr.SolrIndexer._check_if_core_exists')
     @mock.patch('api.public_data.indexers.solr.mimetypes')
     def test_index_call_correctly_made(self, mock_mimetypes,
         mock_check_core, 
-        mock_post):
+        mock_get_session):
         '''
-        Tests that we are issuing the proper request to index a file with solr
+        Tests that we are issuing the proper requests to index a file with
+        solr. The file is sent in batches, followed by a single commit.
         '''
         mock_check_core.return_value = True
         mock_content_type = 'text/csv'
@@ -139,16 +149,41 @@ class TestSolrIndexer(BaseAPITestCase):
                 return 'something'
 
         mock_response_obj = MockResponse()
+        mock_post = mock_get_session.return_value.post
         mock_post.return_value = mock_response_obj
-        self.indexer.index(mock_core_name, ann_filepath)
+        with self.settings(SOLR_INDEX_BATCH_SIZE=100):
+            self.indexer.index(mock_core_name, ann_filepath)
         expected_url ='{host}/{core}/update/'.format(
             host=self.indexer.SOLR_SERVER, core=mock_core_name)
+
+        # 166 documents, so two batches and the commit
+        self.assertEqual(mock_post.call_count, 3)
+        batches = [x.kwargs['data'].decode('utf-8')
+            for x in mock_post.call_args_list[:2]]
+        original_lines = open(ann_filepath, 'r').read().splitlines()
+        header = original_lines[0]
+        for b in batches:
+            self.assertEqual(b.splitlines()[0], header)
+        self.assertEqual(len(batches[0].splitlines()), 101)
+        self.assertEqual(len(batches[1].splitlines()), 67)
+        self.assertEqual(pd.read_csv(io.StringIO(batches[1]))['id'].tolist(),
+            [x.split(',')[0] for x in original_lines[101:]])
+        mock_post.assert_any_call(expected_url,
+            data=mock.ANY,
+            params={},
+            headers={'content-type': mock_content_type},
+            timeout=settings.SOLR_REQUEST_TIMEOUT
+        )
         mock_post.assert_called_with(expected_url,
-            data=open(ann_filepath, 'r').read(),
             params={'commit': 'true'},
-            headers={'content-type': mock_content_type}
+            timeout=settings.SOLR_REQUEST_TIMEOUT
         )
 
+        # if not committing, only the batches are sent
+        mock_post.reset_mock()
+        self.indexer.index(mock_core_name, ann_filepath, commit=False)
+        self.assertEqual(mock_post.call_count, 1)
+
 
 class TestPublicDatasets(BaseAPITestCase): 
 
@@ -208,9 +243,11 @@ class TestPublicDatasets(BaseAPITestCase):
         mock_dataset.verify_files.assert_called_with(file_mapping)
         mock_dataset.get_indexable_files.assert_called_with(file_mapping)
         mock_indexer.index.assert_has_calls([
-            mock.call(index_name, 'a'),
-            mock.call(index_name, 'b')
+            mock.call(index_name, 'a', commit=False),
+            mock.call(index_name, 'b', commit=False)
         ])
+        # a single commit once all the files are indexed
+        mock_indexer.commit.assert_called_once_with(index_name)
 
         # query the database to check that it was updated
         p = PublicDataset.objects.get(pk=self.test_dataset.pk)
@@ -255,6 +292,7 @@ class TestPublicDatasets(BaseAPITestCase):
 
         mock_dataset.create_from_query.return_value = (
             [self.demo_filepath], [mock_name], [resource_type], [file_format])
+        mock_dataset.created_tables = {}
 
         mock_create_resource.return_value = mock_resource_instance
 
@@ -283,6 +321,60 @@ class TestPublicDatasets(BaseAPITestCase):
 
         mock_delete_local_file.assert_called_with(self.demo_filepath)
 
+    @mock.patch('api.public_data.delete_local_file')
+    @mock.patch('api.public_data.validate_resource')
+    @mock.patch('api.public_data.register_trusted_resource')
+    @mock.patch('api.public_data.get_implementing_class')
+    @mock.patch('api.public_data.check_if_valid_public_dataset_name')
+    @mock.patch('api.public_data.create_resource')
+    @mock.patch('api.public_data.File')
+    def test_dataset_creation_with_created_tables(self,
+            mock_file_class,
+            mock_create_resource,
+            mock_check_if_valid_public_dataset_name,
+            mock_get_implementing_class,
+            mock_register_trusted_resource,
+            mock_validate_resource,
+            mock_delete_local_file
+        ):
+        '''
+        Tests that the tables provided by the dataset are used to register
+        the resources directly, falling back to validation if that fails.
+        '''
+        dataset_id = self.test_dataset.index_name
+        mock_user = mock.MagicMock()
+        mock_dataset = mock.MagicMock()
+        mock_resource_instance = mock.MagicMock()
+        mock_create_resource.return_value = mock_resource_instance
+        mock_check_if_valid_public_dataset_name.return_value = True
+        mock_get_implementing_class.return_value = mock_dataset
+
+        other_path = os.path.join(TEST_FILES_DIR, 'demo_file2.tsv')
+        mock_table = pd.DataFrame({'a': [1]})
+        mock_dataset.create_from_query.return_value = (
+            [self.demo_filepath, other_path],
+            ['a.tsv', 'b.tsv'],
+            ['MTX', 'ANN'],
+            [TSV_FORMAT, TSV_FORMAT]
+        )
+        mock_dataset.created_tables = {self.demo_filepath: mock_table}
+
+        create_dataset_from_params(dataset_id, mock_user, {})
+
+        mock_register_trusted_resource.assert_called_once_with(
+            mock_resource_instance, 'MTX', TSV_FORMAT, mock_table)
+        # the table without a dataframe is validated
+        mock_validate_resource.delay.assert_called_once_with(
+            mock_resource_instance.pk, 'ANN', TSV_FORMAT)
+        mock_delete_local_file.assert_has_calls([
+            mock.call(self.demo_filepath), mock.call(other_path)])
+
+        # if registration fails, we validate
+        mock_register_trusted_resource.side_effect = Exception('!!!')
+        mock_validate_resource.reset_mock()
+        create_dataset_from_params(dataset_id, mock_user, {})
+        self.assertEqual(mock_validate_resource.delay.call_count, 2)
+
     @mock.patch('api.public_data.validate_resource')
     @mock.patch('api.public_data.get_implementing_class')
     @mock.patch('api.public_data.check_if_valid_public_dataset_name')
@@ -608,8 +700,10 @@ class TestGTExRnaseq(BaseAPITestCase):
         ]
         converted_tissue_list = [RnaSeqMixin.create_python_compatible_id(x) for x in expected_tissue_list]
         groups_list = ['/{x}/ds'.format(x=x) for x in converted_tissue_list]
-        with pd.HDFStore(expected_output_hdf) as hdf:
-            self.assertCountEqual(groups_list, list(hdf.keys()))
+        with tables.open_file(expected_output_hdf) as h5:
+            written_groups = [g._v_pathname for g in h5.walk_groups()
+                if LAYOUT_ATTR in g._v_attrs]
+            self.assertCountEqual(groups_list, written_groups)
 
         # cleanup the test folder
         shutil.rmtree(tmp_testing_dir)
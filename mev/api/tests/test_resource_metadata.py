@@ -279,6 +279,33 @@ class TestRetrieveResourceMetadata(BaseAPITestCase):
         self.assertCountEqual(elements, self.expected_feature_set['elements'])
         self.assertEqual(response_json[PARENT_OP_KEY], self.expected_parent_operation)
 
+    def test_conditional_metadata_request(self):
+        '''
+        Test that we return a 304 if the client has the current
+        metadata and that changing the metadata changes the ETag.
+        '''
+        self.prepare_metadata()
+        url = reverse(
+            'resource-metadata-detail', 
+            kwargs={'pk':self.new_resource_pk}
+        )
+        response = self.authenticated_regular_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.authenticated_regular_client.get(url,
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        rm = ResourceMetadata.objects.get(resource__pk=self.new_resource_pk)
+        rm.feature_set = None
+        rm.save()
+        response = self.authenticated_regular_client.get(url,
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.json()[FEATURE_SET_KEY])
+        self.assertNotEqual(response['ETag'], etag)
+
     def test_retrieve_observation_metadata(self):
         '''
         Test that we retrieve the proper metadata from a request to 
@@ -16,8 +16,8 @@ from constants import TSV_FORMAT,\
     BED3_FILE_KEY,\
     BED6_FILE_KEY,\
     NARROWPEAK_FILE_KEY, \
-    FASTA_KEY, \
-    FASTA_FORMAT
+    BAI_KEY, \
+    UNSPECIFIED_FORMAT
 from resource_types import RESOURCE_MAPPING
 from resource_types.table_types import PREVIEW_NUM_LINES
 from api.models import Resource
@@ -105,8 +105,8 @@ class TestResourcePreviewEndpoint(BaseAPITestCase):
     def test_preview_request_for_file_without_preview(self, mock_check_resource_request):
         f = os.path.join(TESTDIR, 'test_integer_matrix.tsv')
         associate_file_with_resource(self.resource, f)
-        self.resource.resource_type = FASTA_KEY
-        self.resource.file_format = FASTA_FORMAT
+        self.resource.resource_type = BAI_KEY
+        self.resource.file_format = UNSPECIFIED_FORMAT
         self.resource.save()
         mock_check_resource_request.return_value = (True, self.resource)
         response = self.authenticated_regular_client.get(
@@ -118,6 +118,74 @@ class TestResourcePreviewEndpoint(BaseAPITestCase):
         self.assertTrue('Contents not available' in j['info'])
 
 
+    @mock.patch('api.views.resource_views.get_resource_view')
+    @mock.patch('api.views.resource_views.check_resource_request')
+    def test_conditional_preview_request(self, mock_check_resource_request,
+        mock_get_resource_view):
+        '''
+        Tests that we return a 304 without reading the file if the
+        client has the current ETag, and that modifying the resource
+        changes the ETag.
+        '''
+        f = os.path.join(TESTDIR, 'test_integer_matrix.tsv')
+        associate_file_with_resource(self.resource, f)
+        self.resource.resource_type = MATRIX_KEY
+        self.resource.file_format = TSV_FORMAT
+        self.resource.save()
+        mock_check_resource_request.return_value = (True, self.resource)
+        mock_get_resource_view.return_value = [{'rowname': 'a', 'values': {}}]
+        response = self.authenticated_regular_client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        mock_get_resource_view.assert_called_once()
+
+        mock_get_resource_view.reset_mock()
+        response = self.authenticated_regular_client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        mock_get_resource_view.assert_not_called()
+
+        # weak ETags (e.g. if modified by gzip middleware) also match
+        response = self.authenticated_regular_client.get(
+            self.url, HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # a change to the resource invalidates the ETag
+        self.resource.save()
+        response = self.authenticated_regular_client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        mock_get_resource_view.assert_called_once()
+
+    @mock.patch('api.views.resource_views.check_resource_request')
+    def test_contents_etag_depends_on_query(self, mock_check_resource_request):
+        '''
+        Tests that the contents of the same resource with different
+        query params (e.g. filters) have different ETags.
+        '''
+        f = os.path.join(TESTDIR, 'test_integer_matrix.tsv')
+        associate_file_with_resource(self.resource, f)
+        self.resource.resource_type = MATRIX_KEY
+        self.resource.file_format = TSV_FORMAT
+        self.resource.save()
+        mock_check_resource_request.return_value = (True, self.resource)
+        url = reverse('resource-contents', kwargs={'pk': self.resource.pk})
+        response = self.authenticated_regular_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.authenticated_regular_client.get(
+            url + '?page=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.authenticated_regular_client.get(
+            url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
 class TestResourcePreview(BaseAPITestCase):
 
     @mock.patch('resource_types.table_types.PREVIEW_NUM_LINES', 2)
@@ -164,6 +232,38 @@ class TestResourcePreview(BaseAPITestCase):
         self.assertCountEqual(contents, preview_return)
         os.remove(path)
 
+    @mock.patch('resource_types.base.PREVIEW_INITIAL_BYTES', 16)
+    @mock.patch('resource_types.table_types.PREVIEW_NUM_LINES', 2)
+    def test_table_preview_reads_leading_bytes(self):
+        '''
+        Tests that the preview only reads the leading bytes of the file,
+        requesting more only until it has enough lines.
+        '''
+        rows = [f'gene{i}' for i in range(1000)]
+        df = pd.DataFrame(np.arange(3000).reshape((1000, 3)),
+            index=rows, columns=['colA', 'colB', 'colC'])
+        path = os.path.join('/tmp', 'test_preview_matrix.tsv')
+        df.to_csv(path, sep='\t')
+        r = Resource.objects.all()[0]
+        r.resource_type = MATRIX_KEY
+        r.file_format = TSV_FORMAT
+        r.save()
+        associate_file_with_resource(r, path)
+        file_size = os.stat(path).st_size
+
+        mtx_type = RESOURCE_MAPPING[MATRIX_KEY]()
+        with mock.patch.object(r.datafile.storage, 'read_leading_bytes',
+            wraps=r.datafile.storage.read_leading_bytes) as mock_read:
+            contents = mtx_type.get_contents(r, preview=True)
+            requested_sizes = [x[0][1] for x in mock_read.call_args_list]
+        self.assertEqual(requested_sizes, [16, 32, 64])
+        self.assertTrue(max(requested_sizes) < file_size)
+        self.assertEqual(contents, [
+            {'rowname': 'gene0', 'values': {'colA':0, 'colB':1, 'colC':2}},
+            {'rowname': 'gene1', 'values': {'colA':3, 'colB':4, 'colC':5}},
+        ])
+        os.remove(path)
+
     def test_empty_table_preview(self):
         '''
         In principle, the resource should be validated so this should
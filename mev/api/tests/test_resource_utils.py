@@ -52,7 +52,8 @@ from api.utilities.resource_utilities import initiate_resource_validation, \
     get_resource_view, \
     retrieve_metadata, \
     retrieve_resource_class_standard_format, \
-    check_if_resource_unset
+    check_if_resource_unset, \
+    register_trusted_resource
 from exceptions import NoResourceFoundException, \
     ResourceValidationException, \
     InactiveResourceException, \
@@ -1676,4 +1677,36 @@ class TestResourceUtilities(BaseAPITestCase):
             (r.file_format == '')
             |
             (r.file_format is None)
-        )
\ No newline at end of file
+        )
+
+    @mock.patch('resource_types.table_types.TableResource.read_resource')
+    def test_register_trusted_resource(self, mock_read_resource):
+        '''
+        Tests that we can register a table-based resource using the
+        dataframe that was written, without reading the file.
+        '''
+        r = self.get_unset_resource()
+        df = pd.DataFrame([[1, 2], [3, 4]],
+            index=['gA', 'gB'], columns=['s1', 's2'])
+        register_trusted_resource(r, INTEGER_MATRIX_KEY, TSV_FORMAT, df)
+        mock_read_resource.assert_not_called()
+
+        r = Resource.objects.get(pk=r.pk)
+        self.assertEqual(r.resource_type, INTEGER_MATRIX_KEY)
+        self.assertEqual(r.file_format, TSV_FORMAT)
+        self.assertEqual(r.status, Resource.READY)
+        rm = ResourceMetadata.objects.get(resource=r)
+        self.assertCountEqual(
+            [x['id'] for x in rm.observation_set['elements']], ['s1', 's2'])
+
+        ann_df = pd.DataFrame({'cancer_type': ['TCGA-A', 'TCGA-B']},
+            index=['s1', 's2'])
+        register_trusted_resource(r, ANNOTATION_TABLE_KEY, TSV_FORMAT, ann_df)
+        rm = ResourceMetadata.objects.get(resource=r)
+        elements = {x['id']: x for x in rm.observation_set['elements']}
+        self.assertEqual(
+            elements['s2']['attributes']['cancer_type']['value'], 'TCGA-B')
+
+        # only the standard format can be registered
+        with self.assertRaises(Exception):
+            register_trusted_resource(r, INTEGER_MATRIX_KEY, CSV_FORMAT, df)
@@ -2142,6 +2142,21 @@ class ResourceDetailTests(BaseAPITestCase):
         # check that the resource still exists
         Resource.objects.get(pk=self.regular_user_workspace_resource.pk)
 
+    @mock.patch('api.views.resource_views.delete_json_sidecars')
+    @mock.patch('api.views.resource_views.async_delete_file')
+    def test_users_can_delete_unattached_resource(self, mock_delete_file,
+        mock_delete_json_sidecars):
+        """
+        Test that regular users can delete their own unattached Resource
+        and that the file and local sidecars are removed.
+        """
+        r = self.regular_user_active_unattached_resource
+        response = self.authenticated_regular_client.delete(self.url_for_active_unattached)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_delete_file.delay.assert_called_once_with(r.datafile.name)
+        mock_delete_json_sidecars.assert_called_once_with(r.pk)
+        self.assertFalse(Resource.objects.filter(pk=r.pk).exists())
+
     def test_other_users_cannot_delete_resource(self):
         """
         Test that another regular users can't delete someone else's Workpace.
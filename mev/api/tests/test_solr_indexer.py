@@ -0,0 +1,234 @@
+import os
+import io
+import json
+import uuid
+import threading
+import unittest.mock as mock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from django.conf import settings
+from django.test import override_settings
+
+from api.public_data.indexers.solr import SolrIndexer
+
+from api.tests.base import BaseAPITestCase
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'solr-indexer-tests'
+    }
+}
+
+
+class MockSolrHandler(BaseHTTPRequestHandler):
+    '''
+    A local stand-in for the solr server. Queries on the
+    known core return the number of queries received so far
+    so we can tell whether a response was served from the cache.
+    '''
+    # HTTP/1.1 so that connections can be kept alive
+    protocol_version = 'HTTP/1.1'
+    CORE = 'tcga-rnaseq'
+    requests_received = []
+    # the bodies of update requests, which have documents
+    update_bodies = []
+    # the number of update requests to fail with the given status code
+    num_failed_updates = 0
+    failed_update_status = 503
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status_code, payload):
+        content = json.dumps(payload).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.requests_received.append(self.path)
+        if url.path != f'/solr/{self.CORE}/select':
+            self._respond(404, {'error': {'msg': 'Not found'}})
+        elif 'q=' not in url.query:
+            self._respond(400, {'error': {'msg': 'no query'}})
+        else:
+            self._respond(200, {
+                'response': {'numFound': len(self.requests_received)}
+            })
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        self.requests_received.append(self.path)
+        if len(body) > 0:
+            if MockSolrHandler.num_failed_updates > 0:
+                MockSolrHandler.num_failed_updates -= 1
+                self._respond(self.failed_update_status,
+                    {'error': {'msg': 'Failed'}})
+                return
+            self.update_bodies.append(body.decode('utf-8'))
+        self._respond(200, {'responseHeader': {'status': 0}})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TestSolrIndexerQueryCache(BaseAPITestCase):
+
+    def setUp(self):
+        MockSolrHandler.requests_received = []
+        MockSolrHandler.update_bodies = []
+        MockSolrHandler.num_failed_updates = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockSolrHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+        patcher = mock.patch.object(SolrIndexer, 'SOLR_SERVER',
+            f'http://127.0.0.1:{self.server.server_address[1]}/solr')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.indexer = SolrIndexer()
+        self.indexer._get_cache().clear()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+
+    def test_identical_queries_are_cached(self):
+        core = MockSolrHandler.CORE
+        r1 = self.indexer.query(core, 'q=*:*&facet.field=project_id&rows=2')
+        self.assertEqual(r1['response']['numFound'], 1)
+
+        # the same query with parameters in a different order is
+        # served from the cache
+        r2 = SolrIndexer().query(core, 'rows=2&q=*:*&facet.field=project_id&')
+        self.assertDictEqual(r1, r2)
+        self.assertEqual(len(MockSolrHandler.requests_received), 1)
+
+        # a different query goes to the server
+        r3 = self.indexer.query(core, 'q=*:*&facet.field=project_id&rows=3')
+        self.assertEqual(r3['response']['numFound'], 2)
+
+    def test_failed_queries_not_cached(self):
+        core = MockSolrHandler.CORE
+        with self.assertRaisesRegex(Exception, 'no query'):
+            self.indexer.query(core, 'rows=2')
+        with self.assertRaisesRegex(Exception, 'no query'):
+            self.indexer.query(core, 'rows=2')
+        self.assertEqual(len(MockSolrHandler.requests_received), 2)
+
+    @override_settings(SOLR_QUERY_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        core = MockSolrHandler.CORE
+        self.indexer.query(core, 'q=*:*')
+        r = self.indexer.query(core, 'q=*:*')
+        self.assertEqual(r['response']['numFound'], 2)
+
+    @mock.patch('api.public_data.indexers.solr.mimetypes')
+    def test_reindexing_invalidates_cache(self, mock_mimetypes):
+        mock_mimetypes.guess_type.return_value = ('text/csv', None)
+        core = MockSolrHandler.CORE
+        self.indexer.query(core, 'q=*:*')
+        self.indexer.query(core, 'q=*:*')
+        self.assertEqual(len(MockSolrHandler.requests_received), 1)
+
+        # querying another core is not affected by the reindex below
+        with mock.patch.object(MockSolrHandler, 'CORE', 'other'):
+            self.indexer.query('other', 'q=*:*')
+
+        with mock.patch('api.public_data.indexers.solr.open',
+            mock.mock_open(read_data='id,a\n1,2\n')):
+            self.indexer.index(core, '/some/file.csv')
+        # the core check, the update request and the commit
+        self.assertEqual(len(MockSolrHandler.requests_received), 5)
+
+        r = self.indexer.query(core, 'q=*:*')
+        self.assertEqual(r['response']['numFound'], 6)
+        with mock.patch.object(MockSolrHandler, 'CORE', 'other'):
+            r = self.indexer.query('other', 'q=*:*')
+        self.assertEqual(r['response']['numFound'], 2)
+
+
+@override_settings(CACHES=TEST_CACHES,
+    SOLR_INDEX_BATCH_SIZE=2,
+    SOLR_INDEX_RETRY_BACKOFF=0)
+class TestSolrBatchIndexing(BaseAPITestCase):
+
+    def setUp(self):
+        MockSolrHandler.requests_received = []
+        MockSolrHandler.update_bodies = []
+        MockSolrHandler.num_failed_updates = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockSolrHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+        patcher = mock.patch.object(SolrIndexer, 'SOLR_SERVER',
+            f'http://127.0.0.1:{self.server.server_address[1]}/solr')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.indexer = SolrIndexer()
+        self.core = MockSolrHandler.CORE
+
+        self.filepath = os.path.join(settings.TMP_DIR, f'{uuid.uuid4()}.csv')
+        with open(self.filepath, 'w') as fout:
+            fout.write('id,note\n')
+            fout.write('a,x\n')
+            # a quoted field with a newline is kept in a single document
+            fout.write('b,"line1\nline2"\n')
+            fout.write('c,z\n')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+        os.remove(self.filepath)
+
+    def _get_update_paths(self):
+        return [urlparse(x) for x in MockSolrHandler.requests_received
+            if urlparse(x).path.endswith('/update/')]
+
+    def test_documents_sent_in_batches(self):
+        self.indexer.index(self.core, self.filepath)
+        docs = pd.concat([pd.read_csv(io.StringIO(x))
+            for x in MockSolrHandler.update_bodies])
+        self.assertEqual(len(MockSolrHandler.update_bodies), 2)
+        self.assertEqual(docs['id'].tolist(), ['a', 'b', 'c'])
+        self.assertEqual(docs['note'].tolist(), ['x', 'line1\nline2', 'z'])
+
+        # two batches without a commit, then a single commit
+        queries = [x.query for x in self._get_update_paths()]
+        self.assertEqual(queries, ['', '', 'commit=true'])
+
+    @override_settings(SOLR_INDEX_COMMIT_WITHIN=10000)
+    def test_commit_within(self):
+        self.indexer.index(self.core, self.filepath, commit=False)
+        queries = [x.query for x in self._get_update_paths()]
+        self.assertEqual(queries, ['commitWithin=10000'] * 2)
+
+    def test_failed_batch_retried(self):
+        MockSolrHandler.num_failed_updates = 2
+        self.indexer.index(self.core, self.filepath)
+        docs = pd.concat([pd.read_csv(io.StringIO(x))
+            for x in MockSolrHandler.update_bodies])
+        self.assertEqual(docs['id'].tolist(), ['a', 'b', 'c'])
+        # 2 failed and 2 successful batches plus the commit
+        self.assertEqual(len(self._get_update_paths()), 5)
+
+    @override_settings(SOLR_INDEX_MAX_RETRIES=1)
+    def test_batch_fails_after_retries(self):
+        MockSolrHandler.num_failed_updates = 2
+        with self.assertRaisesRegex(Exception, 'Failed to index a batch'):
+            self.indexer.index(self.core, self.filepath)
+        # no commit was made
+        self.assertEqual(len(self._get_update_paths()), 2)
+
+    @mock.patch.object(MockSolrHandler, 'failed_update_status', 400)
+    def test_bad_request_not_retried(self):
+        MockSolrHandler.num_failed_updates = 1
+        with self.assertRaisesRegex(Exception, 'Failed to index a batch'):
+            self.indexer.index(self.core, self.filepath)
+        self.assertEqual(len(self._get_update_paths()), 1)
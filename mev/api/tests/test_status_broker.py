@@ -0,0 +1,195 @@
+import json
+import uuid
+import datetime
+import threading
+import unittest.mock as mock
+
+from django.urls import reverse
+from django.test import override_settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import status
+
+from api.models import Operation, \
+    ExecutedOperation
+from api.utilities.status_broker import LocalStatusBroker, \
+    CacheStatusBroker, \
+    get_status_broker, \
+    get_status_event, \
+    publish_status
+from api.async_tasks.operation_tasks import check_executed_op
+from api.tests.base import BaseAPITestCase
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'status-broker-tests'
+    }
+}
+
+
+class LocalStatusBrokerTests(BaseAPITestCase):
+
+    def test_events_reach_user_subscriptions(self):
+        broker = LocalStatusBroker()
+        s1 = broker.subscribe('u1')
+        s2 = broker.subscribe('u1')
+        other = broker.subscribe('u2')
+        broker.publish('u1', {'id': 'a'})
+        broker.publish('u1', {'id': 'b'})
+        self.assertEqual(s1.get(0.1), [{'id': 'a'}, {'id': 'b'}])
+        self.assertEqual(s2.get(0.1), [{'id': 'a'}, {'id': 'b'}])
+        self.assertEqual(other.get(0.01), [])
+
+        # closed subscriptions no longer receive events
+        s1.close()
+        broker.publish('u1', {'id': 'c'})
+        self.assertEqual(s1.get(0.01), [])
+        self.assertEqual(s2.get(0.1), [{'id': 'c'}])
+
+    def test_waits_for_event(self):
+        broker = LocalStatusBroker()
+        s = broker.subscribe('u1')
+        t = threading.Timer(0.05, broker.publish, args=['u1', {'id': 'a'}])
+        t.start()
+        self.assertEqual(s.get(5), [{'id': 'a'}])
+        t.join()
+
+
+@override_settings(CACHES=TEST_CACHES,
+    STATUS_BROKER_POLL_INTERVAL=0.01)
+class CacheStatusBrokerTests(BaseAPITestCase):
+
+    def setUp(self):
+        self.broker = CacheStatusBroker()
+        self.broker._get_cache().clear()
+
+    def test_events_passed_through_cache(self):
+        self.broker.publish('u1', {'id': 'before'})
+        s = self.broker.subscribe('u1')
+        self.assertEqual(s.get(0.05), [])
+        self.broker.publish('u1', {'id': 'a'})
+        self.broker.publish('u2', {'id': 'x'})
+        # a separate broker instance, as in another process
+        CacheStatusBroker().publish('u1', {'id': 'b'})
+        self.assertEqual(s.get(0.05), [{'id': 'a'}, {'id': 'b'}])
+        self.assertEqual(s.get(0.05), [])
+
+    def test_counter_reset(self):
+        s = self.broker.subscribe('u1')
+        self.broker.publish('u1', {'id': 'a'})
+        self.broker.publish('u1', {'id': 'a2'})
+        self.assertEqual(s.get(0.05), [{'id': 'a'}, {'id': 'a2'}])
+        # the counter is evicted and restarts below the last number seen
+        self.broker._get_cache().clear()
+        self.broker.publish('u1', {'id': 'b'})
+        self.assertEqual(s.get(0.05), [{'id': 'b'}])
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': '/tmp/status-broker-tests'
+        }
+    })
+    def test_file_based_cache_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CacheStatusBroker()
+
+
+class DisabledStatusBrokerTests(BaseAPITestCase):
+
+    def setUp(self):
+        self.establish_clients()
+
+    @override_settings(STATUS_BROKER=None)
+    def test_stream_disabled(self):
+        self.assertIsNone(get_status_broker())
+        op = Operation.objects.create(id=str(uuid.uuid4()))
+        exec_op = ExecutedOperation.objects.create(
+            owner=self.regular_user_1,
+            operation=op,
+            mode='foo'
+        )
+        # nothing to publish to
+        publish_status(exec_op)
+        url = reverse('executed-operation-status-stream')
+        response = self.authenticated_regular_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StatusPublishingTests(BaseAPITestCase):
+
+    def setUp(self):
+        self.establish_clients()
+        op = Operation.objects.create(id=str(uuid.uuid4()))
+        self.exec_op = ExecutedOperation.objects.create(
+            owner=self.regular_user_1,
+            operation=op,
+            mode='foo',
+            status=ExecutedOperation.SUBMITTED
+        )
+        self.broker = LocalStatusBroker()
+        patcher = mock.patch('api.utilities.status_broker.get_status_broker',
+            return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('api.views.executed_operation_views.get_status_broker',
+            return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_publish_errors_ignored(self):
+        with mock.patch.object(self.broker, 'publish', side_effect=Exception('!!!')):
+            publish_status(self.exec_op)
+
+    @mock.patch('api.async_tasks.operation_tasks.get_runner')
+    def test_poller_publishes_changes(self, mock_get_runner):
+        mock_get_runner.return_value.return_value.check_status.return_value = False
+        s = self.broker.subscribe(self.regular_user_1.pk)
+        with mock.patch.object(check_executed_op, 'retry') as mock_retry:
+            check_executed_op(self.exec_op.pk)
+            mock_retry.assert_called_once_with(
+                args=[self.exec_op.pk, ExecutedOperation.SUBMITTED],
+                countdown=mock.ANY)
+            self.assertEqual(s.get(0.1), [get_status_event(self.exec_op)])
+
+            # the status has not changed
+            check_executed_op(self.exec_op.pk, ExecutedOperation.SUBMITTED)
+            self.assertEqual(s.get(0.01), [])
+
+    @override_settings(STATUS_STREAM_MAX_DURATION=0.3,
+        STATUS_STREAM_HEARTBEAT_INTERVAL=0.1)
+    def test_status_stream(self):
+        # a finished job is not included
+        ExecutedOperation.objects.create(
+            owner=self.regular_user_1,
+            operation=self.exec_op.operation,
+            mode='foo',
+            execution_stop_datetime=datetime.datetime.now()
+        )
+        url = reverse('executed-operation-status-stream')
+        with mock.patch('api.views.executed_operation_views.connection') as mock_connection:
+            response = self.authenticated_regular_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        # the database connection is released before streaming
+        mock_connection.close.assert_called_once()
+
+        self.exec_op.status = ExecutedOperation.RUNNING
+        publish_status(self.exec_op)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        messages = [x for x in content.split('\n\n') if len(x) > 0]
+        events = [json.loads(x.split('data: ')[1]) for x in messages
+            if x.startswith('event: status')]
+        self.assertEqual([x['status'] for x in events],
+            [ExecutedOperation.SUBMITTED, ExecutedOperation.RUNNING])
+        self.assertTrue(all([x['id'] == str(self.exec_op.pk) for x in events]))
+        self.assertTrue(': heartbeat' in messages)
+
+        # the subscription is closed with the stream
+        self.assertEqual(len(self.broker._subscriptions), 0)
+
+    def test_status_stream_requires_auth(self):
+        url = reverse('executed-operation-status-stream')
+        response = self.regular_client.get(url)
+        self.assertTrue((response.status_code == status.HTTP_401_UNAUTHORIZED)
+            | (response.status_code == status.HTTP_403_FORBIDDEN))
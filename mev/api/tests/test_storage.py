@@ -1,14 +1,18 @@
 import os
 import shutil
+import datetime
 import unittest
 import unittest.mock as mock
 
 from django.conf import settings
+from django.test import override_settings
 
 from api.storage import S3ResourceStorage, \
     LocalResourceStorage
 from botocore.exceptions import ClientError
 
+from exceptions import StorageException
+
 
 class TestLocalResourceStorage(unittest.TestCase):
 
@@ -280,4 +284,225 @@ class TestS3ResourceStorage(unittest.TestCase):
 
         files = storage.get_file_listing(f's3://{mock_other_bucket_name}/{mock_dir}')
         self.assertTrue(len(files) == 0)
-        mock_alert_admins.assert_not_called()
\ No newline at end of file
+        mock_alert_admins.assert_not_called()
+
+    @mock.patch('api.storage.boto3')
+    def test_read_leading_bytes_uses_ranged_request(self, mock_boto):
+        '''
+        Tests that we only request the leading bytes of the object
+        '''
+        storage = S3ResourceStorage()
+        storage.bucket_name = 'my-bucket'
+        mock_client = mock.MagicMock()
+        mock_body = mock.MagicMock()
+        mock_body.read.return_value = b'abc'
+        mock_client.get_object.return_value = {'Body': mock_body}
+        mock_boto.client.return_value = mock_client
+        content = storage.read_leading_bytes('some/object.txt', 100)
+        self.assertEqual(content, b'abc')
+        mock_client.get_object.assert_called_once_with(
+            Bucket='my-bucket',
+            Key='some/object.txt',
+            Range='bytes=0-99'
+        )
+
+    @mock.patch('api.storage.boto3')
+    def test_read_leading_bytes_of_empty_object(self, mock_boto):
+        '''
+        Ranged requests on empty objects are not satisfiable. Check
+        that we return empty content rather than raising.
+        '''
+        storage = S3ResourceStorage()
+        mock_client = mock.MagicMock()
+        mock_client.get_object.side_effect = ClientError(
+            {'Error': {'Code': 'InvalidRange'}}, 'get_object')
+        mock_boto.client.return_value = mock_client
+        content = storage.read_leading_bytes('some/object.txt', 100)
+        self.assertEqual(content, b'')
+
+    @mock.patch('api.storage.boto3')
+    def test_read_byte_range_uses_ranged_request(self, mock_boto):
+        '''
+        Tests that we request only the bytes of the given range
+        '''
+        storage = S3ResourceStorage()
+        storage.bucket_name = 'my-bucket'
+        mock_client = mock.MagicMock()
+        mock_body = mock.MagicMock()
+        mock_body.read.return_value = b'abc'
+        mock_client.get_object.return_value = {'Body': mock_body}
+        mock_boto.client.return_value = mock_client
+        content = storage.read_byte_range('some/object.bw', 64, 32)
+        self.assertEqual(content, b'abc')
+        mock_client.get_object.assert_called_once_with(
+            Bucket='my-bucket',
+            Key='some/object.bw',
+            Range='bytes=64-95'
+        )
+
+    @mock.patch('api.storage.boto3')
+    def test_open_stream(self, mock_boto):
+        '''
+        Tests that we return the streaming body of the object
+        rather than reading it.
+        '''
+        storage = S3ResourceStorage()
+        storage.bucket_name = 'my-bucket'
+        mock_client = mock.MagicMock()
+        mock_body = mock.MagicMock()
+        mock_client.get_object.return_value = {'Body': mock_body}
+        mock_boto.client.return_value = mock_client
+        stream = storage.open_stream('some/object.fastq.gz')
+        self.assertEqual(stream, mock_body)
+        mock_body.read.assert_not_called()
+        mock_client.get_object.assert_called_once_with(
+            Bucket='my-bucket',
+            Key='some/object.fastq.gz'
+        )
+
+    @mock.patch('api.storage.create_resource')
+    @mock.patch('api.storage.boto3')
+    def test_create_multipart_upload(self, mock_boto, mock_create_resource):
+        '''
+        Tests that we create a placeholder resource and presign
+        a URL for each part
+        '''
+        storage = S3ResourceStorage()
+        storage.bucket_name = 'my-bucket'
+        mock_resource = mock.MagicMock()
+        mock_resource.datafile.name = 'some/object.txt'
+        mock_create_resource.return_value = mock_resource
+        mock_client = mock.MagicMock()
+        mock_client.create_multipart_upload.return_value = {'UploadId': 'abc'}
+        mock_client.generate_presigned_url.side_effect = ['url1', 'url2']
+        mock_boto.client.return_value = mock_client
+
+        r, upload_id, urls = storage.create_multipart_upload(
+            mock.MagicMock(), 'f.txt', 2)
+        self.assertEqual(r, mock_resource)
+        self.assertEqual(upload_id, 'abc')
+        self.assertEqual(urls, ['url1', 'url2'])
+        self.assertFalse(mock_create_resource.call_args.kwargs['is_active'])
+        mock_client.create_multipart_upload.assert_called_once_with(
+            Bucket='my-bucket',
+            Key='some/object.txt'
+        )
+        mock_client.generate_presigned_url.assert_called_with('upload_part',
+            Params={
+                'Bucket': 'my-bucket',
+                'Key': 'some/object.txt',
+                'UploadId': 'abc',
+                'PartNumber': 2
+            },
+            ExpiresIn=settings.DIRECT_UPLOAD_URL_EXPIRATION
+        )
+
+    @mock.patch('api.storage.create_resource')
+    @mock.patch('api.storage.boto3')
+    def test_failed_multipart_upload_removes_resource(self,
+        mock_boto, mock_create_resource):
+        storage = S3ResourceStorage()
+        storage.delete = mock.MagicMock()
+        mock_resource = mock.MagicMock()
+        mock_create_resource.return_value = mock_resource
+        mock_client = mock.MagicMock()
+        mock_client.create_multipart_upload.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDenied'}}, 'create_multipart_upload')
+        mock_boto.client.return_value = mock_client
+        with self.assertRaises(StorageException):
+            storage.create_multipart_upload(mock.MagicMock(), 'f.txt', 2)
+        mock_resource.delete.assert_called_once()
+
+    @mock.patch('api.storage.boto3')
+    def test_complete_multipart_upload(self, mock_boto):
+        '''
+        Tests that the parts are sent in order and the
+        resource is activated.
+        '''
+        storage = S3ResourceStorage()
+        storage.bucket_name = 'my-bucket'
+        mock_client = mock.MagicMock()
+        mock_boto.client.return_value = mock_client
+        mock_resource = mock.MagicMock()
+        mock_resource.is_active = False
+        mock_resource.datafile.name = 'some/object.txt'
+        mock_resource.datafile.size = 100
+        storage.complete_multipart_upload(mock_resource, 'abc',
+            [(2, 'etag2'), (1, 'etag1')])
+        mock_client.complete_multipart_upload.assert_called_once_with(
+            Bucket='my-bucket',
+            Key='some/object.txt',
+            UploadId='abc',
+            MultipartUpload={'Parts': [
+                {'PartNumber': 1, 'ETag': 'etag1'},
+                {'PartNumber': 2, 'ETag': 'etag2'}
+            ]}
+        )
+        self.assertTrue(mock_resource.is_active)
+        self.assertEqual(mock_resource.size, 100)
+        mock_resource.save.assert_called_once()
+
+    @mock.patch('api.storage.boto3')
+    def test_abort_resource_multipart_uploads(self, mock_boto):
+        '''
+        Tests that only the uploads to the resource's object are aborted
+        and that the placeholder is removed.
+        '''
+        storage = S3ResourceStorage()
+        storage.bucket_name = 'my-bucket'
+        storage.delete = mock.MagicMock()
+        mock_client = mock.MagicMock()
+        mock_boto.client.return_value = mock_client
+        mock_resource = mock.MagicMock()
+        mock_resource.datafile.name = 'some/object.txt'
+        mock_paginator = mock_client.get_paginator.return_value
+        mock_paginator.paginate.return_value = [
+            {'Uploads': [
+                {'Key': 'some/object.txt', 'UploadId': 'a'},
+                # matches the prefix, but is another object
+                {'Key': 'some/object.txt.gz', 'UploadId': 'b'},
+            ]},
+            # a page without uploads does not have the key
+            {}
+        ]
+        storage.abort_resource_multipart_uploads(mock_resource)
+        mock_client.get_paginator.assert_called_once_with(
+            'list_multipart_uploads')
+        mock_paginator.paginate.assert_called_once_with(
+            Bucket='my-bucket', Prefix='some/object.txt')
+        mock_client.abort_multipart_upload.assert_called_once_with(
+            Bucket='my-bucket',
+            Key='some/object.txt',
+            UploadId='a'
+        )
+        storage.delete.assert_called_once_with('some/object.txt')
+        mock_resource.delete.assert_called_once()
+
+    @override_settings(DIRECT_UPLOAD_URL_BATCH_SIZE=2)
+    @mock.patch('api.storage.create_resource')
+    @mock.patch('api.storage.boto3')
+    def test_multipart_upload_urls_in_batches(self, mock_boto, mock_create_resource):
+        '''
+        Tests that only the first batch of part URLs is created
+        when the upload is initiated.
+        '''
+        storage = S3ResourceStorage()
+        mock_resource = mock.MagicMock()
+        mock_create_resource.return_value = mock_resource
+        mock_client = mock.MagicMock()
+        mock_client.create_multipart_upload.return_value = {'UploadId': 'abc'}
+        mock_client.generate_presigned_url.side_effect = ['url1', 'url2']
+        mock_boto.client.return_value = mock_client
+        r, upload_id, urls = storage.create_multipart_upload(
+            mock.MagicMock(), 'f.txt', 5)
+        self.assertEqual(urls, ['url1', 'url2'])
+
+        mock_client.generate_presigned_url.side_effect = ['url4']
+        self.assertEqual(storage.get_part_upload_urls(r, 'abc', [4]), ['url4'])
+        self.assertEqual(mock_client.generate_presigned_url.call_args.kwargs[
+            'Params']['PartNumber'], 4)
+
+    def test_local_storage_rejects_multipart_upload(self):
+        storage = LocalResourceStorage()
+        with self.assertRaises(NotImplementedError):
+            storage.create_multipart_upload(mock.MagicMock(), 'f.txt', 2)
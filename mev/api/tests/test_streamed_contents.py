@@ -0,0 +1,406 @@
+import os
+import gzip
+import zlib
+import struct
+import unittest.mock as mock
+from io import BytesIO
+
+from django.core.files import File
+from rest_framework.exceptions import NotFound
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+
+from exceptions import ParseException, \
+    NonIterableContentsException
+from api.models import Resource
+from api.storage import LocalResourceStorage
+from resource_types.sequence_types import FastAResource, \
+    FastQResource, \
+    AlignedSequenceResource
+from resource_types.genomic_display_types import WigFileResource, \
+    BedGraphFileResource, \
+    BigWigFileResource, \
+    BIGWIG_MAGIC, \
+    CHROM_TREE_MAGIC, \
+    RTREE_MAGIC
+from resource_types.streamed_contents import StreamedContentsPage, \
+    StreamedContentsPagination
+
+from api.tests.base import BaseAPITestCase
+from api.tests.test_helpers import associate_file_with_resource
+
+
+class TestStreamedContents(BaseAPITestCase):
+
+    def setUp(self):
+        self.establish_clients()
+        self.r = Resource.objects.create(
+            owner=self.regular_user_1,
+            file_format='',
+            resource_type='',
+            datafile=File(BytesIO(), 'foo.txt')
+        )
+        self.path = os.path.join('/tmp', 'test_streamed_contents')
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _associate(self, content):
+        with open(self.path, 'wb') as fout:
+            fout.write(content)
+        associate_file_with_resource(self.r, self.path)
+
+    def test_fasta_contents(self):
+        content = b'>seq1 description\nACGT\nTTGA\n>seq2\nGGGG\n>seq3\nCC\n'
+        self._associate(content)
+        expected = [
+            {'name': 'seq1 description', 'start': 1, 'sequence': 'ACGTTTGA'},
+            {'name': 'seq2', 'start': 1, 'sequence': 'GGGG'},
+            {'name': 'seq3', 'start': 1, 'sequence': 'CC'}
+        ]
+        contents = FastAResource().get_contents(self.r)
+        self.assertEqual(contents, expected)
+
+        contents = FastAResource().get_contents(self.r, {'page': 1, 'page_size': 2})
+        self.assertTrue(type(contents) is StreamedContentsPage)
+        self.assertEqual(contents.records, expected[:2])
+        self.assertTrue(contents.has_next)
+
+        contents = FastAResource().get_contents(self.r, {'page': 2, 'page_size': 2})
+        self.assertEqual(contents.records, expected[2:])
+        self.assertFalse(contents.has_next)
+
+    def test_long_fasta_sequences_split(self):
+        '''
+        Tests that long sequences (e.g. chromosomes) are returned in
+        chunks so that a page does not hold the full sequence.
+        '''
+        content = b'>chr1\nACGTA\nCGTAC\nG\n>empty\n>chr2\nTTTTTT\n'
+        self._associate(content)
+        with mock.patch('resource_types.sequence_types.FASTA_SEQUENCE_CHUNK_LENGTH', 3):
+            contents = FastAResource().get_contents(self.r)
+            self.assertEqual(contents, [
+                {'name': 'chr1', 'start': 1, 'sequence': 'ACG'},
+                {'name': 'chr1', 'start': 4, 'sequence': 'TAC'},
+                {'name': 'chr1', 'start': 7, 'sequence': 'GTA'},
+                {'name': 'chr1', 'start': 10, 'sequence': 'CG'},
+                {'name': 'empty', 'start': 1, 'sequence': ''},
+                {'name': 'chr2', 'start': 1, 'sequence': 'TTT'},
+                {'name': 'chr2', 'start': 4, 'sequence': 'TTT'},
+            ])
+            contents = FastAResource().get_contents(self.r, preview=True)
+            self.assertEqual(len(contents), 5)
+
+    def test_malformed_fasta_raises_ex(self):
+        self._associate(b'ACGT\n>seq1\nACGT\n')
+        with self.assertRaises(ParseException):
+            FastAResource().get_contents(self.r)
+
+    def test_gzipped_fastq_contents(self):
+        '''
+        Tests that we parse gzip-compressed FASTQ, including files
+        which are a concatenation of gzip members (e.g. from bgzip).
+        '''
+        records = [
+            {'name': f'read{i}', 'sequence': 'ACGT', 'quality': 'IIII'}
+            for i in range(10)
+        ]
+        lines = [f'@{x["name"]}\n{x["sequence"]}\n+\n{x["quality"]}\n'
+            for x in records]
+        content = gzip.compress(''.join(lines[:4]).encode()) + \
+            gzip.compress(''.join(lines[4:]).encode())
+        self._associate(content)
+
+        contents = FastQResource().get_contents(self.r, preview=True)
+        self.assertEqual(contents, records[:5])
+
+        contents = FastQResource().get_contents(self.r, {'page': 2, 'page_size': 3})
+        self.assertEqual(contents.records, records[3:6])
+        self.assertTrue(contents.has_next)
+
+        contents = FastQResource().get_contents(self.r, {'page': 4, 'page_size': 3})
+        self.assertEqual(contents.records, records[9:])
+        self.assertFalse(contents.has_next)
+
+    def test_truncated_fastq_raises_ex(self):
+        self._associate(b'@read1\nACGT\n+\nIIII\n@read2\nACGT\n')
+        with self.assertRaises(ParseException):
+            FastQResource().get_contents(self.r)
+
+    def test_bad_page_params_raise_ex(self):
+        self._associate(b'>seq1\nACGT\n')
+        with self.assertRaises(ParseException):
+            FastAResource().get_contents(self.r, {'page': 0})
+        with self.assertRaises(ParseException):
+            FastAResource().get_contents(self.r, {'page': 'a'})
+
+    def test_page_size_limited(self):
+        lines = [f'>seq{i}\nACGT\n' for i in range(10)]
+        self._associate(''.join(lines).encode())
+        with mock.patch('resource_types.streamed_contents.MAX_PAGE_SIZE', 3):
+            contents = FastAResource().get_contents(self.r, {'page': 2, 'page_size': 100})
+        self.assertEqual([x['name'] for x in contents.records], ['seq3', 'seq4', 'seq5'])
+        self.assertTrue(contents.has_next)
+
+    def test_only_requested_records_read(self):
+        '''
+        Tests that reading the first page of a large file does not
+        read the full file from storage.
+        '''
+        lines = [f'@read{i}\nACGT\n+\nIIII\n' for i in range(100000)]
+        self._associate(''.join(lines).encode())
+        with mock.patch('resource_types.streamed_contents.STREAM_CHUNK_BYTES', 1024):
+            with mock.patch('api.storage.LocalResourceStorage.open_stream') as mock_open:
+                mock_stream = mock.MagicMock(wraps=open(self.path, 'rb'))
+                mock_open.return_value = mock_stream
+                contents = FastQResource().get_contents(self.r, {'page': 1, 'page_size': 5})
+                self.assertEqual(len(contents.records), 5)
+                self.assertEqual(mock_stream.read.call_count, 1)
+                mock_stream.close.assert_called()
+
+    def test_wig_contents(self):
+        content = b'track type=wiggle_0\n' \
+            b'variableStep chrom=chr1 span=5\n' \
+            b'101 1.5\n201 2.5\n' \
+            b'fixedStep chrom=chr2 start=11 step=10\n' \
+            b'3\n4\n'
+        self._associate(content)
+        contents = WigFileResource().get_contents(self.r)
+        self.assertEqual(contents, [
+            {'chrom': 'chr1', 'start': 101, 'end': 105, 'value': 1.5},
+            {'chrom': 'chr1', 'start': 201, 'end': 205, 'value': 2.5},
+            {'chrom': 'chr2', 'start': 11, 'end': 11, 'value': 3.0},
+            {'chrom': 'chr2', 'start': 21, 'end': 21, 'value': 4.0},
+        ])
+
+    def test_wig_data_before_declaration_raises_ex(self):
+        self._associate(b'101 1.5\n')
+        with self.assertRaises(ParseException):
+            WigFileResource().get_contents(self.r)
+
+    def test_bedgraph_contents(self):
+        content = b'track type=bedGraph\nchr1\t0\t100\t0.5\nchr1\t100\t200\t-1\n'
+        self._associate(content)
+        contents = BedGraphFileResource().get_contents(self.r)
+        self.assertEqual(contents, [
+            {'chrom': 'chr1', 'start': 0, 'end': 100, 'value': 0.5},
+            {'chrom': 'chr1', 'start': 100, 'end': 200, 'value': -1.0},
+        ])
+
+        self._associate(b'chr1\t0\tabc\t0.5\n')
+        with self.assertRaises(ParseException):
+            BedGraphFileResource().get_contents(self.r)
+
+    def test_bam_header(self):
+        '''
+        Tests that we read the header and reference sequences
+        from a BAM file. The file is built from a single
+        gzip member, as in BGZF.
+        '''
+        text = b'@HD\tVN:1.6\n@SQ\tSN:chr1\tLN:1000\n@SQ\tSN:chr2\tLN:500\n'
+        data = b'BAM\x01' + struct.pack('<i', len(text)) + text
+        data += struct.pack('<i', 2)
+        for name, length in [(b'chr1', 1000), (b'chr2', 500)]:
+            data += struct.pack('<i', len(name) + 1) + name + b'\x00'
+            data += struct.pack('<i', length)
+        # alignment records would follow; just add some filler
+        data += os.urandom(1000)
+        self._associate(gzip.compress(data))
+
+        with mock.patch('resource_types.sequence_types.BAM_HEADER_INITIAL_BYTES', 16):
+            contents = AlignedSequenceResource().get_contents(self.r)
+        self.assertEqual(contents, {
+            'header': ['@HD\tVN:1.6', '@SQ\tSN:chr1\tLN:1000', '@SQ\tSN:chr2\tLN:500'],
+            'references': [
+                {'name': 'chr1', 'length': 1000},
+                {'name': 'chr2', 'length': 500}
+            ]
+        })
+
+    def test_non_bam_raises_ex(self):
+        self._associate(gzip.compress(b'abcdefghijklmnop'))
+        with self.assertRaises(ParseException):
+            AlignedSequenceResource().get_contents(self.r)
+
+    def _create_bigwig(self):
+        '''
+        Creates a BigWig file with two chromosomes, three (compressed) data
+        blocks and an R-tree index with a root node and two leaves.
+        Returns the offset of each data block.
+        '''
+        chrom_tree_offset = 64
+        key_size = 8
+        chroms = [(b'chr1', 1000), (b'chr22', 500)]
+        chrom_tree = struct.pack('<IIIIQQ',
+            CHROM_TREE_MAGIC, 256, key_size, 8, len(chroms), 0)
+        chrom_tree += struct.pack('<BBH', 1, 0, len(chroms))
+        for i, (name, length) in enumerate(chroms):
+            chrom_tree += name.ljust(key_size, b'\x00')
+            chrom_tree += struct.pack('<II', i, length)
+        summary_offset = chrom_tree_offset + len(chrom_tree)
+        summary = struct.pack('<Qdddd', 100, -1.0, 3.0, 150.0, 0.0)
+
+        # bedGraph, fixedStep and variableStep sections
+        sections = [
+            (0, 0, 200, struct.pack('<IIIIIBBH', 0, 0, 200, 0, 0, 1, 0, 2)
+                + struct.pack('<IIf', 0, 100, 1.5)
+                + struct.pack('<IIf', 100, 200, 2.5)),
+            (0, 200, 325, struct.pack('<IIIIIBBH', 0, 200, 325, 50, 25, 3, 0, 3)
+                + struct.pack('<fff', 3, 4, 5)),
+            (1, 5, 60, struct.pack('<IIIIIBBH', 1, 5, 60, 0, 10, 2, 0, 2)
+                + struct.pack('<If', 5, -1) + struct.pack('<If', 50, 2))
+        ]
+        data_offset = summary_offset + len(summary)
+        data = b''
+        leaf_items = []
+        for chrom_id, start, end, section in sections:
+            block = zlib.compress(section)
+            leaf_items.append(struct.pack('<IIIIQQ', chrom_id, start,
+                chrom_id, end, data_offset + len(data), len(block)))
+            data += block
+
+        index_offset = data_offset + len(data)
+        index = struct.pack('<IIQIIIIQII', RTREE_MAGIC, 256, 3,
+            0, 0, 1, 60, index_offset, 512, 0)
+        root_offset = index_offset + len(index)
+        leaf1_offset = root_offset + 4 + 2 * 24
+        leaf2_offset = leaf1_offset + 4 + 2 * 32
+        index += struct.pack('<BBH', 0, 0, 2)
+        index += struct.pack('<IIIIQ', 0, 0, 0, 325, leaf1_offset)
+        index += struct.pack('<IIIIQ', 1, 5, 1, 60, leaf2_offset)
+        index += struct.pack('<BBH', 1, 0, 2) + leaf_items[0] + leaf_items[1]
+        index += struct.pack('<BBH', 1, 0, 1) + leaf_items[2]
+
+        header = struct.pack('<IHHQQQHHQQIQ',
+            BIGWIG_MAGIC, 4, 0, chrom_tree_offset, data_offset, index_offset,
+            0, 0, 0, summary_offset, 1024, 0)
+        self.assertEqual(len(header), 64)
+        self._associate(header + chrom_tree + summary + data + index)
+        return [struct.unpack_from('<Q', x, 16)[0] for x in leaf_items]
+
+    def test_bigwig_header(self):
+        '''
+        Tests that we read the chromosomes and summary from a
+        BigWig file.
+        '''
+        self._create_bigwig()
+
+        contents = BigWigFileResource().get_contents(self.r)
+        self.assertEqual(contents, {
+            'version': 4,
+            'zoom_levels': 0,
+            'chromosomes': [
+                {'name': 'chr1', 'length': 1000},
+                {'name': 'chr22', 'length': 500}
+            ],
+            'summary': {
+                'bases_covered': 100,
+                'min': -1.0,
+                'max': 3.0,
+                'mean': 1.5
+            }
+        })
+
+    def test_bigwig_region(self):
+        '''
+        Tests that we read the values in a region using the
+        index, reading only the overlapping data blocks.
+        '''
+        block_offsets = self._create_bigwig()
+        with mock.patch('api.storage.LocalResourceStorage.read_byte_range',
+            autospec=True, side_effect=LocalResourceStorage.read_byte_range) as mock_read:
+            contents = BigWigFileResource().get_contents(self.r,
+                {'chrom': 'chr1', 'start': '150', 'end': '260'})
+            read_offsets = [x[0][2] for x in mock_read.call_args_list]
+        self.assertEqual(contents, [
+            {'chrom': 'chr1', 'start': 100, 'end': 200, 'value': 2.5},
+            {'chrom': 'chr1', 'start': 200, 'end': 225, 'value': 3.0},
+            {'chrom': 'chr1', 'start': 250, 'end': 275, 'value': 4.0},
+        ])
+        # the adjacent blocks are read together and the
+        # block for the other chromosome is not read
+        self.assertEqual(read_offsets.count(block_offsets[0]), 1)
+        self.assertFalse(block_offsets[1] in read_offsets)
+        self.assertFalse(block_offsets[2] in read_offsets)
+
+        contents = BigWigFileResource().get_contents(self.r, {'chrom': 'chr22'})
+        self.assertEqual(contents, [
+            {'chrom': 'chr22', 'start': 5, 'end': 15, 'value': -1.0},
+            {'chrom': 'chr22', 'start': 50, 'end': 60, 'value': 2.0},
+        ])
+
+        contents = BigWigFileResource().get_contents(self.r,
+            {'chrom': 'chr1', 'start': 500})
+        self.assertEqual(contents, [])
+
+        with mock.patch('resource_types.genomic_display_types.BIGWIG_MAX_REGION_RECORDS', 2):
+            with self.assertRaises(ParseException):
+                BigWigFileResource().get_contents(self.r, {'chrom': 'chr1'})
+
+        # regions with too much data are rejected before reading any blocks
+        with mock.patch('resource_types.genomic_display_types.BIGWIG_MAX_REGION_BYTES', 10):
+            with mock.patch('api.storage.LocalResourceStorage.read_byte_range',
+                autospec=True, side_effect=LocalResourceStorage.read_byte_range) as mock_read:
+                with self.assertRaises(ParseException):
+                    BigWigFileResource().get_contents(self.r, {'chrom': 'chr1'})
+                read_offsets = [x[0][2] for x in mock_read.call_args_list]
+            self.assertFalse(block_offsets[0] in read_offsets)
+
+        # adjacent blocks are read separately if they exceed the read size
+        with mock.patch('resource_types.genomic_display_types.BIGWIG_MAX_READ_BYTES', 10):
+            with mock.patch('api.storage.LocalResourceStorage.read_byte_range',
+                autospec=True, side_effect=LocalResourceStorage.read_byte_range) as mock_read:
+                contents = BigWigFileResource().get_contents(self.r, {'chrom': 'chr1'})
+                read_offsets = [x[0][2] for x in mock_read.call_args_list]
+            self.assertEqual(len(contents), 5)
+            self.assertTrue(block_offsets[1] in read_offsets)
+
+        for params in [{'chrom': 'chrX'}, {'chrom': 'chr1', 'start': 'a'},
+            {'chrom': 'chr1', 'start': 100, 'end': 50}]:
+            with self.assertRaises(ParseException):
+                BigWigFileResource().get_contents(self.r, params)
+
+    def test_non_bigwig_raises_ex(self):
+        self._associate(b'\x00' * 100)
+        with self.assertRaises(ParseException):
+            BigWigFileResource().get_contents(self.r)
+
+
+class TestStreamedContentsPagination(BaseAPITestCase):
+
+    def _get_request(self, url):
+        return Request(APIRequestFactory().get(url))
+
+    def test_links(self):
+        paginator = StreamedContentsPagination()
+        request = self._get_request('/api/resources/abc/contents/?page=2&page_size=2')
+        page = StreamedContentsPage([{'a': 1}], 2, True)
+        records = paginator.paginate_queryset(page, request)
+        response = paginator.get_paginated_response(records)
+        self.assertEqual(response.data['results'], [{'a': 1}])
+        self.assertTrue('page=3' in response.data['next'])
+        self.assertTrue('page=1' in response.data['previous'])
+
+        page = StreamedContentsPage([{'a': 1}], 1, False)
+        paginator.paginate_queryset(page, request)
+        response = paginator.get_paginated_response(records)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_empty_page(self):
+        paginator = StreamedContentsPagination()
+        request = self._get_request('/api/resources/abc/contents/?page=3')
+        with self.assertRaises(NotFound):
+            paginator.paginate_queryset(StreamedContentsPage([], 3, False), request)
+
+        # an empty first page (e.g. an empty file) is fine
+        records = paginator.paginate_queryset(
+            StreamedContentsPage([], 1, False), request)
+        self.assertEqual(records, [])
+
+    def test_requires_page(self):
+        paginator = StreamedContentsPagination()
+        request = self._get_request('/api/resources/abc/contents/?page=1')
+        with self.assertRaises(NonIterableContentsException):
+            paginator.paginate_queryset([{'a': 1}], request)
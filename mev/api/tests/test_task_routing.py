@@ -0,0 +1,56 @@
+from mev.celery_app import app, \
+    TASK_ROUTES, \
+    DEFAULT_QUEUE, \
+    JOB_CONTROL_QUEUE, \
+    HOUSEKEEPING_QUEUE, \
+    PUBLIC_DATA_QUEUE, \
+    MAX_TASK_PRIORITY, \
+    INTERACTIVE_TASK_PRIORITY, \
+    DEFAULT_TASK_PRIORITY
+
+from api.tests.base import BaseAPITestCase
+
+
+class TaskRoutingTests(BaseAPITestCase):
+
+    def _route(self, task_name, **options):
+        return app.amqp.router.route(options, task_name)
+
+    def test_routed_tasks_exist(self):
+        '''
+        Guards against renaming a task without updating the routes,
+        which would silently send it to the default queue.
+        '''
+        app.loader.import_default_modules()
+        for name in TASK_ROUTES.keys():
+            self.assertTrue(name in app.tasks)
+
+    def test_routes(self):
+        options = self._route('finalize_executed_op')
+        self.assertEqual(options['queue'].name, JOB_CONTROL_QUEUE)
+        self.assertEqual(options['priority'], INTERACTIVE_TASK_PRIORITY)
+
+        options = self._route('delete_file')
+        self.assertEqual(options['queue'].name, HOUSEKEEPING_QUEUE)
+
+        # no explicit priority, so the default applies when sent
+        options = self._route('create_dataset_from_params')
+        self.assertEqual(options['queue'].name, PUBLIC_DATA_QUEUE)
+        self.assertFalse('priority' in options)
+        self.assertEqual(app.conf.task_default_priority, DEFAULT_TASK_PRIORITY)
+
+        # unrouted tasks go to the default queue
+        options = self._route('mev.celery_app.debug_task')
+        self.assertEqual(options['queue'].name, DEFAULT_QUEUE)
+
+    def test_caller_priority_overrides_route(self):
+        options = self._route('validate_resource', priority=0)
+        self.assertEqual(options['priority'], 0)
+
+    def test_queue_priorities(self):
+        queues = app.amqp.queues
+        self.assertEqual(
+            queues[JOB_CONTROL_QUEUE].queue_arguments['x-max-priority'],
+            MAX_TASK_PRIORITY)
+        # the existing default queue is declared as before
+        self.assertFalse(queues[DEFAULT_QUEUE].queue_arguments)
@@ -0,0 +1,71 @@
+import unittest.mock as mock
+
+from django.test import RequestFactory, override_settings
+
+from mev.upload_handler import UploadProgressCachedHandler
+
+from api.tests.base import BaseAPITestCase
+
+
+@override_settings(UPLOAD_PROGRESS_PERCENT_STEP=10,
+    UPLOAD_PROGRESS_BYTES_STEP=None,
+    UPLOAD_PROGRESS_INTERVAL=None)
+class TestUploadProgressHandler(BaseAPITestCase):
+
+    def setUp(self):
+        request = RequestFactory().post('/', HTTP_X_PROGRESS_ID='abc')
+        self.handler = UploadProgressCachedHandler(request)
+        self.cache_key = '127.0.0.1_abc'
+
+    def _upload(self, num_chunks, chunk):
+        for i in range(num_chunks):
+            self.handler.receive_data_chunk(chunk, i * len(chunk))
+
+    @mock.patch('mev.upload_handler.cache')
+    def test_progress_written_at_percent_steps(self, mock_cache):
+        self.handler.handle_raw_input(None, {}, 1000, None)
+        mock_cache.set.assert_called_once_with(self.cache_key,
+            {'length': 1000, 'uploaded': 0})
+
+        # 100 chunks of 10 bytes. We only write every 10%
+        self._upload(100, b'x' * 10)
+        self.assertEqual(mock_cache.set.call_count, 11)
+        mock_cache.set.assert_called_with(self.cache_key,
+            {'length': 1000, 'uploaded': 1000})
+        mock_cache.get.assert_not_called()
+
+        self.handler.upload_complete()
+        mock_cache.delete.assert_called_once_with(self.cache_key)
+
+    @override_settings(UPLOAD_PROGRESS_PERCENT_STEP=None,
+        UPLOAD_PROGRESS_BYTES_STEP=250)
+    @mock.patch('mev.upload_handler.cache')
+    def test_progress_written_at_byte_steps(self, mock_cache):
+        self.handler.handle_raw_input(None, {}, 1000, None)
+        self._upload(100, b'x' * 10)
+        self.assertEqual(mock_cache.set.call_count, 5)
+
+    @override_settings(UPLOAD_PROGRESS_PERCENT_STEP=None,
+        UPLOAD_PROGRESS_INTERVAL=5)
+    @mock.patch('mev.upload_handler.time')
+    @mock.patch('mev.upload_handler.cache')
+    def test_progress_written_at_intervals(self, mock_cache, mock_time):
+        mock_time.monotonic.return_value = 100
+        self.handler.handle_raw_input(None, {}, 1000, None)
+        self._upload(10, b'x' * 10)
+        self.assertEqual(mock_cache.set.call_count, 1)
+        mock_time.monotonic.return_value = 106
+        self._upload(1, b'x' * 10)
+        self.assertEqual(mock_cache.set.call_count, 2)
+        mock_cache.set.assert_called_with(self.cache_key,
+            {'length': 1000, 'uploaded': 110})
+
+    @mock.patch('mev.upload_handler.cache')
+    def test_untracked_upload(self, mock_cache):
+        request = RequestFactory().post('/')
+        handler = UploadProgressCachedHandler(request)
+        handler.handle_raw_input(None, {}, 1000, None)
+        self.assertEqual(handler.receive_data_chunk(b'abc', 0), b'abc')
+        handler.upload_complete()
+        mock_cache.set.assert_not_called()
+        mock_cache.delete.assert_not_called()
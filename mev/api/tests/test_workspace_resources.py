@@ -1,14 +1,22 @@
 import uuid
 import unittest.mock as mock
+from io import BytesIO
 
 from django.urls import reverse
+from django.core.files import File
 from django.core.exceptions import ImproperlyConfigured
+from django.test import override_settings
 from rest_framework import status
 
 from constants import MATRIX_KEY, \
     TSV_FORMAT
 
-from api.models import Resource, Workspace
+from api.models import Resource, \
+    Workspace, \
+    Operation, \
+    WorkspaceExecutedOperation, \
+    ExecutedOperationResource
+from api.utilities.resource_utilities import create_resource
 from api.tests.base import BaseAPITestCase
 
 
@@ -481,4 +489,136 @@ class WorkspaceResourceRemoveTests(BaseAPITestCase):
         current_assoc_workspaces = set([x.pk for x in r.workspaces.all()])
         self.assertEqual(
             original_assoc_workspaces,
-            current_assoc_workspaces)
\ No newline at end of file
+            current_assoc_workspaces)
+
+
+class WorkspaceResourceBulkTests(BaseAPITestCase):
+
+    def setUp(self):
+        self.establish_clients()
+        self.workspace = Workspace.objects.create(owner=self.regular_user_1)
+        self.add_url = reverse('workspace-resource-bulk-add',
+            kwargs={'workspace_pk': self.workspace.pk})
+        self.remove_url = reverse('workspace-resource-bulk-remove',
+            kwargs={'workspace_pk': self.workspace.pk})
+        self.resources = [self._create_resource(self.regular_user_1)
+            for i in range(5)]
+        self.uuids = [str(r.pk) for r in self.resources]
+
+    def _create_resource(self, owner, is_active=True, validated=True):
+        with BytesIO() as fh:
+            r = create_resource(owner,
+                file_handle=File(fh, 'f.tsv'),
+                name='f.tsv',
+                is_active=is_active
+            )
+        if validated:
+            r.resource_type = MATRIX_KEY
+            r.file_format = TSV_FORMAT
+            r.save()
+        self.addCleanup(r.datafile.delete)
+        return r
+
+    def _workspace_uuids(self):
+        return [str(x) for x in
+            self.workspace.resources.values_list('pk', flat=True)]
+
+    def test_requires_auth(self):
+        for url in [self.add_url, self.remove_url]:
+            response = self.regular_client.post(url,
+                data={'resource_uuids': self.uuids}, format='json')
+            self.assertTrue((response.status_code == status.HTTP_401_UNAUTHORIZED)
+                | (response.status_code == status.HTTP_403_FORBIDDEN))
+
+    def test_bad_payload(self):
+        for payload in [{}, {'resource_uuids': []}, {'resource_uuids': ['abc']}]:
+            response = self.authenticated_regular_client.post(self.add_url,
+                data=payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(MAX_WORKSPACE_RESOURCE_BULK_SIZE=3):
+            response = self.authenticated_regular_client.post(self.add_url,
+                data={'resource_uuids': self.uuids}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._workspace_uuids(), [])
+
+    def test_bad_workspace(self):
+        url = reverse('workspace-resource-bulk-add',
+            kwargs={'workspace_pk': uuid.uuid4()})
+        response = self.authenticated_regular_client.post(url,
+            data={'resource_uuids': self.uuids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_add_and_remove(self):
+        self.resources[0].workspaces.add(self.workspace)
+        # repeated UUIDs are only added once. The number of queries
+        # does not depend on the number of resources.
+        with self.assertNumQueries(6):
+            response = self.authenticated_regular_client.post(self.add_url,
+                data={'resource_uuids': self.uuids + self.uuids[:2]},
+                format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        j = response.json()
+        self.assertCountEqual(j['added'], self.uuids[1:])
+        self.assertEqual(j['unchanged'], self.uuids[:1])
+        self.assertCountEqual(self._workspace_uuids(), self.uuids)
+
+        response = self.authenticated_regular_client.post(self.remove_url,
+            data={'resource_uuids': self.uuids[:3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCountEqual(response.json()['removed'], self.uuids[:3])
+        self.assertCountEqual(self._workspace_uuids(), self.uuids[3:])
+
+    def test_add_is_all_or_nothing(self):
+        inactive = self._create_resource(self.regular_user_1, is_active=False)
+        not_validated = self._create_resource(self.regular_user_1, validated=False)
+        other_owner = self._create_resource(self.regular_user_2)
+        missing = str(uuid.uuid4())
+        response = self.authenticated_regular_client.post(self.add_url,
+            data={'resource_uuids': self.uuids + [str(inactive.pk),
+                str(not_validated.pk), str(other_owner.pk), missing]},
+            format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['resource_uuids'], {
+            'not_found': [missing],
+            'different_owner': [str(other_owner.pk)],
+            'inactive': [str(inactive.pk)],
+            'not_validated': [str(not_validated.pk)]
+        })
+        self.assertEqual(self._workspace_uuids(), [])
+
+    def test_other_users_cannot_change_workspace(self):
+        workspace = Workspace.objects.create(owner=self.regular_user_2)
+        for url_name in ['workspace-resource-bulk-add', 'workspace-resource-bulk-remove']:
+            url = reverse(url_name, kwargs={'workspace_pk': workspace.pk})
+            response = self.authenticated_regular_client.post(url,
+                data={'resource_uuids': self.uuids}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(workspace.resources.count(), 0)
+
+    def test_remove_is_all_or_nothing(self):
+        for r in self.resources[:3]:
+            r.workspaces.add(self.workspace)
+        op = Operation.objects.create(id=str(uuid.uuid4()))
+        ex_op = WorkspaceExecutedOperation.objects.create(
+            owner=self.regular_user_1,
+            workspace=self.workspace,
+            operation=op,
+            mode='foo'
+        )
+        ExecutedOperationResource.objects.create(executed_operation=ex_op,
+            resource_uuid=self.uuids[0], role=ExecutedOperationResource.INPUT)
+        response = self.authenticated_regular_client.post(self.remove_url,
+            data={'resource_uuids': self.uuids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        problems = response.json()['resource_uuids']
+        self.assertEqual(problems['used_in_operations'], self.uuids[:1])
+        self.assertCountEqual(problems['not_in_workspace'], self.uuids[3:])
+        self.assertCountEqual(self._workspace_uuids(), self.uuids[:3])
+
+        # resources used by failed jobs can be removed
+        ex_op.job_failed = True
+        ex_op.save()
+        response = self.authenticated_regular_client.post(self.remove_url,
+            data={'resource_uuids': self.uuids[:3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._workspace_uuids(), [])
@@ -15,8 +15,8 @@ class TestWorkspaceTree(BaseAPITestCase):
     def setUp(self):
         self.establish_clients()
 
-    @mock.patch('api.views.workspace_tree_views.WorkspaceTreeBase.create_workspace_dag')
-    def test_tree_response(self, mock_create_workspace_dag):
+    @mock.patch('api.views.workspace_tree_views.get_workspace_dag')
+    def test_tree_response(self, mock_get_workspace_dag):
         workspaces = Workspace.objects.filter(owner=self.regular_user_1)
         if len(workspaces) == 0:
             raise ImproperlyConfigured('Need at least one workspace to run this')
@@ -29,13 +29,29 @@ class TestWorkspaceTree(BaseAPITestCase):
             {'id': 'foo'},
             {'id': 'bar'}
         ]
-        mock_create_workspace_dag.return_value = expected_response
+        mock_get_workspace_dag.return_value = mock.MagicMock(
+            nodes=expected_response,
+            version=1,
+            last_modified=datetime.datetime.now())
         response = self.authenticated_regular_client.get(url)
         response_json = response.json() 
         self.assertEqual(expected_response, response_json)       
 
-    @mock.patch('api.views.workspace_tree_views.WorkspaceTreeBase.create_workspace_dag')
-    def test_rejects_other_user(self, mock_create_workspace_dag):
+        # the client has the current version
+        etag = response['ETag']
+        response = self.authenticated_regular_client.get(url,
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # ... but not after the DAG changes
+        mock_get_workspace_dag.return_value.version = 2
+        response = self.authenticated_regular_client.get(url,
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    @mock.patch('api.views.workspace_tree_views.get_workspace_dag')
+    def test_rejects_other_user(self, mock_get_workspace_dag):
         '''
         The workspace is owned by someone else, so the request should fail
         with a 403
@@ -52,8 +68,8 @@ class TestWorkspaceTree(BaseAPITestCase):
         self.assertEqual(403, response.status_code)  
 
 
-    @mock.patch('api.views.workspace_tree_views.WorkspaceTreeBase.create_workspace_dag')
-    def test_rejects_bad_workspace_uuid(self, mock_create_workspace_dag):
+    @mock.patch('api.views.workspace_tree_views.get_workspace_dag')
+    def test_rejects_bad_workspace_uuid(self, mock_get_workspace_dag):
         '''
         The workspace arg doesn't reference a valid workspace
         '''
@@ -69,12 +85,12 @@ class TestWorkspaceTreeSave(BaseAPITestCase):
     def setUp(self):
         self.establish_clients()
 
-    @mock.patch('api.views.workspace_tree_views.WorkspaceTreeBase.create_workspace_dag')
+    @mock.patch('api.views.workspace_tree_views.get_workspace_dag')
     @mock.patch('api.views.workspace_tree_views.datetime')
     @mock.patch('api.views.workspace_tree_views.initiate_resource_validation')
     def test_tree_response(self, mock_initiate_resource_validation, \
         mock_datetime, \
-        mock_create_workspace_dag):
+        mock_get_workspace_dag):
 
         workspaces = Workspace.objects.filter(owner=self.regular_user_1)
         if len(workspaces) == 0:
@@ -88,7 +104,8 @@ class TestWorkspaceTreeSave(BaseAPITestCase):
             {'id': 'foo'},
             {'id': 'bar'}
         ]
-        mock_create_workspace_dag.return_value = expected_content
+        mock_get_workspace_dag.return_value = mock.MagicMock(
+            nodes=expected_content)
 
         now = datetime.datetime.now()
         mock_datetime.datetime.now.return_value = now
@@ -36,12 +36,17 @@ urlpatterns = [
     path('resources/<uuid:pk>/contents/', api.views.ResourceContents.as_view(), name='resource-contents'),
     path('resources/<uuid:pk>/contents/preview/', api.views.ResourcePreview.as_view(), name='resource-preview'),
     path('resources/<uuid:pk>/contents/transform/', api.views.ResourceContentTransform.as_view(), name='resource-contents-transform'),
+    path('resources/contents-cache-stats/', api.views.ResourceContentsCacheStats.as_view(), name='resource-contents-cache-stats'),
     path('resources/add-bucket-resources/', api.views.AddBucketResourceView.as_view(), name='bucket-resource-add'),
     path('resources/<uuid:pk>/metadata/', api.views.ResourceMetadataView.as_view(), name='resource-metadata-detail'),
     path('resources/<uuid:pk>/metadata/observations/', api.views.ResourceMetadataObservationsView.as_view(), name='resource-metadata-observations'),
     path('resources/<uuid:pk>/metadata/features/', api.views.ResourceMetadataFeaturesView.as_view(), name='resource-metadata-features'),
     path('resources/<uuid:pk>/metadata/parent/', api.views.ResourceMetadataParentOperationView.as_view(), name='resource-metadata-parent-operation'),
     path('resources/upload/', api.views.ResourceUploadView.as_view(), name='resource-upload'),
+    path('resources/upload/direct/', api.views.DirectUploadInitiate.as_view(), name='direct-upload'),
+    path('resources/upload/direct/<uuid:pk>/parts/', api.views.DirectUploadPartUrls.as_view(), name='direct-upload-parts'),
+    path('resources/upload/direct/<uuid:pk>/complete/', api.views.DirectUploadComplete.as_view(), name='direct-upload-complete'),
+    path('resources/upload/direct/<uuid:pk>/abort/', api.views.DirectUploadAbort.as_view(), name='direct-upload-abort'),
 
     path('resources/dropbox-upload/', api.views.DropboxUpload.as_view(), name='dropbox-upload'),
     path('resources/signed-url/<uuid:pk>/', api.views.ResourceSignedUrl.as_view(), name='signed-resource-url'),
@@ -60,6 +65,8 @@ urlpatterns = [
     path('workspaces/<uuid:workspace_pk>/resources/', api.views.WorkspaceResourceList.as_view(), name='workspace-resource-list'),
     path('workspaces/<uuid:workspace_pk>/resources/<uuid:resource_pk>/remove/', api.views.WorkspaceResourceRemove.as_view(), name='workspace-resource-remove'),
     path('workspaces/<uuid:workspace_pk>/resources/add/', api.views.WorkspaceResourceAdd.as_view(), name='workspace-resource-add'),
+    path('workspaces/<uuid:workspace_pk>/resources/bulk-add/', api.views.WorkspaceResourceBulkAdd.as_view(), name='workspace-resource-bulk-add'),
+    path('workspaces/<uuid:workspace_pk>/resources/bulk-remove/', api.views.WorkspaceResourceBulkRemove.as_view(), name='workspace-resource-bulk-remove'),
 
     # endpoints for working with metadata
     path('workspaces/<uuid:workspace_pk>/metadata/observations/', api.views.WorkspaceMetadataObservationsView.as_view(), name='workspace-observations-metadata'),
@@ -79,9 +86,11 @@ urlpatterns = [
     path('operations/add/', api.views.OperationCreate.as_view(), name='operation-create'),
     path('operations/<uuid:operation_uuid>/', api.views.OperationDetail.as_view(), name='operation-detail'),
     path('operations/<uuid:pk>/update/', api.views.OperationUpdate.as_view(), name='operation-update'),
+    path('operations/<uuid:operation_uuid>/resource-usage/', api.views.OperationResourceUsage.as_view(), name='operation-resource-usage'),
     path('operations/run/', api.views.OperationRun.as_view(), name='operation-run'),
     path('executed-operations/', api.views.ExecutedOperationList.as_view(), name='executed-operation-list'),
     path('non-workspace-executed-operations/', api.views.NonWorkspaceExecutedOperationList.as_view(), name='non-workspace-executed-operation-list'),
+    path('executed-operations/status-stream/', api.views.ExecutedOperationStatusStream.as_view(), name='executed-operation-status-stream'),
     path('executed-operations/workspace/<uuid:workspace_pk>/', api.views.WorkspaceExecutedOperationList.as_view(), name='workspace-executed-operation-list'),
     path('executed-operations/workspace/<uuid:workspace_pk>/tree/', api.views.WorkspaceTreeView.as_view(), name='executed-operation-tree'),
     path('executed-operations/workspace/<uuid:workspace_pk>/tree/save/', api.views.WorkspaceTreeSave.as_view(), name='executed-operation-tree-save'),
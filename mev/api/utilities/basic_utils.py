@@ -213,7 +213,19 @@ def read_local_file(filepath):
         ))
         raise ex
 
-def recursive_copy(src, dest, include_hidden=False, overwrite=False):
+def link_or_copy(src, dest):
+    '''
+    Hardlinks `src` to `dest`, which avoids copying the data. Falls
+    back to a copy if a link can't be made (e.g. if the paths are on
+    different filesystems).
+    '''
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+def recursive_copy(src, dest, include_hidden=False, overwrite=False, hardlink=False):
     '''
     Performs a recursive copy from src to dest
 
@@ -221,6 +233,10 @@ def recursive_copy(src, dest, include_hidden=False, overwrite=False):
 
     By default, this skips "hidden" directories (defined
     as those that begin with a dot ".").
+
+    If `hardlink` is True, files are linked rather than copied
+    where possible. Only use this if the files will not be edited
+    in-place, since such edits would be seen in both locations.
     '''
     logger.info('Perform a recursive copy from {src}-->{dest}'.format(
         src=src,
@@ -252,12 +268,14 @@ def recursive_copy(src, dest, include_hidden=False, overwrite=False):
                 ret.append(x)
         return ret 
 
+    copy_function = link_or_copy if hardlink else shutil.copy2
     if not include_hidden:
         logger.info('Will skip hidden files.')
-        shutil.copytree(src, dest, ignore=skip_hidden)
+        shutil.copytree(src, dest, ignore=skip_hidden,
+            copy_function=copy_function)
     else:
         logger.info('Copying all, including hidden files.')
-        shutil.copytree(src, dest)
+        shutil.copytree(src, dest, copy_function=copy_function)
 
 def run_shell_command(cmd):
     '''
@@ -1,7 +1,9 @@
 import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
+from django.core.cache import caches
 
 from api.utilities.basic_utils import run_shell_command
 from api.utilities.admin_utils import alert_admins
@@ -26,8 +28,20 @@ def get_tag_format(docker_repo_prefix):
     return registry.TAG_FORMAT 
 
 
-def check_image_exists(img_str):
-    logger.info('Check if {img} exists.'.format(img = img_str))
+def _get_image_exists_cache():
+    return caches[settings.DOCKER_IMAGE_EXISTS_CACHE_ALIAS]
+
+
+def _get_image_exists_key(img_str):
+    return 'docker_image_exists:{img}'.format(img=img_str)
+
+
+def locate_image(img_str):
+    '''
+    Returns a boolean indicating whether the image could be located.
+    The manifest lookup does not download the image, so it is tried
+    first. If the registry does not support that, we pull the image.
+    '''
     manifest_cmd = 'docker manifest inspect {img}'.format(img = img_str)
     try:
         stdout, stderr = run_shell_command(manifest_cmd)
@@ -35,7 +49,7 @@ def check_image_exists(img_str):
         return True
     except Exception as ex:
         logger.info('Docker image by manifest lookup failed. Attemping a pull')
-    
+
     try:
         pull_image(img_str)
         return True
@@ -43,6 +57,43 @@ def check_image_exists(img_str):
         return False
 
 
+def check_image_exists(img_str):
+    '''
+    Returns a boolean indicating whether the image can be located.
+    Located images are cached, so ingesting new revisions of an
+    operation which use the same image does not look it up again.
+    Images which were not found are looked up each time.
+    '''
+    logger.info('Check if {img} exists.'.format(img = img_str))
+    cache = _get_image_exists_cache()
+    key = _get_image_exists_key(img_str)
+    if cache.get(key):
+        logger.info(f'Image {img_str} was previously located.')
+        return True
+
+    if not locate_image(img_str):
+        return False
+    cache.set(key, True, settings.DOCKER_IMAGE_EXISTS_CACHE_TIMEOUT)
+    return True
+
+
+def check_images_exist(img_strs):
+    '''
+    Checks that each of the images in `img_strs` can be located. The
+    checks are independent, so they are performed concurrently (at most
+    settings.MAX_CONCURRENT_IMAGE_CHECKS at once).
+
+    Returns a dict mapping each image to a boolean indicating whether
+    it was found.
+    '''
+    img_strs = list(img_strs)
+    if len(img_strs) == 0:
+        return {}
+    with ThreadPoolExecutor(
+        max_workers=settings.MAX_CONCURRENT_IMAGE_CHECKS) as executor:
+        return dict(zip(img_strs, executor.map(check_image_exists, img_strs)))
+
+
 def get_image_name_and_tag(git_repository_name, commit_hash):
     container_registry = get_container_registry()
     org = settings.DOCKER_REPO_ORG
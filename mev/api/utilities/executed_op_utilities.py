@@ -3,8 +3,7 @@ import os
 
 from django.conf import settings
 
-from api.models import WorkspaceExecutedOperation
-from api.utilities.operations import get_operation_instance_data
+from api.models import ExecutedOperationResource
 from data_structures.data_resource_attributes import get_all_data_resource_typenames
 
 logger = logging.getLogger(__name__)
@@ -64,67 +63,61 @@ def collect_resource_uuids(op_input_or_output, exec_op_input_or_output):
     return resource_uuids
 
 
+def record_resource_usage(executed_op, op_data, role):
+    '''
+    Records the Resources used as inputs or outputs (depending on `role`)
+    of an ExecutedOperation so that we can later query for their usage.
+
+    `executed_op` is an instance of api.models.ExecutedOperation
+    `op_data` is the dict representation of the Operation, which gives
+    the types of the inputs/outputs
+    `role` is one of ExecutedOperationResource.INPUT or OUTPUT
+    '''
+    if role == ExecutedOperationResource.INPUT:
+        op_input_or_output = op_data['inputs']
+        exec_op_input_or_output = executed_op.inputs
+    else:
+        op_input_or_output = op_data['outputs']
+        exec_op_input_or_output = executed_op.outputs
+    if exec_op_input_or_output is None:
+        return
+    resource_uuids = set(
+        collect_resource_uuids(op_input_or_output, exec_op_input_or_output))
+    ExecutedOperationResource.objects.bulk_create([
+        ExecutedOperationResource(
+            executed_operation_id=executed_op.pk,
+            resource_uuid=u,
+            role=role
+        ) for u in resource_uuids], ignore_conflicts=True)
+
+
 def check_for_resource_operations(resource_instance, workspace_instance):
     '''
     To prevent deleting critical resources, we check to see if a
     `Resource` instance has been used for any operations within a
     `Workspace`.  If it has, return True.  Otherwise return False.
+
+    Failed operations are ignored.
     '''
-    # need to look through all the executed operations to see if the 
-    # resource was used in any of those, either as an input or output
     logger.info('Search within workspace ({w}) to see if resource ({r}) was used.'.format(
         w = str(workspace_instance.pk),
         r = str(resource_instance.pk)
     ))
-    workspace_executed_ops = WorkspaceExecutedOperation.objects.filter(workspace=workspace_instance)
-    for exec_op in workspace_executed_ops:
-        if exec_op.job_failed:
-            logger.info('Skipping inspection of job ({u}) since it failed.'.format(u = str(exec_op.pk)))
-            continue
-        logger.info('Look in executedOp: {u}'.format(u = str(exec_op.pk)))
-        # get the corresponding operation spec:
-        op = exec_op.operation
-        op_data = get_operation_instance_data(op)
-
-        # the operation spec will tell us what the "types" of each input/output are
-        op_inputs = op_data['inputs']
-        op_outputs = op_data['outputs']
-
-        # the executed ops will have the actual args used. So, for a DataResource
-        # "type", it will be a UUID
-        exec_op_inputs = exec_op.inputs
-        exec_op_outputs = exec_op.outputs
-
-        if exec_op_inputs is not None:
-            # list of dataResources used in the inputs of this executed op:
-            logger.info('Compare inputs:\n{x}\nto\n{y}'.format(
-                x = op_inputs,
-                y = exec_op_inputs
-            ))
-            s1 = collect_resource_uuids(op_inputs, exec_op_inputs)
-            logger.info('Found the following DataResources among'
-                ' the inputs: {u}'.format(
-                    u = ', '.join(s1)
-                ))
-            if str(resource_instance.pk) in s1:
-                return True
-            logger.info('Was not in the inputs. Check the outputs.')
-        else:
-            logger.info('Inputs to the ExecutedOp were None. Moving on.')
-        if exec_op_outputs is not None:
-            s2 = collect_resource_uuids(op_outputs, exec_op_outputs)
-            logger.info('Found the following DataResources among'
-            ' the outputs: {u}'.format(
-                u = ', '.join(s2)
-            ))
-            if str(resource_instance.pk) in s2:
-                return True
-            logger.info('Was not in the outputs. Done checking ExecutedOp ({u}).'.format(
-                u = str(exec_op.pk)
-            ))
-        else:
-            logger.info('Outputs of the ExecutedOp were None. Moving on.')
-    
-    # if we made it this far and have not returned, then the Resource was
-    # not used in any of the ExecutedOps in the Workspace
-    return False
+    return ExecutedOperationResource.objects.filter(
+        resource_uuid=resource_instance.pk,
+        executed_operation__workspaceexecutedoperation__workspace=workspace_instance,
+        executed_operation__job_failed=False
+    ).exists()
+
+
+def get_resources_used_in_workspace(resource_uuids, workspace_instance):
+    '''
+    A set-based version of `check_for_resource_operations`. Returns the
+    subset of `resource_uuids` which were used by (non-failed) operations
+    within the `Workspace`, using a single query.
+    '''
+    return set(ExecutedOperationResource.objects.filter(
+        resource_uuid__in=resource_uuids,
+        executed_operation__workspaceexecutedoperation__workspace=workspace_instance,
+        executed_operation__job_failed=False
+    ).values_list('resource_uuid', flat=True).distinct())
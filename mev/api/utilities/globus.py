@@ -4,6 +4,7 @@ import string
 import time
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import globus_sdk
 from globus_sdk import TransferAPIError, \
@@ -11,6 +12,7 @@ from globus_sdk import TransferAPIError, \
 
 from django.conf import settings
 from django.core.files.storage import default_storage
+from django.db import connections
 
 from exceptions import NonexistentGlobusTokenException, \
     GlobusTransferPermissionsError
@@ -23,6 +25,17 @@ logger = logging.getLogger(__name__)
 GLOBUS_UPLOAD = '__globus_upload__'
 GLOBUS_DOWNLOAD = '__globus_download__'
 
+# The statuses of Globus transfer tasks which are finished. Note that
+# in-progress tasks are "ACTIVE" or "INACTIVE"
+GLOBUS_TASK_COMPLETED_STATUSES = ('SUCCEEDED', 'FAILED')
+
+# Globus limits the number of task IDs in a single status query
+MAX_TASKS_PER_STATUS_QUERY = 50
+
+# the status of each copy performed by `perform_concurrent_copies`
+COPY_SUCCEEDED = 'succeeded'
+COPY_FAILED = 'failed'
+
 
 def random_string(length=12):
     '''
@@ -442,6 +455,80 @@ def submit_transfer(transfer_client, transfer_data):
     return task_id
 
 
+def get_transfer_tasks(transfer_client, task_ids):
+    '''
+    Returns a dict mapping Globus transfer task IDs to the task
+    document returned by Globus, which includes the status
+    (e.g. "ACTIVE", "SUCCEEDED") and the endpoints of the transfer.
+
+    `transfer_client` is an endpoint manager client (see
+    `create_endpoint_manager_transfer_client`) so that we can query
+    the tasks of all users in a small number of requests. Each
+    request can return multiple pages, so we use the paginated
+    variant of the task list.
+    '''
+    tasks = {}
+    for i in range(0, len(task_ids), MAX_TASKS_PER_STATUS_QUERY):
+        paginator = transfer_client.paginated.endpoint_manager_task_list(
+            filter_task_id=task_ids[i:i + MAX_TASKS_PER_STATUS_QUERY])
+        for task_info in paginator.items():
+            tasks[task_info['task_id']] = task_info
+    return tasks
+
+
+def infer_transfer_direction(task_info):
+    '''
+    Given a task document returned by Globus, returns whether
+    the transfer was to (GLOBUS_UPLOAD) or from (GLOBUS_DOWNLOAD)
+    WebMeV. Used for transfers which were recorded before we tracked
+    the direction.
+    '''
+    if task_info.get('destination_endpoint_id') == settings.GLOBUS_ENDPOINT_ID:
+        return GLOBUS_UPLOAD
+    return GLOBUS_DOWNLOAD
+
+
+def perform_concurrent_copies(copy_fn, items):
+    '''
+    Calls `copy_fn` on each of `items` (e.g. paths or Resource instances)
+    using a bounded pool of threads (settings.MAX_CONCURRENT_BUCKET_COPIES).
+    The copies are independent, so a failed copy does not stop the others.
+
+    Returns a list (in the same order as `items`) of dicts giving the
+    status of each copy, e.g.
+    {
+        'item': <item>,
+        'status': COPY_SUCCEEDED,
+        'result': <return value of copy_fn>,
+        'error': None
+    }
+    '''
+    def copy(item):
+        try:
+            result = copy_fn(item)
+            return {
+                'item': item,
+                'status': COPY_SUCCEEDED,
+                'result': result,
+                'error': None
+            }
+        except Exception as ex:
+            logger.info(f'Failed to copy {item}. Reason: {ex}')
+            return {
+                'item': item,
+                'status': COPY_FAILED,
+                'result': None,
+                'error': str(ex)
+            }
+        finally:
+            # the worker threads each hold their own database connection
+            connections.close_all()
+
+    with ThreadPoolExecutor(
+        max_workers=settings.MAX_CONCURRENT_BUCKET_COPIES) as executor:
+        return list(executor.map(copy, items))
+
+
 def post_upload(task_id, user):
     '''
     Handles the post-upload behavior following a Globus transfer
@@ -451,6 +538,8 @@ def post_upload(task_id, user):
     to avoid the situation where a user's session expires prior
     to the completion of the transfer. If that happens, then 
     clients based on the user's credentials will fail with a 403.
+
+    Returns the status of each file copy (see `perform_concurrent_copies`)
     '''
     transfer_client = create_endpoint_manager_transfer_client()
 
@@ -460,21 +549,29 @@ def post_upload(task_id, user):
     #for info in transfer_client.endpoint_manager_task_successful_transfers(task_id):
     response = transfer_client.get(
         f"endpoint_manager/task/{task_id}/successful_transfers")
-    for info in response.data['DATA']:
-        # this is relative to the Globus bucket
-        rel_path = info['destination_path']
-        path = f'{S3_PREFIX}{settings.GLOBUS_BUCKET}{rel_path}'
+    # the destination paths are relative to the Globus bucket
+    paths = [f'{S3_PREFIX}{settings.GLOBUS_BUCKET}{info["destination_path"]}'
+        for info in response.data['DATA']]
+
+    def copy_to_storage(path):
         # Note that even if Globus says the transfer is complete,
         # we can have a race condition where the copy does not work
         # since boto3 can't (yet) locate the source object. Thus,
         # we wait before attempting the copy
         default_storage.wait_until_exists(path)
-        default_storage.create_resource_from_interbucket_copy(
+        r = default_storage.create_resource_from_interbucket_copy(
             user,
             path
         )
         # remove the intermediate file in the globus bucket now that
         # it's stored in the "main" webmev storage
         default_storage.delete_object(path)
-    
-    #TODO: handle transfer failures
+        return r
+
+    copy_status = perform_concurrent_copies(copy_to_storage, paths)
+    failed_paths = [x['item'] for x in copy_status
+        if x['status'] == COPY_FAILED]
+    if len(failed_paths) > 0:
+        alert_admins(f'Following the Globus transfer {task_id}, failed'
+            f' to copy the following files into storage: {failed_paths}')
+    return copy_status
@@ -1,6 +1,9 @@
 import json
 import os
 import uuid
+import fcntl
+import shlex
+import hashlib
 import logging
 import subprocess as sp
 import shutil
@@ -17,7 +20,9 @@ from data_structures.data_resource_attributes import get_all_data_resource_typen
 from data_structures.operation import Operation
 
 from api.models import Operation as OperationDbModel
-from api.utilities.basic_utils import recursive_copy
+from api.utilities.basic_utils import recursive_copy, \
+    make_local_directory, \
+    run_shell_command
 from api.utilities.operations import read_operation_json
 from api.runners import get_runner, AVAILABLE_RUNNERS
 
@@ -133,28 +138,99 @@ def retrieve_repo_name(git_dir):
             return final_piece
 
 
-def clone_repository(url):
+def get_repository_mirror_dir(url):
     '''
-    This clones the repository and returns the destination dir
+    Returns the path to the local (bare) repository which
+    caches the commits fetched from the repository at `url`
+    '''
+    url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(settings.OPERATION_REPO_CACHE_DIR, url_hash + '.git')
+
+
+def fetch_to_mirror(url, commit_id=None):
+    '''
+    Fetches a commit from the repository at `url` into the local mirror,
+    creating the mirror if necessary. If `commit_id` is None, we fetch
+    the commit at the head of the default branch.
+
+    Only the single commit (and not its history) is fetched and the
+    objects already in the mirror are not transferred again, so
+    re-ingesting a large repository is quick.
+
+    Returns the full hash of the fetched commit.
+    '''
+    if not os.path.exists(settings.OPERATION_REPO_CACHE_DIR):
+        make_local_directory(settings.OPERATION_REPO_CACHE_DIR)
+    mirror_dir = get_repository_mirror_dir(url)
+    ref = commit_id if commit_id else 'HEAD'
+
+    # other workers may be ingesting from the same repository
+    with open(mirror_dir + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not os.path.exists(mirror_dir):
+            logger.info(f'Create a local mirror of {url} at {mirror_dir}')
+            run_shell_command(f'git init --quiet --bare {mirror_dir}')
+
+        git_cmd = f'git -C {mirror_dir}'
+        try:
+            run_shell_command(f'{git_cmd} fetch --quiet --depth=1'
+                f' {shlex.quote(url)} {shlex.quote(ref)}')
+            rev = 'FETCH_HEAD'
+        except Exception as ex:
+            # Servers only allow fetching full commit hashes or refs.
+            # Others (e.g. abbreviated hashes) require the full history.
+            logger.info(f'Could not directly fetch {ref} from {url}.'
+                ' Fetching the full history instead.')
+            unshallow = '--unshallow' if os.path.exists(
+                os.path.join(mirror_dir, 'shallow')) else ''
+            run_shell_command(f'{git_cmd} fetch --quiet {unshallow}'
+                f' {shlex.quote(url)} +refs/heads/*:refs/heads/*'
+                ' +refs/tags/*:refs/tags/*')
+            rev = ref
+        stdout, stderr = run_shell_command(
+            f'{git_cmd} rev-parse --verify {shlex.quote(rev + "^{commit}")}')
+        commit_hash = stdout.strip().decode('utf-8')
+
+        # keep a reference so the commit is not garbage-collected
+        run_shell_command(f'{git_cmd} update-ref'
+            f' refs/ingested/{commit_hash} {commit_hash}')
+    return commit_hash
+
+
+def clone_repository(url, commit_id=None):
+    '''
+    This checks out the repository (at `commit_id`, or the head of the
+    default branch if None) and returns the destination dir.
+
+    The commit is fetched through the local mirror (see `fetch_to_mirror`)
+    and only the commit itself is checked out, without any history. Any
+    paths given in settings.OPERATION_REPO_SPARSE_EXCLUDES are skipped.
     '''
     uuid_str = str(uuid.uuid4())
     dest = os.path.join(settings.CLONE_STAGING_DIR, uuid_str)
-    clone_cmd = 'git clone %s %s' % (url, dest)
-    clone_cmd = clone_cmd.split(' ')
-    logger.info('About to clone repository with command: {cmd}'.format(
-        cmd=clone_cmd
-    ))
-    p = sp.Popen(clone_cmd, stdout=sp.PIPE, stderr=sp.STDOUT)
-    stdout, stderr = p.communicate()
-
-    if p.returncode != 0:
-        logger.error('Problem when cloning the repository.\n'
-                     ' STDERR was: {stderr}\n'
-                     ' STDOUT was: {stdout}'.format(
-                         stderr=stderr,
-                         stdout=stdout
-                     )
-                     )
+    logger.info(f'About to check out repository at {url} to {dest}')
+    try:
+        commit_hash = fetch_to_mirror(url, commit_id)
+        mirror_dir = get_repository_mirror_dir(url)
+
+        run_shell_command(f'git init --quiet {dest}')
+        git_cmd = f'git -C {dest}'
+        # the repository name is later inferred from the remote
+        run_shell_command(f'{git_cmd} remote add origin {shlex.quote(url)}')
+        if len(settings.OPERATION_REPO_SPARSE_EXCLUDES) > 0:
+            run_shell_command(f'{git_cmd} config core.sparseCheckout true')
+            patterns = ['/*'] + [f'!{x}'
+                for x in settings.OPERATION_REPO_SPARSE_EXCLUDES]
+            with open(os.path.join(dest, '.git', 'info', 'sparse-checkout'), 'w') as fout:
+                fout.write('\n'.join(patterns) + '\n')
+        run_shell_command(f'{git_cmd} fetch --quiet --depth=1'
+            f' {mirror_dir} {commit_hash}')
+        run_shell_command(f'{git_cmd} checkout --quiet --detach FETCH_HEAD')
+    except Exception as ex:
+        logger.error(f'Problem when checking out the repository at {url}.'
+            f' Exception was: {ex}')
+        if os.path.exists(dest):
+            shutil.rmtree(dest)
         raise Exception('Failed when cloning the repository. See logs.')
     logger.info('Completed clone.')
     return dest
@@ -231,12 +307,10 @@ def perform_operation_ingestion(repository_url, op_uuid, commit_id, overwrite=Fa
     # Check that we can find this
     check_for_repo(repository_url)
 
-    # pull from the repository:
-    staging_dir = clone_repository(repository_url)
+    # pull from the repository, checking out the commit (if provided):
+    staging_dir = clone_repository(repository_url, commit_id)
 
     if commit_id:
-        # if provided with a commit ID, check that out
-        checkout_branch(staging_dir, commit_id)
         git_hash = commit_id
     else:
         git_hash = retrieve_commit_hash(staging_dir)
@@ -388,13 +462,17 @@ def save_operation(op_data, staging_dir, overwrite):
                 f' this operation at {dest_dir}')
 
     # copy the cloned directory and include the .git folder
-    # and any other hidden files/dirs:
+    # and any other hidden files/dirs. The staging directory is
+    # removed afterward, so we link the files rather than copying.
     recursive_copy(staging_dir, dest_dir,
-                   include_hidden=True, overwrite=overwrite)
+                   include_hidden=True, overwrite=overwrite, hardlink=True)
 
     # overwrite the spec file just to ensure it's valid with our
     # current serializer implementation. Technically it wouldn't validate
-    # if that weren't true, but we do it here either way.
+    # if that weren't true, but we do it here either way. The linked
+    # file is removed first so that it is not edited in-place.
     op_fileout = os.path.join(dest_dir, settings.OPERATION_SPEC_FILENAME)
+    if os.path.exists(op_fileout):
+        os.remove(op_fileout)
     with open(op_fileout, 'w') as fout:
         fout.write(json.dumps(op_data))
@@ -0,0 +1,141 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+from api.models import ExecutedOperation
+from api.utilities.admin_utils import alert_admins
+from api.utilities.nextflow_utils import READABLE_STATES, \
+    NEXTFLOW_COMPLETED, \
+    NEXTFLOW_ERROR
+from api.utilities.nextflow_trace import create_task_trace, \
+    save_task_traces
+
+logger = logging.getLogger(__name__)
+
+# Once a job has reached one of these states, the (buffered) status
+# of a running process should not overwrite it. Otherwise a flush which
+# happens after the job has completed would prevent it from finalizing.
+FINAL_STATES = [
+    NEXTFLOW_COMPLETED,
+    NEXTFLOW_ERROR,
+    READABLE_STATES[NEXTFLOW_ERROR],
+    ExecutedOperation.FINALIZING,
+    ExecutedOperation.COMPLETION_SUCCESS,
+    ExecutedOperation.COMPLETION_ERROR,
+    ExecutedOperation.FINALIZING_ERROR,
+    ExecutedOperation.ADMIN_NOTIFIED
+]
+
+
+class NextflowEventBuffer(object):
+    '''
+    Collects the events that Nextflow sends while a run is in progress
+    (e.g. process_submitted) so that we don't make a database request
+    for each one. Only the most recent status of each run is kept and
+    the statuses are written in a few bulk updates. The task traces
+    sent with completed processes are saved in bulk at the same time. The buffer is written once it has received
+    NEXTFLOW_EVENT_BUFFER_SIZE events or NEXTFLOW_EVENT_FLUSH_INTERVAL
+    seconds after the first buffered event.
+
+    Note that the buffer is specific to each process, so the status
+    endpoint must be served by a single process (see the
+    gunicorn_nextflow program in the deployment). Otherwise the
+    final event, which is not buffered, flushes only the buffer of
+    the process which received it, and the statuses can be written
+    out of order. Callers should `flush` before handling a final
+    event. A flush can still land after the final event (e.g. from a
+    timer that already held the events), so it never overwrites
+    FINAL_STATES.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer = None
+        self._reset()
+
+    def _reset(self):
+        # maps the run name to the latest status
+        self._statuses = {}
+        # maps the run name to a list of task traces
+        self._traces = defaultdict(list)
+        self._num_events = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def __len__(self):
+        return self._num_events
+
+    def add(self, run_name, event, trace=None):
+        with self._lock:
+            self._statuses[run_name] = READABLE_STATES[event]
+            if trace is not None:
+                self._traces[run_name].append(trace)
+            self._num_events += 1
+            should_flush = self._num_events >= settings.NEXTFLOW_EVENT_BUFFER_SIZE
+            if (not should_flush) and (self._timer is None):
+                self._timer = threading.Timer(
+                    settings.NEXTFLOW_EVENT_FLUSH_INTERVAL, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if should_flush:
+            self.flush()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception as ex:
+            logger.error(f'Failed to write buffered Nextflow events. Reason: {ex}')
+        finally:
+            # the timer runs in its own thread, so close the
+            # connection(s) it opened
+            connections.close_all()
+
+    def flush(self):
+        with self._lock:
+            statuses = self._statuses
+            traces = self._traces
+            self._reset()
+        run_names = set(statuses.keys()).union(traces.keys())
+        if len(run_names) == 0:
+            return
+
+        op_pks = defaultdict(list)
+        for job_id, pk in ExecutedOperation.objects.filter(
+            job_id__in=run_names).values_list('job_id', 'pk'):
+            op_pks[job_id].append(pk)
+        invalid_runs = [x for x in run_names if len(op_pks[x]) != 1]
+        if len(invalid_runs) > 0:
+            alert_admins('Unexpected application state encountered when querying for'
+                ' Nextflow jobs. Expected a single database object for each, but the'
+                f' following did not match: {", ".join(sorted(invalid_runs))}'
+            )
+
+        # a single update for each distinct status, skipping
+        # jobs which have already finished
+        runs_by_status = defaultdict(list)
+        for run_name, status in statuses.items():
+            if run_name not in invalid_runs:
+                runs_by_status[status].append(run_name)
+        for status, runs in runs_by_status.items():
+            ExecutedOperation.objects.filter(job_id__in=runs) \
+                .exclude(status__in=FINAL_STATES) \
+                .exclude(status=status) \
+                .update(status=status)
+
+        save_task_traces([create_task_trace(op_pks[run_name][0], trace)
+            for run_name, run_traces in traces.items()
+            if run_name not in invalid_runs
+            for trace in run_traces])
+
+
+event_buffer = NextflowEventBuffer()
+atexit.register(event_buffer.flush)
@@ -0,0 +1,107 @@
+import logging
+
+import pandas as pd
+from django.conf import settings
+from django.db.models import Count
+
+from api.models import NextflowTaskTrace
+
+logger = logging.getLogger(__name__)
+
+# The status Nextflow reports for a task that completed successfully.
+# Only these are used when aggregating resource usage since failed
+# tasks can end early (or run out of memory) and skew the numbers.
+TASK_COMPLETED_STATUS = 'COMPLETED'
+
+# The aggregated metrics and the quantiles we report for each
+USAGE_METRICS = ['realtime', 'peak_rss']
+USAGE_QUANTILES = {'p50': 0.5, 'p95': 0.95}
+
+
+def _to_number(val, cast):
+    '''
+    Nextflow does not always report a trace field (e.g. if the
+    task was cached). Returns None if `val` can't be converted.
+    '''
+    try:
+        return cast(val)
+    except (TypeError, ValueError):
+        return None
+
+
+def create_task_trace(executed_operation_pk, trace):
+    '''
+    Returns an (unsaved) NextflowTaskTrace given the `trace`
+    dict that Nextflow sends with a process event.
+    '''
+    return NextflowTaskTrace(
+        executed_operation_id=executed_operation_pk,
+        task_id=trace['task_id'],
+        process=trace['process'],
+        name=trace.get('name') or '',
+        status=trace.get('status') or '',
+        exit_code=_to_number(trace.get('exit'), int),
+        cpu_percent=_to_number(trace.get('%cpu'), float),
+        peak_rss=_to_number(trace.get('peak_rss'), int),
+        realtime=_to_number(trace.get('realtime'), int),
+        read_bytes=_to_number(trace.get('read_bytes'), int),
+        write_bytes=_to_number(trace.get('write_bytes'), int)
+    )
+
+
+def save_task_traces(task_traces):
+    '''
+    Saves the (unsaved) NextflowTaskTrace instances in bulk. The traces
+    are buffered along with the other Nextflow events (see
+    api/utilities/nextflow_events.py), so this is called once per flush.
+    '''
+    if len(task_traces) == 0:
+        return
+    try:
+        NextflowTaskTrace.objects.bulk_create(task_traces,
+            batch_size=settings.NEXTFLOW_TRACE_BATCH_SIZE)
+    except Exception as ex:
+        # the traces are only used for analytics so we don't
+        # want a failure here to affect the job itself.
+        logger.error(f'Failed to save {len(task_traces)} Nextflow task'
+            f' traces. Reason: {ex}')
+
+
+def get_process_resource_usage(operation_pk):
+    '''
+    Aggregates the traces of all the successful tasks run for
+    the Operation identified by `operation_pk`. Returns a list
+    with the number of tasks and quantiles of the runtime
+    (in milliseconds) and peak memory (in bytes) for each process.
+
+    The number of tasks is counted in the database. Since operations
+    can accumulate many traces, the quantiles are computed from (at most)
+    the NEXTFLOW_USAGE_MAX_SAMPLES most recent tasks of each process.
+    '''
+    completed_traces = NextflowTaskTrace.objects.filter(
+        executed_operation__operation_id=operation_pk,
+        status=TASK_COMPLETED_STATUS
+    )
+    process_counts = completed_traces.values('process') \
+        .annotate(num_tasks=Count('pk')) \
+        .order_by('process')
+
+    usage = []
+    for item in process_counts:
+        process = item['process']
+        traces = completed_traces.filter(process=process) \
+            .order_by('-pk') \
+            .values_list(*USAGE_METRICS)[:settings.NEXTFLOW_USAGE_MAX_SAMPLES]
+        df = pd.DataFrame.from_records(list(traces), columns=USAGE_METRICS)
+        process_usage = {
+            'process': process,
+            'num_tasks': item['num_tasks']
+        }
+        for metric in USAGE_METRICS:
+            values = df[metric].dropna().astype(float)
+            process_usage[metric] = {
+                k: (values.quantile(q) if values.size > 0 else None)
+                for k, q in USAGE_QUANTILES.items()
+            }
+        usage.append(process_usage)
+    return usage
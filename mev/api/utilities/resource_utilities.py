@@ -1,9 +1,11 @@
 import os
+import hashlib
 import logging
 
 from django.db.utils import OperationalError
 from rest_framework.exceptions import ValidationError
 from django.core.files.storage import default_storage
+from django.utils.http import quote_etag
 
 from exceptions import NoResourceFoundException, \
     InactiveResourceException, \
@@ -29,6 +31,7 @@ from resource_types import get_contents, \
     get_standard_format, \
     RESOURCE_TYPES_WITHOUT_CONTENTS_VIEW, \
     RESOURCE_MAPPING
+from resource_types.json_contents import delete_json_sidecars
 
 from api.utilities.admin_utils import alert_admins
 
@@ -110,6 +113,9 @@ def delete_resource_by_pk(resource_pk):
         message = 'Failed to delete Resource ({pk}) from the database.'
         logger.info(message)
         alert_admins(message)
+        return
+    # local files derived from the resource are no longer needed
+    delete_json_sidecars(resource_pk)
 
 def set_resource_to_inactive(resource_instance):
     '''
@@ -145,6 +151,33 @@ def get_resource_view(resource_instance, query_params={}, preview=False):
     else:
         return get_contents(resource_instance, query_params, preview=preview)
 
+def get_resource_etag(resource_instance, query_params={}, tag=''):
+    '''
+    Returns an ETag (a quoted string) identifying a view of the resource.
+    It changes whenever the resource is modified (e.g. its file
+    is replaced or its type changes) so that clients can make
+    conditional requests and we can avoid reading the file.
+
+    `query_params` is a dict-like (e.g. a QueryDict) of the request
+    parameters, which change the view (e.g. filtering). `tag` is a
+    string which can distinguish views of the same resource, such as
+    a preview versus the full contents.
+    '''
+    if hasattr(query_params, 'lists'):
+        params = sorted((k, sorted(v)) for k, v in query_params.lists())
+    else:
+        params = sorted((k, str(v)) for k, v in query_params.items())
+    s = ':'.join([
+        str(resource_instance.pk),
+        str(resource_instance.datafile.name),
+        str(resource_instance.size),
+        str(resource_instance.resource_type),
+        resource_instance.modification_datetime.isoformat(),
+        tag,
+        str(params)
+    ])
+    return quote_etag(hashlib.md5(s.encode('utf-8')).hexdigest())
+
 def get_resource_paginator(resource_type):
     '''
     Depending on how a data resource is represented in the backend,
@@ -478,6 +511,35 @@ def initiate_resource_validation(resource_instance, requested_resource_type, fil
     # save changes    
     resource_instance.save()
 
+def register_trusted_resource(resource_instance, resource_type, file_format, table):
+    '''
+    For table-based files which were generated by MEV itself from a known
+    schema (e.g. subsets of public datasets), we can skip validation, which
+    would re-read and parse the file we just wrote.
+
+    `table` is the pandas DataFrame that was written to the file (in the
+    standard format for `resource_type`). Metadata is extracted directly from
+    that dataframe.
+
+    Raises an exception if the resource could not be registered, in which case
+    callers should fall back to the usual validation.
+    '''
+    resource_class_instance = retrieve_resource_class_instance(resource_type)
+    if file_format != resource_class_instance.STANDARD_FORMAT:
+        raise Exception(f'The format ({file_format}) was not the standard'
+            f' format for resource type {resource_type}.')
+
+    logger.info(f'Registering trusted resource ({resource_instance.pk}) with'
+        f' type {resource_type} and shape {table.shape}.')
+    resource_class_instance.table = table
+    handle_valid_resource(resource_instance, resource_class_instance)
+
+    resource_instance.resource_type = resource_type
+    resource_instance.file_format = file_format
+    resource_instance.status = Resource.READY
+    resource_instance.is_active = True
+    resource_instance.save()
+
 def resource_supports_pagination(resource_type_str):
     logger.info('Check if resource type "{t}" supports pagination.'.format(
         t = resource_type_str
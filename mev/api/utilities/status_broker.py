@@ -0,0 +1,214 @@
+import time
+import queue
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+
+def get_status_event(executed_op):
+    '''
+    Returns the (JSON-compatible) dict describing the status
+    of an api.models.ExecutedOperation which is sent to subscribers.
+    '''
+    return {
+        'id': str(executed_op.pk),
+        'status': executed_op.status,
+        'job_failed': executed_op.job_failed,
+        'is_finalizing': executed_op.is_finalizing,
+        'completed': executed_op.execution_stop_datetime is not None
+    }
+
+
+class LocalStatusSubscription(object):
+
+    def __init__(self, broker, user_pk):
+        self.broker = broker
+        self.user_pk = user_pk
+        self.queue = queue.Queue()
+
+    def get(self, timeout):
+        '''
+        Returns a list of the events received, waiting up
+        to `timeout` seconds for the first.
+        '''
+        try:
+            events = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalStatusBroker(object):
+    '''
+    Passes status events between threads of a single process. Useful
+    for development and testing, but events published by other processes
+    (e.g. Celery workers) are not received.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def publish(self, user_pk, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions[str(user_pk)])
+        for s in subscriptions:
+            s.queue.put(event)
+
+    def subscribe(self, user_pk):
+        s = LocalStatusSubscription(self, str(user_pk))
+        with self._lock:
+            self._subscriptions[s.user_pk].add(s)
+        return s
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions[subscription.user_pk].discard(subscription)
+            if len(self._subscriptions[subscription.user_pk]) == 0:
+                self._subscriptions.pop(subscription.user_pk)
+
+
+class CacheStatusSubscription(object):
+
+    def __init__(self, broker, user_pk):
+        self.broker = broker
+        self.user_pk = user_pk
+        # only events published after subscribing are received
+        self.last_seq = broker.get_sequence_number(user_pk)
+
+    def get(self, timeout):
+        '''
+        Returns a list of the events received, checking the cache
+        every STATUS_BROKER_POLL_INTERVAL seconds for up to `timeout`
+        seconds.
+        '''
+        deadline = time.monotonic() + timeout
+        while True:
+            seq = self.broker.get_sequence_number(self.user_pk)
+            if seq < self.last_seq:
+                # the counter was evicted from the cache and restarted
+                self.last_seq = 0
+            if seq > self.last_seq:
+                events = self.broker.get_events(self.user_pk, self.last_seq + 1, seq)
+                self.last_seq = seq
+                return events
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(settings.STATUS_BROKER_POLL_INTERVAL, remaining))
+
+    def close(self):
+        pass
+
+
+class CacheStatusBroker(object):
+    '''
+    Passes status events through the cache, so that events published
+    by any process (e.g. Celery workers) reach the subscribers in the
+    web server processes. Each user has a counter of published events and
+    each event is kept under a key derived from that counter. Subscribers
+    poll the counter, which is cheaper than querying the database.
+
+    Note that this requires a cache which is shared between processes
+    (e.g. Redis) and which supports atomic increments. The counters do
+    not expire, so the cache should not evict them. If one is evicted
+    anyway, subscribers detect the restarted counter (see
+    CacheStatusSubscription).
+    '''
+    KEY_PREFIX = 'exec_op_status'
+
+    def __init__(self):
+        # The file-based cache is shared between processes, but its
+        # increments are not atomic and culling can remove the counters
+        if isinstance(self._get_cache(), FileBasedCache):
+            raise ImproperlyConfigured('The cache status broker requires a'
+                ' cache with atomic increments, such as Redis.')
+
+    def _get_cache(self):
+        return caches[settings.STATUS_BROKER_CACHE_ALIAS]
+
+    def _seq_key(self, user_pk):
+        return f'{self.KEY_PREFIX}:{user_pk}:seq'
+
+    def _event_key(self, user_pk, seq):
+        return f'{self.KEY_PREFIX}:{user_pk}:{seq}'
+
+    def get_sequence_number(self, user_pk):
+        return self._get_cache().get(self._seq_key(user_pk)) or 0
+
+    def get_events(self, user_pk, start, end):
+        '''
+        Returns the events numbered `start` to `end` (inclusive) which
+        are still in the cache.
+        '''
+        keys = [self._event_key(user_pk, i) for i in range(start, end + 1)]
+        found = self._get_cache().get_many(keys)
+        return [found[k] for k in keys if k in found]
+
+    def publish(self, user_pk, event):
+        cache = self._get_cache()
+        seq_key = self._seq_key(user_pk)
+        # `add` and `incr` are atomic so that concurrent
+        # publishers get distinct numbers
+        cache.add(seq_key, 0, timeout=None)
+        seq = cache.incr(seq_key)
+        cache.set(self._event_key(user_pk, seq), event,
+            timeout=settings.STATUS_BROKER_EVENT_TIMEOUT)
+
+    def subscribe(self, user_pk):
+        return CacheStatusSubscription(self, user_pk)
+
+
+STATUS_BROKER_CHOICES = {
+    'local': LocalStatusBroker,
+    'cache': CacheStatusBroker
+}
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_status_broker():
+    '''
+    Returns the (per-process) instance of the status broker
+    chosen in the Django settings, or None if the status
+    events are disabled.
+    '''
+    global _broker
+    if settings.STATUS_BROKER is None:
+        return None
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = STATUS_BROKER_CHOICES[settings.STATUS_BROKER]()
+    return _broker
+
+
+def publish_status(executed_op):
+    '''
+    Publishes the current status of an api.models.ExecutedOperation to
+    the subscribers of its owner. Failures are only logged since status
+    events are a convenience for clients and should not affect jobs.
+    '''
+    try:
+        broker = get_status_broker()
+        if broker is not None:
+            broker.publish(executed_op.owner_id,
+                get_status_event(executed_op))
+    except Exception as ex:
+        logger.error('Failed to publish status of executed op'
+            f' {executed_op.pk}. Reason: {ex}')
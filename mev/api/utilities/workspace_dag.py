@@ -0,0 +1,248 @@
+import logging
+
+from django.db import transaction
+
+from data_structures.dag_components import SimpleDag, DagNode
+from data_structures.data_resource_attributes import DataResourceAttribute, \
+    VariableDataResourceAttribute, \
+    OperationDataResourceAttribute
+
+from api.models import Workspace, \
+    WorkspaceExecutedOperation, \
+    WorkspaceDag, \
+    ExecutedOperationResource
+from api.utilities.operations import get_operation_instance_data
+from api.utilities.resource_utilities import get_resource_by_pk
+
+logger = logging.getLogger(__name__)
+
+
+DATARESOURCE_TYPES = [
+    DataResourceAttribute,
+    VariableDataResourceAttribute,
+    OperationDataResourceAttribute
+]
+DATARESOURCE_TYPENAMES = [x.typename for x in DATARESOURCE_TYPES]
+
+
+def create_executed_op_dag(exec_op):
+    '''
+    Returns a list of the (serialized) DAG nodes for a single
+    ExecutedOperation (database model), i.e. the node for the operation
+    and those for its input and output resources.
+    '''
+    # don't want to show failed jobs
+    if exec_op.job_failed:
+        return []
+
+    graph = SimpleDag()
+
+    # we need the operation definition to know if any of the inputs
+    # were DataResources
+    op = exec_op.operation
+    op_data = get_operation_instance_data(op)
+
+    # the operation spec will tell us what the "types" of each input/output are
+    op_inputs = op_data['inputs']
+    op_outputs = op_data['outputs']
+
+    # the executed ops will have the actual args used. So, for a DataResource
+    # "type", it will be a UUID
+    exec_op_inputs = exec_op.inputs
+    exec_op_outputs = exec_op.outputs
+
+    # create a spec for the executed op that includes the operation spec
+    # and the actual inputs/outputs
+    full_op_data = {
+        'op_spec': op_data,
+        'inputs': exec_op_inputs,
+        'outputs': exec_op_outputs
+    }
+
+    # create a node for the operation
+    op_node = DagNode(str(exec_op.pk), 
+        DagNode.OP_NODE, 
+        node_name = op_data['name'],
+        op_data = full_op_data)
+    graph.add_node(op_node)
+
+    for k,v in exec_op_inputs.items():
+        # compare with the expected type:
+        op_input_definition = op_inputs[k]
+        op_spec = op_input_definition['spec']
+        input_type = op_spec['attribute_type']
+        if input_type in DATARESOURCE_TYPENAMES:
+            r = get_resource_by_pk(v)
+            resource_node = graph.get_or_create_node(
+                str(v), 
+                DagNode.DATARESOURCE_NODE, 
+                node_name = r.name)
+            op_node.add_parent(resource_node)
+
+    # show the outputs if the operation has completed
+    if exec_op.execution_stop_datetime and exec_op_outputs:
+        for k,v in exec_op_outputs.items():
+            # compare with the expected type:
+            op_output_definition = op_outputs[k]
+            op_spec = op_output_definition['spec']
+            output_type = op_spec['attribute_type']
+            if output_type in DATARESOURCE_TYPENAMES:
+                if v is not None:
+                    r = get_resource_by_pk(v)
+                    resource_node = graph.get_or_create_node(
+                        str(v), 
+                        DagNode.DATARESOURCE_NODE, 
+                        node_name = r.name)
+                    resource_node.add_parent(op_node)
+
+    # The nodes are held in sets, so we sort them (operation first)
+    # to get a consistent representation which we can compare.
+    nodes = graph.serialize()
+    for node in nodes:
+        node['parentIds'] = sorted(node['parentIds'])
+    return sorted(nodes,
+        key=lambda x: (x['node_type'] != DagNode.OP_NODE, x['id']))
+
+
+def merge_dag_fragments(fragments):
+    '''
+    Merges lists of serialized DAG nodes (see `create_executed_op_dag`)
+    into a single list. A resource can appear in multiple lists (e.g. as the
+    output of one operation and the input of another), in which case
+    the parents of the nodes are combined.
+    '''
+    merged = {}
+    for fragment in fragments:
+        for node in fragment:
+            key = (node['id'], node['node_type'])
+            if key in merged:
+                parent_ids = merged[key]['parentIds']
+                parent_ids.extend(
+                    [x for x in node['parentIds'] if x not in parent_ids])
+            else:
+                merged[key] = dict(node, parentIds=list(node['parentIds']))
+    return list(merged.values())
+
+
+def create_workspace_dag(workspace_executed_ops):
+    '''
+    Returns a DAG (a list of serialized nodes) representing the resources
+    and operations contained in a workspace
+
+    `workspace_executed_ops` is a set of ExecutedOperation (database model) objects
+    '''
+    return merge_dag_fragments(
+        [create_executed_op_dag(x) for x in workspace_executed_ops])
+
+
+def _lock_workspace(workspace_pk):
+    '''
+    Locks the Workspace (until the end of the transaction) so that
+    changes to its DAG, including a full build, are applied one at a time.
+    '''
+    Workspace.objects.select_for_update().get(pk=workspace_pk)
+
+
+def build_workspace_dag(workspace):
+    '''
+    Builds the DAG for all of the executed operations
+    in `workspace`. Saves and returns the WorkspaceDag.
+    '''
+    with transaction.atomic():
+        _lock_workspace(workspace.pk)
+        executed_ops = WorkspaceExecutedOperation.objects.filter(
+            workspace=workspace).select_related('operation')
+        fragments = {str(x.pk): create_executed_op_dag(x) for x in executed_ops}
+        dag, created = WorkspaceDag.objects.get_or_create(workspace=workspace)
+        dag.fragments = fragments
+        dag.nodes = merge_dag_fragments(fragments.values())
+        dag.version += 1
+        dag.save()
+    return dag
+
+
+def get_workspace_dag(workspace):
+    '''
+    Returns the WorkspaceDag for `workspace`, building it if
+    it does not exist yet.
+    '''
+    try:
+        return WorkspaceDag.objects.get(workspace=workspace)
+    except WorkspaceDag.DoesNotExist:
+        return build_workspace_dag(workspace)
+
+
+def _update_fragments(workspace_pk, update_fn):
+    '''
+    Applies `update_fn` to the fragments of the stored DAG and saves
+    the DAG if they changed. If there is no stored DAG, it will be
+    built in full when it is first requested, so there is nothing to do.
+
+    If the update fails, the stored DAG is removed (and rebuilt
+    when next requested) rather than leaving it out of date.
+    '''
+    try:
+        with transaction.atomic():
+            _lock_workspace(workspace_pk)
+            try:
+                dag = WorkspaceDag.objects.get(workspace_id=workspace_pk)
+            except WorkspaceDag.DoesNotExist:
+                return
+            if update_fn(dag.fragments):
+                dag.nodes = merge_dag_fragments(dag.fragments.values())
+                dag.version += 1
+                dag.save()
+    except Exception as ex:
+        logger.error(f'Failed to update the DAG of workspace {workspace_pk}.'
+            f' Removing it so it is rebuilt. Reason: {ex}')
+        WorkspaceDag.objects.filter(workspace_id=workspace_pk).delete()
+
+
+def update_workspace_dag(executed_op):
+    '''
+    Updates the stored DAG following a change to `executed_op` (e.g. it
+    was submitted or completed). Only the nodes of that operation are
+    recreated. Operations which are not associated with a workspace
+    are ignored.
+    '''
+    if not isinstance(executed_op, WorkspaceExecutedOperation):
+        return
+
+    def update_fn(fragments):
+        key = str(executed_op.pk)
+        fragment = create_executed_op_dag(executed_op)
+        if fragments.get(key) == fragment:
+            return False
+        fragments[key] = fragment
+        return True
+
+    _update_fragments(executed_op.workspace_id, update_fn)
+
+
+def rename_resource_in_dags(resource):
+    '''
+    Updates the name of `resource` in the stored DAGs of the
+    workspaces where it was used by an operation.
+    '''
+    resource_pk = str(resource.pk)
+    workspace_pks = ExecutedOperationResource.objects.filter(
+        resource_uuid=resource.pk,
+        executed_operation__workspaceexecutedoperation__isnull=False
+    ).values_list(
+        'executed_operation__workspaceexecutedoperation__workspace',
+        flat=True
+    ).distinct()
+
+    def update_fn(fragments):
+        changed = False
+        for fragment in fragments.values():
+            for node in fragment:
+                if (node['id'] == resource_pk) \
+                    and (node['node_type'] == DagNode.DATARESOURCE_NODE) \
+                    and (node['node_name'] != resource.name):
+                    node['node_name'] = resource.name
+                    changed = True
+        return changed
+
+    for workspace_pk in workspace_pks:
+        _update_fragments(workspace_pk, update_fn)
@@ -1,5 +1,6 @@
 from .api_root import ApiRoot
-from .nextflow_views import NextflowStatusView
+from .nextflow_views import NextflowStatusView, \
+    OperationResourceUsage
 from .user_views import UserList, \
     UserDetail, \
     UserRegisterView, \
@@ -15,14 +16,17 @@ from .resource_views import ResourceList, \
     ResourceContents, \
     ResourcePreview, \
     AddBucketResourceView, \
-    ResourceContentTransform
+    ResourceContentTransform, \
+    ResourceContentsCacheStats
 from .resource_download import ResourceDownload, \
     ResourceSignedUrl
 from .operation_resource_views import OperationResourceList, \
     OperationResourceFieldList
 from .workspace_resource_views import WorkspaceResourceList, \
     WorkspaceResourceAdd, \
-    WorkspaceResourceRemove
+    WorkspaceResourceRemove, \
+    WorkspaceResourceBulkAdd, \
+    WorkspaceResourceBulkRemove
 from .workspace_metadata_views import WorkspaceMetadataObservationsView, \
     WorkspaceMetadataFeaturesView
 from .metadata_operations_views import MetadataIntersectView, \
@@ -30,7 +34,11 @@ from .metadata_operations_views import MetadataIntersectView, \
     MetadataSetDifferenceView
 from .workspace_tree_views import WorkspaceTreeView, WorkspaceTreeSave
 from .resource_upload_views import ResourceUploadView, \
-    DropboxUpload
+    DropboxUpload, \
+    DirectUploadInitiate, \
+    DirectUploadPartUrls, \
+    DirectUploadComplete, \
+    DirectUploadAbort
 from .resource_metadata import ResourceMetadataView, \
     ResourceMetadataObservationsView, \
     ResourceMetadataFeaturesView, \
@@ -46,7 +54,8 @@ from .executed_operation_views import OperationRun, \
     ExecutedOperationList, \
     NonWorkspaceExecutedOperationList, \
     WorkspaceExecutedOperationList, \
-    ExecutedOperationResultsQuery
+    ExecutedOperationResultsQuery, \
+    ExecutedOperationStatusStream
 from .operation_category_views import OperationCategoryList, \
     OperationCategoryDetail, \
     OperationCategoryAdd
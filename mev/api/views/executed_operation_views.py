@@ -1,9 +1,16 @@
+import json
+import time
 import logging
 import uuid
 
+from django.conf import settings
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import StreamingHttpResponse
+from django.db import connection
 
 from rest_framework.views import APIView
+from rest_framework.generics import ListAPIView
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
@@ -17,6 +24,8 @@ from api.serializers.workspace_executed_operation import WorkspaceExecutedOperat
 from api.models import Operation as OperationDbModel
 from api.models import Workspace, ExecutedOperation, WorkspaceExecutedOperation
 from api.utilities.operations import validate_operation_inputs
+from api.utilities.status_broker import get_status_broker, \
+    get_status_event
 from api.async_tasks.operation_tasks import submit_async_job
 import api.permissions as api_permissions
 
@@ -36,57 +45,73 @@ def check_op(user, exec_op_uuid):
         return matching_op
 
 
-class ExecutedOperationList(APIView):
+class ExecutedOperationPagination(PageNumberPagination):
     '''
-    Lists all the ExecutedOperations, both workspace and 
-    non-workspace associated.
+    Pages the listing of ExecutedOperations. Consistent with the other
+    listings, we only paginate if the request includes the page parameter.
     '''
+    page_query_param = settings.PAGE_PARAM
+    page_size_query_param = settings.PAGE_SIZE_PARAM
+    max_page_size = 1000
 
-    def get(self, request, *args, **kwargs):
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.page_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view=view)
 
-        user = request.user
-        all_executed_operations = ExecutedOperation.objects.filter(owner=user)
-        all_workspace_executed_operations = WorkspaceExecutedOperation.objects.filter(owner=user)
 
-        # want to show the Workspace for the workspace-associated operations. Querying ExecutedOperation
-        # gets both, and we want to separate them out
-        s1 = set([x.pk for x in all_executed_operations])
-        s2 = set([x.pk for x in all_workspace_executed_operations])
-        s3 = s1.difference(s2) # the set of UUIDs for the operations executed *outside* of workspaces
-
-        # have to now segregate them out. Can't just iterate through all_executed_operations
-        # since those are all of type ExecutedOperation (and hence don't have the workspace attr)
+class ExecutedOperationList(ListAPIView):
+    '''
+    Lists all the ExecutedOperations, both workspace and 
+    non-workspace associated.
+    '''
+    pagination_class = ExecutedOperationPagination
+
+    def get_queryset(self):
+        # Querying ExecutedOperation gets both types. Joining the
+        # WorkspaceExecutedOperation table lets us show the Workspace for
+        # the workspace-associated operations without further queries.
+        return ExecutedOperation.objects.filter(owner=self.request.user) \
+            .select_related('operation', 'workspaceexecutedoperation') \
+            .prefetch_related('operation__operationcategory_set') \
+            .order_by('-execution_start_datetime')
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+        executed_ops = page if page is not None else queryset
+
+        # shared by the serializers so that the data for each
+        # Operation is only loaded once
+        context = {'operation_data': {}}
         response_payload = []
-        for op in all_workspace_executed_operations:
-            response_payload.append(WorkspaceExecutedOperationSerializer(op).data)
-        for op in all_executed_operations:
-            if op.pk in s3:
+        for op in executed_ops:
+            try:
+                response_payload.append(WorkspaceExecutedOperationSerializer(
+                    op.workspaceexecutedoperation, context=context).data)
+            except WorkspaceExecutedOperation.DoesNotExist:
                 response_payload.append(ExecutedOperationSerializer(op).data)
+
+        if page is not None:
+            return self.get_paginated_response(response_payload)
         return Response(response_payload, 
             status=status.HTTP_200_OK
         )
 
 
-class NonWorkspaceExecutedOperationList(APIView):
+class NonWorkspaceExecutedOperationList(ListAPIView):
     '''
     Lists all the ExecutedOperations not associated with a workspace
     '''
+    pagination_class = ExecutedOperationPagination
+    serializer_class = ExecutedOperationSerializer
 
-    def get(self, request, *args, **kwargs):
-
-        user = request.user
-        all_executed_operations = ExecutedOperation.objects.filter(owner=user)
-
-        # Since ExecutedOperation is a superset of WorkspaceExecutedOperation
-        # we need to iterate through and skip the workspace-associated objects.
-        response_payload = []
-        for exec_op in all_executed_operations:
-            op = exec_op.operation
-            if not op.workspace_operation:
-                response_payload.append(ExecutedOperationSerializer(exec_op).data)
-        return Response(response_payload, 
-            status=status.HTTP_200_OK
-        )
+    def get_queryset(self):
+        return ExecutedOperation.objects.filter(owner=self.request.user,
+                operation__workspace_operation=False) \
+            .select_related('operation') \
+            .prefetch_related('operation__operationcategory_set') \
+            .order_by('-execution_start_datetime')
 
 
 class WorkspaceExecutedOperationList(APIView):
@@ -112,9 +137,11 @@ class WorkspaceExecutedOperationList(APIView):
         # check ownership via workspace. Users should only be able to query their own
         # analyses:
         if user == workspace.owner:
-            executed_ops = WorkspaceExecutedOperation.objects.filter(workspace=workspace)
+            executed_ops = WorkspaceExecutedOperation.objects.filter(workspace=workspace) \
+                .select_related('operation') \
+                .prefetch_related('operation__operationcategory_set')
             response_payload = WorkspaceExecutedOperationSerializer(
-                executed_ops, many=True).data
+                executed_ops, many=True, context={'operation_data': {}}).data
             return Response(response_payload, 
                 status=status.HTTP_200_OK
             )
@@ -125,6 +152,74 @@ class WorkspaceExecutedOperationList(APIView):
                 status=status.HTTP_404_NOT_FOUND)
 
 
+class ExecutedOperationStatusStream(APIView):
+    '''
+    Streams the status of the requesting user's ExecutedOperations
+    as server-sent events. On connecting, the status of each unfinished
+    ExecutedOperation is sent, followed by each change in status. This
+    lets clients follow many jobs without polling ExecutedOperationCheck.
+
+    Note that an open stream holds the worker serving it, so a sync
+    gunicorn worker can serve nothing else. In the deployment, this
+    endpoint has its own gunicorn with gevent workers, where a stream
+    only holds a greenlet. Those workers patch psycopg2 so that database
+    queries yield to other greenlets (see mev/gunicorn_gevent.py), and
+    the database connection is closed once the initial events are
+    read. The stream closes after
+    STATUS_STREAM_MAX_DURATION seconds (below the gunicorn timeout)
+    and clients (e.g. EventSource) are expected to reconnect.
+
+    If no status broker is configured, clients have to poll.
+    '''
+
+    def get(self, request, *args, **kwargs):
+        broker = get_status_broker()
+        if broker is None:
+            return Response({'error': 'Status streaming is not enabled.'
+                    ' Check the status of each executed operation instead.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # subscribe before querying so that we don't miss changes
+        subscription = broker.subscribe(request.user.pk)
+        unfinished_ops = ExecutedOperation.objects.filter(owner=request.user,
+            execution_stop_datetime__isnull=True)
+        initial_events = [get_status_event(x) for x in unfinished_ops]
+        # The stream itself does not query the database, so we release
+        # the connection rather than holding it (for each greenlet) until
+        # the stream closes.
+        connection.close()
+        response = StreamingHttpResponse(
+            self.stream(subscription, initial_events),
+            content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # keeps a proxy (e.g. nginx) from buffering the events
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def format_event(self, event):
+        return f'event: status\ndata: {json.dumps(event)}\n\n'
+
+    def stream(self, subscription, initial_events):
+        try:
+            for event in initial_events:
+                yield self.format_event(event)
+            deadline = time.monotonic() + settings.STATUS_STREAM_MAX_DURATION
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                events = subscription.get(
+                    min(settings.STATUS_STREAM_HEARTBEAT_INTERVAL, remaining))
+                if len(events) > 0:
+                    for event in events:
+                        yield self.format_event(event)
+                else:
+                    # a comment, which keeps the connection open
+                    yield ': heartbeat\n\n'
+        finally:
+            subscription.close()
+
+
 class ExecutedOperationCheck(APIView):
     '''
     Checks the status of an ExecutedOperation.
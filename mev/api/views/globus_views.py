@@ -32,8 +32,7 @@ from api.utilities.globus import random_string, \
     GLOBUS_UPLOAD
 from api.utilities.admin_utils import alert_admins
 from api.utilities.resource_utilities import get_resource_by_pk
-from api.async_tasks.globus_tasks import poll_globus_task, \
-    perform_globus_download
+from api.async_tasks.globus_tasks import perform_globus_download
 from api.models import GlobusTask, GlobusTask
 
 SESSION_MESSAGE = ('Since this is a high-assurance Globus collection, we'
@@ -147,13 +146,15 @@ class GlobusUploadView(APIView):
             task_id = submit_transfer(user_transfer_client, transfer_data)
             if task_id:
                 task_data = user_transfer_client.get_task(task_id)
+                # the status of the transfer is checked by the
+                # periodic `check_globus_tasks` task
                 GlobusTask.objects.create(
                     user=request.user,
                     task_id=task_id,
                     rule_id=rule_id,
-                    label=task_data['label']
+                    label=task_data['label'],
+                    transfer_direction=GLOBUS_UPLOAD
                 )
-                poll_globus_task.delay(task_id, GLOBUS_UPLOAD)
             return Response({'transfer_id': task_id})
         except GlobusTransferPermissionsError as ex:
             globus_username = get_globus_username(request.user)
@@ -2,14 +2,19 @@ import logging
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework import status
+from rest_framework.permissions import AllowAny, IsAdminUser
 
 from api.utilities.admin_utils import alert_admins
-from api.models import ExecutedOperation
+from api.models import ExecutedOperation, \
+    Operation as OperationDbModel
 from api.utilities.nextflow_utils import READABLE_STATES, \
+    NEXTFLOW_PROCESS_COMPLETED, \
     NEXTFLOW_COMPLETED, \
     NEXTFLOW_ERROR, \
     write_final_nextflow_metadata
+from api.utilities.nextflow_trace import get_process_resource_usage
+from api.utilities.nextflow_events import event_buffer
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +25,9 @@ class NextflowStatusView(APIView):
     state back to the server.
 
     Note that the proxy server is configured so that this view
-    is effectively forbidden unless called from localhost
+    is effectively forbidden unless called from localhost. The
+    events are buffered in memory, so this view is served by a
+    single gunicorn process (see api/utilities/nextflow_events.py).
     '''
     # The nextflow engine is making the requests and external
     # requests get 403, so we don't bother with tokens-
@@ -34,28 +41,57 @@ class NextflowStatusView(APIView):
         event = data['event']
         run_name = data['runName']
         logger.info(f'Nextflow event ({event}) received for: {run_name}')
+        if event in [NEXTFLOW_COMPLETED, NEXTFLOW_ERROR]:
+            # write any buffered events and traces first so they
+            # are all in place once the job is finalized
+            event_buffer.flush()
+            self.handle_final_event(data, event, run_name)
+        elif event in READABLE_STATES:
+            # Nextflow sends many events while a run is in progress.
+            # These are buffered and written in bulk so that we can
+            # respond immediately.
+            trace = data.get('trace') if event == NEXTFLOW_PROCESS_COMPLETED else None
+            event_buffer.add(run_name, event, trace)
+        else:
+            logger.info(f'Ignoring unexpected Nextflow event: {event}')
+        return Response({})
+
+    def handle_final_event(self, data, event, run_name):
         matching_ops = ExecutedOperation.objects.filter(job_id=run_name)
         if len(matching_ops) != 1:
             alert_admins('Unexpected application state encountered when querying for'
                 f' a Nextflow job named {run_name}. Expected a single database object'
                 f' but found {len(matching_ops)}'
             )
+            return
+
+        matching_op = matching_ops[0]
+        if event == NEXTFLOW_COMPLETED:
+            # by setting the `status` field, the nextflow
+            # runner will know that it's ready for finalization
+            matching_op.status = NEXTFLOW_COMPLETED
+
+            # when the job has completed, Nextflow also POSTS metadata about
+            # the job stats, success, etc. Save it to the execution directory
+            # since there is no way to get this otherwise (e.g. there is no nextflow
+            # database which we can query at a later time)
+            write_final_nextflow_metadata(data, matching_op.pk)
         else:
-            matching_op = matching_ops[0]
-            if event == NEXTFLOW_COMPLETED:
-                # by setting the `status` field, the nextflow
-                # runner will know that it's ready for finalization
-                matching_op.status = NEXTFLOW_COMPLETED
-
-                # when the job has completed, Nextflow also POSTS metadata about
-                # the job stats, success, etc. Save it to the execution directory
-                # since there is no way to get this otherwise (e.g. there is no nextflow
-                # database which we can query at a later time)
-                write_final_nextflow_metadata(data, matching_op.pk)
-            elif event == NEXTFLOW_ERROR:
-                matching_op.status = READABLE_STATES[event]
-                alert_admins(f'Job failure: {matching_op.pk}')
-            else:
-                matching_op.status = READABLE_STATES[event]
-            matching_op.save()
-        return Response({})
+            matching_op.status = READABLE_STATES[event]
+            alert_admins(f'Job failure: {matching_op.pk}')
+        matching_op.save()
+
+
+class OperationResourceUsage(APIView):
+    '''
+    Returns the runtime and peak memory (as quantiles) of each process
+    in a Nextflow-based Operation, aggregated over all the completed
+    tasks. Used by admins to size the resources requested by the processes.
+    '''
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        op_uuid = kwargs['operation_uuid']
+        if not OperationDbModel.objects.filter(id=op_uuid).exists():
+            return Response({}, status=status.HTTP_404_NOT_FOUND)
+        return Response(get_process_resource_usage(op_uuid))
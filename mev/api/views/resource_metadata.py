@@ -3,12 +3,15 @@ import logging
 from django.http import Http404
 from rest_framework.exceptions import APIException
 from rest_framework.generics import RetrieveAPIView
+from rest_framework.response import Response
 
 from api.models import Resource, ResourceMetadata
 from api.serializers.resource_metadata import ResourceMetadataSerializer, \
     ResourceMetadataObservationsSerializer, \
     ResourceMetadataFeaturesSerializer, \
     ResourceMetadataParentOperationSerializer
+from api.utilities.resource_utilities import get_resource_etag
+from api.views.resource_views import get_not_modified_response
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +45,19 @@ class ResourceMetadataView(RetrieveAPIView):
                 f' a Resource ({self.kwargs["pk"]})')
             raise APIException()
 
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        # the metadata can change independently of the resource,
+        # so the ETag also depends on when the metadata was modified.
+        etag = get_resource_etag(instance.resource,
+            tag=f'{self.__class__.__name__}:'
+                f'{instance.modification_datetime.isoformat()}')
+        not_modified_response = get_not_modified_response(request, etag)
+        if not_modified_response is not None:
+            return not_modified_response
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, headers={'ETag': etag})
+
 
 class ResourceMetadataObservationsView(ResourceMetadataView):
     serializer_class = ResourceMetadataObservationsSerializer
@@ -1,16 +1,25 @@
 import uuid
+import math
 import logging
 
+from botocore.exceptions import ClientError
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
 from rest_framework.generics import CreateAPIView
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser
 from rest_framework import status
 from rest_framework.response import Response
 
+from api.models import Resource
 from api.serializers.upload_serializer import DropboxUploadSerializer
 from api.serializers.resource import ResourceSerializer
 from api.uploaders import get_async_uploader, DROPBOX
 from api.async_tasks.operation_tasks import submit_async_job
+from api.async_tasks.async_resource_tasks import \
+    validate_resource as async_validate_resource
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +35,254 @@ class ResourceUploadView(CreateAPIView):
         serializer.save(owner=self.request.user)
 
 
+def get_direct_upload_part_size(size):
+    '''
+    Returns the part size to use for a direct upload of a file
+    with the given size (in bytes). This is the configured part size
+    unless that would exceed the maximum number of parts.
+    '''
+    return max(settings.DIRECT_UPLOAD_PART_SIZE,
+        math.ceil(size / settings.DIRECT_UPLOAD_MAX_PARTS))
+
+
+class DirectUploadInitiate(APIView):
+    '''
+    Starts a direct upload where the client sends the file to
+    storage (in parts) rather than through the server. Returns the
+    upload ID, the number of parts and presigned URLs for the first
+    parts. The URLs for the remaining parts are requested from
+    DirectUploadPartUrls as the upload progresses. Once the parts
+    are uploaded, the client calls the completion endpoint.
+
+    Only available for bucket-based storage.
+    '''
+
+    NAME = 'name'
+    SIZE = 'size'
+
+    def post(self, request, *args, **kwargs):
+        try:
+            name = request.data[self.NAME]
+        except KeyError as ex:
+            return Response({self.NAME: 'You must supply this required key.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            size = int(request.data[self.SIZE])
+        except KeyError as ex:
+            return Response({self.SIZE: 'You must supply this required key.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except (ValueError, TypeError) as ex:
+            return Response({self.SIZE: 'This must be an integer.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if size <= 0:
+            return Response({self.SIZE: 'This must be a positive integer.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if size > settings.DIRECT_UPLOAD_MAX_SIZE:
+            return Response({self.SIZE: 'The file exceeds the maximum size'
+                    f' of {settings.DIRECT_UPLOAD_MAX_SIZE} bytes.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        part_size = get_direct_upload_part_size(size)
+        num_parts = math.ceil(size / part_size)
+        try:
+            r, upload_id, part_urls = default_storage.create_multipart_upload(
+                request.user, name, num_parts)
+        except NotImplementedError:
+            return Response({'error': 'The storage system does not support this endpoint.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as ex:
+            logger.info(f'Failed to initiate a direct upload. Reason: {ex}')
+            return Response({'error': 'Could not initiate the upload.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        r.status = Resource.UPLOADING
+        r.save()
+
+        return Response({
+                'resource_pk': r.pk,
+                'upload_id': upload_id,
+                'part_size': part_size,
+                'num_parts': num_parts,
+                'part_urls': part_urls
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+
+class DirectUploadBase(APIView):
+    '''
+    Base class for the views which act on a direct upload which
+    is in progress.
+    '''
+
+    UPLOAD_ID = 'upload_id'
+
+    def get_upload(self, request, pk):
+        '''
+        Returns a tuple of the Resource and upload ID or a
+        Response if the request is not valid.
+        '''
+        try:
+            r = Resource.objects.get(pk=pk, owner=request.user)
+        except Resource.DoesNotExist:
+            return None, Response(status=status.HTTP_404_NOT_FOUND)
+
+        if r.is_active or (r.status != Resource.UPLOADING):
+            return None, Response({'error': 'This resource does not'
+                    ' have an upload in progress.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            upload_id = request.data[self.UPLOAD_ID]
+        except KeyError as ex:
+            return None, Response({self.UPLOAD_ID: 'You must supply this required key.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return (r, upload_id), None
+
+
+class DirectUploadPartUrls(DirectUploadBase):
+    '''
+    Returns presigned URLs for the requested parts of a direct upload
+    which is in progress. Since the URLs expire, clients request them
+    in batches (of at most DIRECT_UPLOAD_URL_BATCH_SIZE parts) as the
+    upload progresses.
+    '''
+
+    PART_NUMBERS = 'part_numbers'
+
+    def post(self, request, *args, **kwargs):
+        upload, error_response = self.get_upload(request, kwargs['pk'])
+        if error_response is not None:
+            return error_response
+        r, upload_id = upload
+
+        try:
+            part_numbers = [int(x) for x in request.data[self.PART_NUMBERS]]
+        except KeyError as ex:
+            return Response({self.PART_NUMBERS: 'You must supply this required key.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except (ValueError, TypeError) as ex:
+            return Response({self.PART_NUMBERS: 'This must be a list of integers.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (len(part_numbers) == 0) \
+            or (len(part_numbers) > settings.DIRECT_UPLOAD_URL_BATCH_SIZE):
+            return Response({self.PART_NUMBERS: 'You must request between 1 and'
+                    f' {settings.DIRECT_UPLOAD_URL_BATCH_SIZE} parts.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if any([(x < 1) or (x > settings.DIRECT_UPLOAD_MAX_PARTS)
+            for x in part_numbers]):
+            return Response({self.PART_NUMBERS: 'The part numbers must be'
+                    f' between 1 and {settings.DIRECT_UPLOAD_MAX_PARTS}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            part_urls = default_storage.get_part_upload_urls(
+                r, upload_id, part_numbers)
+        except NotImplementedError:
+            return Response({'error': 'The storage system does not support this endpoint.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # marks the upload as active so it is not removed as abandoned
+        r.save()
+        return Response({
+            'part_urls': dict(zip(part_numbers, part_urls))
+        })
+
+
+class DirectUploadComplete(DirectUploadBase):
+    '''
+    Completes a direct upload. The client provides the part numbers
+    and ETags returned by storage when the parts were uploaded. The
+    Resource is then activated and validated.
+    '''
+
+    PARTS = 'parts'
+
+    def post(self, request, *args, **kwargs):
+        upload, error_response = self.get_upload(request, kwargs['pk'])
+        if error_response is not None:
+            return error_response
+        r, upload_id = upload
+
+        try:
+            parts = [(int(x['part_number']), x['etag'])
+                for x in request.data[self.PARTS]]
+        except KeyError as ex:
+            return Response({self.PARTS: 'You must supply a list of parts,'
+                    ' each with a "part_number" and "etag".'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except (ValueError, TypeError) as ex:
+            return Response({self.PARTS: 'The part numbers must be integers.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(parts) == 0:
+            return Response({self.PARTS: 'You must supply at least one part.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resource_type = request.data.get('resource_type')
+        file_format = request.data.get('file_format')
+
+        try:
+            default_storage.complete_multipart_upload(r, upload_id, parts)
+        except NotImplementedError:
+            return Response({'error': 'The storage system does not support this endpoint.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ClientError as ex:
+            logger.info(f'Failed to complete direct upload for resource {r.pk}.'
+                f' Reason: {ex}')
+            return Response({'error': 'Could not complete the upload. Check'
+                    ' that all the parts were uploaded.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Even if the resource type or format were not set, we can
+        # call this function
+        async_validate_resource.delay(r.pk, resource_type, file_format)
+
+        resource_serializer = ResourceSerializer(r, context={'request': request})
+        return Response(resource_serializer.data, status=status.HTTP_200_OK)
+
+
+class DirectUploadAbort(DirectUploadBase):
+    '''
+    Aborts a direct upload, removing any uploaded parts
+    and the placeholder Resource.
+    '''
+
+    def post(self, request, *args, **kwargs):
+        upload, error_response = self.get_upload(request, kwargs['pk'])
+        if error_response is not None:
+            return error_response
+        r, upload_id = upload
+        try:
+            default_storage.abort_multipart_upload(r, upload_id)
+        except NotImplementedError:
+            return Response({'error': 'The storage system does not support this endpoint.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ClientError as ex:
+            logger.info(f'Failed to abort direct upload for resource {r.pk}.'
+                f' Reason: {ex}')
+            return Response({'error': 'Could not abort the upload.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class AsyncUpload(APIView):
     '''
     Base class for uploads that are performed asynchronously,
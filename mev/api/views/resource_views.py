@@ -2,6 +2,7 @@ import logging
 
 from django.conf import settings
 from django.core.files.storage import default_storage
+from django.utils.http import parse_etags
 from rest_framework import permissions as framework_permissions
 from rest_framework import generics
 from rest_framework.views import APIView
@@ -20,8 +21,11 @@ import api.permissions as api_permissions
 from api.utilities.resource_utilities import get_resource_view, \
     get_resource_paginator, \
     resource_supports_pagination, \
-    check_resource_request_validity
+    check_resource_request_validity, \
+    get_resource_etag
+from resource_types.json_contents import delete_json_sidecars
 from api.data_transformations import get_transformation_function
+from resource_types.contents_cache import get_cache_stats
 from api.async_tasks.async_resource_tasks import \
     delete_file as async_delete_file
 from api.async_tasks.async_resource_tasks import \
@@ -61,6 +65,25 @@ def check_resource_request(user, resource_pk):
             return (False, Response(status=status.HTTP_404_NOT_FOUND))
 
 
+def get_not_modified_response(request, etag):
+    '''
+    Helper function for conditional requests. If the request's
+    If-None-Match header includes the current `etag` (i.e. the client
+    already has the current data), returns a 304 response. Otherwise,
+    returns None and the caller should prepare the full response.
+    '''
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is None:
+        return None
+    # compression middleware can change our ETags to weak ETags (W/"..."),
+    # which are fine for our purposes.
+    client_etags = [x.removeprefix('W/') for x in parse_etags(if_none_match)]
+    if ('*' in client_etags) or (etag in client_etags):
+        return Response(status=status.HTTP_304_NOT_MODIFIED,
+            headers={'ETag': etag})
+    return None
+
+
 class ResourceList(generics.ListAPIView):
     '''
     Lists available Resource instances.
@@ -138,8 +161,11 @@ class ResourceDetail(generics.RetrieveUpdateDestroyAPIView):
         # delete the actual file
         async_delete_file.delay(instance.datafile.name)
         
-        # Now delete the database object:
+        # Now delete the database object and any local files
+        # derived from the resource:
+        resource_pk = instance.pk
         self.perform_destroy(instance)
+        delete_json_sidecars(resource_pk)
         return Response(status=status.HTTP_200_OK)
 
 
@@ -169,6 +195,13 @@ class ResourceContents(APIView):
             # if the request was not valid, then `r` is a Response object.
             return r
 
+        # if the client already has the current contents, we
+        # do not need to read the file.
+        etag = get_resource_etag(r, request.query_params, 'contents')
+        not_modified_response = get_not_modified_response(request, etag)
+        if not_modified_response is not None:
+            return not_modified_response
+
         # requester can access, resource is active.  Go get contents
         try:
             contents = get_resource_view(r, request.query_params)
@@ -204,10 +237,12 @@ class ResourceContents(APIView):
                     logging.info(f'Contents of resource ({resource_pk}) were'
                         ' not iterable. Returning all contents.'
                     )
-                    return Response(contents)
-                return paginator.get_paginated_response(results)
+                    return Response(contents, headers={'ETag': etag})
+                response = paginator.get_paginated_response(results)
+                response['ETag'] = etag
+                return response
             else:
-                return Response(contents)
+                return Response(contents, headers={'ETag': etag})
 
 
 class ResourcePreview(APIView):
@@ -233,6 +268,11 @@ class ResourcePreview(APIView):
             # if the request was not valid, then `r` is a Response object.
             return r
 
+        etag = get_resource_etag(r, tag='preview')
+        not_modified_response = get_not_modified_response(request, etag)
+        if not_modified_response is not None:
+            return not_modified_response
+
         # requester can access, resource is active.  Go get contents
         try:
             contents = get_resource_view(r, {}, preview=True)
@@ -248,7 +288,7 @@ class ResourcePreview(APIView):
                 status=status.HTTP_200_OK
             )
         else:
-            return Response(contents)
+            return Response(contents, headers={'ETag': etag})
 
 
 class AddBucketResourceView(APIView):
@@ -329,14 +369,31 @@ class ResourceContentTransform(ResourceContents):
             return r
         else:
             query_params = request.query_params
+            etag = get_resource_etag(r, query_params, 'transform')
+            not_modified_response = get_not_modified_response(request, etag)
+            if not_modified_response is not None:
+                return not_modified_response
             try:
                 transform_fn = get_transformation_function(query_params['transform-name'])
                 result = transform_fn(r, query_params)
-                return Response(result)
+                return Response(result, headers={'ETag': etag})
             except KeyError as ex:
                 return Response(
                     {'error': f'The request must contain the {ex} parameter.'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )   
             except Exception as ex:
-                return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+                return Response({'error': str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ResourceContentsCacheStats(APIView):
+    '''
+    Returns the hit/miss counts and size of the cache of resource
+    contents. Used by admins for tuning the cache settings. Note that
+    the counts are for the process handling the request.
+    '''
+    permission_classes = [framework_permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_cache_stats())
+
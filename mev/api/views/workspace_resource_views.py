@@ -1,5 +1,6 @@
 import logging 
 
+from django.db import transaction
 from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework import status
@@ -10,8 +11,10 @@ from api.models import Resource, Workspace
 from api.serializers.resource import ResourceSerializer
 from api.serializers.workspace_resource import WorkspaceResourceSerializer
 from api.serializers.workspace_resource_add import WorkspaceResourceAddSerializer
+from api.serializers.workspace_resource_bulk import WorkspaceResourceBulkSerializer
 import api.permissions as api_permissions
-from api.utilities.executed_op_utilities import check_for_resource_operations
+from api.utilities.executed_op_utilities import check_for_resource_operations, \
+    get_resources_used_in_workspace
 
 
 logger = logging.getLogger(__name__)
@@ -198,3 +201,129 @@ class WorkspaceResourceAdd(APIView):
                 )
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+def add_problem(problems, key, resource_uuids):
+    if len(resource_uuids) > 0:
+        problems[key] = [str(x) for x in resource_uuids]
+
+
+def get_workspace_and_resources(workspace_uuid, resource_uuids):
+    '''
+    The bulk counterpart to `get_workspace_and_resource`. Fetches all
+    the Resources with a single query and locks the Workspace so that
+    concurrent changes to its Resources are applied in turn. Hence, this
+    must be called within a transaction.
+
+    Returns the Workspace, the list of Resources and a dict which maps
+    the problems found to the UUIDs of the offending Resources.
+    '''
+    try:
+        workspace = Workspace.objects.select_for_update().get(pk=workspace_uuid)
+    except Workspace.DoesNotExist:
+        logger.info(f'Could not locate Workspace ({workspace_uuid}).')
+        raise ParseError({
+            'workspace_uuid': \
+                f'Workspace referenced by {workspace_uuid} was not found.'})
+
+    resources = list(Resource.objects.filter(pk__in=resource_uuids))
+    found_uuids = set([r.pk for r in resources])
+    problems = {}
+    add_problem(problems, 'not_found',
+        [x for x in resource_uuids if not x in found_uuids])
+
+    # as for single resources, the workspace and resources
+    # must have the same owner
+    add_problem(problems, 'different_owner',
+        [r.pk for r in resources if r.owner_id != workspace.owner_id])
+    return workspace, resources, problems
+
+
+class WorkspaceResourceBulkBase(APIView):
+    '''
+    Common behavior for adding/removing many Resources to/from a Workspace
+    in a single request. The changes are all-or-nothing: if any of the
+    Resources can't be added/removed, the response lists the problems
+    and the Workspace is not changed.
+    '''
+    serializer_class = WorkspaceResourceBulkSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = WorkspaceResourceBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        workspace_uuid = kwargs['workspace_pk']
+        resource_uuids = serializer.validated_data['resource_uuids']
+        with transaction.atomic():
+            workspace, resources, problems = get_workspace_and_resources(
+                workspace_uuid, resource_uuids)
+            if not self.is_permitted(request.user, workspace):
+                return Response({
+                        'resource_uuids':'The owner of the workspace and '
+                        'resources must match the requesting user.'
+                    }, status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # the workspace's current Resources among those requested
+            attached_uuids = set(workspace.resources.filter(
+                pk__in=resource_uuids).values_list('pk', flat=True))
+            self.check_resources(workspace, resources, attached_uuids, problems)
+            if len(problems) > 0:
+                logger.info(f'Rejected a bulk request for workspace'
+                    f' ({workspace_uuid}). Problems: {problems}')
+                return Response({'resource_uuids': problems},
+                    status=status.HTTP_400_BAD_REQUEST)
+            return self.apply_changes(workspace, resources, attached_uuids)
+
+
+class WorkspaceResourceBulkAdd(WorkspaceResourceBulkBase):
+    '''
+    This endpoint adds many Resource instances to a specific Workspace.
+    Resources which are already in the Workspace are left as-is.
+    '''
+
+    def is_permitted(self, user, workspace):
+        return (user.is_staff) or (user.pk == workspace.owner_id)
+
+    def check_resources(self, workspace, resources, attached_uuids, problems):
+        add_problem(problems, 'inactive',
+            [r.pk for r in resources if not r.is_active])
+        add_problem(problems, 'not_validated',
+            [r.pk for r in resources if (r.resource_type is None)
+                or (r.file_format is None or r.file_format == '')])
+
+    def apply_changes(self, workspace, resources, attached_uuids):
+        new_resources = [r for r in resources if not r.pk in attached_uuids]
+        logger.info(f'Adding {len(new_resources)} resources to'
+            f' workspace ({workspace.pk})')
+        workspace.resources.add(*new_resources)
+        return Response({
+            'added': [str(r.pk) for r in new_resources],
+            'unchanged': [str(x) for x in attached_uuids]
+        }, status=status.HTTP_200_OK)
+
+
+class WorkspaceResourceBulkRemove(WorkspaceResourceBulkBase):
+    '''
+    This endpoint removes many Resources from a specific Workspace. As for
+    single Resources, those used in one or more Operations in the Workspace
+    cannot be removed.
+    '''
+
+    def is_permitted(self, user, workspace):
+        return user.pk == workspace.owner_id
+
+    def check_resources(self, workspace, resources, attached_uuids, problems):
+        add_problem(problems, 'not_in_workspace',
+            [r.pk for r in resources if not r.pk in attached_uuids])
+        add_problem(problems, 'used_in_operations',
+            get_resources_used_in_workspace(attached_uuids, workspace))
+
+    def apply_changes(self, workspace, resources, attached_uuids):
+        logger.info(f'Removing {len(resources)} resources from'
+            f' workspace ({workspace.pk})')
+        workspace.resources.remove(*resources)
+        return Response({
+            'removed': [str(r.pk) for r in resources]
+        }, status=status.HTTP_200_OK)
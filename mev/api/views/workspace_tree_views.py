@@ -2,9 +2,10 @@ import logging
 import datetime
 import os
 import json
-from io import BytesIO
+from tempfile import TemporaryFile
 
 from django.core.files.base import File
+from django.utils.http import quote_etag
 
 from rest_framework.exceptions import PermissionDenied, ParseError
 from rest_framework.views import APIView
@@ -14,101 +15,21 @@ from rest_framework import status
 from constants import JSON_FILE_KEY, JSON_FORMAT
 
 from api.utilities.resource_utilities import initiate_resource_validation, \
-    create_resource, \
-    get_resource_by_pk
-from api.utilities.operations import get_operation_instance_data
-from data_structures.dag_components import SimpleDag, DagNode
-from data_structures.data_resource_attributes import DataResourceAttribute, \
-    VariableDataResourceAttribute, \
-    OperationDataResourceAttribute
-from api.models import Workspace, WorkspaceExecutedOperation
+    create_resource
+from api.utilities.workspace_dag import get_workspace_dag
+from api.views.resource_views import get_not_modified_response
+from api.models import Workspace
 
 logger = logging.getLogger(__name__)
 
 
-DATARESOURCE_TYPES = [
-    DataResourceAttribute,
-    VariableDataResourceAttribute,
-    OperationDataResourceAttribute
-]
-DATARESOURCE_TYPENAMES = [x.typename for x in DATARESOURCE_TYPES]
-
-
 class WorkspaceTreeBase(object):
 
-    def create_workspace_dag(self, workspace_executed_ops):
+    def get_tree(self, request, *args, **kwargs):
         '''
-        Returns a DAG representing the resources and operations contained in a workspace
-
-        `workspace_executed_ops` is a set of ExecutedOperation (database model) objects
+        Returns the Workspace and its (stored) WorkspaceDag, which
+        represents the resources and operations contained in the workspace.
         '''
-        graph = SimpleDag()
-        for exec_op in workspace_executed_ops:
-
-            # don't want to show failed jobs
-            if exec_op.job_failed:
-                continue
-
-            # we need the operation definition to know if any of the inputs
-            # were DataResources
-            op = exec_op.operation
-            op_data = get_operation_instance_data(op)
-
-            # the operation spec will tell us what the "types" of each input/output are
-            op_inputs = op_data['inputs']
-            op_outputs = op_data['outputs']
-
-            # the executed ops will have the actual args used. So, for a DataResource
-            # "type", it will be a UUID
-            exec_op_inputs = exec_op.inputs
-            exec_op_outputs = exec_op.outputs
-
-            # create a spec for the executed op that includes the operation spec
-            # and the actual inputs/outputs
-            full_op_data = {
-                'op_spec': op_data,
-                'inputs': exec_op_inputs,
-                'outputs': exec_op_outputs
-            }
-
-            # create a node for the operation
-            op_node = DagNode(str(exec_op.pk), 
-                DagNode.OP_NODE, 
-                node_name = op_data['name'],
-                op_data = full_op_data)
-            graph.add_node(op_node)
-
-            for k,v in exec_op_inputs.items():
-                # compare with the expected type:
-                op_input_definition = op_inputs[k]
-                op_spec = op_input_definition['spec']
-                input_type = op_spec['attribute_type']
-                if input_type in DATARESOURCE_TYPENAMES:
-                    r = get_resource_by_pk(v)
-                    resource_node = graph.get_or_create_node(
-                        str(v), 
-                        DagNode.DATARESOURCE_NODE, 
-                        node_name = r.name)
-                    op_node.add_parent(resource_node)
-
-            # show the outputs if the operation has completed
-            if exec_op.execution_stop_datetime:
-                for k,v in exec_op_outputs.items():
-                    # compare with the expected type:
-                    op_output_definition = op_outputs[k]
-                    op_spec = op_output_definition['spec']
-                    output_type = op_spec['attribute_type']
-                    if output_type in DATARESOURCE_TYPENAMES:
-                        if v is not None:
-                            r = get_resource_by_pk(v)
-                            resource_node = graph.get_or_create_node(
-                                str(v), 
-                                DagNode.DATARESOURCE_NODE, 
-                                node_name = r.name)
-                            resource_node.add_parent(op_node)
-        return graph.serialize()
-
-    def get_tree(self, request, *args, **kwargs):
         workspace_uuid = kwargs['workspace_pk']
         try:
             workspace = Workspace.objects.get(pk=workspace_uuid)
@@ -119,8 +40,7 @@ class WorkspaceTreeBase(object):
                     f'Workspace referenced by {workspace_uuid} was not found.'})
 
         if (request.user.is_staff) or (request.user == workspace.owner):
-            executed_ops = WorkspaceExecutedOperation.objects.filter(workspace=workspace)
-            return self.create_workspace_dag(executed_ops)
+            return workspace, get_workspace_dag(workspace)
         else:
             raise PermissionDenied()
 
@@ -128,8 +48,15 @@ class WorkspaceTreeBase(object):
 class WorkspaceTreeView(APIView, WorkspaceTreeBase):
 
     def get(self, request, *args, **kwargs):
-        dag = self.get_tree(request, *args, **kwargs)
-        return Response(dag)
+        workspace, dag = self.get_tree(request, *args, **kwargs)
+        # the version is reset if the DAG is rebuilt, so we also
+        # include the modification time
+        etag = quote_etag(
+            f'{workspace.pk}:{dag.version}:{dag.last_modified.isoformat()}')
+        not_modified_response = get_not_modified_response(request, etag)
+        if not_modified_response is not None:
+            return not_modified_response
+        return Response(dag.nodes, headers={'ETag': etag})
 
 
 class WorkspaceTreeSave(APIView, WorkspaceTreeBase):
@@ -137,20 +64,25 @@ class WorkspaceTreeSave(APIView, WorkspaceTreeBase):
     def get(self, request, *args, **kwargs):
         timestamp_str = datetime.datetime.now().strftime('%m-%d-%Y-%H-%M-%S')
         output_filename = f'workspace_export.{kwargs["workspace_pk"]}.{timestamp_str}.json'
-        dag = self.get_tree(request, *args, **kwargs)
-        fh = File(BytesIO(json.dumps(dag).encode('utf-8')), name=output_filename)
-        try:
-            workspace = Workspace.objects.get(pk=kwargs['workspace_pk'])
-            resource_instance = create_resource(
-                request.user,
-                file_handle=fh,
-                name=output_filename,
-                is_active=False,
-                workspace=workspace
-            )
-        except Exception as ex:
-            logger.error('Failed at writing the workspace export.')
-            raise ex
+        workspace, dag = self.get_tree(request, *args, **kwargs)
+        # write the stored DAG in chunks rather than as a single
+        # (potentially large) string
+        with TemporaryFile() as tmp_fh:
+            for chunk in json.JSONEncoder().iterencode(dag.nodes):
+                tmp_fh.write(chunk.encode('utf-8'))
+            tmp_fh.seek(0)
+            fh = File(tmp_fh, name=output_filename)
+            try:
+                resource_instance = create_resource(
+                    request.user,
+                    file_handle=fh,
+                    name=output_filename,
+                    is_active=False,
+                    workspace=workspace
+                )
+            except Exception as ex:
+                logger.error('Failed at writing the workspace export.')
+                raise ex
 
         initiate_resource_validation(resource_instance,
             JSON_FILE_KEY,
@@ -219,6 +219,14 @@ if not os.path.exists(TMP_DIR):
 FILE_UPLOAD_HANDLERS = ['mev.upload_handler.UploadProgressCachedHandler',] + \
     global_settings.FILE_UPLOAD_HANDLERS
 
+# Rather than updating the cache for every chunk of an upload, the upload
+# progress is only written once it has advanced by the given percentage
+# or number of bytes, or once the given interval (in seconds) has passed.
+# Set any of these to None to disable that criterion.
+UPLOAD_PROGRESS_PERCENT_STEP = 1
+UPLOAD_PROGRESS_BYTES_STEP = 64 * 1024 * 1024
+UPLOAD_PROGRESS_INTERVAL = 2
+
 
 ###############################################################################
 # Parameters for domains and front-end URLs
@@ -281,6 +289,22 @@ if get_env('ENABLE_REMOTE_JOB_RUNNERS') == 'yes':
 else:
     ENABLE_REMOTE_JOBS = False
 
+# Nextflow reports the resource usage (trace) of each task in a run.
+# These are buffered with the status events (below) and saved in
+# batches of this many.
+NEXTFLOW_TRACE_BATCH_SIZE = 500
+
+# When reporting the resource usage of each process, the quantiles are
+# computed from at most this many of the most recent successful tasks.
+NEXTFLOW_USAGE_MAX_SAMPLES = 10000
+
+# The status events Nextflow sends while a run is in progress are
+# buffered and written once this many have been received or this many
+# seconds after the first. Only the latest status of each run is written,
+# but all of the task traces are saved.
+NEXTFLOW_EVENT_BUFFER_SIZE = 1000
+NEXTFLOW_EVENT_FLUSH_INTERVAL = 2
+
 ###############################################################################
 # END Parameters for configuring the cloud environment
 ###############################################################################
@@ -334,6 +358,27 @@ if not os.path.exists(RESOURCE_CACHE_DIR):
 # parameter is used.
 RESOURCE_CACHE_EXPIRATION_DAYS = 2
 
+# For JSON-based resources that are arrays of records, we create
+# "sidecar" files which permit filtering, sorting, and pagination without
+# parsing the entire file. These can be recreated at any time, so they
+# are kept alongside the other locally cached files.
+JSON_CONTENTS_CACHE_DIR = os.path.join(RESOURCE_CACHE_DIR, 'json_contents')
+
+# The results of resource contents queries (e.g. filtered and sorted tables)
+# are cached so that paging through results does not require parsing the file
+# for every request. The first tier of the cache is held in the memory of each
+# process and the second tier is the Django cache given by the alias below. 
+# Items larger than RESOURCE_CONTENTS_CACHE_MAX_ITEM_BYTES (as pickled) are
+# not cached. For large items, the size is estimated from a sample of the
+# records so that they are not pickled only to be discarded. These items are much larger than the other cached items, so 
+# they have their own cache (see the CACHES in the dev/production settings) 
+# and do not cause small, frequently used items to be culled.
+RESOURCE_CONTENTS_CACHE_ENABLED = True
+RESOURCE_CONTENTS_CACHE_ALIAS = 'resource_contents'
+RESOURCE_CONTENTS_LOCAL_CACHE_MAX_BYTES = 128 * 1024 * 1024
+RESOURCE_CONTENTS_CACHE_MAX_ITEM_BYTES = 16 * 1024 * 1024
+RESOURCE_CONTENTS_SHARED_CACHE_TIMEOUT = 60 * 60
+
 # The maximum size (in bytes) to allow "direct" downloads from the API.
 # If the file exceeds this, we ask the user to download in another way. 
 # Most files are small and this will be fine. However, we don't want users
@@ -341,6 +386,38 @@ RESOURCE_CACHE_EXPIRATION_DAYS = 2
 # like via Dropbox.
 MAX_DOWNLOAD_SIZE_BYTES = 512 * 1000 * 1000
 
+# When copying many objects between buckets (e.g. for Globus transfers),
+# this bounds the number of copies which are performed concurrently.
+MAX_CONCURRENT_BUCKET_COPIES = 8
+
+# For direct (client-to-bucket) multipart uploads, the size of each part
+# and the lifetime (in seconds) of the presigned part URLs. Note that S3
+# requires parts of at least 5MB (except the last) and allows at most
+# 10000 parts, so the part size is increased for very large files.
+# Direct uploads bypass the request size limit of the proxy, so the
+# size of the file (in bytes) is limited by DIRECT_UPLOAD_MAX_SIZE.
+DIRECT_UPLOAD_PART_SIZE = 64 * 1024 * 1024
+DIRECT_UPLOAD_MAX_PARTS = 10000
+DIRECT_UPLOAD_MAX_SIZE = 50 * 1024 * 1024 * 1024
+DIRECT_UPLOAD_URL_EXPIRATION = 3600
+
+# The presigned part URLs are created in batches of (at most) this many
+# parts. Clients request the next batch as the upload progresses so that
+# long uploads do not outlast the URLs.
+DIRECT_UPLOAD_URL_BATCH_SIZE = 100
+
+# How frequently (in seconds) a periodic task removes the direct uploads
+# which were abandoned, i.e. which have not had any activity (such as a
+# request for part URLs) for DIRECT_UPLOAD_ABANDONED_AFTER seconds. This is
+# longer than the URL expiration so that a client can still upload with
+# the last URLs it received and complete the upload. See mev/celery_app.py
+DIRECT_UPLOAD_CLEANUP_INTERVAL = 3600
+DIRECT_UPLOAD_ABANDONED_AFTER = 3 * DIRECT_UPLOAD_URL_EXPIRATION
+
+# The maximum number of resources which can be added to or removed from a
+# workspace in a single (bulk) request.
+MAX_WORKSPACE_RESOURCE_BULK_SIZE = 1000
+
 if STORAGE_LOCATION == REMOTE:
     if CLOUD_PLATFORM == AMAZON:
         DEFAULT_FILE_STORAGE = 'api.storage.S3ResourceStorage'
@@ -441,6 +518,18 @@ if not os.path.exists(CLONE_STAGING_DIR):
             d = CLONE_STAGING_DIR
         )
     )
+
+# Repositories are fetched into local (bare) mirrors so that re-ingesting
+# a repository only transfers the new commit. Mirrors are created as
+# needed and can be removed at any time.
+OPERATION_REPO_CACHE_DIR = os.path.join(CLONE_STAGING_DIR, 'repo_mirrors')
+
+# Paths (relative to the repository root) which are skipped when checking
+# out a repository for ingestion, e.g. ['/.github/', '/tests/']. Operations
+# can reference any file in their repository (e.g. test data), so nothing is
+# skipped unless paths are given here.
+OPERATION_REPO_SPARSE_EXCLUDES = []
+
 # the name of the file that contains the specification for an Operation:
 OPERATION_SPEC_FILENAME = 'operation_spec.json'
 
@@ -478,6 +567,27 @@ if not os.path.exists(OPERATION_EXECUTION_DIR):
 # based task that polls for status. This sets how frequently this happens
 JOB_STATUS_CHECK_INTERVAL = 3 # seconds
 
+# Changes in job status are published so that clients can receive them
+# via a server-sent event stream rather than polling. The broker is one of
+# the keys of api.utilities.status_broker.STATUS_BROKER_CHOICES. The 'local'
+# broker only works within a single process. The 'cache' broker passes
+# events through a (shared) cache and the subscribers check for new events
+# every STATUS_BROKER_POLL_INTERVAL seconds. If None, the stream is
+# disabled and clients poll for the status of their jobs.
+STATUS_BROKER = 'local'
+STATUS_BROKER_CACHE_ALIAS = 'default'
+STATUS_BROKER_POLL_INTERVAL = 1 # seconds
+STATUS_BROKER_EVENT_TIMEOUT = 300 # seconds
+
+# A heartbeat comment is sent on the status stream if there were no
+# events in this interval. Each stream holds a gunicorn worker (or a
+# greenlet, if using gevent workers) while it is open, so the stream is
+# closed after the max duration (clients reconnect automatically). Keep
+# the max duration below the gunicorn timeout, which otherwise kills
+# sync workers that are serving a stream.
+STATUS_STREAM_HEARTBEAT_INTERVAL = 15 # seconds
+STATUS_STREAM_MAX_DURATION = 60 # seconds
+
 ###############################################################################
 # END Settings for Operation executions
 ###############################################################################
@@ -502,6 +612,16 @@ CONTAINER_REGISTRY = get_env('CONTAINER_REGISTRY')
 # A string that indicates where Docker containers are held. 
 DOCKER_REPO_ORG = 'web-mev'
 
+# During ingestion, the container images used by an operation are located
+# concurrently (at most MAX_CONCURRENT_IMAGE_CHECKS at once). The images
+# which were located are cached for DOCKER_IMAGE_EXISTS_CACHE_TIMEOUT seconds so
+# that ingesting a new revision of an operation does not look up the same
+# images again. Since ingestion requires tagged images, these are not
+# expected to change. Set the timeout to None to cache them indefinitely.
+MAX_CONCURRENT_IMAGE_CHECKS = 4
+DOCKER_IMAGE_EXISTS_CACHE_ALIAS = 'default'
+DOCKER_IMAGE_EXISTS_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
 ###############################################################################
 # END Settings for Docker container repos
 ###############################################################################
@@ -552,6 +672,27 @@ from api.filters import *
 # Don't change unless you know what you're doing.
 PUBLIC_DATA_INDEXER = 'solr'
 
+# Requests to solr share a pooled (keep-alive) HTTP session. The timeouts
+# (in seconds) are given as (connect, read)
+SOLR_CONNECTION_POOL_SIZE = 10
+SOLR_REQUEST_TIMEOUT = (5, 60)
+
+# Identical queries (e.g. from the public dataset browser) are cached for
+# a short time. The cache for a core is invalidated when it is reindexed.
+# Set the timeout to zero to disable the cache.
+SOLR_QUERY_CACHE_ALIAS = 'default'
+SOLR_QUERY_CACHE_TIMEOUT = 60
+
+# Files are indexed by sending batches of documents to solr. Batches are
+# retried (with a linear backoff, in seconds) if the server is unavailable.
+# By default, documents are committed once, after all files for a dataset
+# are indexed. If SOLR_INDEX_COMMIT_WITHIN (in milliseconds) is set,
+# solr will also (soft) commit each batch within that time.
+SOLR_INDEX_BATCH_SIZE = 5000
+SOLR_INDEX_MAX_RETRIES = 3
+SOLR_INDEX_RETRY_BACKOFF = 2
+SOLR_INDEX_COMMIT_WITHIN = None
+
 ###############################################################################
 # END settings/imports for public data indexing
 ###############################################################################
@@ -584,6 +725,15 @@ GLOBUS_SCOPES = (
 )
 GLOBUS_REAUTHENTICATION_WINDOW_IN_MINUTES = 60
 
+# How frequently (in seconds) a periodic task checks the status of all the
+# in-progress Globus transfers. See mev/celery_app.py
+GLOBUS_TASK_CHECK_INTERVAL = 30
+
+# The number of times we attempt the post-transfer work (e.g. copying
+# uploaded files into WebMeV storage) before giving up and leaving
+# the transfer for an admin.
+GLOBUS_MAX_FINALIZE_ATTEMPTS = 3
+
 try:
     # this is the client/secret for the endpoint manager.
     GLOBUS_ENDPOINT_CLIENT_ID = get_env('GLOBUS_ENDPOINT_CLIENT_UUID')
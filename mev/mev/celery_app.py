@@ -1,10 +1,83 @@
 import os
 from celery import Celery
 from django.apps import apps
+from kombu import Queue
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mev.settings')
 
+# Tasks are routed to dedicated queues so that long-running work
+# (e.g. parsing large files or building public datasets) does not hold up
+# quick tasks like job finalization or file deletion. Each queue is
+# consumed by its own worker(s) so concurrency and prefetching can be set
+# per queue (see the supervisor config in the deployment).
+DEFAULT_QUEUE = 'celery'
+VALIDATION_QUEUE = 'validation'
+JOB_CONTROL_QUEUE = 'job_control'
+PUBLIC_DATA_QUEUE = 'public_data'
+INGESTION_QUEUE = 'ingestion'
+HOUSEKEEPING_QUEUE = 'housekeeping'
+
+# Within a queue, tasks which a user is actively waiting on are
+# sent with a higher priority. Note that higher numbers are handled first
+# by RabbitMQ, which only supports priorities up to the queue's max.
+MAX_TASK_PRIORITY = 9
+INTERACTIVE_TASK_PRIORITY = 8
+DEFAULT_TASK_PRIORITY = 4
+BACKGROUND_TASK_PRIORITY = 0
+
+# The queues which support priorities. The default queue is left as-is
+# since RabbitMQ does not allow changing the arguments of an existing queue.
+PRIORITY_QUEUE_NAMES = [
+    VALIDATION_QUEUE,
+    JOB_CONTROL_QUEUE,
+    PUBLIC_DATA_QUEUE,
+    INGESTION_QUEUE,
+    HOUSEKEEPING_QUEUE
+]
+
+# Maps the task names to their queue and (optionally) the default
+# priority. Tasks not listed here go to the default queue.
+TASK_ROUTES = {
+    'validate_resource': {
+        'queue': VALIDATION_QUEUE,
+        'priority': INTERACTIVE_TASK_PRIORITY
+    },
+    'submit_async_job': {
+        'queue': JOB_CONTROL_QUEUE,
+        'priority': INTERACTIVE_TASK_PRIORITY
+    },
+    'finalize_executed_op': {
+        'queue': JOB_CONTROL_QUEUE,
+        'priority': INTERACTIVE_TASK_PRIORITY
+    },
+    'check_executed_op': {
+        'queue': JOB_CONTROL_QUEUE
+    },
+    'create_dataset_from_params': {
+        'queue': PUBLIC_DATA_QUEUE
+    },
+    'ingest_new_operation': {
+        'queue': INGESTION_QUEUE
+    },
+    'perform_globus_download': {
+        'queue': INGESTION_QUEUE
+    },
+    'finalize_globus_task': {
+        'queue': INGESTION_QUEUE
+    },
+    'delete_file': {
+        'queue': HOUSEKEEPING_QUEUE,
+        'priority': INTERACTIVE_TASK_PRIORITY
+    },
+    'check_globus_tasks': {
+        'queue': HOUSEKEEPING_QUEUE
+    },
+    'cleanup_abandoned_direct_uploads': {
+        'queue': HOUSEKEEPING_QUEUE
+    }
+}
+
 app = Celery('mev')
 app.conf.update(
     broker_url='amqp://localhost',
@@ -13,7 +86,19 @@ app.conf.update(
     task_serializer='json',
     result_serializer='json',
     worker_hijack_root_logger = False,
-    enable_utc=True
+    enable_utc=True,
+    task_queues=[Queue(DEFAULT_QUEUE, routing_key=DEFAULT_QUEUE)] + [
+        Queue(name, routing_key=name,
+            queue_arguments={'x-max-priority': MAX_TASK_PRIORITY})
+        for name in PRIORITY_QUEUE_NAMES
+    ],
+    task_default_queue=DEFAULT_QUEUE,
+    task_default_priority=DEFAULT_TASK_PRIORITY,
+    task_routes=TASK_ROUTES,
+    # Workers reserve one task per process at a time by default. Otherwise
+    # a worker holds tasks it can't start yet, which defeats the priorities.
+    # Queues of short tasks can raise this with --prefetch-multiplier.
+    worker_prefetch_multiplier=1
 )
 app.autodiscover_tasks(
     lambda: [n.name for n in apps.get_app_configs()],
@@ -24,6 +109,26 @@ app.autodiscover_tasks(
 app.conf.beat_schedule = {}
 
 
+@app.on_after_configure.connect
+def setup_periodic_tasks(sender, **kwargs):
+    # Imported here since the Django settings are not
+    # necessarily configured when this module is imported
+    from django.conf import settings
+
+    sender.add_periodic_task(
+        settings.DIRECT_UPLOAD_CLEANUP_INTERVAL,
+        sender.signature('cleanup_abandoned_direct_uploads'),
+        name='cleanup_abandoned_direct_uploads'
+    )
+
+    if settings.GLOBUS_ENABLED:
+        sender.add_periodic_task(
+            settings.GLOBUS_TASK_CHECK_INTERVAL,
+            sender.signature('check_globus_tasks'),
+            name='check_globus_tasks'
+        )
+
+
 @app.task(bind=True)
 def debug_task(self):
     print('Request: {0!r}'.format(self.request))
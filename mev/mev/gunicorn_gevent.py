@@ -0,0 +1,10 @@
+# Configuration for the gunicorn program serving the job status stream
+# with gevent workers (see the gunicorn_stream program in the deployment).
+# gevent patches the standard library, but psycopg2 is a C extension, so
+# its queries would block all the greenlets of a worker. psycogreen makes
+# psycopg2 wait on the gevent loop instead.
+
+
+def post_fork(server, worker):
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
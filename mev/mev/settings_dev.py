@@ -12,6 +12,10 @@ DEBUG = True
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    },
+    RESOURCE_CONTENTS_CACHE_ALIAS: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'resource-contents'
     }
 }
 
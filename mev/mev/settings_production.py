@@ -17,6 +17,56 @@ EMAIL_HOST_PASSWORD = os.environ['EMAIL_HOST_PASSWORD']
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 
+# The Django caches are file-based so that they are shared between the
+# processes on this host. If REDIS_CACHE_URL is set, Redis is used instead.
+# Resource contents (e.g. pages of large tables) are much larger than the
+# other cached items (upload progress, query results, etc.) so they are kept
+# separately; otherwise, culling would evict the small, frequently used items
+# to make room for them.
+if os.environ.get('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_CACHE_URL']
+        },
+        RESOURCE_CONTENTS_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_CONTENTS_CACHE_URL',
+                os.environ['REDIS_CACHE_URL']),
+            'KEY_PREFIX': 'resource_contents'
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(DATA_DIR, 'django_cache'),
+            'OPTIONS': {
+                'MAX_ENTRIES': 1000
+            }
+        },
+        RESOURCE_CONTENTS_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(DATA_DIR, 'resource_contents_cache'),
+            'OPTIONS': {
+                # entries can be up to RESOURCE_CONTENTS_CACHE_MAX_ITEM_BYTES
+                'MAX_ENTRIES': 200
+            }
+        }
+    }
+
+# Job status changes are published by the Celery workers, so the
+# status events need to pass through a shared cache. This requires Redis
+# since the file-based cache does not have atomic increments and can cull
+# the event counters. Note that the Redis maxmemory-policy should be
+# `noeviction` or one of the `volatile-*` policies so that the counters
+# (which do not expire) are not evicted. Without Redis, the status stream
+# is disabled and clients poll for the status of their jobs.
+if os.environ.get('REDIS_CACHE_URL'):
+    STATUS_BROKER = 'cache'
+else:
+    STATUS_BROKER = None
+
 ###############################################################################
 # START logging settings
 ###############################################################################
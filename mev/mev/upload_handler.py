@@ -1,3 +1,6 @@
+import time
+
+from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadhandler import FileUploadHandler
 
@@ -7,12 +10,19 @@ class UploadProgressCachedHandler(FileUploadHandler):
     The HTTP POST request must contain a header or query parameter, 'X-Progress-ID'
     which should contain a unique string to identify the upload to be tracked.
     Note that Django mutates 'X-Progress-ID' to 'HTTP_X_PROGRESS_ID'
+
+    The progress is kept locally and only written to the cache when it
+    has advanced sufficiently (see the UPLOAD_PROGRESS_* settings). This
+    avoids a cache request for every chunk of the upload.
     '''
 
     def __init__(self, request=None):
         super().__init__(request)
         self.progress_id = None
         self.cache_key = None
+        self.uploaded = 0
+        self.last_reported = 0
+        self.last_reported_time = None
 
     def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
         '''
@@ -38,21 +48,18 @@ class UploadProgressCachedHandler(FileUploadHandler):
             self.progress_id = self.request.META['HTTP_X_PROGRESS_ID']
         if self.progress_id:
             self.cache_key = "%s_%s" % (self.request.META['REMOTE_ADDR'], self.progress_id )
-            cache.set(self.cache_key, {
-                'length': self.content_length,
-                'uploaded' : 0
-            })
+            self._report_progress()
 
-    # This method needs to be here so that the other handlers can 
+    # This method needs to be here so that the other handlers can
     # handle the creation of appropriate in-memory or temporary files
     def new_file(self, *args, **kwargs):
         pass
 
     def receive_data_chunk(self, raw_data, start):
         if self.cache_key:
-            data = cache.get(self.cache_key)
-            data['uploaded'] += self.chunk_size
-            cache.set(self.cache_key, data)
+            self.uploaded += len(raw_data)
+            if self._should_report_progress():
+                self._report_progress()
         return raw_data
 
     # This method needs to be present, but the actual implementation
@@ -63,3 +70,35 @@ class UploadProgressCachedHandler(FileUploadHandler):
     def upload_complete(self):
         if self.cache_key:
             cache.delete(self.cache_key)
+
+    def _should_report_progress(self):
+        '''
+        Returns True if the progress has advanced enough since
+        it was last written to the cache.
+        '''
+        delta = self.uploaded - self.last_reported
+        if delta == 0:
+            return False
+
+        bytes_step = settings.UPLOAD_PROGRESS_BYTES_STEP
+        if bytes_step is not None and delta >= bytes_step:
+            return True
+
+        percent_step = settings.UPLOAD_PROGRESS_PERCENT_STEP
+        if (percent_step is not None) and self.content_length:
+            if (100 * delta / self.content_length) >= percent_step:
+                return True
+
+        interval = settings.UPLOAD_PROGRESS_INTERVAL
+        if interval is not None:
+            if (time.monotonic() - self.last_reported_time) >= interval:
+                return True
+        return False
+
+    def _report_progress(self):
+        cache.set(self.cache_key, {
+            'length': self.content_length,
+            'uploaded' : self.uploaded
+        })
+        self.last_reported = self.uploaded
+        self.last_reported_time = time.monotonic()
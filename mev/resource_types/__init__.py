@@ -1,5 +1,7 @@
 import logging
 
+from django.conf import settings
+
 from constants import FASTQ_KEY, \
     FASTA_KEY, \
     ALIGNMENTS_KEY, \
@@ -46,6 +48,7 @@ from .json_types import JsonResource
 from .genomic_display_types import WigFileResource, \
     BigWigFileResource, \
     BedGraphFileResource
+from .contents_cache import get_cached_contents
 
 logger = logging.getLogger(__name__)
 
@@ -92,10 +95,13 @@ RESOURCE_TYPES_WITHOUT_VALIDATION = set([
     GeneralResource
 ])
 
-# At minimum, those types that don't have validation methods also 
-# will not return resource previews. For instance, we do not want to 
-# produce the contents of a FASTQ file. 
-RESOURCE_TYPES_WITHOUT_CONTENTS_VIEW = RESOURCE_TYPES_WITHOUT_VALIDATION
+# These types do not return resource contents or previews. Note that
+# some types without validation (e.g. FASTQ) can still provide
+# contents, since they stream only the records that are requested.
+RESOURCE_TYPES_WITHOUT_CONTENTS_VIEW = set([
+    BAMIndexResource,
+    GeneralResource
+])
 
 
 def get_resource_type_instance(resource_type_str):
@@ -155,6 +161,13 @@ def get_contents(resource_instance, query_params={}, preview=False):
         
     # instantiate the proper class for this type:
     resource_type = resource_class()
+    if getattr(resource_type, 'CACHE_CONTENTS', False):
+        # the page params are ignored since pagination
+        # is applied to the (cached) contents
+        return get_cached_contents(resource_instance, query_params, preview,
+            lambda: resource_type.get_contents(
+                resource_instance, query_params, preview=preview),
+            ignored_params=[settings.PAGE_PARAM, settings.PAGE_SIZE_PARAM])
     return resource_type.get_contents(resource_instance, query_params, preview=preview)
 
 
@@ -1,14 +1,26 @@
+from io import BytesIO
+
 from constants import RESOURCE_KEY, \
     OBSERVATION_SET_KEY, \
     FEATURE_SET_KEY, \
     PARENT_OP_KEY, \
     UNSPECIFIED_FORMAT
 
+# When reading the leading lines of a file (e.g. for previews), we
+# initially request this many bytes. If that does not contain enough
+# lines, we double the request until it does (or we reach the end of the file)
+PREVIEW_INITIAL_BYTES = 64 * 1024
+
 
 class DataResource(object):
 
     STANDARD_FORMAT = UNSPECIFIED_FORMAT
 
+    # Whether the results of `get_contents` can be cached and reused for
+    # identical queries (see contents_cache.py). Pagination is performed
+    # on the cached results, so they cannot depend on the page params.
+    CACHE_CONTENTS = False
+
     def validate_type(self, resource_instance, file_format):
         raise NotImplementedError('You must'
         ' implement this method in the derived class')
@@ -44,6 +56,37 @@ class DataResource(object):
         '''
         return path.split('.')[-1].lower()
 
+    @staticmethod
+    def read_leading_lines(resource_instance, num_lines, comment=None):
+        '''
+        Returns a file-like BytesIO containing the leading lines of the
+        resource's file. Only the bytes at the start of the file are 
+        read from storage (e.g. with a ranged request for bucket storage)
+        so that previews of large files are inexpensive.
+
+        The returned content has at least `num_lines` complete lines
+        (not counting blank lines or lines starting with `comment`),
+        unless the file has fewer lines. Partial lines are dropped.
+        '''
+        storage = resource_instance.datafile.storage
+        num_bytes = PREVIEW_INITIAL_BYTES
+        while True:
+            content = storage.read_leading_bytes(
+                resource_instance.datafile.name, num_bytes)
+            if len(content) < num_bytes:
+                # we have the full file
+                return BytesIO(content)
+
+            # drop any trailing partial line
+            content = content[:content.rfind(b'\n') + 1]
+            lines = [x for x in content.splitlines() if len(x.strip()) > 0]
+            if comment is not None:
+                lines = [x for x in lines 
+                    if not x.startswith(comment.encode('utf-8'))]
+            if len(lines) >= num_lines:
+                return BytesIO(content)
+            num_bytes *= 2
+
     @staticmethod
     def get_paginator():
         raise NotImplementedError('Must override this method in a subclass.')
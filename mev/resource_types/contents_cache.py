@@ -0,0 +1,211 @@
+# This file contains a two-tier cache for the results of resource
+# "contents" queries (e.g. a filtered and sorted table). Users paging
+# through a table will repeat the same query many times, so we keep the
+# results rather than re-parsing the file for each request.
+#
+# The first tier is held in the memory of each process and is limited
+# by a total size (in bytes). The second tier is the Django cache,
+# which can be shared between processes (depending on the backend).
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+LOCAL_HITS = 'local_hits'
+SHARED_HITS = 'shared_hits'
+MISSES = 'misses'
+EVICTIONS = 'evictions'
+UNCACHEABLE = 'uncacheable'
+
+# For contents with many records (e.g. table rows), the pickled size
+# is estimated from this many records before pickling the full contents
+SIZE_ESTIMATE_SAMPLE_RECORDS = 100
+
+
+class LocalContentsCache(object):
+    '''
+    A thread-safe LRU cache of pickled contents. The total size of
+    the entries is kept under settings.RESOURCE_CONTENTS_LOCAL_CACHE_MAX_BYTES
+    '''
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.num_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            except KeyError:
+                return None
+
+    def set(self, key, value):
+        '''
+        Adds the (bytes) `value` and returns the number of
+        entries that were evicted to make room.
+        '''
+        max_bytes = settings.RESOURCE_CONTENTS_LOCAL_CACHE_MAX_BYTES
+        if len(value) > max_bytes:
+            return 0
+        num_evicted = 0
+        with self.lock:
+            if key in self.entries:
+                self.num_bytes -= len(self.entries.pop(key))
+            while self.num_bytes + len(value) > max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.num_bytes -= len(evicted)
+                num_evicted += 1
+            self.entries[key] = value
+            self.num_bytes += len(value)
+        return num_evicted
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.num_bytes = 0
+
+
+_local_cache = LocalContentsCache()
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _increment(stat, n=1):
+    with _stats_lock:
+        _stats[stat] += n
+
+
+def get_shared_cache():
+    return caches[settings.RESOURCE_CONTENTS_CACHE_ALIAS]
+
+
+def get_cache_key(resource_instance, query_params, preview, ignored_params=()):
+    '''
+    Returns the cache key for a query. Along with the query itself, the
+    key depends on the resource's file, type, and modification time. Hence,
+    if the resource is changed, prior entries are no longer used and will
+    eventually be evicted.
+
+    `ignored_params` are query param names which do not change the
+    contents (e.g. the page, if pagination happens after the query).
+    '''
+    if hasattr(query_params, 'lists'):
+        params = sorted((k, sorted(v)) for k, v in query_params.lists()
+            if not k in ignored_params)
+    else:
+        params = sorted((k, str(v)) for k, v in query_params.items()
+            if not k in ignored_params)
+    s = ':'.join([
+        str(resource_instance.datafile.name),
+        str(resource_instance.size),
+        str(resource_instance.resource_type),
+        resource_instance.modification_datetime.isoformat(),
+        str(preview),
+        str(params)
+    ])
+    h = hashlib.md5(s.encode('utf-8')).hexdigest()
+    return f'resource_contents:{resource_instance.pk}:{h}'
+
+
+def estimate_pickled_size(contents):
+    '''
+    Returns an estimate of the pickled size (in bytes) of a list of
+    records, based on a sample of those records. Returns None if the
+    contents are small enough (or not a list) so that no estimate is made.
+    '''
+    if (not isinstance(contents, list)) or \
+        (len(contents) <= SIZE_ESTIMATE_SAMPLE_RECORDS):
+        return None
+    sample = pickle.dumps(contents[:SIZE_ESTIMATE_SAMPLE_RECORDS],
+        protocol=pickle.HIGHEST_PROTOCOL)
+    return len(sample) * len(contents) // SIZE_ESTIMATE_SAMPLE_RECORDS
+
+
+def get_cached_contents(resource_instance, query_params, preview,
+    get_contents_fn, ignored_params=()):
+    '''
+    Returns the contents from the cache if possible. Otherwise, calls
+    `get_contents_fn` (which takes no arguments) and caches the result.
+    Exceptions (e.g. for bad query params) are not cached.
+    '''
+    if not settings.RESOURCE_CONTENTS_CACHE_ENABLED:
+        return get_contents_fn()
+
+    key = get_cache_key(resource_instance, query_params,
+        preview, ignored_params)
+
+    value = _local_cache.get(key)
+    if value is not None:
+        _increment(LOCAL_HITS)
+        return pickle.loads(value)
+
+    shared_cache = get_shared_cache()
+    try:
+        value = shared_cache.get(key)
+    except Exception as ex:
+        # the cache is an optimization, so we do not want
+        # to fail the request if it is unavailable
+        logger.warning(f'Could not query the contents cache: {ex}')
+        value = None
+    if value is not None:
+        _increment(SHARED_HITS)
+        _increment(EVICTIONS, _local_cache.set(key, value))
+        return pickle.loads(value)
+
+    _increment(MISSES)
+    contents = get_contents_fn()
+    max_bytes = settings.RESOURCE_CONTENTS_CACHE_MAX_ITEM_BYTES
+    try:
+        # avoid pickling (i.e. copying) large contents which will not be cached
+        estimated_size = estimate_pickled_size(contents)
+        if (estimated_size is not None) and (estimated_size > max_bytes):
+            _increment(UNCACHEABLE)
+            return contents
+        value = pickle.dumps(contents, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as ex:
+        logger.info(f'Contents for resource {resource_instance.pk}'
+            f' could not be cached: {ex}')
+        _increment(UNCACHEABLE)
+        return contents
+
+    if len(value) > max_bytes:
+        _increment(UNCACHEABLE)
+        return contents
+
+    _increment(EVICTIONS, _local_cache.set(key, value))
+    try:
+        shared_cache.set(key, value,
+            timeout=settings.RESOURCE_CONTENTS_SHARED_CACHE_TIMEOUT)
+    except Exception as ex:
+        logger.warning(f'Could not add to the contents cache: {ex}')
+    return contents
+
+
+def get_cache_stats():
+    '''
+    Returns a dict of the hit/miss counts (for this process)
+    and the current size of the local tier.
+    '''
+    with _stats_lock:
+        stats = {k: _stats[k] for k in
+            [LOCAL_HITS, SHARED_HITS, MISSES, EVICTIONS, UNCACHEABLE]}
+    stats['local_entries'] = len(_local_cache.entries)
+    stats['local_bytes'] = _local_cache.num_bytes
+    stats['local_max_bytes'] = settings.RESOURCE_CONTENTS_LOCAL_CACHE_MAX_BYTES
+    return stats
+
+
+def clear_local_cache():
+    '''
+    Empties the local tier and resets the counters
+    '''
+    _local_cache.clear()
+    with _stats_lock:
+        _stats.clear()
@@ -1,10 +1,55 @@
+import zlib
+import struct
+
 from constants import PARENT_OP_KEY, \
     UNSPECIFIED_FORMAT
 
+from exceptions import ParseException
+
 from .base import DataResource
+from .streamed_contents import StreamedContentsMixin, \
+    iter_lines
+
+# Lines in WIG and BedGraph files which do not hold data
+TRACK_LINE_PREFIXES = ('track', 'browser', '#')
+
+# Constants for the BigWig binary format. See
+# https://genome.ucsc.edu/goldenPath/help/bigWig.html and the
+# supplement of Kent et al. (2010) for the layout.
+BIGWIG_MAGIC = 0x888FFC26
+BIGWIG_HEADER_SIZE = 64
+BIGWIG_SUMMARY_SIZE = 40
+CHROM_TREE_MAGIC = 0x78CA8C91
+CHROM_TREE_HEADER_SIZE = 32
+CHROM_TREE_NODE_HEADER_SIZE = 4
+RTREE_MAGIC = 0x2468ACE0
+RTREE_HEADER_SIZE = 48
+RTREE_NODE_HEADER_SIZE = 4
+RTREE_LEAF_ITEM_SIZE = 32
+RTREE_CHILD_ITEM_SIZE = 24
+DATA_SECTION_HEADER_SIZE = 24
+BEDGRAPH_SECTION = 1
+VARIABLE_STEP_SECTION = 2
+FIXED_STEP_SECTION = 3
+
+# Query parameters for requesting the values in a region of a BigWig
+# file. As in the BigWig format, positions are 0-based and half-open.
+REGION_CHROM_PARAM = 'chrom'
+REGION_START_PARAM = 'start'
+REGION_END_PARAM = 'end'
+
+# The maximum number of values returned for a region. Requests
+# for larger regions need to be split by the client.
+BIGWIG_MAX_REGION_RECORDS = 10000
 
+# The maximum number of bytes of data blocks read for a region, which
+# is checked (using the index) before any data is read. Contiguous
+# blocks are read together, up to BIGWIG_MAX_READ_BYTES per request.
+BIGWIG_MAX_REGION_BYTES = 4 * 1024 * 1024
+BIGWIG_MAX_READ_BYTES = 1024 * 1024
 
-class WigFileResource(DataResource):
+
+class WigFileResource(StreamedContentsMixin, DataResource):
 
     ACCEPTABLE_FORMATS = [UNSPECIFIED_FORMAT]
     DESCRIPTION = 'A WIG-format file.'
@@ -26,6 +71,55 @@ class WigFileResource(DataResource):
             self.metadata[PARENT_OP_KEY] = parent_op_pk
         return self.metadata
 
+    @staticmethod
+    def parse_declaration(line):
+        '''
+        Parses a "variableStep" or "fixedStep" declaration line
+        into a dict, e.g. {'chrom': 'chr1', 'span': '25'}
+        '''
+        declaration = {}
+        for item in line.split()[1:]:
+            try:
+                k, v = item.split('=')
+            except ValueError:
+                raise ParseException(f'Could not parse the line: {line}')
+            declaration[k] = v
+        return declaration
+
+    def iter_records(self, resource_instance):
+        '''
+        Yields a dict for each data value. Positions are 1-based
+        and inclusive, as in the WIG format.
+        '''
+        step_type = None
+        for line in iter_lines(resource_instance):
+            line = line.strip()
+            if (len(line) == 0) or line.startswith(TRACK_LINE_PREFIXES):
+                continue
+            try:
+                if line.startswith(('variableStep', 'fixedStep')):
+                    step_type = line.split()[0]
+                    declaration = WigFileResource.parse_declaration(line)
+                    chrom = declaration['chrom']
+                    span = int(declaration.get('span', 1))
+                    if step_type == 'fixedStep':
+                        position = int(declaration['start'])
+                        step = int(declaration['step'])
+                elif step_type == 'variableStep':
+                    start, value = line.split()
+                    start = int(start)
+                    yield {'chrom': chrom, 'start': start,
+                        'end': start + span - 1, 'value': float(value)}
+                elif step_type == 'fixedStep':
+                    yield {'chrom': chrom, 'start': position,
+                        'end': position + span - 1, 'value': float(line)}
+                    position += step
+                else:
+                    raise ParseException('Data was found prior to a'
+                        ' variableStep or fixedStep declaration.')
+            except (KeyError, ValueError):
+                raise ParseException(f'Could not parse the line: {line}')
+
 
 class BigWigFileResource(DataResource):
 
@@ -49,8 +143,261 @@ class BigWigFileResource(DataResource):
             self.metadata[PARENT_OP_KEY] = parent_op_pk
         return self.metadata
 
+    @staticmethod
+    def _read(resource_instance, start, num_bytes):
+        data = resource_instance.datafile.storage.read_byte_range(
+            resource_instance.datafile.name, start, num_bytes)
+        if len(data) < num_bytes:
+            raise ParseException('The BigWig file was truncated or'
+                ' not properly formatted.')
+        return data
+
+    def read_header(self, resource_instance):
+        '''
+        Returns a dict of the fields in the BigWig header that we use.
+        '''
+        header = self._read(resource_instance, 0, BIGWIG_HEADER_SIZE)
+        byte_order = None
+        for x in ['<', '>']:
+            if struct.unpack(x + 'I', header[:4])[0] == BIGWIG_MAGIC:
+                byte_order = x
+        if byte_order is None:
+            raise ParseException('The file was not in BigWig format.')
+
+        (version, zoom_levels, chrom_tree_offset, _, full_index_offset,
+            _, _, _, total_summary_offset, uncompress_buf_size) = struct.unpack(
+                byte_order + 'HHQQQHHQQI', header[4:56])
+        return {
+            'byte_order': byte_order,
+            'version': version,
+            'zoom_levels': zoom_levels,
+            'chrom_tree_offset': chrom_tree_offset,
+            'full_index_offset': full_index_offset,
+            'total_summary_offset': total_summary_offset,
+            # data blocks are zlib-compressed if this is non-zero
+            'is_compressed': uncompress_buf_size > 0
+        }
+
+    def read_chromosomes(self, resource_instance, byte_order, offset):
+        '''
+        Reads the chromosome names, IDs and sizes from the B+ tree
+        starting at `offset`. Returns a list of dicts.
+        '''
+        header = self._read(resource_instance, offset, CHROM_TREE_HEADER_SIZE)
+        magic, block_size, key_size, val_size, item_count = struct.unpack(
+            byte_order + 'IIIIQ', header[:24])
+        if magic != CHROM_TREE_MAGIC:
+            raise ParseException('The chromosome index of the BigWig'
+                ' file was not properly formatted.')
+
+        chromosomes = []
+        node_offsets = [offset + CHROM_TREE_HEADER_SIZE]
+        while len(node_offsets) > 0:
+            node_offset = node_offsets.pop(0)
+            node_header = self._read(resource_instance, node_offset,
+                CHROM_TREE_NODE_HEADER_SIZE)
+            is_leaf, _, count = struct.unpack(byte_order + 'BBH', node_header)
+            # leaf items have the chromosome ID and size while
+            # non-leaf items have the offset of a child node
+            item_size = key_size + (val_size if is_leaf else 8)
+            items = self._read(resource_instance,
+                node_offset + CHROM_TREE_NODE_HEADER_SIZE, count * item_size)
+            for i in range(count):
+                item = items[i * item_size:(i + 1) * item_size]
+                if is_leaf:
+                    chrom_id, chrom_size = struct.unpack(
+                        byte_order + 'II', item[key_size:key_size + 8])
+                    chromosomes.append({
+                        'name': item[:key_size].rstrip(b'\x00').decode('utf-8'),
+                        'id': chrom_id,
+                        'length': chrom_size
+                    })
+                else:
+                    node_offsets.append(struct.unpack(
+                        byte_order + 'Q', item[key_size:])[0])
+        return chromosomes
+
+    def find_data_blocks(self, resource_instance, byte_order, offset,
+        chrom_id, start, end):
+        '''
+        Traverses the R-tree index starting at `offset` and returns a
+        list of (offset, size) tuples for the data blocks which overlap
+        the region. Only the index nodes that overlap the region are read.
+        '''
+        header = self._read(resource_instance, offset, RTREE_HEADER_SIZE)
+        if struct.unpack(byte_order + 'I', header[:4])[0] != RTREE_MAGIC:
+            raise ParseException('The data index of the BigWig'
+                ' file was not properly formatted.')
+
+        blocks = []
+        node_offsets = [offset + RTREE_HEADER_SIZE]
+        while len(node_offsets) > 0:
+            node_offset = node_offsets.pop(0)
+            node_header = self._read(resource_instance, node_offset,
+                RTREE_NODE_HEADER_SIZE)
+            is_leaf, _, count = struct.unpack(byte_order + 'BBH', node_header)
+            # leaf items give the location of a data block while
+            # non-leaf items give the offset of a child node
+            item_size = RTREE_LEAF_ITEM_SIZE if is_leaf else RTREE_CHILD_ITEM_SIZE
+            items = self._read(resource_instance,
+                node_offset + RTREE_NODE_HEADER_SIZE, count * item_size)
+            for i in range(count):
+                (start_chrom, start_base, end_chrom, end_base,
+                    item_offset) = struct.unpack_from(
+                        byte_order + 'IIIIQ', items, i * item_size)
+                if ((start_chrom, start_base) < (chrom_id, end)) \
+                    and ((end_chrom, end_base) > (chrom_id, start)):
+                    if is_leaf:
+                        size = struct.unpack_from(
+                            byte_order + 'Q', items, i * item_size + 24)[0]
+                        blocks.append((item_offset, size))
+                    else:
+                        node_offsets.append(item_offset)
+        return sorted(blocks)
+
+    @staticmethod
+    def parse_data_block(data, byte_order, chrom_id, start, end):
+        '''
+        Yields (start, end, value) tuples for the items in the (decompressed)
+        data block which overlap the region.
+        '''
+        (section_chrom, section_start, _, step, span, section_type,
+            _, count) = struct.unpack_from(byte_order + 'IIIIIBBH', data, 0)
+        offset = DATA_SECTION_HEADER_SIZE
+        for i in range(count):
+            if section_type == BEDGRAPH_SECTION:
+                item_start, item_end, value = struct.unpack_from(
+                    byte_order + 'IIf', data, offset)
+                offset += 12
+            elif section_type == VARIABLE_STEP_SECTION:
+                item_start, value = struct.unpack_from(
+                    byte_order + 'If', data, offset)
+                item_end = item_start + span
+                offset += 8
+            elif section_type == FIXED_STEP_SECTION:
+                value = struct.unpack_from(byte_order + 'f', data, offset)[0]
+                item_start = section_start + i * step
+                item_end = item_start + span
+                offset += 4
+            else:
+                raise ParseException('The BigWig file contained an'
+                    ' unknown type of data section.')
+            if (section_chrom == chrom_id) and (item_start < end) \
+                and (item_end > start):
+                yield item_start, item_end, value
+
+    @staticmethod
+    def get_region_params(query_params, chromosomes):
+        '''
+        Returns a tuple of the chromosome (a dict from `read_chromosomes`)
+        and the start and end positions of the requested region.
+        '''
+        chrom_name = query_params[REGION_CHROM_PARAM]
+        try:
+            chrom = [x for x in chromosomes if x['name'] == chrom_name][0]
+        except IndexError:
+            raise ParseException(f'The chromosome "{chrom_name}" was'
+                ' not found in the BigWig file.')
+        try:
+            start = int(query_params.get(REGION_START_PARAM, 0))
+            end = int(query_params.get(REGION_END_PARAM, chrom['length']))
+        except ValueError:
+            raise ParseException('The start and end of the region'
+                ' must be integers.')
+        if (start < 0) or (end <= start):
+            raise ParseException('The start of the region must be non-negative'
+                ' and less than the end.')
+        return chrom, start, end
+
+    def query_region(self, resource_instance, header, chromosomes, query_params):
+        '''
+        Returns the values in the requested region, using the R-tree
+        index to read only the data blocks which overlap the region.
+        Adjacent blocks are read with a single request.
+
+        Regions whose blocks add up to more than BIGWIG_MAX_REGION_BYTES
+        are rejected before reading any data.
+        '''
+        byte_order = header['byte_order']
+        chrom, start, end = self.get_region_params(query_params, chromosomes)
+        blocks = self.find_data_blocks(resource_instance, byte_order,
+            header['full_index_offset'], chrom['id'], start, end)
+        if sum([size for _, size in blocks]) > BIGWIG_MAX_REGION_BYTES:
+            raise ParseException('The region was too large. Please request'
+                ' a smaller region.')
 
-class BedGraphFileResource(DataResource):
+        # merge blocks that are contiguous in the file, up to
+        # BIGWIG_MAX_READ_BYTES per read
+        ranges = []
+        for offset, size in blocks:
+            if (len(ranges) > 0) and (ranges[-1][0] + ranges[-1][1] == offset) \
+                and (ranges[-1][1] + size <= BIGWIG_MAX_READ_BYTES):
+                ranges[-1][2].append(size)
+                ranges[-1][1] += size
+            else:
+                ranges.append([offset, size, [size]])
+
+        records = []
+        for offset, total_size, sizes in ranges:
+            data = self._read(resource_instance, offset, total_size)
+            block_start = 0
+            for size in sizes:
+                block = data[block_start:block_start + size]
+                block_start += size
+                if header['is_compressed']:
+                    try:
+                        block = zlib.decompress(block)
+                    except zlib.error as ex:
+                        raise ParseException('Could not decompress the'
+                            f' BigWig data. The error reported was: {ex}')
+                for item_start, item_end, value in self.parse_data_block(
+                    block, byte_order, chrom['id'], start, end):
+                    records.append({'chrom': chrom['name'], 'start': item_start,
+                        'end': item_end, 'value': value})
+                if len(records) > BIGWIG_MAX_REGION_RECORDS:
+                    raise ParseException('The region contained more than'
+                        f' {BIGWIG_MAX_REGION_RECORDS} values. Please request'
+                        ' a smaller region.')
+        return records
+
+    def get_contents(self, resource_instance, query_params={}, preview=False):
+        '''
+        Returns the header information of the BigWig file, including
+        the chromosomes and the summary statistics over the whole file.
+        Only the header and index blocks are read from storage.
+
+        If a chromosome (and optionally a start and end) is given in the
+        query parameters, returns the values in that region instead.
+        '''
+        header = self.read_header(resource_instance)
+        byte_order = header['byte_order']
+        chromosomes = self.read_chromosomes(
+            resource_instance, byte_order, header['chrom_tree_offset'])
+        if (not preview) and (REGION_CHROM_PARAM in query_params):
+            return self.query_region(resource_instance, header,
+                chromosomes, query_params)
+
+        contents = {
+            'version': header['version'],
+            'zoom_levels': header['zoom_levels'],
+            'chromosomes': [{'name': x['name'], 'length': x['length']}
+                for x in chromosomes]
+        }
+        if header['total_summary_offset'] > 0:
+            summary = self._read(resource_instance,
+                header['total_summary_offset'], BIGWIG_SUMMARY_SIZE)
+            bases_covered, min_val, max_val, sum_data, _ = struct.unpack(
+                byte_order + 'Qdddd', summary)
+            contents['summary'] = {
+                'bases_covered': bases_covered,
+                'min': min_val,
+                'max': max_val,
+                'mean': sum_data / bases_covered if bases_covered > 0 else None
+            }
+        return contents
+
+
+class BedGraphFileResource(StreamedContentsMixin, DataResource):
 
     ACCEPTABLE_FORMATS = [UNSPECIFIED_FORMAT]
     DESCRIPTION = 'A BedGraph-format file.'
@@ -71,3 +418,19 @@ class BedGraphFileResource(DataResource):
         if parent_op_pk:
             self.metadata[PARENT_OP_KEY] = parent_op_pk
         return self.metadata
+
+    def iter_records(self, resource_instance):
+        '''
+        Yields a dict for each line of data. As in the BedGraph
+        format, positions are 0-based and half-open.
+        '''
+        for line in iter_lines(resource_instance):
+            line = line.strip()
+            if (len(line) == 0) or line.startswith(TRACK_LINE_PREFIXES):
+                continue
+            try:
+                chrom, start, end, value = line.split()[:4]
+                yield {'chrom': chrom, 'start': int(start),
+                    'end': int(end), 'value': float(value)}
+            except ValueError:
+                raise ParseException(f'Could not parse the line: {line}')
@@ -0,0 +1,387 @@
+# This file contains a "contents engine" for JSON-based resources
+# that are arrays of records (e.g. the per-gene results of an
+# analysis). Rather than parsing the full JSON document for
+# every request, we write a sidecar which permits us to read
+# only the data needed to answer a contents request.
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+
+from exceptions import ParseException
+
+from api.utilities.basic_utils import make_local_directory
+
+logger = logging.getLogger(__name__)
+
+# Names of the files that make up a sidecar.
+# - the records file has one JSON-serialized record per line
+#   so that we can seek to any record given the byte offsets
+#   held in the offsets file.
+# - the columns file has one line per top-level field. Each line holds
+#   all the values for that field (in record order) so that filtering
+#   and sorting only read the fields they need.
+# - the index file is small and tells us where each column
+#   is located in the columns file.
+RECORDS_FILENAME = 'records.ndjson'
+RECORD_OFFSETS_FILENAME = 'record_offsets.npy'
+COLUMNS_FILENAME = 'columns.ndjson'
+INDEX_FILENAME = 'index.json'
+
+# sidecars are written to temporary directories (with this prefix)
+# before they are moved into place
+SIDECAR_TMP_PREFIX = 'tmp'
+
+# keys used in the index file and in each line of the columns file
+IS_RECORD_ARRAY_KEY = 'is_record_array'
+NUM_RECORDS_KEY = 'num_records'
+COLUMNS_KEY = 'columns'
+VALUES_KEY = 'values'
+MISSING_KEY = 'missing'
+
+
+def is_record_array(j):
+    '''
+    Returns True if the parsed JSON is an array where every
+    item is an object/dict.
+    '''
+    return (type(j) is list) and all([type(x) is dict for x in j])
+
+
+def get_resource_sidecars_dir(resource_pk):
+    '''
+    Returns the directory holding all the sidecars for a resource.
+    '''
+    return os.path.join(settings.JSON_CONTENTS_CACHE_DIR, str(resource_pk))
+
+
+def delete_json_sidecars(resource_pk, keep=None):
+    '''
+    Removes the sidecars for a resource (e.g. once it is deleted). If
+    `keep` is given, that sidecar is retained and only the stale
+    sidecars (for previous versions of the datafile) are removed.
+    Sidecars which are still being written are not touched.
+    '''
+    resource_dir = get_resource_sidecars_dir(resource_pk)
+    if keep is None:
+        shutil.rmtree(resource_dir, ignore_errors=True)
+        return
+    try:
+        names = os.listdir(resource_dir)
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(resource_dir, name)
+        if (path != keep) and (not name.startswith(SIDECAR_TMP_PREFIX)):
+            logger.info(f'Removing stale JSON contents sidecar at {path}')
+            shutil.rmtree(path, ignore_errors=True)
+
+
+class JsonRecordsView(object):
+    '''
+    A list-like object which provides the records of a JsonRecordStore
+    at the requested positions. Records are only read from the sidecar
+    when they are accessed (e.g. when a page is requested by the paginator),
+    so requesting a page of a very large array only reads that page.
+    '''
+    def __init__(self, store, positions):
+        self.store = store
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.store.read_records(self.positions[index])
+        elif isinstance(index, (int, np.integer)):
+            return self.store.read_records([self.positions[index]])[0]
+        raise TypeError('Indices must be integers or slices, not'
+            f' {type(index).__name__}.')
+
+    def __iter__(self):
+        return iter(self.store.read_records(self.positions))
+
+
+class JsonRecordStore(object):
+    '''
+    Provides access to the sidecar files for a JSON-based
+    resource that is an array of records.
+    '''
+
+    def __init__(self, sidecar_dir, index):
+        self.sidecar_dir = sidecar_dir
+        self.num_records = index[NUM_RECORDS_KEY]
+        self.column_ranges = index[COLUMNS_KEY]
+        self.offsets = np.load(
+            os.path.join(sidecar_dir, RECORD_OFFSETS_FILENAME), mmap_mode='r')
+
+    @staticmethod
+    def get_sidecar_dir(resource_instance):
+        '''
+        The sidecar location depends on the resource and its current
+        datafile so that a changed file never uses a stale sidecar.
+        '''
+        key = '{pk}:{name}:{size}'.format(
+            pk=resource_instance.pk,
+            name=resource_instance.datafile.name,
+            size=resource_instance.datafile.size
+        )
+        return os.path.join(get_resource_sidecars_dir(resource_instance.pk),
+            hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    @staticmethod
+    def _write_sidecar(sidecar_dir, j):
+        '''
+        Writes the sidecar files for the parsed JSON `j` into
+        `sidecar_dir` and returns the index dict.
+        '''
+        if not is_record_array(j):
+            index = {IS_RECORD_ARRAY_KEY: False}
+        else:
+            # the field names, in the order they are first encountered
+            fields = {}
+            for record in j:
+                for k in record.keys():
+                    fields[k] = None
+
+            offsets = np.zeros(len(j) + 1, dtype=np.int64)
+            with open(os.path.join(sidecar_dir, RECORDS_FILENAME), 'wb') as fout:
+                for i, record in enumerate(j):
+                    fout.write(json.dumps(record).encode('utf-8') + b'\n')
+                    offsets[i + 1] = fout.tell()
+            np.save(os.path.join(sidecar_dir, RECORD_OFFSETS_FILENAME), offsets)
+
+            column_ranges = {}
+            with open(os.path.join(sidecar_dir, COLUMNS_FILENAME), 'wb') as fout:
+                for field in fields:
+                    values = []
+                    missing = []
+                    for i, record in enumerate(j):
+                        try:
+                            values.append(record[field])
+                        except KeyError:
+                            values.append(None)
+                            missing.append(i)
+                    start = fout.tell()
+                    fout.write(json.dumps({
+                        VALUES_KEY: values,
+                        MISSING_KEY: missing
+                    }).encode('utf-8') + b'\n')
+                    column_ranges[field] = [start, fout.tell()]
+
+            index = {
+                IS_RECORD_ARRAY_KEY: True,
+                NUM_RECORDS_KEY: len(j),
+                COLUMNS_KEY: column_ranges
+            }
+
+        # the index is written last. Its presence indicates
+        # a complete sidecar.
+        with open(os.path.join(sidecar_dir, INDEX_FILENAME), 'w') as fout:
+            json.dump(index, fout)
+        return index
+
+    @staticmethod
+    def build(resource_instance, j):
+        '''
+        Creates the sidecar for `resource_instance` given the parsed
+        JSON contents `j`. Returns a JsonRecordStore instance if `j` was
+        an array of records. Otherwise, returns None.
+
+        We write to a temporary directory and then move it into place
+        so that concurrent requests never see a partial sidecar.
+        '''
+        sidecar_dir = JsonRecordStore.get_sidecar_dir(resource_instance)
+        parent_dir = os.path.dirname(sidecar_dir)
+        if not os.path.exists(parent_dir):
+            make_local_directory(parent_dir)
+
+        tmp_dir = tempfile.mkdtemp(prefix=SIDECAR_TMP_PREFIX, dir=parent_dir)
+        try:
+            index = JsonRecordStore._write_sidecar(tmp_dir, j)
+            os.rename(tmp_dir, sidecar_dir)
+            # sidecars for earlier versions of the datafile are not used again
+            delete_json_sidecars(resource_instance.pk, keep=sidecar_dir)
+        except OSError:
+            # another process may have created the same sidecar first.
+            # Since the sidecar location is specific to the file, that
+            # one is equivalent.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(sidecar_dir, INDEX_FILENAME)):
+                raise
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        logger.info(f'Created JSON contents sidecar for resource'
+            f' ({resource_instance.pk}) at {sidecar_dir}')
+        if index[IS_RECORD_ARRAY_KEY]:
+            return JsonRecordStore(sidecar_dir, index)
+        return None
+
+    @staticmethod
+    def open(resource_instance):
+        '''
+        Returns a tuple of (bool, JsonRecordStore).
+        The bool indicates whether a sidecar existed. If it did, the
+        second item is None if the resource was NOT an array of records.
+        '''
+        sidecar_dir = JsonRecordStore.get_sidecar_dir(resource_instance)
+        try:
+            with open(os.path.join(sidecar_dir, INDEX_FILENAME)) as fin:
+                index = json.load(fin)
+        except FileNotFoundError:
+            return (False, None)
+        if index[IS_RECORD_ARRAY_KEY]:
+            return (True, JsonRecordStore(sidecar_dir, index))
+        return (True, None)
+
+    def __len__(self):
+        return self.num_records
+
+    def read_records(self, positions):
+        '''
+        Returns a list of the records at the (0-based) `positions`.
+        Contiguous runs of positions are read in a single block.
+        '''
+        records = []
+        positions = [int(x) for x in positions]
+        with open(os.path.join(self.sidecar_dir, RECORDS_FILENAME), 'rb') as fin:
+            i = 0
+            while i < len(positions):
+                # extend the run as long as the positions are consecutive
+                j = i
+                while (j + 1 < len(positions)) and \
+                    (positions[j + 1] == positions[j] + 1):
+                    j += 1
+                start = int(self.offsets[positions[i]])
+                end = int(self.offsets[positions[j] + 1])
+                fin.seek(start)
+                block = fin.read(end - start)
+                records.extend(
+                    [json.loads(x) for x in block.splitlines()])
+                i = j + 1
+        return records
+
+    def read_column(self, field):
+        '''
+        Returns a tuple of (pd.Series, np.ndarray) for the field. The
+        first item holds the values for each record and the second is a
+        boolean array which is True where the record contained the field.
+
+        Returns None if no record contained the field.
+        '''
+        try:
+            start, end = self.column_ranges[field]
+        except KeyError:
+            return None
+        with open(os.path.join(self.sidecar_dir, COLUMNS_FILENAME), 'rb') as fin:
+            fin.seek(start)
+            column = json.loads(fin.read(end - start))
+        present = np.ones(self.num_records, dtype=bool)
+        present[column[MISSING_KEY]] = False
+        return pd.Series(column[VALUES_KEY], dtype=object), present
+
+    def filter_positions(self, filter_ops):
+        '''
+        Returns a np.ndarray of the record positions which pass all
+        the filters. `filter_ops` maps a field name to a tuple of
+        (operator key, value), where the operator key is one of the keys
+        in settings.OPERATOR_MAPPING
+        '''
+        mask = np.ones(self.num_records, dtype=bool)
+        for field, (op_id, val) in filter_ops.items():
+            column = self.read_column(field)
+            if column is None:
+                # the key was not in any record. We don't consider
+                # this an error, but nothing can pass the filter.
+                return np.array([], dtype=np.int64)
+            values, present = column
+            mask &= present & self._apply_operator(values, present, op_id, val)
+        return np.flatnonzero(mask)
+
+    @staticmethod
+    def _apply_operator(values, present, op_id, val):
+        '''
+        Returns a boolean np.ndarray giving the result of the comparison
+        for each item in `values`.
+
+        Numeric comparisons are vectorized. Non-numeric values fail those
+        comparisons, consistent with the functions in settings.OPERATOR_MAPPING.
+        Other comparisons use the functions in settings.OPERATOR_MAPPING,
+        applied only to the records that contain the field.
+        '''
+        if op_id in settings.NUMERIC_OPERATORS:
+            x = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+            with np.errstate(invalid='ignore'):
+                if op_id == settings.LESS_THAN:
+                    return x < val
+                elif op_id == settings.LESS_THAN_OR_EQUAL:
+                    return x <= val
+                elif op_id == settings.GREATER_THAN:
+                    return x > val
+                elif op_id == settings.GREATER_THAN_OR_EQUAL:
+                    return x >= val
+                elif op_id == settings.ABS_VAL_GREATER_THAN:
+                    return np.abs(x) > val
+                elif op_id == settings.ABS_VAL_LESS_THAN:
+                    return np.abs(x) < val
+
+        op = settings.OPERATOR_MAPPING[op_id]
+        result = np.zeros(len(values), dtype=bool)
+        result[present] = [bool(op(x, val)) for x in values[present]]
+        return result
+
+    def sort_positions(self, positions, field, ascending):
+        '''
+        Returns the `positions` ordered by the values of `field`. Records
+        which do not contain the field (or have null values) are placed
+        at the end. If no record contains the field, the order is unchanged.
+        '''
+        column = self.read_column(field)
+        if column is None:
+            return positions
+        values, present = column
+        values[~present] = np.nan
+        try:
+            ordered = values.iloc[positions].sort_values(
+                ascending=ascending, na_position='last', kind='stable')
+        except TypeError:
+            raise ParseException(f'The values in the "{field}" field'
+                ' could not be compared for sorting.')
+        # the index of `values` is the record position
+        return ordered.index.to_numpy()
+
+
+def load_json_contents(resource_instance):
+    '''
+    Returns either a JsonRecordStore (if the JSON-based resource is
+    an array of records) or the parsed JSON.
+
+    If the sidecar does not exist yet (e.g. the resource was validated
+    prior to the sidecar's introduction), it is created here.
+    '''
+    sidecar_exists, store = JsonRecordStore.open(resource_instance)
+    if store is not None:
+        return store
+
+    logger.info('Using python-native JSON loader to'
+        f' read resource: {resource_instance.pk}')
+    j = json.load(resource_instance.datafile.open())
+    if not sidecar_exists:
+        try:
+            store = JsonRecordStore.build(resource_instance, j)
+            if store is not None:
+                return store
+        except Exception as ex:
+            logger.warning('Failed to create the JSON contents sidecar for'
+                f' resource ({resource_instance.pk}). Error was {ex}')
+    return j
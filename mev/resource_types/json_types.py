@@ -16,6 +16,9 @@ from exceptions import NonIterableContentsException, \
     ParseException
 
 from .base import DataResource
+from .json_contents import JsonRecordStore, \
+    JsonRecordsView, \
+    load_json_contents
 
 logger = logging.getLogger(__name__)
 
@@ -67,7 +70,7 @@ class JsonResourcePaginator(Paginator):
         top = bottom + self.per_page
         if top + self.orphans >= self.count:
             top = self.count
-        if type(self.object_list) == list:
+        if isinstance(self.object_list, (list, JsonRecordsView)):
             return JsonArrayPage(self.object_list[bottom:top], number, self)
         else:
             raise NonIterableContentsException()
@@ -117,7 +120,6 @@ class JsonResource(DataResource):
                 f' resource: {resource_instance.pk}')
             j = json.load(resource_instance.datafile.open())
             logger.info(f'Successfully parsed {resource_instance.pk} as JSON.')
-            return (True, None)
         except json.decoder.JSONDecodeError as ex:
             logger.info('Failed to parse JSON-based resource.')
             return (False, 'There was an issue with the JSON formatting.'
@@ -128,6 +130,16 @@ class JsonResource(DataResource):
             return (False, 'There was an unexpected encountered when attempting'
                 f' to parse the file was JSON. The reported error was: {ex}')
 
+        # Since we already have the parsed contents, create the sidecar
+        # used for serving contents requests. If this fails, the sidecar
+        # is created on the first contents request instead.
+        try:
+            JsonRecordStore.build(resource_instance, j)
+        except Exception as ex:
+            logger.warning('Failed to create the JSON contents sidecar for'
+                f' resource ({resource_instance.pk}). Error was {ex}')
+        return (True, None)
+
     def extract_metadata(self, resource_instance, parent_op_pk=None):
         # call the super method to initialize the self.metadata
         # dictionary
@@ -139,6 +151,14 @@ class JsonResource(DataResource):
         return self.metadata
 
     def get_contents(self, resource_instance, query_params={}, preview=False):
+        '''
+        Returns the (possibly filtered and sorted) JSON contents.
+
+        For JSON arrays of records, the filtering and sorting are performed
+        using the sidecar (see json_contents.py). If pagination was requested,
+        we return a list-like JsonRecordsView so that only the requested page
+        of records is read.
+        '''
 
         # since the pagination query params are among the general query parameters, we DON'T
         # want to pass them to the filtering.
@@ -151,9 +171,10 @@ class JsonResource(DataResource):
         logger.info('Get contents of JSON resource and filter'
             f' against query params: {filtering_query_params}')
         try:
-            logger.info('Using python-native JSON loader to'
-                f' read resource: {resource_instance.pk}')
-            j = json.load(resource_instance.datafile.open())
+            j = load_json_contents(resource_instance)
+            if isinstance(j, JsonRecordStore):
+                return self.get_record_store_contents(j,
+                    filtering_query_params, query_params)
             if filtering_query_params:
                 j = self.filter_based_on_query_params(j, filtering_query_params)
             if settings.SORT_PARAM in query_params:
@@ -165,11 +186,34 @@ class JsonResource(DataResource):
             logger.info(f'Failed to load JSON resource. Error was {ex}')
             raise ex
 
-    def sort_json(self, j, sort_string):
+    def get_record_store_contents(self, store, filtering_query_params, query_params):
         '''
-        Return the results sorted by a particular field.
-        Only permit simple sorts. No nested sorts on multiple
-        fields
+        Applies the filters and sorting using the sidecar for JSON arrays
+        of records. Returns a JsonRecordsView if pagination was requested.
+        Otherwise, returns a list of the records.
+        '''
+        if filtering_query_params:
+            filter_ops = self.parse_filter_params(filtering_query_params)
+            positions = store.filter_positions(filter_ops)
+        else:
+            positions = np.arange(len(store))
+
+        if settings.SORT_PARAM in query_params:
+            sort_order, field = self.parse_sort_string(
+                query_params[settings.SORT_PARAM])
+            positions = store.sort_positions(positions, field,
+                sort_order == settings.ASCENDING)
+
+        view = JsonRecordsView(store, positions)
+        if settings.PAGE_PARAM in query_params:
+            return view
+        return list(view)
+
+    def parse_sort_string(self, sort_string):
+        '''
+        Returns a tuple of the sort order (e.g. "[asc]") and the field
+        to sort on. Only permit simple sorts. No nested sorts on
+        multiple fields
         '''
         if len(sort_string.split(',')) > 1:
             raise ParseException(f'Based on the query string ({sort_string})'
@@ -187,6 +231,15 @@ class JsonResource(DataResource):
             raise ParseException(f'The sort order "{sort_order}" is'
                 ' not an available option. Choose'
                 f' from: {",".join(settings.SORTING_OPTIONS)}')
+        return sort_order, field
+
+    def sort_json(self, j, sort_string):
+        '''
+        Return the results sorted by a particular field.
+        Only permit simple sorts. No nested sorts on multiple
+        fields
+        '''
+        sort_order, field = self.parse_sort_string(sort_string)
 
         # extract the values for the field of interest. If that field doesn't exist
         # on the item, then assign it to np.nan
@@ -209,18 +262,17 @@ class JsonResource(DataResource):
                 nan_idx = ordering[-num_nans:]
                 # We strip off the indexes corresponding to the NaNs
                 # so that we can reverse the list and not put those NaNs at the front            
-                ordering = ordering[:-num_nans][::-1]
-                ordering.extend(nan_idx) # then add them back onto the tail
+                ordering = np.concatenate([ordering[:-num_nans][::-1], nan_idx])
             else:
                 ordering = ordering[::-1]
         return [j[k] for k in ordering]
 
-
-    def filter_based_on_query_params(self, j, query_params):
-        # we can only really filter if the json data structure is list-like:
-        if not type(j) is list:
-            return j
-
+    def parse_filter_params(self, query_params):
+        '''
+        Returns a dict which maps the field name to a tuple of
+        (operator key, value). The operator key is one of the keys
+        in settings.OPERATOR_MAPPING.
+        '''
         filter_ops = {}
         for k,v in query_params.items():
             # v is either a value (in the case of strict equality)
@@ -236,7 +288,7 @@ class JsonResource(DataResource):
                 except ValueError as ex:
                     val = v
                 
-                filter_ops[k] = create_closure(settings.OPERATOR_MAPPING['=='], val)
+                filter_ops[k] = ('==', val)
 
             elif len(split_v) == 2:
                 # something like "[lte]:0.01" or "[startswith]:aaa"
@@ -254,18 +306,27 @@ class JsonResource(DataResource):
                             f' parameter value {val} as a number.')
 
                 # the supplied value was ok. Check the operator supplied
-                try:
-                    op = settings.OPERATOR_MAPPING[op_id]
-                except KeyError as ex:
+                if not op_id in settings.OPERATOR_MAPPING:
                     raise ParseException(f'The operator string ("{op_id}")'
                         ' was not understood. Choose from among:'
                         f' {",".join(settings.OPERATOR_MAPPING.keys())}')
-                filter_ops[k] = create_closure(op, val)
+                filter_ops[k] = (op_id, val)
 
             else:
                 raise ParseException(f'The query param string ({v}) for'
                     f' filtering on the "{k}" field was not'
                     ' formatted properly.')
+        return filter_ops
+
+    def filter_based_on_query_params(self, j, query_params):
+        # we can only really filter if the json data structure is list-like:
+        if not type(j) is list:
+            return j
+
+        filter_ops = {}
+        for k, (op_id, val) in self.parse_filter_params(query_params).items():
+            filter_ops[k] = create_closure(settings.OPERATOR_MAPPING[op_id], val)
+
         # now go through the list and keep those that pass the filter
         filtered_list = []
         for item in j:
@@ -284,4 +345,4 @@ class JsonResource(DataResource):
                     tests.append(False)
             if all(tests):
                 filtered_list.append(item)
-        return filtered_list
\ No newline at end of file
+        return filtered_list
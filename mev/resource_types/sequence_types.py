@@ -1,6 +1,8 @@
 # This file contains information about the different 
 # sequence-based file types and methods for validating them
 
+import zlib
+import struct
 import logging
 
 from constants import FASTQ_FORMAT, \
@@ -9,7 +11,21 @@ from constants import FASTQ_FORMAT, \
     PARENT_OP_KEY, \
     UNSPECIFIED_FORMAT
 
+from exceptions import ParseException
+
 from .base import DataResource
+from .streamed_contents import StreamedContentsMixin, \
+    iter_lines, \
+    iter_decompressed
+
+# When reading the header of a BAM file, we initially request this many
+# (compressed) bytes and double the request if the header is larger.
+BAM_HEADER_INITIAL_BYTES = 64 * 1024
+BAM_MAGIC = b'BAM\x01'
+
+# FASTA sequences (e.g. whole chromosomes) can be very long, so we
+# return them in chunks of (at most) this many bases.
+FASTA_SEQUENCE_CHUNK_LENGTH = 1000
 
 logger = logging.getLogger(__name__)
 
@@ -47,7 +63,7 @@ class SequenceResource(DataResource):
             self.metadata[PARENT_OP_KEY] = parent_op_pk
         return self.metadata
 
-class FastAResource(SequenceResource):
+class FastAResource(StreamedContentsMixin, SequenceResource):
     '''
     This type is for compressed Fasta files
     '''
@@ -61,7 +77,38 @@ class FastAResource(SequenceResource):
     def validate_type(self, resource_instance, file_format):
         pass
 
-class FastQResource(SequenceResource):
+    def iter_records(self, resource_instance):
+        '''
+        Yields dicts with the name of the sequence, the (1-based) position
+        of the first base, and at most FASTA_SEQUENCE_CHUNK_LENGTH bases.
+        Long sequences are split over several records so that a page
+        never holds a full chromosome and we stop reading the file once
+        the page is filled.
+        '''
+        name = None
+        position = 1
+        sequence = ''
+        for line in iter_lines(resource_instance):
+            if line.startswith('>'):
+                if (name is not None) and ((len(sequence) > 0) or (position == 1)):
+                    yield {'name': name, 'start': position, 'sequence': sequence}
+                name = line[1:].strip()
+                position = 1
+                sequence = ''
+            elif name is not None:
+                sequence += line.strip()
+                while len(sequence) >= FASTA_SEQUENCE_CHUNK_LENGTH:
+                    yield {'name': name, 'start': position,
+                        'sequence': sequence[:FASTA_SEQUENCE_CHUNK_LENGTH]}
+                    sequence = sequence[FASTA_SEQUENCE_CHUNK_LENGTH:]
+                    position += FASTA_SEQUENCE_CHUNK_LENGTH
+            elif len(line.strip()) > 0:
+                raise ParseException('The file did not begin with a'
+                    ' FASTA header line (starting with ">").')
+        if (name is not None) and ((len(sequence) > 0) or (position == 1)):
+            yield {'name': name, 'start': position, 'sequence': sequence}
+
+class FastQResource(StreamedContentsMixin, SequenceResource):
     '''
     This resource type is for gzip-compressed Fastq files
     '''
@@ -77,6 +124,24 @@ class FastQResource(SequenceResource):
     def validate_type(self, resource_instance, file_format):
         pass
 
+    def iter_records(self, resource_instance):
+        '''
+        Yields dicts with the name, sequence, and quality string
+        of each (four-line) record.
+        '''
+        lines = (x for x in iter_lines(resource_instance) if len(x.strip()) > 0)
+        for header in lines:
+            record_lines = [next(lines, None) for i in range(3)]
+            if (not header.startswith('@')) or (None in record_lines) \
+                or (not record_lines[1].startswith('+')):
+                raise ParseException('The file did not contain properly'
+                    ' formatted four-line FASTQ records.')
+            yield {
+                'name': header[1:].strip(),
+                'sequence': record_lines[0].strip(),
+                'quality': record_lines[2].strip()
+            }
+
 
 class AlignedSequenceResource(SequenceResource):
     '''
@@ -94,6 +159,72 @@ class AlignedSequenceResource(SequenceResource):
     def validate_type(self, resource_instance, file_format):
         pass
 
+    @staticmethod
+    def parse_header(data):
+        '''
+        Parses the (decompressed) start of a BAM file. Returns None
+        if `data` does not contain the full header.
+        '''
+        if len(data) < 8:
+            return None
+        if data[:4] != BAM_MAGIC:
+            raise ParseException('The file was not in BAM format.')
+        l_text = struct.unpack_from('<i', data, 4)[0]
+        offset = 8 + l_text
+        if len(data) < offset + 4:
+            return None
+        text = data[8:offset].rstrip(b'\x00').decode('utf-8', errors='replace')
+        n_ref = struct.unpack_from('<i', data, offset)[0]
+        offset += 4
+        references = []
+        for i in range(n_ref):
+            if len(data) < offset + 4:
+                return None
+            l_name = struct.unpack_from('<i', data, offset)[0]
+            if len(data) < offset + 8 + l_name:
+                return None
+            name = data[offset + 4:offset + 4 + l_name].rstrip(b'\x00')
+            l_ref = struct.unpack_from('<i', data, offset + 4 + l_name)[0]
+            references.append({'name': name.decode('utf-8'), 'length': l_ref})
+            offset += 8 + l_name
+        return {
+            'header': [x for x in text.split('\n') if len(x) > 0],
+            'references': references
+        }
+
+    def get_contents(self, resource_instance, query_params={}, preview=False):
+        '''
+        Returns the header of the BAM file (the SAM-format header lines
+        and the reference sequences). Only the leading compressed blocks
+        are read from storage.
+
+        Note that region queries are not supported since they require the
+        BAI index, which is a separate resource that is not associated
+        with the BAM file.
+        '''
+        storage = resource_instance.datafile.storage
+        num_bytes = BAM_HEADER_INITIAL_BYTES
+        while True:
+            content = storage.read_leading_bytes(
+                resource_instance.datafile.name, num_bytes)
+            # the final block may be truncated, so decompress
+            # whatever is available.
+            data = b''
+            try:
+                for x in iter_decompressed([content]):
+                    data += x
+            except zlib.error as ex:
+                if len(data) == 0:
+                    raise ParseException('Could not decompress the BAM file.'
+                        f' The error reported was: {ex}')
+            header = AlignedSequenceResource.parse_header(data)
+            if header is not None:
+                return header
+            if len(content) < num_bytes:
+                raise ParseException('The BAM file ended before the'
+                    ' end of its header.')
+            num_bytes *= 2
+
 
 class BAMIndexResource(SequenceResource):
     '''
@@ -0,0 +1,200 @@
+# This file contains common elements for resource types (e.g. sequence
+# files) whose contents are provided by streaming the file from
+# storage. Since those files can be very large, we only read as far
+# into the file as needed to provide the requested page of records.
+import zlib
+import logging
+from itertools import islice
+from collections import OrderedDict
+
+from django.conf import settings
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from exceptions import NonIterableContentsException, \
+    ParseException
+
+logger = logging.getLogger(__name__)
+
+# If requesting a preview of a streamed resource,
+# how many records do we return?
+PREVIEW_NUM_RECORDS = 5
+
+# The maximum page size which can be requested. Larger
+# requested page sizes are reduced to this value, as with
+# the `max_page_size` of the other paginators.
+MAX_PAGE_SIZE = 1000
+
+# how many bytes to read from storage at a time
+STREAM_CHUNK_BYTES = 256 * 1024
+
+# the first bytes of any gzip-compressed file (including
+# BGZF files, which are a series of gzip members)
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def iter_decompressed(chunks):
+    '''
+    Decompresses an iterable of gzip-compressed chunks. Handles
+    files made of multiple gzip members (e.g. from bgzip)
+    '''
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        while len(chunk) > 0:
+            yield decompressor.decompress(chunk)
+            if decompressor.eof:
+                chunk = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+            else:
+                chunk = b''
+
+
+def iter_lines(resource_instance):
+    '''
+    Yields the lines (as strings, without line endings) of the resource's
+    file. The file is read incrementally from storage and gzip-compressed
+    files are decompressed on the fly. If the caller stops iterating, no
+    more of the file is read.
+    '''
+    stream = resource_instance.datafile.storage.open_stream(
+        resource_instance.datafile.name)
+
+    def iter_chunks(first_chunk):
+        chunk = first_chunk
+        while len(chunk) > 0:
+            yield chunk
+            chunk = stream.read(STREAM_CHUNK_BYTES)
+
+    try:
+        first_chunk = stream.read(STREAM_CHUNK_BYTES)
+        chunks = iter_chunks(first_chunk)
+        if first_chunk.startswith(GZIP_MAGIC):
+            chunks = iter_decompressed(chunks)
+
+        remainder = b''
+        for chunk in chunks:
+            lines = (remainder + chunk).split(b'\n')
+            remainder = lines.pop()
+            for line in lines:
+                yield line.rstrip(b'\r').decode('utf-8', errors='replace')
+        if len(remainder) > 0:
+            yield remainder.rstrip(b'\r').decode('utf-8', errors='replace')
+    except zlib.error as ex:
+        raise ParseException('Could not decompress the file. The error'
+            f' reported was: {ex}')
+    finally:
+        stream.close()
+
+
+class StreamedContentsPage(object):
+    '''
+    A single page of records, as returned by the `get_contents` method
+    of streamed resource types when pagination is requested.
+
+    Since the records are streamed, we do not know the total count.
+    Instead, we know whether there is a subsequent page.
+    '''
+    def __init__(self, records, number, has_next):
+        self.records = records
+        self.number = number
+        self.has_next = has_next
+
+
+class StreamedContentsPagination(PageNumberPagination):
+    '''
+    The `get_contents` method of streamed resources only reads the records
+    for the requested page, so this class simply formats the response
+    with links to the adjacent pages.
+    '''
+    page_query_param = settings.PAGE_PARAM
+    page_size_query_param = settings.PAGE_SIZE_PARAM
+    max_page_size = MAX_PAGE_SIZE
+
+    def paginate_queryset(self, contents, request, view=None):
+        if not isinstance(contents, StreamedContentsPage):
+            raise NonIterableContentsException()
+        if (contents.number > 1) and (len(contents.records) == 0):
+            raise NotFound('Invalid page.')
+        self.request = request
+        self.contents = contents
+        return contents.records
+
+    def get_next_link(self):
+        if not self.contents.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param,
+            self.contents.number + 1)
+
+    def get_previous_link(self):
+        if self.contents.number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param,
+            self.contents.number - 1)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+
+class StreamedContentsMixin(object):
+    '''
+    A mixin for resource types whose contents are provided as a sequence
+    of records read from the start of the file. Classes using this
+    mixin implement `iter_records`, which yields the records.
+
+    Without pagination, the first page of records is returned
+    since these files are typically too large to return in full.
+    '''
+
+    @staticmethod
+    def get_paginator():
+        return StreamedContentsPagination()
+
+    def iter_records(self, resource_instance):
+        raise NotImplementedError('You must'
+        ' implement this method in the derived class')
+
+    @staticmethod
+    def get_page_params(query_params):
+        '''
+        Returns a tuple of the (1-based) page number and the page size.
+        The page size is limited to MAX_PAGE_SIZE.
+        '''
+        try:
+            page = int(query_params.get(settings.PAGE_PARAM, 1))
+        except ValueError:
+            raise ParseException('The page must be a positive integer.')
+        try:
+            page_size = int(query_params.get(settings.PAGE_SIZE_PARAM,
+                settings.REST_FRAMEWORK['PAGE_SIZE']))
+        except ValueError:
+            raise ParseException('The page size must be a positive integer.')
+        if (page < 1) or (page_size < 1):
+            raise ParseException('The page and page size must'
+                ' be positive integers.')
+        return page, min(page_size, MAX_PAGE_SIZE)
+
+    def get_contents(self, resource_instance, query_params={}, preview=False):
+        if preview:
+            return list(islice(self.iter_records(resource_instance),
+                PREVIEW_NUM_RECORDS))
+
+        page, page_size = self.get_page_params(query_params)
+        start = (page - 1) * page_size
+
+        # read one record beyond the page so we know if there is another page
+        records = list(islice(self.iter_records(resource_instance),
+            start, start + page_size + 1))
+        has_next = len(records) > page_size
+        records = records[:page_size]
+        if settings.PAGE_PARAM in query_params:
+            return StreamedContentsPage(records, page, has_next)
+        return records
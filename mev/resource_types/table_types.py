@@ -195,6 +195,10 @@ class TableResource(DataResource):
     # the "standardized" format we will save all table-based files as:
     STANDARD_FORMAT = TSV_FORMAT
 
+    # the full (filtered and sorted) table is returned by `get_contents`
+    # and then paginated, so we can cache that result.
+    CACHE_CONTENTS = True
+
     # Create a list of query params that are "reserved" and we ignore when
     # attempting to filter on the actual table content (e.g. the column/rows)
     IGNORED_QUERY_PARAMS = [settings.PAGE_SIZE_PARAM, settings.PAGE_PARAM, settings.SORT_PARAM]
@@ -284,13 +288,21 @@ class TableResource(DataResource):
             raise ParserNotFoundException('')
         else:
             try:
-                # read the table using the appropriate parser:
+                # read the table using the appropriate parser.
+                # For previews of delimited files, only read the leading
+                # lines (plus the header) from storage. Excel files
+                # cannot be read partially.
                 if preview:
                     nrows = PREVIEW_NUM_LINES
+                    if reader is pd.read_excel:
+                        fh = resource_instance.datafile.open()
+                    else:
+                        fh = self.read_leading_lines(resource_instance,
+                            PREVIEW_NUM_LINES + 1, comment='#')
                 else:
                     nrows = None
-                self.table = reader(
-                    resource_instance.datafile.open(),
+                    fh = resource_instance.datafile.open()
+                self.table = reader(fh,
                     index_col=0, comment='#', nrows=nrows)
 
                 # drop extra/empty cols and rows
@@ -1351,14 +1363,16 @@ class BaseBEDFile(TableResource):
 
         if preview:
             nrows = PREVIEW_NUM_LINES
+            fh = self.read_leading_lines(resource_instance, PREVIEW_NUM_LINES)
         else:
             nrows = None
+            fh = resource_instance.datafile.open()
 
         # if the BED file has a header, the reader below will incorporate
         # that into the columns and the 2nd and 3rd columns will no longer have
         # the proper integer type.
         try:
-            self.table = reader(resource_instance.datafile.open(), 
+            self.table = reader(fh, 
                 names=names,
                 usecols=column_numbers,
                 nrows=nrows)